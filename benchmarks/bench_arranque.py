@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de Arranque de la Aplicación
+Sistema de Laboratorios - Centro Minero SENA
+Mide en procesos nuevos el tiempo de importar web_app, de create_app(), de la primera
+petición (/login) y del primer uso de visión (importación diferida de cv2/numpy),
+con carga diferida frente a precarga (PRELOAD_VISION/PRELOAD_REPORTS).
+
+No requiere base de datos.
+
+Uso:
+    python benchmarks/bench_arranque.py --repeticiones 5 --salida arranque.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Código ejecutado en cada proceso hijo; imprime una línea JSON con los tiempos
+HIJO = r'''
+import json, sys, time
+t0 = time.perf_counter()
+import web_app
+t1 = time.perf_counter()
+pesados = [m for m in ('cv2', 'numpy', 'reportlab', 'openpyxl', 'tensorflow') if m in sys.modules]
+app = web_app.create_app({'TESTING': True})
+t2 = time.perf_counter()
+cliente = app.test_client()
+estado = cliente.get('/login').status_code
+t3 = time.perf_counter()
+# PNG 1x1 para forzar el primer uso de cv2/numpy
+png = ('iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg==')
+from blueprints.comun import _decode_image_base64
+_decode_image_base64(png)
+t4 = time.perf_counter()
+print(json.dumps({
+    'importar_ms': (t1 - t0) * 1000,
+    'create_app_ms': (t2 - t1) * 1000,
+    'primera_peticion_ms': (t3 - t2) * 1000,
+    'primer_uso_vision_ms': (t4 - t3) * 1000,
+    'total_ms': (t4 - t0) * 1000,
+    'estado_login': estado,
+    'modulos_pesados_tras_importar': pesados,
+}))
+'''
+
+MODOS = {
+    'diferido': {'PRELOAD_VISION': '0', 'PRELOAD_REPORTS': '0', 'AI_MODE': 'lazy'},
+    'precarga': {'PRELOAD_VISION': '1', 'PRELOAD_REPORTS': '1', 'AI_MODE': 'lazy'},
+}
+
+
+def ejecutar(entorno_extra):
+    entorno = dict(os.environ, LOG_LEVEL='WARNING', **entorno_extra)
+    salida = subprocess.run([sys.executable, '-c', HIJO], cwd=RAIZ, env=entorno,
+                            capture_output=True, text=True, check=True)
+    # La última línea JSON con 'importar_ms' es el resultado (el resto son logs)
+    for linea in reversed(salida.stdout.strip().splitlines()):
+        if linea.startswith('{') and 'importar_ms' in linea:
+            return json.loads(linea)
+    raise RuntimeError(f"Salida inesperada:\n{salida.stdout}\n{salida.stderr}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de arranque de web_app')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados')
+    args = parser.parse_args()
+
+    resultado = {}
+    for modo, entorno in MODOS.items():
+        corridas = [ejecutar(entorno) for _ in range(args.repeticiones)]
+        claves = ('importar_ms', 'create_app_ms', 'primera_peticion_ms', 'primer_uso_vision_ms', 'total_ms')
+        resultado[modo] = {c: round(statistics.median(r[c] for r in corridas), 1) for c in claves}
+        resultado[modo]['modulos_pesados_tras_importar'] = corridas[0]['modulos_pesados_tras_importar']
+
+    print(f"{'Modo':<10}{'import':>10}{'create_app':>12}{'1a petición':>13}{'1er cv2':>10}{'total':>10}  (mediana ms)")
+    for modo, r in resultado.items():
+        print(f"{modo:<10}{r['importar_ms']:>10}{r['create_app_ms']:>12}{r['primera_peticion_ms']:>13}"
+              f"{r['primer_uso_vision_ms']:>10}{r['total_ms']:>10}")
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.salida}")
+
+
+if __name__ == '__main__':
+    main()
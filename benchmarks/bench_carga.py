@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de Carga de las Rutas Principales
+Sistema de Laboratorios - Centro Minero SENA
+Siembra una base de datos MySQL local de pruebas (nunca la de producción) con datos
+sintéticos a escala 1k/10k/100k, genera plantillas y rostros sintéticos, y lanza
+peticiones concurrentes contra las rutas clave registrando throughput y percentiles
+de latencia en un JSON comparable entre commits.
+
+Requiere un MySQL local (p. ej. `docker run -e MYSQL_ROOT_PASSWORD=bench -p 3306:3306 mysql:8`).
+
+Uso:
+    # Sembrar 10k filas y medir en proceso (cliente de pruebas de Flask)
+    python benchmarks/bench_carga.py --sembrar --escala 10k --password bench --salida carga.json
+
+    # Medir un servidor ya levantado (gunicorn/waitress) con la misma base e IMG_ROOT
+    python benchmarks/bench_carga.py --url http://127.0.0.1:5000 --concurrencia 8
+
+    # Comparar con una corrida anterior
+    python benchmarks/bench_carga.py --password bench --comparar carga_base.json
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from benchmarks import datos_sinteticos as ds  # noqa: E402
+from utils.perfilador_consultas import percentil  # noqa: E402
+
+# (nombre, método, ruta, tipo de cuerpo, requiere sesión de administrador, pesada)
+ESCENARIOS = [
+    ('dashboard', 'GET', '/dashboard', None, True, False),
+    ('inventario', 'GET', '/inventario', None, True, False),
+    ('registros_completos', 'GET', '/api/registros-completos', None, True, False),
+    ('login_facial', 'POST', '/login_facial', 'rostro', False, True),
+    ('vision_match', 'POST', '/api/vision/match', 'plantilla', False, True),
+    ('visual_recognize', 'POST', '/api/visual/recognize', 'plantilla', False, True),
+    ('reporte_pdf', 'GET', '/reportes/descargar/pdf', None, True, True),
+    ('reporte_excel', 'GET', '/reportes/descargar/excel', None, True, True),
+]
+
+
+# =====================================================================
+# CLIENTES
+# =====================================================================
+
+class ClienteLocal:
+    """Peticiones en proceso con el cliente de pruebas de Flask"""
+
+    def __init__(self, app, admin):
+        self.cliente = app.test_client()
+        if admin:
+            with self.cliente.session_transaction() as sesion:
+                sesion['user_id'] = ds.USUARIO_ADMIN
+                sesion['user_name'] = 'Administrador Benchmark'
+                sesion['user_type'] = 'administrador'
+                sesion['user_level'] = 5
+
+    def pedir(self, metodo, ruta, cuerpo=None):
+        respuesta = self.cliente.open(ruta, method=metodo, json=cuerpo)
+        return respuesta.status_code, len(respuesta.get_data())
+
+
+class ClienteHTTP:
+    """Peticiones HTTP reales contra un servidor levantado (cookie de sesión propia)"""
+
+    def __init__(self, url_base, admin, timeout=60):
+        self.url_base = url_base.rstrip('/')
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        if admin:
+            datos = urllib.parse.urlencode({'user_id': ds.USUARIO_ADMIN, 'password': ds.PASSWORD_BENCH}).encode()
+            self.opener.open(self.url_base + '/login', data=datos, timeout=timeout).read()
+
+    def pedir(self, metodo, ruta, cuerpo=None):
+        datos = json.dumps(cuerpo).encode() if cuerpo is not None else None
+        peticion = urllib.request.Request(self.url_base + ruta, data=datos, method=metodo,
+                                          headers={'Content-Type': 'application/json'} if datos else {})
+        try:
+            with self.opener.open(peticion, timeout=self.timeout) as respuesta:
+                return respuesta.status, len(respuesta.read())
+        except urllib.error.HTTPError as e:
+            return e.code, len(e.read())
+
+
+# =====================================================================
+# MEDICIÓN
+# =====================================================================
+
+def medir_escenario(crear_cliente, escenario, cuerpos, peticiones, concurrencia, calentamiento):
+    nombre, metodo, ruta, tipo_cuerpo, admin, _ = escenario
+    locales = threading.local()
+
+    def una(i):
+        cliente = getattr(locales, 'cliente', None)
+        if cliente is None:
+            cliente = locales.cliente = crear_cliente(admin)
+        cuerpo = cuerpos[tipo_cuerpo][i % len(cuerpos[tipo_cuerpo])] if tipo_cuerpo else None
+        inicio = time.perf_counter()
+        try:
+            estado, tamano = cliente.pedir(metodo, ruta, cuerpo)
+        except Exception as e:
+            estado, tamano = type(e).__name__, 0
+        return (time.perf_counter() - inicio) * 1000, estado, tamano
+
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        list(pool.map(una, range(calentamiento)))
+        inicio = time.perf_counter()
+        resultados = list(pool.map(una, range(peticiones)))
+        duracion = time.perf_counter() - inicio
+
+    tiempos = sorted(r[0] for r in resultados)
+    estados = {}
+    for _, estado, _ in resultados:
+        estados[str(estado)] = estados.get(str(estado), 0) + 1
+    return {
+        'ruta': ruta,
+        'peticiones': peticiones,
+        'rps': round(peticiones / duracion, 2) if duracion else None,
+        'media_ms': round(sum(tiempos) / len(tiempos), 2),
+        'p50_ms': round(percentil(tiempos, 50), 2),
+        'p90_ms': round(percentil(tiempos, 90), 2),
+        'p95_ms': round(percentil(tiempos, 95), 2),
+        'p99_ms': round(percentil(tiempos, 99), 2),
+        'max_ms': round(tiempos[-1], 2),
+        'bytes_medio': round(sum(r[2] for r in resultados) / len(resultados)),
+        'estados': estados,
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def comparar(actual, base):
+    print(f"\n{'Escenario':<22}{'p50 base':>10}{'p50 act':>10}{'Δ%':>8}{'p95 base':>10}{'p95 act':>10}{'Δ%':>8}"
+          f"{'rps base':>10}{'rps act':>10}")
+    for nombre, r in actual['escenarios'].items():
+        b = base.get('escenarios', {}).get(nombre)
+        if not b:
+            continue
+
+        def delta(clave):
+            return f"{(r[clave] - b[clave]) / b[clave] * 100:+.1f}" if b[clave] else '-'
+        print(f"{nombre:<22}{b['p50_ms']:>10}{r['p50_ms']:>10}{delta('p50_ms'):>8}"
+              f"{b['p95_ms']:>10}{r['p95_ms']:>10}{delta('p95_ms'):>8}{b['rps']:>10}{r['rps']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de carga de las rutas principales')
+    parser.add_argument('--escala', default='1k', help='Filas de equipos/inventario/reservas: 1k, 10k, 100k o un número')
+    parser.add_argument('--sembrar', action='store_true', help='Recrear la base de benchmark y sembrarla')
+    parser.add_argument('--rostros', type=int, default=50, help='Usuarios con rostro registrado')
+    parser.add_argument('--plantillas', type=int, default=20, help='Objetos/equipos con plantillas de imagen')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--host', default=os.getenv('BENCH_DB_HOST', '127.0.0.1'))
+    parser.add_argument('--usuario', default=os.getenv('BENCH_DB_USER', 'root'))
+    parser.add_argument('--password', default=os.getenv('BENCH_DB_PASSWORD', ''))
+    parser.add_argument('--base-datos', default=os.getenv('BENCH_DB_NAME', 'laboratorio_bench'))
+    parser.add_argument('--directorio', default=os.path.join(tempfile.gettempdir(), 'laboratorio_bench'),
+                        help='Carpeta de trabajo; las imágenes se generan en <directorio>/imagenes')
+    parser.add_argument('--url', help='Medir un servidor HTTP en lugar del cliente en proceso')
+    parser.add_argument('--concurrencia', type=int, default=4)
+    parser.add_argument('--peticiones', type=int, default=200, help='Peticiones por escenario ligero')
+    parser.add_argument('--peticiones-pesadas', type=int, default=30, help='Peticiones por escenario de visión/reportes')
+    parser.add_argument('--calentamiento', type=int, default=5)
+    parser.add_argument('--escenarios', help='Lista separada por comas (por defecto todos)')
+    parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados')
+    parser.add_argument('--comparar', help='JSON de una corrida anterior para mostrar diferencias')
+    args = parser.parse_args()
+
+    filas = ds.escala(args.escala)
+    # Rutas de archivo absolutas: en modo en proceso se cambia el directorio actual
+    args.salida = os.path.abspath(args.salida) if args.salida else None
+    args.comparar = os.path.abspath(args.comparar) if args.comparar else None
+    if args.base_datos in ('laboratorio_sistema', os.getenv('BASE_DATOS')):
+        parser.error('La base de benchmark no puede ser la de producción')
+
+    if args.sembrar:
+        import mysql.connector
+        config = {'host': args.host, 'user': args.usuario, 'password': args.password, 'charset': 'utf8mb4'}
+        inicio = time.perf_counter()
+        ds.crear_base_datos(config, args.base_datos)
+        conn = mysql.connector.connect(database=args.base_datos, **config)
+        try:
+            conteos = ds.sembrar(conn, filas, rostros=args.rostros, semilla=args.semilla)
+        finally:
+            conn.close()
+        print(f"Base '{args.base_datos}' sembrada en {time.perf_counter() - inicio:.1f}s: {conteos}")
+
+    imagenes = os.path.join(args.directorio, 'imagenes')
+    bases = ds.generar_corpus(imagenes, args.plantillas, semilla=args.semilla)
+    cuerpos = {
+        'plantilla': [{'image_base64': ds.a_base64(ds.variacion(b, args.semilla + i))} for i, b in enumerate(bases)],
+        'rostro': [{'image': ds.a_base64(ds.rostro_sintetico(args.semilla + i))} for i in range(1, 11)],
+    }
+
+    if args.url:
+        def crear_cliente(admin):
+            return ClienteHTTP(args.url, admin)
+        print(f"Servidor externo: debe usar BASE_DATOS={args.base_datos} e IMG_ROOT={imagenes} "
+              f"(y ejecutarse desde {args.directorio})")
+    else:
+        # La aplicación lee la configuración de BD e IMG_ROOT al importarse
+        os.environ.update({'HOST': args.host, 'USUARIO_PRODUCCION': args.usuario,
+                           'PASSWORD_PRODUCCION': args.password, 'BASE_DATOS': args.base_datos,
+                           'IMG_ROOT': imagenes, 'LOG_LEVEL': os.getenv('LOG_LEVEL', 'WARNING')})
+        import web_app
+        app = web_app.create_app({'TESTING': True})
+        # VisualRecognitionAPI busca en 'imagenes/' relativo al directorio actual
+        os.chdir(args.directorio)
+
+        def crear_cliente(admin):
+            return ClienteLocal(app, admin)
+
+    seleccion = set(args.escenarios.split(',')) if args.escenarios else None
+    resultado = {
+        'meta': {
+            'commit': _commit(),
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'escala': filas,
+            'rostros': args.rostros,
+            'plantillas': args.plantillas,
+            'concurrencia': args.concurrencia,
+            'modo': 'http' if args.url else 'proceso',
+            'python': platform.python_version(),
+        },
+        'escenarios': {},
+    }
+    print(f"{'Escenario':<22}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}  estados")
+    for escenario in ESCENARIOS:
+        if seleccion and escenario[0] not in seleccion:
+            continue
+        peticiones = args.peticiones_pesadas if escenario[5] else args.peticiones
+        r = medir_escenario(crear_cliente, escenario, cuerpos, peticiones, args.concurrencia, args.calentamiento)
+        resultado['escenarios'][escenario[0]] = r
+        print(f"{escenario[0]:<22}{r['rps']:>8}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}  {r['estados']}")
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.salida}")
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            comparar(resultado, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark del Registro de Detectores OpenCV
+Sistema de Laboratorios - Centro Minero SENA
+Compara, para cada detector de utils.detectores (Haar frontal, ORB 500/1500, BF Hamming,
+FLANN LSH), el costo de construirlo en cada petición (lo que hacían login_facial,
+FacialRegistrationAPI, _simple_recognition y _match_orb_flann) contra pedirlo al
+registro, y el de una petición típica completa (construcción + uso) en ambos modos.
+Al final reparte peticiones entre varios hilos para mostrar que cada hilo construye
+su instancia una sola vez.
+
+Uso:
+    python benchmarks/bench_detectores.py --repeticiones 50 --hilos 8 --salida detectores.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from benchmarks import datos_sinteticos as ds  # noqa: E402
+from benchmarks.bench_vision import medir  # noqa: E402
+from utils.detectores import RegistroDetectores, detectores  # noqa: E402
+
+
+def casos(cv2):
+    """(detector, uso típico por petición) sobre un rostro y una escena sintéticos"""
+    rostro = cv2.cvtColor(cv2.resize(ds.rostro_sintetico(7), (640, 480)), cv2.COLOR_BGR2GRAY)
+    escena = cv2.cvtColor(ds.imagen_sintetica(7), cv2.COLOR_BGR2GRAY)
+    plantilla = cv2.cvtColor(ds.variacion(ds.imagen_sintetica(7), 3), cv2.COLOR_BGR2GRAY)
+    _, des_escena = cv2.ORB_create(nfeatures=1500).detectAndCompute(escena, None)
+    _, des_plantilla = cv2.ORB_create(nfeatures=1500).detectAndCompute(plantilla, None)
+    return {
+        'rostros_haar': lambda d: d.detectMultiScale(rostro, scaleFactor=1.1, minNeighbors=5, minSize=(100, 100)),
+        'orb_500': lambda d: d.detectAndCompute(escena, None),
+        'orb_1500': lambda d: d.detectAndCompute(escena, None),
+        'bf_hamming': lambda d: d.match(des_escena, des_plantilla),
+        'flann_lsh': lambda d: d.knnMatch(des_escena, des_plantilla, k=2),
+    }
+
+
+def medir_detector(nombre, uso, repeticiones):
+    fabrica = detectores.fabricas()[nombre][0]
+    detectores.obtener(nombre)
+    r = {}
+    r['construir'], _ = medir(fabrica, repeticiones)
+    r['registro'], _ = medir(lambda: detectores.obtener(nombre), repeticiones)
+    r['peticion_construyendo'], _ = medir(lambda: uso(fabrica()), repeticiones)
+    r['peticion_registro'], _ = medir(lambda: uso(detectores.obtener(nombre)), repeticiones)
+    r['ahorro_ms'] = round(r['peticion_construyendo']['media_ms'] - r['peticion_registro']['media_ms'], 3)
+    return r
+
+
+def medir_hilos(hilos, peticiones):
+    """Peticiones concurrentes contra un registro nuevo: una construcción por hilo y detector"""
+    registro = RegistroDetectores()
+    for nombre, (fabrica, por_hilo) in detectores.fabricas().items():
+        registro.registrar(nombre, fabrica, por_hilo)
+    ids = set()
+
+    def peticion(_):
+        ids.add(threading.get_ident())
+        registro.obtener('rostros_haar')
+        registro.obtener('orb_500')
+
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        list(pool.map(peticion, range(peticiones)))
+    return {'hilos_usados': len(ids), 'peticiones': peticiones, **registro.estadisticas()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del registro de detectores OpenCV')
+    parser.add_argument('--repeticiones', type=int, default=50)
+    parser.add_argument('--hilos', type=int, default=8)
+    parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados')
+    args = parser.parse_args()
+
+    from utils.detectores import cv2
+    resultado = {'repeticiones': args.repeticiones, 'detectores': {}}
+    print(f"{'Detector':<14}{'construir':>11}{'registro':>11}{'petición+c':>12}{'petición+r':>12}{'ahorro':>10}  (ms)")
+    for nombre, uso in casos(cv2).items():
+        r = medir_detector(nombre, uso, args.repeticiones)
+        resultado['detectores'][nombre] = r
+        print(f"{nombre:<14}{r['construir']['media_ms']:>11}{r['registro']['media_ms']:>11}"
+              f"{r['peticion_construyendo']['media_ms']:>12}{r['peticion_registro']['media_ms']:>12}{r['ahorro_ms']:>10}")
+
+    resultado['hilos'] = medir_hilos(args.hilos, args.hilos * 25)
+    h = resultado['hilos']
+    print(f"\n{h['peticiones']} peticiones en {h['hilos_usados']} hilos: {h['creados']} construcciones, "
+          f"{h['reutilizados']} reutilizaciones")
+
+    if args.salida:
+        with open(os.path.abspath(args.salida), 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.salida}")
+
+
+if __name__ == '__main__':
+    main()
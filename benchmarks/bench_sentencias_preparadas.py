@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de Sentencias Preparadas
+Sistema de Laboratorios - Centro Minero SENA
+Compara las rutas de dashboard y listados ejecutando el SQL como texto frente a
+sentencias preparadas cacheadas por conexión del pool (DatabaseManager.use_prepared).
+
+Requiere la base de datos configurada en .env_produccion.
+
+Uso:
+    python benchmarks/bench_sentencias_preparadas.py --iteraciones 200
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import web_app  # noqa: E402
+
+RUTAS = ['/dashboard', '/equipos', '/inventario', '/laboratorios', '/reservas']
+USUARIO_BENCH = 'BENCH'
+
+# Contadores globales de MySQL que reflejan el trabajo del parser
+CONTADORES = ('Com_select', 'Com_stmt_prepare', 'Com_stmt_execute', 'Com_stmt_close')
+
+
+def _contadores_mysql(db):
+    marcadores = ', '.join(['%s'] * len(CONTADORES))
+    filas = db.execute_query(
+        "SELECT VARIABLE_NAME, VARIABLE_VALUE FROM performance_schema.global_status "
+        f"WHERE VARIABLE_NAME IN ({marcadores})",
+        tuple(c.upper() for c in CONTADORES),
+        prepared=False,
+    ) or []
+    return {f['VARIABLE_NAME'].title(): int(f['VARIABLE_VALUE']) for f in filas}
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100.0 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+def medir(cliente, iteraciones, preparadas):
+    """Ejecuta cada ruta `iteraciones` veces y devuelve tiempos en milisegundos"""
+    db = web_app.db_manager
+    db.use_prepared = preparadas
+    # Calentamiento: llena el pool y, si aplica, la caché de sentencias
+    for ruta in RUTAS:
+        for _ in range(db.prepared_min_uses + 1):
+            cliente.get(ruta)
+
+    antes = _contadores_mysql(db)
+    stats_antes = dict(db.stats)
+    resultados = {}
+    for ruta in RUTAS:
+        tiempos = []
+        for _ in range(iteraciones):
+            inicio = time.perf_counter()
+            respuesta = cliente.get(ruta)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            if respuesta.status_code != 200:
+                raise RuntimeError(f"{ruta} respondió {respuesta.status_code}")
+        resultados[ruta] = {
+            'media_ms': round(statistics.mean(tiempos), 3),
+            'p50_ms': round(_percentil(tiempos, 50), 3),
+            'p95_ms': round(_percentil(tiempos, 95), 3),
+        }
+    despues = _contadores_mysql(db)
+
+    return {
+        'rutas': resultados,
+        'mysql': {k: despues.get(k, 0) - antes.get(k, 0) for k in despues},
+        'db_manager': {k: db.stats[k] - stats_antes.get(k, 0) for k in db.stats},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de sentencias preparadas')
+    parser.add_argument('--iteraciones', type=int, default=100)
+    parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados')
+    args = parser.parse_args()
+
+    web_app.app.config['TESTING'] = True
+    cliente = web_app.app.test_client()
+    # Cada petición valida la sesión contra la caché de usuarios: sin esta entrada 'BENCH' no
+    # existe en la tabla, la sesión se cierra y las rutas redirigen al login. TTL sin límite
+    # para que no se consulte (ni venza) durante la medición.
+    web_app.usuarios_cache.ttl_s = float('inf')
+    web_app.usuarios_cache.guardar(USUARIO_BENCH, {'id': USUARIO_BENCH, 'nombre': 'Benchmark', 'tipo': 'administrador',
+                                                   'nivel_acceso': 5, 'activo': 1})
+    with cliente.session_transaction() as sesion:
+        sesion['user_id'] = USUARIO_BENCH
+        sesion['user_name'] = 'Benchmark'
+        sesion['user_type'] = 'administrador'
+        sesion['user_level'] = 5
+
+    resultado = {
+        'iteraciones': args.iteraciones,
+        'texto': medir(cliente, args.iteraciones, preparadas=False),
+        'preparadas': medir(cliente, args.iteraciones, preparadas=True),
+    }
+
+    print(f"{'Ruta':<16}{'texto p50':>12}{'prep p50':>12}{'texto p95':>12}{'prep p95':>12}")
+    for ruta in RUTAS:
+        t = resultado['texto']['rutas'][ruta]
+        p = resultado['preparadas']['rutas'][ruta]
+        print(f"{ruta:<16}{t['p50_ms']:>12}{p['p50_ms']:>12}{t['p95_ms']:>12}{p['p95_ms']:>12}")
+    print("\nContadores MySQL (texto):     ", resultado['texto']['mysql'])
+    print("Contadores MySQL (preparadas):", resultado['preparadas']['mysql'])
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.salida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark de las Rutas Calientes de Visión
+Sistema de Laboratorios - Centro Minero SENA
+Desglosa el costo del reconocimiento por etapa (base64, cv2.imdecode, CLAHE de
+_preprocess_for_orb, extracción ORB, matching FLANN/BF, lectura de metadata.json,
+carga de plantillas) y de las funciones completas _decode_image_base64,
+_match_orb_flann y VisualRecognitionAPI._simple_recognition, sobre un corpus de
+plantillas sintéticas de tamaño creciente. Reporta tiempos y memoria por etapa.
+
+La base de datos se aísla (las consultas devuelven []) para medir sólo el trabajo de
+visión; bench_carga.py mide las rutas completas con BD.
+
+Uso:
+    python benchmarks/bench_vision.py --tamanos 5,20,80 --repeticiones 20 --salida vision.json
+"""
+
+import argparse
+import base64
+import glob
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from benchmarks import datos_sinteticos as ds  # noqa: E402
+from utils.perfilador_consultas import percentil  # noqa: E402
+
+try:
+    import psutil
+except ImportError:  # Sólo se omite la memoria residente
+    psutil = None
+
+
+def _rss_mb():
+    return psutil.Process().memory_info().rss / 1048576 if psutil else None
+
+
+def medir(funcion, repeticiones):
+    """Tiempos (ms) de `repeticiones` llamadas y pico de memoria Python/numpy de una llamada"""
+    funcion()  # calentamiento (cachés de OpenCV, importaciones)
+    tracemalloc.start()
+    resultado = funcion()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return {
+        'media_ms': round(statistics.mean(tiempos), 3),
+        'p50_ms': round(percentil(tiempos, 50), 3),
+        'p95_ms': round(percentil(tiempos, 95), 3),
+        'pico_kb': round(pico / 1024, 1),
+    }, resultado
+
+
+def medir_corpus(vision, cv2, items, por_item, repeticiones, directorio, semilla):
+    imagenes = os.path.join(directorio, 'imagenes')
+    bases = ds.generar_corpus(imagenes, items, por_item=por_item, semilla=semilla)
+    consulta = ds.variacion(bases[0], semilla)
+    data_url = ds.a_base64(consulta)
+    payload = data_url.split(',', 1)[1]
+    etapas = {}
+    rss_inicio = _rss_mb()
+
+    # --- Decodificación ---
+    etapas['base64_decode'], datos = medir(lambda: base64.b64decode(payload), repeticiones)
+    import numpy as np
+    etapas['cv2_imdecode'], frame = medir(
+        lambda: cv2.imdecode(np.frombuffer(datos, dtype=np.uint8), cv2.IMREAD_COLOR), repeticiones)
+    etapas['_decode_image_base64'], frame = medir(lambda: vision._decode_image_base64(data_url), repeticiones)
+
+    # --- Preprocesado y características ---
+    etapas['_preprocess_for_orb'], gris = medir(lambda: vision._preprocess_for_orb(frame), repeticiones)
+    orb = cv2.ORB_create(nfeatures=1500)
+    etapas['orb_detect_compute'], (kp, des) = medir(lambda: orb.detectAndCompute(gris, None), repeticiones)
+
+    # --- Plantillas (disco) ---
+    vision.IMG_ROOT = imagenes
+    etapas['carga_plantillas'], plantillas = medir(
+        lambda: vision._load_template_images_slim(max_per_key=12), max(1, repeticiones // 5))
+    metadata = glob.glob(os.path.join(imagenes, 'entrenamiento', '*', '*', 'metadata.json'))
+
+    def leer_metadata():
+        for ruta in metadata:
+            with open(ruta, encoding='utf-8') as f:
+                json.load(f)
+    etapas['metadata_json'], _ = medir(leer_metadata, repeticiones)
+
+    # --- Matching ---
+    _, des_plantilla = orb.detectAndCompute(plantillas[0][1], None)
+    flann = cv2.FlannBasedMatcher(dict(algorithm=6, table_number=12, key_size=20, multi_probe_level=2),
+                                  dict(checks=50))
+    etapas['flann_knn_una_plantilla'], _ = medir(lambda: flann.knnMatch(des, des_plantilla, k=2), repeticiones)
+    bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
+    etapas['bf_match_una_plantilla'], _ = medir(lambda: bf.match(des, des_plantilla), repeticiones)
+    etapas['_match_orb_flann'], coincidencia = medir(
+        lambda: vision._match_orb_flann(gris, plantillas), max(1, repeticiones // 5))
+
+    # --- Reconocimiento completo (lee imagenes/ relativo al directorio actual) ---
+    reconocedor = vision.VisualRecognitionAPI()
+    etapas['_simple_recognition'], reconocido = medir(
+        lambda: reconocedor._simple_recognition(frame), max(1, repeticiones // 5))
+
+    return {
+        'items': items,
+        'plantillas': len(plantillas),
+        'rss_mb': round(_rss_mb() - rss_inicio, 1) if psutil else None,
+        'match_orb_flann': coincidencia,
+        'simple_recognition': {k: reconocido.get(k) for k in ('recognized', 'item_id', 'confidence', 'best_score')
+                               if k in reconocido},
+        'etapas': etapas,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark de visión por etapa')
+    parser.add_argument('--tamanos', default='5,20,80', help='Items del corpus (separados por comas)')
+    parser.add_argument('--por-item', type=int, default=3, help='Imágenes por item')
+    parser.add_argument('--repeticiones', type=int, default=20)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados')
+    args = parser.parse_args()
+    salida = os.path.abspath(args.salida) if args.salida else None
+
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    from blueprints import vision
+    from blueprints.comun import cv2, db_manager
+    from utils.registro_log import configurar_logging
+    configurar_logging()
+    db_manager.execute_query = lambda *a, **k: []
+
+    resultado = {'por_item': args.por_item, 'repeticiones': args.repeticiones, 'corpus': []}
+    for items in (int(t) for t in args.tamanos.split(',')):
+        with tempfile.TemporaryDirectory(prefix='bench_vision_') as directorio:
+            anterior = os.getcwd()
+            os.chdir(directorio)
+            try:
+                r = medir_corpus(vision, cv2, items, args.por_item, args.repeticiones, directorio, args.semilla)
+            finally:
+                os.chdir(anterior)
+        resultado['corpus'].append(r)
+
+        rss = f" (RSS +{r['rss_mb']} MB)" if r['rss_mb'] is not None else ''
+        print(f"\nCorpus: {items} items, {r['plantillas']} plantillas{rss}")
+        print(f"  match_orb_flann: {r['match_orb_flann']}  simple_recognition: {r['simple_recognition']}")
+        print(f"  {'Etapa':<28}{'media ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'pico KB':>10}")
+        for etapa, e in r['etapas'].items():
+            print(f"  {etapa:<28}{e['media_ms']:>10}{e['p50_ms']:>10}{e['p95_ms']:>10}{e['pico_kb']:>10}")
+
+    if salida:
+        with open(salida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False, default=str)
+        print(f"\nResultados guardados en {salida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de Datos Sintéticos para Benchmarks
+Sistema de Laboratorios - Centro Minero SENA
+Crea el esquema a partir del respaldo más reciente de backups/, siembra laboratorios,
+equipos, inventario, reservas, usuarios y objetos a la escala pedida, y genera imágenes
+con textura (plantillas para ORB) y rostros dibujados que detecta el Haar Cascade.
+
+Todo es determinista a partir de una semilla para poder comparar corridas entre commits.
+"""
+
+import glob
+import json
+import os
+import random
+import re
+from datetime import datetime, timedelta
+
+import cv2
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Escalas con nombre: filas de equipos, inventario y reservas
+ESCALAS = {'1k': 1000, '10k': 10000, '100k': 100000}
+
+USUARIO_ADMIN = 'BENCH_ADMIN'
+PASSWORD_BENCH = 'bench'
+
+TABLAS_SEMBRADAS = ('laboratorios', 'usuarios', 'objetos', 'equipos', 'inventario', 'reservas')
+
+
+def escala(valor):
+    """'10k' o '10000' -> 10000"""
+    return ESCALAS.get(str(valor).lower()) or int(valor)
+
+
+def slug(nombre):
+    """Mismo saneamiento que usa visión para nombres de carpeta"""
+    return re.sub(r"\s+", '_', re.sub(r"[^a-z0-9_\- ]+", '', (nombre or '').lower())).strip()
+
+
+# =====================================================================
+# ESQUEMA Y SIEMBRA
+# =====================================================================
+
+def esquema_tablas(ruta_respaldo=None):
+    """Sentencias CREATE TABLE del respaldo más reciente (backups/backup_AAAAMMDD_HHMMSS.sql)"""
+    if ruta_respaldo is None:
+        candidatos = [r for r in glob.glob(os.path.join(RAIZ, 'backups', 'backup_*.sql'))
+                      if re.search(r'backup_\d{8}_\d{6}\.sql$', r)]
+        if not candidatos:
+            raise FileNotFoundError("No hay respaldos en backups/ para obtener el esquema")
+        ruta_respaldo = max(candidatos)
+    with open(ruta_respaldo, encoding='utf-8') as f:
+        texto = f.read()
+    return re.findall(r'CREATE TABLE `\w+` \(.*?\)[^;]*;', texto, re.S)
+
+
+def crear_base_datos(config, nombre, recrear=True):
+    """
+    Crear (o recrear) la base de datos de benchmark con el esquema de producción
+
+    Args:
+        config: dict para mysql.connector.connect sin 'database'
+        nombre: Nombre de la base de datos (nunca la de producción)
+        recrear: Borrar las tablas existentes
+    """
+    import mysql.connector
+
+    conn = mysql.connector.connect(**config)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{nombre}` CHARACTER SET utf8mb4")
+        cursor.execute(f"USE `{nombre}`")
+        cursor.execute("SET FOREIGN_KEY_CHECKS=0")
+        for sentencia in esquema_tablas():
+            tabla = re.match(r'CREATE TABLE `(\w+)`', sentencia).group(1)
+            if recrear:
+                cursor.execute(f"DROP TABLE IF EXISTS `{tabla}`")
+            cursor.execute(sentencia.replace('CREATE TABLE', 'CREATE TABLE IF NOT EXISTS', 1))
+        cursor.execute("SET FOREIGN_KEY_CHECKS=1")
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _insertar(conn, tabla, columnas, filas, tamano_lote):
+    sql = f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({', '.join(['%s'] * len(columnas))})"
+    cursor = conn.cursor()
+    try:
+        for i in range(0, len(filas), tamano_lote):
+            cursor.executemany(sql, filas[i:i + tamano_lote])
+            conn.commit()
+    finally:
+        cursor.close()
+    return len(filas)
+
+
+def sembrar(conn, filas, rostros=50, semilla=42, tamano_lote=1000):
+    """
+    Insertar datos sintéticos
+
+    Args:
+        conn: Conexión mysql.connector a la base de benchmark
+        filas: Filas de equipos, inventario y reservas (usuarios = filas/10, laboratorios = filas/200)
+        rostros: Usuarios con rostro_data (tamaño del índice facial)
+        semilla: Semilla del generador
+
+    Returns:
+        dict: Filas insertadas por tabla
+    """
+    rnd = random.Random(semilla)
+    ahora = datetime.now().replace(microsecond=0)
+    n_labs = max(5, filas // 200)
+    n_usuarios = max(50, filas // 10)
+    n_objetos = max(10, filas // 1000)
+    conteos = {}
+
+    labs = [(f'LAB-{i:04d}', f'Laboratorio sintético {i}', rnd.choice(['Química', 'Física', 'Minería', 'Suelos']),
+             f'Bloque {rnd.randint(1, 9)}', rnd.randint(10, 40), 'activo') for i in range(1, n_labs + 1)]
+    conteos['laboratorios'] = _insertar(conn, 'laboratorios',
+                                        ('codigo', 'nombre', 'tipo', 'ubicacion', 'capacidad_estudiantes', 'estado'),
+                                        labs, tamano_lote)
+    ids_labs = [str(i) for i in range(1, n_labs + 1)]
+
+    tipos = [('aprendiz', 1), ('instructor', 2), ('administrador', 4)]
+    usuarios = [(USUARIO_ADMIN, 'Administrador Benchmark', 'administrador', 5, 1,
+                 'bench_admin@example.com', PASSWORD_BENCH, None)]
+    for i in range(1, n_usuarios + 1):
+        tipo, nivel = rnd.choice(tipos)
+        rostro = _blob_rostro(semilla + i) if i <= rostros else None
+        usuarios.append((f'U{i:07d}', f'Usuario Sintético {i}', tipo, nivel, 1,
+                         f'usuario{i}@example.com', PASSWORD_BENCH, rostro))
+    conteos['usuarios'] = _insertar(conn, 'usuarios',
+                                    ('id', 'nombre', 'tipo', 'nivel_acceso', 'activo', 'email',
+                                     'password_hash', 'rostro_data'),
+                                    usuarios, min(tamano_lote, 200))
+
+    objetos = [(f'Objeto sintetico {i}', 'benchmark', 'Objeto generado para benchmarks')
+               for i in range(1, n_objetos + 1)]
+    conteos['objetos'] = _insertar(conn, 'objetos', ('nombre', 'categoria', 'descripcion'), objetos, tamano_lote)
+
+    estados = ['disponible', 'disponible', 'en_uso', 'mantenimiento', 'fuera_servicio']
+    equipos = [(f'EQ{i:07d}', f'Equipo sintético {i}', rnd.choice(['Balanza', 'Microscopio', 'Horno', 'Centrífuga']),
+                rnd.choice(estados), f'Mesa {rnd.randint(1, 30)}', rnd.choice(ids_labs),
+                json.dumps({'serie': f'S{rnd.randint(10000, 99999)}'}))
+               for i in range(1, filas + 1)]
+    conteos['equipos'] = _insertar(conn, 'equipos',
+                                   ('id', 'nombre', 'tipo', 'estado', 'ubicacion', 'laboratorio_id', 'especificaciones'),
+                                   equipos, tamano_lote)
+
+    inventario = []
+    for i in range(1, filas + 1):
+        minima = rnd.randint(1, 20)
+        inventario.append((f'INV{i:07d}', f'Insumo sintético {i}', rnd.choice(['Reactivo', 'Vidriería', 'EPP']),
+                           rnd.randint(0, 100), minima, rnd.choice(['und', 'ml', 'g']), rnd.choice(ids_labs)))
+    conteos['inventario'] = _insertar(conn, 'inventario',
+                                      ('id', 'nombre', 'categoria', 'cantidad_actual', 'cantidad_minima', 'unidad',
+                                       'laboratorio_id'),
+                                      inventario, tamano_lote)
+
+    reservas = []
+    for i in range(1, filas + 1):
+        inicio = ahora + timedelta(hours=rnd.randint(-24 * 60, 24 * 60))
+        reservas.append((f'RES{i:07d}', f'U{rnd.randint(1, n_usuarios):07d}', f'EQ{rnd.randint(1, filas):07d}',
+                         inicio, inicio + timedelta(hours=rnd.randint(1, 4)),
+                         rnd.choice(['programada', 'activa', 'completada', 'cancelada'])))
+    conteos['reservas'] = _insertar(conn, 'reservas',
+                                    ('id', 'usuario_id', 'equipo_id', 'fecha_inicio', 'fecha_fin', 'estado'),
+                                    reservas, tamano_lote)
+    return conteos
+
+
+# =====================================================================
+# IMÁGENES SINTÉTICAS
+# =====================================================================
+
+def imagen_sintetica(semilla, ancho=640, alto=480):
+    """Imagen BGR con figuras, líneas y texto (suficientes esquinas para ORB)"""
+    rng = np.random.default_rng(semilla)
+    img = np.full((alto, ancho, 3), rng.integers(180, 240), np.uint8)
+    for _ in range(25):
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        x, y = int(rng.integers(0, ancho)), int(rng.integers(0, alto))
+        forma = rng.integers(0, 3)
+        if forma == 0:
+            cv2.rectangle(img, (x, y), (x + int(rng.integers(20, 120)), y + int(rng.integers(20, 120))), color, -1)
+        elif forma == 1:
+            cv2.circle(img, (x, y), int(rng.integers(10, 60)), color, -1)
+        else:
+            cv2.line(img, (x, y), (int(rng.integers(0, ancho)), int(rng.integers(0, alto))), color, 3)
+    cv2.putText(img, f'LAB-{semilla}', (20, alto - 30), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 0), 3)
+    return img
+
+
+def variacion(img, semilla):
+    """Versión rotada, escalada y con ruido de una imagen (consulta que debe coincidir)"""
+    rng = np.random.default_rng(semilla)
+    alto, ancho = img.shape[:2]
+    matriz = cv2.getRotationMatrix2D((ancho / 2, alto / 2), float(rng.uniform(-15, 15)), float(rng.uniform(0.85, 1.1)))
+    salida = cv2.warpAffine(img, matriz, (ancho, alto), borderMode=cv2.BORDER_REFLECT)
+    ruido = rng.normal(0, 8, salida.shape)
+    return np.clip(salida + ruido, 0, 255).astype(np.uint8)
+
+
+def rostro_sintetico(semilla, tamano=320):
+    """Rostro dibujado (óvalo, cejas, ojos, nariz, boca) que el Haar Cascade frontal detecta"""
+    rng = np.random.default_rng(semilla)
+    img = np.full((tamano, tamano), 200, np.uint8)
+    cx, cy = tamano // 2, tamano // 2
+    fw, fh = int(tamano * 0.30), int(tamano * 0.40)
+    cv2.ellipse(img, (cx, cy), (fw, fh), 0, 0, 360, int(rng.integers(150, 190)), -1)
+    ey, ex = cy - int(fh * 0.25), int(fw * 0.42)
+    for lado in (-1, 1):
+        cv2.ellipse(img, (cx + lado * ex, ey - int(fh * 0.15)), (int(fw * 0.25), int(fh * 0.04)), 0, 0, 360, 60, -1)
+        cv2.ellipse(img, (cx + lado * ex, ey), (int(fw * 0.2), int(fh * 0.08)), 0, 0, 360, 40, -1)
+    cv2.ellipse(img, (cx, cy + int(fh * 0.12)), (int(fw * 0.12), int(fh * 0.06)), 0, 0, 360, 110, -1)
+    cv2.ellipse(img, (cx, cy + int(fh * 0.45)), (int(fw * 0.4), int(fh * 0.07)), 0, 0, 360, 70, -1)
+    img = cv2.GaussianBlur(img, (9, 9), 3)
+    img = np.clip(img + rng.normal(0, 6, img.shape), 0, 255).astype(np.uint8)
+    return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+
+
+def _blob_rostro(semilla):
+    # Igual que FacialRegistrationAPI: recorte del rostro a 200x200 en JPEG
+    img = rostro_sintetico(semilla)
+    t = img.shape[0]
+    recorte = cv2.resize(img[int(t * 0.15):int(t * 0.9), int(t * 0.15):int(t * 0.85)], (200, 200))
+    return cv2.imencode('.jpg', recorte)[1].tobytes()
+
+
+def a_base64(img, formato='.jpg'):
+    """Imagen -> data URL como la envía la cámara del navegador"""
+    import base64
+    datos = base64.b64encode(cv2.imencode(formato, img)[1].tobytes()).decode('ascii')
+    return f"data:image/{formato.strip('.').replace('jpg', 'jpeg')};base64,{datos}"
+
+
+def generar_corpus(raiz, items, por_item=3, semilla=42):
+    """
+    Escribir plantillas en el formato que leen los reconocedores
+
+    - raiz/objetos/objeto_sintetico_N/*.jpg                  (/api/vision/match)
+    - raiz/entrenamiento/equipo/EQnnnnnnn/*.jpg + metadata.json (/api/visual/recognize)
+
+    Args:
+        raiz: Carpeta 'imagenes' de destino
+        items: Número de objetos/equipos con plantillas
+        por_item: Imágenes por objeto/equipo
+
+    Returns:
+        list: Imágenes BGR base (una por item) para construir consultas con variacion()
+    """
+    bases = []
+    for i in range(1, items + 1):
+        base = imagen_sintetica(semilla + i)
+        bases.append(base)
+        dir_objeto = os.path.join(raiz, 'objetos', slug(f'Objeto sintetico {i}'))
+        dir_equipo = os.path.join(raiz, 'entrenamiento', 'equipo', f'EQ{i:07d}')
+        os.makedirs(dir_objeto, exist_ok=True)
+        os.makedirs(dir_equipo, exist_ok=True)
+        metadata = []
+        for k in range(por_item):
+            img = base if k == 0 else variacion(base, semilla * 1000 + i * 10 + k)
+            cv2.imwrite(os.path.join(dir_objeto, f'vista_{k}.jpg'), img)
+            ruta = os.path.join(dir_equipo, f'frontal_{k}.jpg')
+            cv2.imwrite(ruta, img)
+            metadata.append({'view_angle': 'frontal', 'filepath': ruta,
+                             'item_details': {'id': f'EQ{i:07d}', 'nombre': f'Equipo sintético {i}'}})
+        with open(os.path.join(dir_equipo, 'metadata.json'), 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False)
+    return bases
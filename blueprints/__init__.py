@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Blueprints de la Aplicación Web
+Sistema de Laboratorios - Centro Minero SENA
+Cada área se registra por separado para poder montarla en procesos o pools de
+workers distintos (p. ej. visión/facial con OpenCV aislados del tráfico del dashboard).
+"""
+
+import importlib
+import logging
+
+logger = logging.getLogger('web_app')
+
+# Grupo -> módulo con el Blueprint 'bp'
+GRUPOS = {
+    'nucleo': 'blueprints.nucleo',
+    'crud': 'blueprints.crud',
+    'reportes': 'blueprints.reportes',
+    'vision': 'blueprints.vision',
+    'facial': 'blueprints.facial',
+}
+
+# 'nucleo' (login, dashboard) se registra siempre: los decoradores redirigen allí
+GRUPO_OBLIGATORIO = 'nucleo'
+
+
+def normalizar_grupos(grupos=None):
+    """
+    Lista de grupos a registrar
+
+    Args:
+        grupos: Iterable o texto separado por comas ('vision,facial'); None o 'todos' = todos
+
+    Returns:
+        list: Grupos válidos en el orden de GRUPOS, incluyendo siempre 'nucleo'
+    """
+    if isinstance(grupos, str):
+        grupos = [g.strip() for g in grupos.split(',') if g.strip()]
+    if not grupos or 'todos' in grupos:
+        return list(GRUPOS)
+    desconocidos = set(grupos) - set(GRUPOS)
+    if desconocidos:
+        raise ValueError(f"Grupos de blueprints desconocidos: {', '.join(sorted(desconocidos))}")
+    seleccion = set(grupos) | {GRUPO_OBLIGATORIO}
+    return [g for g in GRUPOS if g in seleccion]
+
+
+def registrar_blueprints(app, grupos=None):
+    """Registrar en la aplicación los blueprints de los grupos indicados"""
+    registrados = normalizar_grupos(grupos)
+    for grupo in registrados:
+        app.register_blueprint(importlib.import_module(GRUPOS[grupo]).bp)
+    return registrados
+
+
+def precargar_indices(grupos):
+    """
+    Construir los índices en memoria de los grupos montados (plantillas ORB, rostros)
+
+    Pensado para llamarse en el proceso maestro antes del fork: los workers heredan
+    los índices ya construidos y los comparten por copy-on-write.
+    """
+    cargadores = []
+    if 'vision' in grupos:
+        from blueprints.vision import obtener_plantillas
+        cargadores.append(('plantillas', obtener_plantillas))
+    if 'facial' in grupos:
+        from blueprints.facial import indice_embeddings, indice_rostros
+        cargadores.append(('rostros', indice_rostros))
+        cargadores.append(('embeddings faciales', indice_embeddings))
+    for nombre, cargar in cargadores:
+        try:
+            cargar()
+        except Exception as e:
+            # Sin BD o sin imágenes: el worker lo construirá en la primera petición
+            logger.warning("No se pudo precargar el índice de %s: %s", nombre, e)
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de Recursos Compartidos entre Blueprints
+Sistema de Laboratorios - Centro Minero SENA
+Conexión a base de datos, caché de vistas, cola de correo, loggers, contexto y decoradores de autenticación y utilidades de
+imagen que usan todos los grupos de rutas (nucleo, crud, reportes, vision, facial).
+"""
+
+from __future__ import annotations
+
+import base64
+import logging
+import os
+from functools import wraps
+
+from flask import flash, redirect, url_for
+from flask_jwt_extended import verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from flask_restful import Api
+from jwt.exceptions import PyJWTError
+
+from utils.base_datos import DatabaseManager
+from utils.cache_sistema import CacheSistema, crear_almacen
+from utils.contexto_auth import CacheUsuarios, contexto_actual
+from utils.eventos_cambio import BusCambios, TransporteRedis
+from utils.carga_diferida import modulo_diferido
+from utils.correo_saliente import AlmacenCorreoMySQL, ColaCorreo, RemitenteSMTP
+from utils.perfilador_consultas import PerfiladorConsultas
+
+# Dependencias pesadas: se importan en el primer uso (create_app puede precargarlas)
+cv2 = modulo_diferido('cv2')
+np = modulo_diferido('numpy')
+
+# Logging estructurado (JSON) con cola no bloqueante; se configura en create_app()
+logger = logging.getLogger('web_app')
+logger_auth = logging.getLogger('web_app.auth')
+logger_facial = logging.getLogger('web_app.facial')
+logger_vision = logging.getLogger('web_app.vision')
+logger_objetos = logging.getLogger('web_app.objetos')
+logger_registros = logging.getLogger('web_app.registros')
+# En bucles calientes (comparación por usuario/plantilla) sólo se emite 1 de cada N mensajes DEBUG
+LOG_MUESTREO_BUCLES = int(os.getenv('LOG_SAMPLE_LOOPS', '20'))
+
+# Rutas absolutas seguras para imágenes (IMG_ROOT permite apuntar a otro corpus, p. ej. benchmarks)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMG_ROOT = os.getenv('IMG_ROOT') or os.path.join(BASE_DIR, 'imagenes')
+
+# =====================================================================
+# CONEXIÓN A BASE DE DATOS
+# =====================================================================
+
+db_manager = DatabaseManager()
+if os.getenv('DB_PROFILER', '1') == '1':
+    db_manager.profiler = PerfiladorConsultas(
+        umbral_lento_ms=float(os.getenv('DB_SLOW_QUERY_MS', '200')),
+        explicar=db_manager.explain,
+    )
+
+# Caché de vistas calculadas: TTL desde configuracion_sistema (claves cache_*), LRU por
+# proceso y, con CACHE_BACKEND=mysql|redis, almacén compartido entre workers
+cache_sistema = CacheSistema(
+    db_manager,
+    almacen=crear_almacen(os.getenv('CACHE_BACKEND', 'local'), db_manager, os.getenv('CACHE_REDIS_URL')),
+    max_entradas=int(os.getenv('CACHE_MAX_ENTRADAS', '1024')),
+    ttl_local_max=float(os.getenv('CACHE_TTL_LOCAL_MAX', '5')),
+)
+
+# Notificación de cambios: cada escritura emite etiquetas (equipo:ID, equipos, objetos...)
+# y las cachés/índices suscritos se invalidan. Con Redis los eventos llegan a todos los workers.
+bus_cambios = BusCambios()
+if os.getenv('CACHE_BACKEND', 'local').strip().lower() == 'redis':
+    bus_cambios.transporte = TransporteRedis(os.getenv('CACHE_REDIS_URL') or 'redis://localhost:6379/0')
+notificar_cambio = bus_cambios.cambio
+
+
+@bus_cambios.suscribir('*')
+def _invalidar_cache_sistema(etiquetas, remoto):
+    cache_sistema.invalidar(*etiquetas, solo_local=remoto)
+
+
+# Campos de autorización de usuarios (nivel_acceso, activo) con TTL; un cambio en el usuario
+# ('usuario:ID') lo invalida en este worker (en los demás, por Redis o al vencer el TTL)
+usuarios_cache = CacheUsuarios(db_manager, ttl_s=float(os.getenv('AUTH_CACHE_TTL_S', '60')))
+bus_cambios.suscribir(('usuario:*', 'usuarios'), usuarios_cache.al_cambiar, nombre='usuarios_cache')
+
+
+# Correo saliente: las rutas encolan en la tabla cola_correo y un hilo por worker envía por
+# una conexión SMTP reutilizada (SMTP_SERVER, SMTP_PORT, SMTP_USER, SMTP_PASSWORD, SMTP_TLS, SMTP_FROM)
+cola_correo = ColaCorreo(
+    AlmacenCorreoMySQL(db_manager),
+    RemitenteSMTP.desde_entorno(),
+    lote=int(os.getenv('MAIL_BATCH', '20')),
+    intervalo_s=float(os.getenv('MAIL_INTERVAL_S', '5')),
+    max_intentos=int(os.getenv('MAIL_MAX_RETRIES', '5')),
+    espera_base_s=float(os.getenv('MAIL_RETRY_BASE_S', '30')),
+    limite_destinatario=int(os.getenv('MAIL_RATE_MAX', '3')),
+    ventana_destinatario_s=int(os.getenv('MAIL_RATE_WINDOW_S', '900')),
+)
+
+
+# =====================================================================
+# AUTENTICACIÓN Y SEGURIDAD (Decoradores)
+# =====================================================================
+
+def contexto_auth():
+    """Identidad de la petición (sesión web o JWT) validada contra usuarios_cache, una vez por petición"""
+    return contexto_actual(usuarios_cache)
+
+
+def require_login(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        contexto = contexto_auth()
+        if contexto.origen != 'sesion' or not contexto.autenticado:
+            if contexto.revocado:
+                flash('Su cuenta fue desactivada. Contacte al administrador', 'error')
+            else:
+                flash('Debe iniciar sesión para acceder', 'error')
+            return redirect(url_for('nucleo.login'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def require_level(min_level):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not contexto_auth().tiene_nivel(min_level):
+                flash('No tiene permisos suficientes', 'error')
+                return redirect(url_for('nucleo.dashboard'))
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+class ApiRest(Api):
+    """Api de flask_restful que deja los errores de JWT a los manejadores de JWTManager (401)
+
+    Sin esto, un token ausente, expirado o revocado en un Resource termina en 500.
+    """
+
+    def handle_error(self, e):
+        if isinstance(e, (JWTExtendedException, PyJWTError)):
+            raise e
+        return super().handle_error(e)
+
+
+# Permitir API si hay JWT válido o sesión web con rol admin
+def verify_jwt_or_admin():
+    contexto = contexto_auth()
+    if contexto.autenticado and (contexto.origen == 'jwt' or contexto.es_admin):
+        return True
+    # Sesión sin rol admin: se exige el JWT; si falta o no es válido, el endpoint responde 401
+    verify_jwt_in_request()
+    return True
+
+
+# =====================================================================
+# UTILIDADES DE IMAGEN
+# =====================================================================
+
+def _decode_image_base64(img_b64: str):
+    try:
+        if ',' in img_b64:  # dataURL
+            img_b64 = img_b64.split(',')[1]
+        img_bytes = base64.b64decode(img_b64)
+        img_array = np.frombuffer(img_bytes, dtype=np.uint8)
+        frame = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+        return frame
+    except Exception:
+        return None
+
+def _safe_imread(path: str):
+    try:
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is not None:
+            return img
+        # Fallback: leer bytes y decodificar
+        with open(path, 'rb') as f:
+            buf = f.read()
+        arr = np.frombuffer(buf, dtype=np.uint8)
+        return cv2.imdecode(arr, cv2.IMREAD_COLOR)
+    except Exception:
+        return None
+
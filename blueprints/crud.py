@@ -0,0 +1,2445 @@
+# -*- coding: utf-8 -*-
+"""
+Blueprint CRUD: Gestión de Laboratorios, Equipos, Inventario, Reservas y Objetos
+Sistema de Laboratorios - Centro Minero SENA
+Páginas de gestión, API REST de las entidades, importación/exportación masiva,
+registros completos y comandos de voz.
+"""
+
+from datetime import datetime
+import base64
+import json
+import os
+
+from flask import (Blueprint, current_app, render_template, request, jsonify, session, redirect,
+                   url_for, flash, Response, stream_with_context)
+from flask_restful import Resource, reqparse
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+
+from blueprints.comun import (ApiRest, cv2, np, db_manager, logger, logger_objetos, logger_registros,
+                              bus_cambios, cache_sistema, cola_correo, contexto_auth, notificar_cambio,
+                              require_login, require_level, verify_jwt_or_admin)
+from blueprints.nucleo import get_dashboard_stats
+from utils.importacion_masiva import ImportadorMasivo, ErrorImportacion
+from utils.exportacion_datos import generar_exportacion, nombre_archivo, ErrorExportacion
+from utils.eventos_cambio import etiquetas_cambio
+from utils.perfilado_peticiones import EXTENSIONES as EXTENSIONES_PERFIL
+
+bp = Blueprint('crud', __name__)
+api = ApiRest(bp)
+
+importador_masivo = ImportadorMasivo(db_manager, tamano_lote=int(os.getenv('IMPORTACION_TAMANO_LOTE', '500')))
+
+@bp.route('/ayuda')
+def ayuda():
+    """Manual de usuario interactivo"""
+    return render_template('ayuda.html', user=session if 'user_id' in session else None)
+
+
+@bp.route('/design-system')
+@require_login
+@require_level(4)
+def design_system():
+    """Sistema de diseño - Solo para administradores"""
+    return render_template('design_system.html', user=session)
+
+
+@bp.route('/modulos')
+def modulos():
+    """Vista de todos los módulos del proyecto"""
+    return render_template('modulos_proyecto.html', user=session if 'user_id' in session else None)
+
+
+@bp.route('/perfil', methods=['GET', 'POST'])
+@require_login
+def perfil():
+    """Editar perfil de usuario"""
+    if request.method == 'POST':
+        nombre = request.form.get('nombre')
+        email = request.form.get('email')
+        telefono = request.form.get('telefono')
+        programa = request.form.get('programa')
+        
+        query = """
+            UPDATE usuarios 
+            SET nombre = %s, email = %s, telefono = %s, programa = %s
+            WHERE id = %s
+        """
+        try:
+            db_manager.execute_query(query, (nombre, email, telefono, programa, session['user_id']))
+            notificar_cambio('usuario', session['user_id'])
+            session['user_name'] = nombre
+            flash('Perfil actualizado exitosamente', 'success')
+        except Exception as e:
+            flash(f'Error al actualizar perfil: {str(e)}', 'error')
+        return redirect(url_for('crud.perfil'))
+    
+    # GET - Mostrar formulario
+    query = "SELECT id, nombre, email, telefono, tipo, programa, nivel_acceso FROM usuarios WHERE id = %s"
+    user_data = db_manager.execute_query(query, (session['user_id'],))
+    if user_data:
+        return render_template('perfil.html', usuario=user_data[0], user=session)
+    return redirect(url_for('nucleo.dashboard'))
+
+
+@bp.route('/backup', methods=['GET', 'POST'])
+@require_login
+@require_level(4)
+def backup():
+    """Gestión de backups de base de datos"""
+    import subprocess
+    from pathlib import Path
+    
+    backup_dir = Path('backups')
+    backup_dir.mkdir(exist_ok=True)
+    
+    if request.method == 'POST':
+        action = request.form.get('action')
+        
+        if action == 'create':
+            # Crear backup
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            backup_file = backup_dir / f'backup_{timestamp}.sql'
+            
+            try:
+                # Usar ruta completa de mysqldump si está disponible
+                mysqldump_path = os.getenv('MYSQLDUMP_PATH', 'mysqldump')
+                
+                cmd = [
+                    mysqldump_path,
+                    '-h', os.getenv('HOST', 'localhost'),
+                    '-u', os.getenv('USUARIO_PRODUCCION', 'laboratorio_prod'),
+                    f"-p{os.getenv('PASSWORD_PRODUCCION', '')}",
+                    '--single-transaction',
+                    '--routines',
+                    '--triggers',
+                    os.getenv('BASE_DATOS', 'laboratorio_sistema')
+                ]
+                
+                with open(backup_file, 'w', encoding='utf-8') as f:
+                    subprocess.run(cmd, stdout=f, check=True, stderr=subprocess.PIPE)
+                
+                flash(f'Backup creado exitosamente: {backup_file.name}', 'success')
+            except Exception as e:
+                flash(f'Error creando backup: {str(e)}', 'error')
+        
+        elif action == 'restore':
+            # Restaurar backup
+            backup_name = request.form.get('backup_file')
+            backup_file = backup_dir / backup_name
+            
+            if backup_file.exists():
+                try:
+                    # Usar ruta completa de mysql si está disponible
+                    mysql_path = os.getenv('MYSQL_PATH', 'mysql')
+                    
+                    cmd = [
+                        mysql_path,
+                        '-h', os.getenv('HOST', 'localhost'),
+                        '-u', os.getenv('USUARIO_PRODUCCION', 'laboratorio_prod'),
+                        f"-p{os.getenv('PASSWORD_PRODUCCION', '')}",
+                        os.getenv('BASE_DATOS', 'laboratorio_sistema')
+                    ]
+                    
+                    with open(backup_file, 'r', encoding='utf-8') as f:
+                        subprocess.run(cmd, stdin=f, check=True, stderr=subprocess.PIPE)
+                    
+                    flash(f'Backup restaurado exitosamente: {backup_name}', 'success')
+                except Exception as e:
+                    flash(f'Error restaurando backup: {str(e)}', 'error')
+            else:
+                flash('Archivo de backup no encontrado', 'error')
+        
+        elif action == 'delete':
+            # Eliminar backup
+            backup_name = request.form.get('backup_file')
+            backup_file = backup_dir / backup_name
+            
+            if backup_file.exists():
+                try:
+                    backup_file.unlink()  # Eliminar archivo
+                    flash(f'Backup eliminado exitosamente: {backup_name}', 'success')
+                except Exception as e:
+                    flash(f'Error eliminando backup: {str(e)}', 'error')
+            else:
+                flash('Archivo de backup no encontrado', 'error')
+        
+        return redirect(url_for('crud.backup'))
+    
+    # GET - Listar backups disponibles
+    backups = []
+    if backup_dir.exists():
+        backups = [
+            {
+                'nombre': f.name,
+                'tamaño': f'{f.stat().st_size / 1024 / 1024:.2f} MB',
+                'fecha': datetime.fromtimestamp(f.stat().st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+            }
+            for f in sorted(backup_dir.glob('*.sql'), key=lambda x: x.stat().st_mtime, reverse=True)
+        ]
+    
+    return render_template('backup.html', backups=backups, user=session)
+
+
+@bp.route('/backup/download/<filename>')
+@require_login
+@require_level(4)
+def download_backup(filename):
+    """Descargar un archivo de backup"""
+    from flask import send_file
+    from pathlib import Path
+    import os
+    
+    # Validar que el archivo existe y es un backup válido
+    backup_dir = Path('backups')
+    backup_file = backup_dir / filename
+    
+    # Seguridad: verificar que el archivo está dentro del directorio de backups
+    try:
+        backup_file = backup_file.resolve()
+        backup_dir = backup_dir.resolve()
+        
+        if not str(backup_file).startswith(str(backup_dir)):
+            flash('Acceso denegado: ruta inválida', 'error')
+            return redirect(url_for('crud.backup'))
+        
+        if not backup_file.exists() or not backup_file.is_file():
+            flash('Archivo de backup no encontrado', 'error')
+            return redirect(url_for('crud.backup'))
+        
+        if not filename.endswith('.sql'):
+            flash('Tipo de archivo no permitido', 'error')
+            return redirect(url_for('crud.backup'))
+        
+        # Enviar archivo para descarga
+        return send_file(
+            backup_file,
+            as_attachment=True,
+            download_name=filename,
+            mimetype='application/sql'
+        )
+    
+    except Exception as e:
+        flash(f'Error descargando backup: {str(e)}', 'error')
+        return redirect(url_for('crud.backup'))
+
+@bp.route('/laboratorios')
+@require_login
+def laboratorios():
+    query = """
+        SELECT 
+            l.id, l.codigo, l.nombre, l.tipo, l.ubicacion, l.capacidad_estudiantes,
+            l.responsable, l.estado,
+            COUNT(DISTINCT e.id) as total_equipos,
+            COUNT(DISTINCT i.id) as total_items,
+            COUNT(DISTINCT CASE WHEN i.cantidad_actual <= i.cantidad_minima THEN i.id END) as items_criticos
+        FROM laboratorios l
+        LEFT JOIN equipos e ON l.id = e.laboratorio_id
+        LEFT JOIN inventario i ON l.id = i.laboratorio_id
+        GROUP BY l.id, l.codigo, l.nombre, l.tipo, l.ubicacion, l.capacidad_estudiantes, l.responsable, l.estado
+        ORDER BY l.tipo, l.codigo
+    """
+    laboratorios_list = db_manager.execute_query(query)
+    return render_template('laboratorios.html', laboratorios=laboratorios_list, user=session)
+
+
+@bp.route('/laboratorio/<int:laboratorio_id>')
+@require_login
+def laboratorio_detalle(laboratorio_id):
+    # Información del laboratorio con estadísticas
+    query_lab = """
+        SELECT l.*,
+               COUNT(DISTINCT e.id) as total_equipos,
+               COUNT(DISTINCT i.id) as total_items,
+               COUNT(DISTINCT CASE WHEN i.cantidad_actual <= i.cantidad_minima THEN i.id END) as items_criticos,
+               COUNT(DISTINCT CASE WHEN e.estado = 'disponible' THEN e.id END) as equipos_disponibles
+        FROM laboratorios l
+        LEFT JOIN equipos e ON l.id = e.laboratorio_id
+        LEFT JOIN inventario i ON l.id = i.laboratorio_id
+        WHERE l.id = %s
+        GROUP BY l.id
+    """
+    laboratorio = db_manager.execute_query(query_lab, (laboratorio_id,))
+    if not laboratorio:
+        flash('Laboratorio no encontrado', 'error')
+        return redirect(url_for('crud.laboratorios'))
+    
+    # Equipos de ESTE laboratorio
+    query_equipos = """
+        SELECT id, nombre, tipo, estado, ubicacion,
+               DATE_FORMAT(ultima_calibracion, '%d/%m/%Y') as calibracion,
+               DATE_FORMAT(proximo_mantenimiento, '%d/%m/%Y') as mantenimiento
+        FROM equipos
+        WHERE laboratorio_id = %s
+        ORDER BY tipo, nombre
+    """
+    equipos = db_manager.execute_query(query_equipos, (laboratorio_id,))
+    
+    # Inventario de ESTE laboratorio
+    query_inventario = """
+        SELECT id, nombre, categoria, cantidad_actual, cantidad_minima,
+               unidad, ubicacion, proveedor,
+               DATE_FORMAT(fecha_vencimiento, '%d/%m/%Y') as vencimiento,
+               CASE 
+                   WHEN cantidad_actual <= cantidad_minima THEN 'critico'
+                   WHEN cantidad_actual <= cantidad_minima * 1.5 THEN 'bajo'
+                   ELSE 'normal'
+               END as nivel_stock
+        FROM inventario
+        WHERE laboratorio_id = %s
+        ORDER BY categoria, nombre
+    """
+    inventario = db_manager.execute_query(query_inventario, (laboratorio_id,))
+    
+    return render_template('laboratorio_detalle.html', 
+                         laboratorio=laboratorio[0], 
+                         equipos=equipos, 
+                         inventario=inventario, 
+                         user=session)
+
+
+@bp.route('/equipos')
+@require_login
+def equipos():
+    query = """
+        SELECT e.id, e.nombre, e.tipo, e.estado, e.ubicacion,
+               e.laboratorio_id,
+               l.nombre as laboratorio_nombre,
+               l.codigo as laboratorio_codigo,
+               DATE_FORMAT(e.ultima_calibracion, '%d/%m/%Y') as calibracion,
+               DATE_FORMAT(e.proximo_mantenimiento, '%d/%m/%Y') as mantenimiento,
+               e.especificaciones
+        FROM equipos e
+        INNER JOIN laboratorios l ON e.laboratorio_id = l.id
+        ORDER BY l.nombre, e.tipo, e.nombre
+    """
+    equipos_list = db_manager.execute_query(query)
+    for equipo in equipos_list:
+        if equipo.get('especificaciones'):
+            try:
+                specs_obj = json.loads(equipo['especificaciones'])
+                # Si tiene el formato nuevo con "descripcion", extraer el texto
+                if isinstance(specs_obj, dict) and 'descripcion' in specs_obj:
+                    equipo['especificaciones'] = specs_obj['descripcion']
+                else:
+                    equipo['especificaciones'] = specs_obj
+            except Exception:
+                equipo['especificaciones'] = {}
+    return render_template('equipos.html', equipos=equipos_list, user=session)
+
+@bp.route('/equipos/crear', methods=['POST'])
+@require_login
+def crear_equipo_web():
+    """Crear equipo desde interfaz web (sin JWT)"""
+    try:
+        data = request.get_json()
+        nombre = data.get('nombre')
+        tipo = data.get('tipo')
+        ubicacion = data.get('ubicacion')
+        laboratorio_id = data.get('laboratorio_id', 1)  # Por defecto laboratorio 1
+        especificaciones_texto = data.get('especificaciones', '')
+        
+        if not nombre or not tipo:
+            return jsonify({'success': False, 'message': 'Nombre y tipo son requeridos'}), 400
+        
+        # Generar ID único
+        import uuid
+        equipo_id = f"EQ-{uuid.uuid4().hex[:8].upper()}"
+        
+        # Convertir texto a JSON válido
+        especificaciones_json = json.dumps({"descripcion": especificaciones_texto})
+        
+        query = """
+            INSERT INTO equipos (id, nombre, tipo, estado, ubicacion, laboratorio_id, especificaciones)
+            VALUES (%s, %s, %s, 'disponible', %s, %s, %s)
+        """
+        db_manager.execute_query(query, (equipo_id, nombre, tipo, ubicacion, laboratorio_id, especificaciones_json))
+        notificar_cambio('equipo', equipo_id, extra=[f'laboratorio:{laboratorio_id}'])
+        
+        return jsonify({'success': True, 'message': 'Equipo creado exitosamente', 'id': equipo_id}), 201
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+
+
+@bp.route('/inventario')
+@require_login
+def inventario():
+    # Obtener todos los equipos con información del laboratorio
+    query_equipos = """
+        SELECT e.id, e.nombre, e.tipo, e.estado, e.ubicacion,
+               e.laboratorio_id,
+               l.nombre as laboratorio_nombre,
+               l.codigo as laboratorio_codigo,
+               DATE_FORMAT(e.ultima_calibracion, '%d/%m/%Y') as calibracion,
+               DATE_FORMAT(e.proximo_mantenimiento, '%d/%m/%Y') as mantenimiento
+        FROM equipos e
+        INNER JOIN laboratorios l ON e.laboratorio_id = l.id
+        ORDER BY l.nombre, e.tipo, e.nombre
+    """
+    equipos_list = db_manager.execute_query(query_equipos)
+    
+    # Obtener todos los items con información del laboratorio
+    query_items = """
+        SELECT i.id, i.nombre, i.categoria, i.cantidad_actual, i.cantidad_minima,
+               i.unidad, i.ubicacion, i.proveedor, i.costo_unitario,
+               i.laboratorio_id,
+               l.nombre as laboratorio_nombre,
+               l.codigo as laboratorio_codigo,
+               DATE_FORMAT(i.fecha_vencimiento, '%d/%m/%Y') as vencimiento,
+               CASE
+                   WHEN i.cantidad_actual <= i.cantidad_minima THEN 'critico'
+                   WHEN i.cantidad_actual <= i.cantidad_minima * 1.5 THEN 'bajo'
+                   ELSE 'normal'
+               END as nivel_stock
+        FROM inventario i
+        INNER JOIN laboratorios l ON i.laboratorio_id = l.id
+        ORDER BY l.nombre, i.categoria, i.nombre
+    """
+    inventario_list = db_manager.execute_query(query_items)
+    
+    # Obtener lista de laboratorios para el filtro
+    query_labs = "SELECT id, codigo, nombre FROM laboratorios WHERE estado = 'activo' ORDER BY nombre"
+    laboratorios_list = db_manager.execute_query(query_labs)
+    
+    return render_template('inventario.html', 
+                         equipos=equipos_list,
+                         inventario=inventario_list, 
+                         laboratorios=laboratorios_list,
+                         user=session)
+
+
+@bp.route('/inventario/crear', methods=['POST'])
+@require_login
+def crear_item_inventario_web():
+    """Crear item de inventario desde interfaz web (sin JWT)"""
+    try:
+        data = request.get_json()
+        nombre = data.get('nombre')
+        categoria = data.get('categoria')
+        cantidad_actual = data.get('cantidad_actual', 0)
+        cantidad_minima = data.get('cantidad_minima', 0)
+        unidad = data.get('unidad', 'unidad')
+        ubicacion = data.get('ubicacion')
+        laboratorio_id = data.get('laboratorio_id', 1)  # Por defecto laboratorio 1
+        proveedor = data.get('proveedor')
+        costo_unitario = data.get('costo_unitario', 0)
+        
+        if not nombre:
+            return jsonify({'success': False, 'message': 'Nombre es requerido'}), 400
+        
+        # Generar ID único
+        import uuid
+        item_id = f"INV-{uuid.uuid4().hex[:8].upper()}"
+        
+        query = """
+            INSERT INTO inventario (id, nombre, categoria, cantidad_actual, cantidad_minima, 
+                                  unidad, ubicacion, laboratorio_id, proveedor, costo_unitario)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """
+        db_manager.execute_query(query, (item_id, nombre, categoria, cantidad_actual, 
+                                        cantidad_minima, unidad, ubicacion, laboratorio_id,
+                                        proveedor, costo_unitario))
+        notificar_cambio('inventario', item_id, extra=[f'laboratorio:{laboratorio_id}'])
+        
+        return jsonify({'success': True, 'message': 'Item de inventario creado exitosamente', 'id': item_id}), 201
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+
+
+@bp.route('/api/importar/<tipo>', methods=['POST'])
+@require_login
+@require_level(4)
+def importar_masivo(tipo):
+    """Importación masiva de equipos o inventario desde CSV/XLSX (campo 'archivo')"""
+    if tipo not in ('equipos', 'inventario'):
+        return jsonify({'success': False, 'message': 'tipo debe ser "equipos" o "inventario"'}), 400
+
+    archivo = request.files.get('archivo')
+    if not archivo or not archivo.filename:
+        return jsonify({'success': False, 'message': 'Debe adjuntar un archivo CSV o XLSX en el campo "archivo"'}), 400
+
+    try:
+        resultado = importador_masivo.importar(tipo, archivo.stream, archivo.filename)
+    except ErrorImportacion as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error importando archivo: {str(e)}'}), 500
+    if resultado['insertados']:
+        notificar_cambio('equipo' if tipo == 'equipos' else 'inventario')
+
+    # Log de auditoría
+    try:
+        log_query = """
+            INSERT INTO logs_seguridad (usuario_id, accion, detalle, ip_origen, exitoso)
+            VALUES (%s, 'importacion_masiva', %s, %s, TRUE)
+        """
+        detalle = (f"Importación {tipo} ({archivo.filename}): {resultado['insertados']} insertados, "
+                   f"{resultado['rechazados']} rechazados")
+        db_manager.execute_query(log_query, (session.get('user_id'), detalle, request.remote_addr))
+    except Exception:
+        pass
+
+    resultado['success'] = resultado['insertados'] > 0 or resultado['total_filas'] == 0
+    return jsonify(resultado), 200
+
+
+@bp.route('/api/exportar/<tabla>', methods=['GET'])
+def exportar_masivo(tabla):
+    """Exportación completa en streaming (CSV/NDJSON) de equipos, inventario, reservas o historial_uso
+
+    Parámetros: formato=csv|ndjson, laboratorio=<id|codigo>, desde/hasta=AAAA-MM-DD, gzip=1
+    """
+    try:
+        verify_jwt_or_admin()
+    except Exception:
+        return jsonify({'success': False, 'message': 'No autorizado'}), 401
+
+    formato = (request.args.get('formato') or 'csv').lower()
+    comprimir = request.args.get('gzip', '').lower() in ('1', 'true', 'si')
+    try:
+        generador = generar_exportacion(
+            db_manager, tabla, formato,
+            laboratorio=(request.args.get('laboratorio') or '').strip() or None,
+            desde=request.args.get('desde'),
+            hasta=request.args.get('hasta'),
+            comprimir=comprimir,
+            tamano_bloque=int(os.getenv('EXPORTACION_TAMANO_BLOQUE', '1000')),
+        )
+    except ErrorExportacion as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    if comprimir:
+        mimetype = 'application/gzip'
+    elif formato == 'csv':
+        mimetype = 'text/csv; charset=utf-8'
+    else:
+        mimetype = 'application/x-ndjson; charset=utf-8'
+
+    respuesta = Response(stream_with_context(generador), mimetype=mimetype)
+    respuesta.headers['Content-Disposition'] = f'attachment; filename="{nombre_archivo(tabla, formato, comprimir)}"'
+    # Evitar que proxies (nginx) acumulen la respuesta completa
+    respuesta.headers['X-Accel-Buffering'] = 'no'
+    return respuesta
+
+
+@bp.route('/api/admin/consultas', methods=['GET', 'DELETE'])
+@require_login
+@require_level(4)
+def admin_consultas():
+    """Consultas SQL con mayor costo (por huella) y registro de consultas lentas
+
+    Parámetros: orden=total_ms|p95_ms|p99_ms|max_ms|ejecuciones|filas, limite=N
+    DELETE reinicia las estadísticas.
+    """
+    perfilador = db_manager.profiler
+    if perfilador is None:
+        return jsonify({'success': False, 'message': 'Instrumentación de consultas deshabilitada (DB_PROFILER=0)'}), 404
+
+    if request.method == 'DELETE':
+        perfilador.reiniciar()
+        return jsonify({'success': True, 'message': 'Estadísticas de consultas reiniciadas'}), 200
+
+    try:
+        limite = max(1, min(int(request.args.get('limite', 20)), 200))
+    except ValueError:
+        limite = 20
+    return jsonify({
+        'success': True,
+        'desde': perfilador.inicio.isoformat(timespec='seconds'),
+        'umbral_lento_ms': perfilador.umbral_lento_ms,
+        'consultas': perfilador.resumen(request.args.get('orden', 'total_ms'), limite),
+        'lentas': perfilador.lentas(limite),
+        'sentencias_preparadas': dict(db_manager.stats),
+    }), 200
+
+
+@bp.route('/api/admin/perfiles', methods=['GET', 'DELETE'])
+@require_login
+@require_level(4)
+def admin_perfiles():
+    """Perfiles de peticiones guardados (activar con la cabecera X-Perfilar: 1 o ?_perfilar=1)
+
+    DELETE vacía el buffer de perfiles.
+    """
+    perfilado = current_app.extensions.get('perfilado')
+    if perfilado is None:
+        return jsonify({'success': False, 'message': 'Perfilado de peticiones deshabilitado (REQUEST_PROFILER=0)'}), 404
+
+    if request.method == 'DELETE':
+        perfilado.eliminar_todos()
+        return jsonify({'success': True, 'message': 'Perfiles eliminados'}), 200
+
+    try:
+        limite = max(1, min(int(request.args.get('limite', 50)), 500))
+    except ValueError:
+        limite = 50
+    return jsonify({'success': True, 'max_perfiles': perfilado.max_perfiles, 'perfiles': perfilado.listar(limite)}), 200
+
+
+@bp.route('/api/admin/perfiles/<perfil_id>')
+@require_login
+@require_level(4)
+def admin_perfil(perfil_id):
+    """Detalle de un perfil (con sus consultas SQL) o, con ?archivo=folded|prof, el archivo del perfilador"""
+    from flask import send_file
+
+    perfilado = current_app.extensions.get('perfilado')
+    if perfilado is None:
+        return jsonify({'success': False, 'message': 'Perfilado de peticiones deshabilitado (REQUEST_PROFILER=0)'}), 404
+
+    extension = request.args.get('archivo')
+    if extension:
+        ruta = perfilado.ruta_archivo(perfil_id, extension)
+        if ruta is None:
+            return jsonify({'success': False, 'message': 'Archivo de perfil no encontrado'}), 404
+        return send_file(ruta, as_attachment=True, download_name=os.path.basename(ruta),
+                         mimetype=EXTENSIONES_PERFIL[extension])
+
+    perfil = perfilado.obtener(perfil_id)
+    if perfil is None:
+        return jsonify({'success': False, 'message': 'Perfil no encontrado'}), 404
+    return jsonify({'success': True, 'perfil': perfil}), 200
+
+
+@bp.route('/api/admin/cache', methods=['GET', 'DELETE'])
+@require_login
+@require_level(4)
+def admin_cache():
+    """Aciertos/fallos de la caché de vistas y eventos de cambio
+
+    DELETE notifica ?etiqueta=... (varias separadas por comas: también invalida los índices
+    suscritos) o vacía la caché completa.
+    """
+    if request.method == 'DELETE':
+        etiquetas = [e.strip() for e in request.args.get('etiqueta', '').split(',') if e.strip()]
+        if etiquetas:
+            bus_cambios.notificar(*etiquetas)
+        else:
+            cache_sistema.vaciar()
+        return jsonify({'success': True, 'invalidadas': etiquetas or 'todas'}), 200
+    return jsonify({'success': True, 'cache': cache_sistema.estadisticas(), 'eventos': dict(bus_cambios.stats)}), 200
+
+
+@bp.route('/api/admin/correo', methods=['GET', 'POST'])
+@require_login
+@require_level(4)
+def admin_correo():
+    """Estado de la cola de correo saliente; POST procesa un lote inmediatamente"""
+    try:
+        procesados = cola_correo.procesar_lote() if request.method == 'POST' else None
+        return jsonify({'success': True, 'cola': cola_correo.almacen.resumen(),
+                        'procesados': procesados, 'estadisticas': cola_correo.estadisticas()}), 200
+    except Exception as e:
+        logger.exception("Error consultando la cola de correo: %s", e)
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@cache_sistema.cacheado('equipos_reservables', ttl_config='cache_equipos_disponibles', etiquetas=('equipos',))
+def equipos_reservables():
+    """Equipos disponibles o en uso para el formulario de reservas"""
+    equipos_query = """
+        SELECT id, nombre, tipo, estado 
+        FROM equipos 
+        WHERE estado IN ('disponible', 'en_uso')
+        ORDER BY nombre
+    """
+    return db_manager.execute_query(equipos_query) or []
+
+
+@bp.route('/reservas')
+@require_login
+def reservas():
+    # Obtener lista de equipos disponibles para el formulario
+    equipos_list = equipos_reservables()
+    
+    if session.get('user_level', 1) >= 3:
+        query = (
+            """
+            SELECT r.id, 
+                   DATE_FORMAT(r.fecha_inicio, '%d/%m/%Y %H:%i') as fecha_inicio,
+                   DATE_FORMAT(r.fecha_fin, '%d/%m/%Y %H:%i') as fecha_fin,
+                   r.estado,
+                   u.nombre as usuario_nombre, 
+                   e.nombre as equipo_nombre
+            FROM reservas r
+            JOIN usuarios u ON r.usuario_id = u.id
+            JOIN equipos e ON r.equipo_id = e.id
+            ORDER BY r.fecha_inicio DESC
+            """
+        )
+        reservas_list = db_manager.execute_query(query) or []
+    else:
+        query = (
+            """
+            SELECT r.id,
+                   DATE_FORMAT(r.fecha_inicio, '%d/%m/%Y %H:%i') as fecha_inicio,
+                   DATE_FORMAT(r.fecha_fin, '%d/%m/%Y %H:%i') as fecha_fin,
+                   r.estado,
+                   u.nombre as usuario_nombre, 
+                   e.nombre as equipo_nombre
+            FROM reservas r
+            JOIN usuarios u ON r.usuario_id = u.id
+            JOIN equipos e ON r.equipo_id = e.id
+            WHERE r.usuario_id = %s
+            ORDER BY r.fecha_inicio DESC
+            """
+        )
+        reservas_list = db_manager.execute_query(query, (session['user_id'],)) or []
+    
+    return render_template('reservas.html', reservas=reservas_list, equipos=equipos_list, user=session)
+
+
+@bp.route('/reservas/crear', methods=['POST'])
+@require_login
+def crear_reserva_web():
+    """Crear reserva desde interfaz web (sin JWT)"""
+    try:
+        data = request.get_json()
+        equipo_id = data.get('equipo_id')
+        fecha_inicio = data.get('fecha_inicio')
+        fecha_fin = data.get('fecha_fin')
+        proposito = data.get('proposito')
+        usuario_id = session.get('user_id')
+        
+        if not all([equipo_id, fecha_inicio, fecha_fin, proposito]):
+            return jsonify({'success': False, 'message': 'Todos los campos son requeridos'}), 400
+        
+        # Verificar que el equipo existe
+        query_equipo = "SELECT id FROM equipos WHERE id = %s"
+        equipo = db_manager.execute_query(query_equipo, (equipo_id,))
+        if not equipo:
+            return jsonify({'success': False, 'message': 'El equipo no existe'}), 404
+        
+        # Generar ID único
+        import uuid
+        reserva_id = f"RES-{uuid.uuid4().hex[:8].upper()}"
+        
+        # Crear la reserva (usar 'notas' en lugar de 'proposito')
+        query = """
+            INSERT INTO reservas (id, equipo_id, usuario_id, fecha_inicio, fecha_fin, estado, notas)
+            VALUES (%s, %s, %s, %s, %s, 'programada', %s)
+        """
+        db_manager.execute_query(query, (reserva_id, equipo_id, usuario_id, fecha_inicio, fecha_fin, proposito))
+        notificar_cambio('reserva', reserva_id)
+        
+        return jsonify({'success': True, 'message': 'Reserva creada exitosamente'}), 201
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+
+
+@bp.route('/usuarios')
+@require_login
+@require_level(3)
+def usuarios():
+    query = (
+        """
+        SELECT id, nombre, tipo, programa, nivel_acceso, activo, email, telefono,
+               DATE_FORMAT(fecha_registro, '%d/%m/%Y') as registro,
+               CASE WHEN rostro_data IS NOT NULL THEN 'Sí' ELSE 'No' END as tiene_rostro
+        FROM usuarios
+        ORDER BY tipo, nombre
+        """
+    )
+    usuarios_list = db_manager.execute_query(query)
+    return render_template('usuarios.html', usuarios=usuarios_list, user=session)
+
+@bp.route('/configuracion')
+@require_login
+@require_level(4)
+def configuracion():
+    query = "SELECT clave, valor, descripcion FROM configuracion_sistema ORDER BY clave"
+    config_list = db_manager.execute_query(query) or []
+    perfilado = current_app.extensions.get('perfilado')
+    perfiles = perfilado.listar(20) if perfilado else None
+    return render_template('configuracion.html', configuraciones=config_list, perfiles=perfiles, user=session)
+
+@bp.route('/entrenamiento-visual')
+@require_login
+def entrenamiento_visual():
+    """Página para entrenar la IA de reconocimiento visual"""
+    return render_template('entrenamiento_visual.html', user=session)
+
+
+@bp.route('/registro-facial')
+@require_login
+def registro_facial():
+    """Página para registro facial de usuarios"""
+    return render_template('registro_facial.html', user=session)
+
+class EquiposAPI(Resource):
+    def get(self):
+        # Permitir acceso con JWT o sesión web
+        if not contexto_auth().autenticado:
+            return {'message': 'Autenticación requerida'}, 401
+        
+        # Obtener todos los equipos (sin filtro de laboratorio ya que la columna no existe)
+        query = """
+            SELECT e.id, e.nombre, e.tipo, e.estado, e.ubicacion, e.especificaciones,
+                   DATE_FORMAT(e.ultima_calibracion, '%Y-%m-%d') as ultima_calibracion,
+                   DATE_FORMAT(e.proximo_mantenimiento, '%Y-%m-%d') as proximo_mantenimiento
+            FROM equipos e
+            ORDER BY e.tipo, e.nombre
+        """
+        params = []
+        
+        equipos = db_manager.execute_query(query, params)
+        
+        for e in equipos:
+            if e.get('especificaciones'):
+                try:
+                    e['especificaciones'] = json.loads(e['especificaciones'])
+                except Exception:
+                    e['especificaciones'] = {}
+        
+        return {'equipos': equipos}, 200
+
+    def post(self):
+        verify_jwt_or_admin()
+        data = request.get_json(silent=True) or {}
+        
+        # Validar campos requeridos
+        if not data.get('nombre'):
+            return {'message': 'nombre es requerido'}, 400
+        if not data.get('tipo'):
+            return {'message': 'tipo es requerido'}, 400
+        
+        import uuid
+        equipo_id = f"EQ_{str(uuid.uuid4())[:8].upper()}"
+        
+        query = """
+            INSERT INTO equipos (id, nombre, tipo, estado, ubicacion, especificaciones)
+            VALUES (%s, %s, %s, 'disponible', %s, %s)
+        """
+        
+        specs_json = json.dumps(data.get('especificaciones')) if data.get('especificaciones') else None
+        
+        try:
+            db_manager.execute_query(query, (
+                equipo_id, data['nombre'], data['tipo'], 
+                data.get('ubicacion'), specs_json
+            ))
+            notificar_cambio('equipo', equipo_id)
+            return {'message': 'Equipo creado exitosamente', 'id': equipo_id}, 201
+        except Exception as e:
+            return {'message': f'Error creando equipo: {str(e)}'}, 500
+
+
+class EquipoAPI(Resource):
+    def get(self, equipo_id):
+        verify_jwt_in_request()
+        query = (
+            """
+            SELECT id, nombre, tipo, estado, ubicacion, especificaciones,
+                   DATE_FORMAT(ultima_calibracion, '%Y-%m-%d') as ultima_calibracion,
+                   DATE_FORMAT(proximo_mantenimiento, '%Y-%m-%d') as proximo_mantenimiento
+            FROM equipos WHERE id = %s
+            """
+        )
+        rs = db_manager.execute_query(query, (equipo_id,))
+        if not rs:
+            return {'message': 'Equipo no encontrado'}, 404
+        e = rs[0]
+        if e.get('especificaciones'):
+            try:
+                e['especificaciones'] = json.loads(e['especificaciones'])
+            except Exception:
+                e['especificaciones'] = {}
+        return {'equipo': e}, 200
+
+    def put(self, equipo_id):
+        # Permitir acceso con JWT o sesión web
+        if not contexto_auth().autenticado:
+            return {'message': 'Autenticación requerida'}, 401
+        
+        data = request.get_json(silent=True) or {}
+        args = {
+            'estado': data.get('estado'),
+            'ubicacion': data.get('ubicacion'),
+            'especificaciones': data.get('especificaciones')
+        }
+        updates, params = [], []
+        if args['estado']:
+            updates.append('estado = %s'); params.append(args['estado'])
+        if args['ubicacion'] is not None:
+            updates.append('ubicacion = %s'); params.append(args['ubicacion'])
+        if args['especificaciones']:
+            # Manejar especificaciones como string o dict
+            if isinstance(args['especificaciones'], str):
+                # Si es string, intentar parsear como JSON, si falla usar como texto
+                try:
+                    specs_dict = json.loads(args['especificaciones'])
+                    updates.append('especificaciones = %s'); params.append(json.dumps(specs_dict))
+                except:
+                    # No es JSON válido, guardar como descripción
+                    updates.append('especificaciones = %s'); params.append(json.dumps({'descripcion': args['especificaciones']}))
+            else:
+                updates.append('especificaciones = %s'); params.append(json.dumps(args['especificaciones']))
+        if not updates:
+            return {'message': 'No hay datos para actualizar'}, 400
+        query = f"UPDATE equipos SET {', '.join(updates)} WHERE id = %s"
+        params.append(equipo_id)
+        try:
+            affected = db_manager.execute_query(query, params)
+            if affected:
+                notificar_cambio('equipo', equipo_id)
+            return ({'message': 'Equipo actualizado exitosamente'}, 200) if affected else ({'message': 'Equipo no encontrado'}, 404)
+        except Exception as e:
+            return {'message': f'Error actualizando equipo: {str(e)}'}, 500
+
+
+class LaboratoriosAPI(Resource):
+    def get(self):
+        verify_jwt_in_request()
+        tipo = request.args.get('tipo')
+        estado = request.args.get('estado', 'activo')
+        
+        query = """
+            SELECT l.id, l.codigo, l.nombre, l.tipo, l.ubicacion, l.capacidad_estudiantes,
+                   l.area_m2, l.responsable, l.estado, l.equipamiento_especializado,
+                   COUNT(DISTINCT e.id) as total_equipos,
+                   COUNT(DISTINCT i.id) as total_items,
+                   COUNT(DISTINCT CASE WHEN e.estado = 'disponible' THEN e.id END) as equipos_disponibles,
+                   COUNT(DISTINCT CASE WHEN i.cantidad_actual <= i.cantidad_minima THEN i.id END) as items_criticos
+            FROM laboratorios l
+            LEFT JOIN equipos e ON l.id = e.laboratorio_id
+            LEFT JOIN inventario i ON l.id = i.laboratorio_id
+        """
+        
+        params, conds = [], []
+        if tipo:
+            conds.append('l.tipo = %s'); params.append(tipo)
+        if estado:
+            conds.append('l.estado = %s'); params.append(estado)
+        
+        if conds:
+            query += ' WHERE ' + ' AND '.join(conds)
+        
+        query += ' GROUP BY l.id ORDER BY l.tipo, l.codigo'
+        
+        laboratorios = db_manager.execute_query(query, params)
+        return {'laboratorios': laboratorios}, 200
+    
+    def post(self):
+        verify_jwt_or_admin()
+        data = request.get_json(silent=True) or {}
+        
+        campos_requeridos = ['codigo', 'nombre', 'tipo']
+        for campo in campos_requeridos:
+            if not data.get(campo):
+                return {'message': f'{campo} es requerido'}, 400
+        
+        # Validar que codigo no sea vacío
+        if not data['codigo'].strip():
+            return {'message': 'codigo no puede estar vacío'}, 400
+        
+        # Verificar que el código no exista ya
+        check_query = "SELECT id FROM laboratorios WHERE codigo = %s"
+        existing = db_manager.execute_query(check_query, (data['codigo'],))
+        if existing:
+            return {'message': 'Ya existe un laboratorio con ese código'}, 400
+        
+        query = """
+            INSERT INTO laboratorios (codigo, nombre, tipo, ubicacion, capacidad_estudiantes,
+                                    area_m2, responsable, equipamiento_especializado, normas_seguridad)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """
+        
+        try:
+            db_manager.execute_query(query, (
+                data['codigo'], data['nombre'], data['tipo'],
+                data.get('ubicacion', ''), data.get('capacidad_estudiantes', 0),
+                data.get('area_m2'), data.get('responsable', ''),
+                data.get('equipamiento_especializado', ''), data.get('normas_seguridad', '')
+            ))
+            notificar_cambio('laboratorio')
+            return {'message': 'Laboratorio creado exitosamente'}, 201
+        except Exception as e:
+            return {'message': f'Error creando laboratorio: {str(e)}'}, 500
+
+
+class LaboratorioAPI(Resource):
+    def get(self, laboratorio_id):
+        verify_jwt_in_request()
+        
+        # Información del laboratorio
+        query_lab = """
+            SELECT l.*, 
+                   COUNT(DISTINCT e.id) as total_equipos,
+                   COUNT(DISTINCT i.id) as total_items,
+                   SUM(DISTINCT i.cantidad_actual * IFNULL(i.costo_unitario, 0)) as valor_inventario
+            FROM laboratorios l
+            LEFT JOIN equipos e ON l.id = e.laboratorio_id
+            LEFT JOIN inventario i ON l.id = i.laboratorio_id
+            WHERE l.id = %s
+            GROUP BY l.id
+        """
+        
+        laboratorio = db_manager.execute_query(query_lab, (laboratorio_id,))
+        if not laboratorio:
+            return {'message': 'Laboratorio no encontrado'}, 404
+        
+        return {'laboratorio': laboratorio[0]}, 200
+    
+    def put(self, laboratorio_id):
+        verify_jwt_or_admin()
+        data = request.get_json(silent=True) or {}
+        
+        campos_actualizables = [
+            'nombre', 'ubicacion', 'capacidad_estudiantes', 'area_m2',
+            'responsable', 'equipamiento_especializado', 'normas_seguridad', 'estado'
+        ]
+        
+        updates, params = [], []
+        for campo in campos_actualizables:
+            if campo in data:
+                updates.append(f'{campo} = %s')
+                params.append(data[campo])
+        
+        if not updates:
+            return {'message': 'No hay datos para actualizar'}, 400
+        
+        query = f"UPDATE laboratorios SET {', '.join(updates)} WHERE id = %s"
+        params.append(laboratorio_id)
+        
+        try:
+            affected = db_manager.execute_query(query, params)
+            if affected:
+                notificar_cambio('laboratorio', laboratorio_id)
+            return ({'message': 'Laboratorio actualizado'}, 200) if affected else ({'message': 'Laboratorio no encontrado'}, 404)
+        except Exception as e:
+            return {'message': f'Error actualizando laboratorio: {str(e)}'}, 500
+
+
+class InventarioAPI(Resource):
+    def get(self):
+        # Permitir acceso con JWT o sesión web
+        if not contexto_auth().autenticado:
+            return {'message': 'Autenticación requerida'}, 401
+        
+        laboratorio_id = request.args.get('laboratorio_id')
+        categoria = request.args.get('categoria')
+        stock_bajo = request.args.get('stock_bajo', 'false').lower() == 'true'
+        
+        if laboratorio_id:
+            # Inventario específico de un laboratorio
+            query = """
+                SELECT i.id, i.nombre, i.categoria, i.cantidad_actual, i.cantidad_minima,
+                       i.unidad, i.ubicacion, i.proveedor, i.costo_unitario,
+                       DATE_FORMAT(i.fecha_vencimiento, '%Y-%m-%d') as fecha_vencimiento,
+                       l.codigo as laboratorio_codigo, l.nombre as laboratorio_nombre
+                FROM inventario i
+                INNER JOIN laboratorios l ON i.laboratorio_id = l.id
+                WHERE i.laboratorio_id = %s
+            """
+            params = [laboratorio_id]
+        else:
+            # Vista general con información de laboratorio
+            query = """
+                SELECT i.id, i.nombre, i.categoria, i.cantidad_actual, i.cantidad_minima,
+                       i.unidad, i.ubicacion, i.proveedor, i.costo_unitario,
+                       DATE_FORMAT(i.fecha_vencimiento, '%Y-%m-%d') as fecha_vencimiento,
+                       l.codigo as laboratorio_codigo, l.nombre as laboratorio_nombre,
+                       l.tipo as laboratorio_tipo
+                FROM inventario i
+                INNER JOIN laboratorios l ON i.laboratorio_id = l.id
+            """
+            params = []
+        
+        conds = []
+        if categoria:
+            conds.append('i.categoria = %s'); params.append(categoria)
+        if stock_bajo:
+            conds.append('i.cantidad_actual <= i.cantidad_minima')
+        
+        if conds:
+            query += ' AND ' + ' AND '.join(conds)
+        
+        query += ' ORDER BY l.codigo, i.categoria, i.nombre'
+        
+        inventario = db_manager.execute_query(query, params)
+        
+        # Calcular nivel de stock
+        for item in inventario:
+            if item['cantidad_actual'] <= item['cantidad_minima']:
+                item['nivel_stock'] = 'critico'
+            elif item['cantidad_actual'] <= item['cantidad_minima'] * 1.5:
+                item['nivel_stock'] = 'bajo'
+            else:
+                item['nivel_stock'] = 'normal'
+        
+        return {'inventario': inventario}, 200
+    
+    def post(self):
+        verify_jwt_in_request()
+        data = request.get_json(silent=True) or {}
+        
+        campos_requeridos = ['nombre', 'laboratorio_id', 'cantidad_actual', 'cantidad_minima']
+        for campo in campos_requeridos:
+            if not data.get(campo):
+                return {'message': f'{campo} es requerido'}, 400
+        
+        # Verificar que el laboratorio existe
+        lab_exists = db_manager.execute_query("SELECT id FROM laboratorios WHERE id = %s", (data['laboratorio_id'],))
+        if not lab_exists:
+            return {'message': 'Laboratorio no encontrado'}, 404
+        
+        query = """
+            INSERT INTO inventario (nombre, categoria, cantidad_actual, cantidad_minima, unidad,
+                                  ubicacion, proveedor, costo_unitario, fecha_vencimiento, laboratorio_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """
+        
+        try:
+            db_manager.execute_query(query, (
+                data['nombre'], data.get('categoria'), data['cantidad_actual'],
+                data['cantidad_minima'], data.get('unidad'), data.get('ubicacion'),
+                data.get('proveedor'), data.get('costo_unitario'),
+                data.get('fecha_vencimiento'), data['laboratorio_id']
+            ))
+            notificar_cambio('inventario', extra=[f"laboratorio:{data['laboratorio_id']}"])
+            return {'message': 'Item de inventario creado exitosamente'}, 201
+        except Exception as e:
+            return {'message': f'Error creando item: {str(e)}'}, 500
+
+
+class ReservasAPI(Resource):
+    def get(self):
+        verify_jwt_in_request()
+        current_user = get_jwt_identity()
+        usuario_nivel = request.args.get('nivel_usuario', '1')
+        if int(usuario_nivel) >= 3:
+            query = (
+                """
+                SELECT r.id, r.usuario_id, r.equipo_id, r.fecha_inicio, r.fecha_fin,
+                       r.estado, r.notas,
+                       u.nombre as usuario_nombre, e.nombre as equipo_nombre
+                FROM reservas r
+                JOIN usuarios u ON r.usuario_id = u.id
+                JOIN equipos e ON r.equipo_id = e.id
+                ORDER BY r.fecha_inicio DESC
+                """
+            )
+            reservas = db_manager.execute_query(query)
+        else:
+            query = (
+                """
+                SELECT r.id, r.usuario_id, r.equipo_id, r.fecha_inicio, r.fecha_fin,
+                       r.estado, r.notas,
+                       u.nombre as usuario_nombre, e.nombre as equipo_nombre
+                FROM reservas r
+                JOIN usuarios u ON r.usuario_id = u.id
+                JOIN equipos e ON r.equipo_id = e.id
+                WHERE r.usuario_id = %s
+                ORDER BY r.fecha_inicio DESC
+                """
+            )
+            reservas = db_manager.execute_query(query, (current_user,))
+        return {'reservas': reservas}, 200
+
+    def post(self):
+        verify_jwt_in_request()
+        current_user = get_jwt_identity()
+        parser = reqparse.RequestParser()
+        parser.add_argument('equipo_id', required=True)
+        parser.add_argument('fecha_inicio', required=True)
+        parser.add_argument('fecha_fin', required=True)
+        parser.add_argument('notas')
+        args = parser.parse_args()
+        # Normalizar fechas (aceptar 'YYYY-MM-DDTHH:mm' de inputs HTML)
+        def normalize(dt: str) -> str:
+            dt = dt.replace('T', ' ').strip()
+            # agregar segundos si faltan
+            if len(dt) == 16:  # 'YYYY-MM-DD HH:MM'
+                dt = dt + ":00"
+            return dt
+        fecha_inicio = normalize(args['fecha_inicio'])
+        fecha_fin = normalize(args['fecha_fin'])
+        # Validación simple de orden temporal
+        try:
+            dt_ini = datetime.strptime(fecha_inicio, '%Y-%m-%d %H:%M:%S')
+            dt_fin = datetime.strptime(fecha_fin, '%Y-%m-%d %H:%M:%S')
+            if dt_fin <= dt_ini:
+                return {'message': 'La fecha fin debe ser posterior al inicio'}, 400
+        except Exception:
+            return {'message': 'Formato de fecha inválido'}, 400
+
+        # Validar equipo
+        try:
+            rs = db_manager.execute_query("SELECT estado FROM equipos WHERE id=%s", (args['equipo_id'],))
+        except Exception as e:
+            return {'message': f'Error consultando equipo: {str(e)}'}, 500
+        if not rs:
+            return {'message': 'Equipo no encontrado'}, 404
+        if rs[0]['estado'] != 'disponible':
+            return {'message': 'Equipo no disponible'}, 400
+
+        import uuid
+        reserva_id = f"RES{str(uuid.uuid4())[:8].upper()}"
+        try:
+            db_manager.execute_query(
+                """
+                INSERT INTO reservas (id, usuario_id, equipo_id, fecha_inicio, fecha_fin, estado, notas)
+                VALUES (%s, %s, %s, %s, %s, 'programada', %s)
+                """,
+                (reserva_id, current_user, args['equipo_id'], fecha_inicio, fecha_fin, args['notas']),
+            )
+            db_manager.execute_query("UPDATE equipos SET estado='en_uso' WHERE id=%s", (args['equipo_id'],))
+            notificar_cambio('reserva', reserva_id, extra=etiquetas_cambio('equipo', args['equipo_id']))
+            return {'message': 'Reserva creada exitosamente', 'reserva_id': reserva_id}, 201
+        except Exception as e:
+            return {'message': f'Error creando reserva: {str(e)}'}, 500
+
+
+class ReservaAPI(Resource):
+    def delete(self, reserva_id):
+        verify_jwt_in_request()
+        rs = db_manager.execute_query("SELECT usuario_id, equipo_id, estado FROM reservas WHERE id=%s", (reserva_id,))
+        if not rs:
+            return {'message': 'Reserva no encontrada'}, 404
+        reserva = rs[0]
+        if reserva['estado'] not in ['programada', 'activa']:
+            return {'message': 'No se puede cancelar esta reserva'}, 400
+        try:
+            db_manager.execute_query("UPDATE reservas SET estado='cancelada' WHERE id=%s", (reserva_id,))
+            db_manager.execute_query("UPDATE equipos SET estado='disponible' WHERE id=%s", (reserva['equipo_id'],))
+            notificar_cambio('reserva', reserva_id, extra=etiquetas_cambio('equipo', reserva['equipo_id']))
+            return {'message': 'Reserva cancelada exitosamente'}, 200
+        except Exception as e:
+            return {'message': f'Error cancelando reserva: {str(e)}'}, 500
+
+
+class UsuariosAPI(Resource):
+    def get(self):
+        verify_jwt_in_request()
+        query = (
+            """
+            SELECT id, nombre, tipo, programa, nivel_acceso, activo, email,
+                   DATE_FORMAT(fecha_registro, '%Y-%m-%d') as fecha_registro,
+                   CASE WHEN rostro_data IS NOT NULL THEN true ELSE false END as tiene_rostro
+            FROM usuarios
+            ORDER BY tipo, nombre
+            """
+        )
+        usuarios = db_manager.execute_query(query)
+        return {'usuarios': usuarios}, 200
+
+
+class EstadisticasAPI(Resource):
+    def get(self):
+        verify_jwt_in_request()
+        stats = dict(get_dashboard_stats())  # copia: el resultado está cacheado
+        q1 = (
+            """
+            SELECT u.programa, COUNT(DISTINCT h.id) usos
+            FROM usuarios u
+            LEFT JOIN historial_uso h ON u.id = h.usuario_id AND h.fecha_uso >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
+            GROUP BY u.programa
+            ORDER BY usos DESC
+            """
+        )
+        stats['uso_por_programa'] = db_manager.execute_query(q1)
+        q2 = (
+            """
+            SELECT e.nombre, e.tipo, COUNT(h.id) usos
+            FROM equipos e
+            LEFT JOIN historial_uso h ON e.id = h.equipo_id AND h.fecha_uso >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
+            GROUP BY e.id, e.nombre, e.tipo
+            ORDER BY usos DESC
+            LIMIT 10
+            """
+        )
+        stats['equipos_mas_usados'] = db_manager.execute_query(q2)
+        return {'estadisticas': stats}, 200
+
+
+class ComandosVozAPI(Resource):
+    def post(self):
+        # Comandos de voz sin autenticación para navegación simple
+        parser = reqparse.RequestParser()
+        parser.add_argument('comando', required=True)
+        args = parser.parse_args()
+        
+        respuesta = procesar_comando_voz(args['comando'].lower().strip())
+        
+        # Intentar registrar el comando (opcional, sin fallar si no hay usuario)
+        try:
+            # Verificar si hay usuario logueado (opcional)
+            current_user = None
+            try:
+                verify_jwt_in_request()
+                current_user = get_jwt_identity()
+            except:
+                current_user = 'anonimo'  # Usuario anónimo para comandos de navegación
+            
+            db_manager.execute_query(
+                """
+                INSERT INTO comandos_voz (usuario_id, comando, respuesta, exito)
+                VALUES (%s, %s, %s, %s)
+                """,
+                (current_user, args['comando'], respuesta['mensaje'], respuesta['exito']),
+            )
+            notificar_cambio('comandos_voz')
+        except Exception as e:
+            # No fallar si no se puede registrar el comando
+            logger.warning("No se pudo registrar comando de voz: %s", e)
+            pass
+        
+        return respuesta, 200
+
+
+def procesar_comando_voz(comando: str):
+    """
+    Procesador de comandos de voz - Navegación entre módulos del sistema
+    """
+    comando = comando.lower().strip()
+    
+    # =============================
+    # COMANDOS DE NAVEGACIÓN
+    # =============================
+    
+    # Dashboard / Inicio
+    if any(p in comando for p in ['dashboard', 'inicio', 'home', 'principal', 'tablero']):
+        return {'mensaje': '📊 Navegando al dashboard...', 'exito': True, 'accion': 'navegar', 'url': '/dashboard'}
+    
+    # Laboratorios
+    if any(p in comando for p in ['laboratorios', 'laboratorio', 'labs', 'lab']):
+        return {'mensaje': '🔬 Navegando a laboratorios...', 'exito': True, 'accion': 'navegar', 'url': '/laboratorios'}
+    
+    # Equipos
+    if any(p in comando for p in ['equipos', 'equipo', 'maquinaria', 'herramientas']):
+        return {'mensaje': '⚙️ Navegando a equipos...', 'exito': True, 'accion': 'navegar', 'url': '/equipos'}
+    
+    # Inventario
+    if any(p in comando for p in ['inventario', 'stock', 'almacén', 'almacen', 'reactivos', 'materiales']):
+        return {'mensaje': '📦 Navegando a inventario...', 'exito': True, 'accion': 'navegar', 'url': '/inventario'}
+    
+    # Reservas
+    if any(p in comando for p in ['reservas', 'reserva', 'reservaciones', 'reservación']):
+        return {'mensaje': '📅 Navegando a reservas...', 'exito': True, 'accion': 'navegar', 'url': '/reservas'}
+    
+    # Usuarios
+    if any(p in comando for p in ['usuarios', 'usuario', 'personas', 'estudiantes']):
+        return {'mensaje': '👥 Navegando a usuarios...', 'exito': True, 'accion': 'navegar', 'url': '/usuarios'}
+    
+    # Reportes
+    if any(p in comando for p in ['reportes', 'reporte', 'informes', 'estadísticas', 'estadisticas']):
+        return {'mensaje': '📈 Navegando a reportes...', 'exito': True, 'accion': 'navegar', 'url': '/reportes'}
+    
+    # Configuración
+    if any(p in comando for p in ['configuración', 'configuracion', 'ajustes', 'settings']):
+        return {'mensaje': '⚙️ Navegando a configuración...', 'exito': True, 'accion': 'navegar', 'url': '/configuracion'}
+    
+    # Ayuda / Manual
+    if any(p in comando for p in ['manual', 'ayuda general', 'documentación', 'documentacion', 'guía', 'guia']):
+        return {'mensaje': '📖 Abriendo manual de usuario...', 'exito': True, 'accion': 'navegar', 'url': '/ayuda'}
+    
+    # Módulos del proyecto
+    if any(p in comando for p in ['módulos', 'modulos', 'funcionalidades', 'características', 'caracteristicas']):
+        return {'mensaje': '🧩 Navegando a módulos del proyecto...', 'exito': True, 'accion': 'navegar', 'url': '/modulos'}
+    
+    # Cerrar sesión
+    if any(p in comando for p in ['cerrar sesión', 'cerrar sesion', 'salir', 'logout', 'desconectar']):
+        return {'mensaje': '👋 Cerrando sesión...', 'exito': True, 'accion': 'navegar', 'url': '/logout'}
+    
+    # =============================
+    # COMANDOS DE AYUDA
+    # =============================
+    
+    if any(p in comando for p in ['ayuda', 'help', 'comandos', 'qué puedo decir', 'que puedo decir', 'opciones']):
+        return {
+            'mensaje': """🎤 Comandos de voz disponibles:
+            
+📍 NAVEGACIÓN:
+• "Dashboard" o "Inicio" - Panel principal
+• "Laboratorios" - Gestión de laboratorios
+• "Equipos" - Gestión de equipos
+• "Inventario" - Control de inventario y reactivos
+• "Reservas" - Sistema de reservas
+• "Usuarios" - Gestión de usuarios
+• "Reportes" - Informes y estadísticas
+• "Configuración" - Ajustes del sistema
+• "Ayuda" - Manual de usuario
+• "Módulos" - Ver funcionalidades del proyecto
+
+🚪 SESIÓN:
+• "Cerrar sesión" - Salir del sistema
+
+💡 Tip: Puede decir variaciones como "ir a equipos", "mostrar inventario", etc.""", 
+            'exito': True
+        }
+    
+    # =============================
+    # COMANDO NO RECONOCIDO
+    # =============================
+    
+    return {
+        'mensaje': f'❌ Comando "{comando}" no reconocido. Diga "ayuda" para ver todos los comandos disponibles.', 
+        'exito': False
+    }
+
+# =============================
+# OBJETOS: Registro unificado (crear + imagen)
+# =============================
+
+@bp.post('/api/objetos/crear_con_imagen')
+def crear_objeto_con_imagen():
+    try:
+        verify_jwt_or_admin()
+    except Exception:
+        return jsonify({'message': 'No autorizado'}), 401
+
+    data = request.get_json(silent=True) or {}
+    nombre = (data.get('nombre') or '').strip()
+    categoria = (data.get('categoria') or '').strip() or None
+    descripcion = data.get('descripcion')
+    img_b64 = data.get('image_base64')
+    vista = (data.get('vista') or '').strip()
+    notas = data.get('notas')
+    fuente = data.get('fuente', 'upload')
+    if not nombre:
+        return jsonify({'message': 'nombre requerido'}), 400
+    if not img_b64:
+        return jsonify({'message': 'image_base64 requerido'}), 400
+    if not vista:
+        return jsonify({'message': 'vista requerida'}), 400
+
+    # crear/obtener objeto
+    try:
+        rs_exist = db_manager.execute_query(
+            "SELECT id FROM objetos WHERE nombre=%s AND (categoria=%s OR (categoria IS NULL AND %s IS NULL))",
+            (nombre, categoria, categoria)
+        ) or []
+        if rs_exist:
+            objeto_id = rs_exist[0]['id']
+            logger_objetos.debug("Objeto existente encontrado: ID=%s", objeto_id)
+        else:
+            logger_objetos.debug("Creando nuevo objeto: nombre='%s', categoria='%s'", nombre, categoria)
+            db_manager.execute_query(
+                "INSERT INTO objetos (nombre, categoria, descripcion) VALUES (%s,%s,%s)",
+                (nombre, categoria, descripcion)
+            )
+            rs_new = db_manager.execute_query("SELECT LAST_INSERT_ID() as id")
+            logger_objetos.debug("Resultado LAST_INSERT_ID: %s", rs_new)
+            
+            if not rs_new or not rs_new[0].get('id'):
+                return jsonify({'message': 'Error: No se pudo obtener el ID del objeto creado'}), 500
+            
+            objeto_id = rs_new[0]['id']
+            logger_objetos.debug("Nuevo objeto creado: ID=%s", objeto_id)
+        
+        if not objeto_id:
+            return jsonify({'message': 'Error: objeto_id es nulo'}), 500
+            
+    except Exception as e:
+        logger_objetos.exception("Error creando/consultando objeto: %s: %s", type(e).__name__, e)
+        return jsonify({'message': f'Error creando/consultando objeto: {e}'}), 500
+
+    # Guardar imagen en FS y BD (igual a ObjetoImagenAPI.post)
+    try:
+        # decode base64
+        if ',' in img_b64:
+            _, img_b64 = img_b64.split(',', 1)
+        blob = base64.b64decode(img_b64)
+        content_type = 'image/jpeg'
+        import re
+        def san(s: str) -> str:
+            s = (s or '').lower().replace('..','').replace('/','').replace('\\','')
+            s = re.sub(r"[^a-z0-9_\- ]+", '', s).strip()
+            s = re.sub(r"\s+", '_', s)
+            return s
+        base_dir = os.path.join('imagenes', 'objetos', san(nombre), vista)
+        os.makedirs(base_dir, exist_ok=True)
+        filename = f"img_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
+        file_path = os.path.join(base_dir, filename)
+        with open(file_path, 'wb') as f:
+            f.write(blob)
+        # thumbnail
+        thumb_blob = None
+        try:
+            img_arr = np.frombuffer(blob, dtype=np.uint8)
+            im = cv2.imdecode(img_arr, cv2.IMREAD_COLOR)
+            if im is not None:
+                h, w = im.shape[:2]
+                scale = 320.0 / max(1.0, w)
+                if scale < 1.0:
+                    im_res = cv2.resize(im, (int(w*scale), int(h*scale)))
+                else:
+                    im_res = im
+                ok, enc = cv2.imencode('.jpg', im_res, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
+                if ok:
+                    thumb_blob = enc.tobytes()
+        except Exception:
+            thumb_blob = None
+        # insert BD
+        logger_objetos.debug("Insertando imagen: objeto_id=%s, path=%s, vista=%s", objeto_id, file_path, vista)
+        db_manager.execute_query(
+            """
+            INSERT INTO objetos_imagenes (objeto_id, path, thumbnail, fuente, notas, vista)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            """,
+            (objeto_id, file_path.replace('\\','/'), thumb_blob, fuente, notas, vista)
+        )
+        logger_objetos.debug("Imagen guardada exitosamente")
+        notificar_cambio('objeto', objeto_id)
+    except Exception as e:
+        logger_objetos.exception("Error guardando imagen: %s: %s", type(e).__name__, e)
+        return jsonify({'message': f'Error guardando imagen: {e}'}), 500
+
+    return jsonify({'message': 'Objeto e imagen guardados', 'id': objeto_id}), 201
+
+# =============================
+# OBJETOS: Registro y Gestión
+# =============================
+
+class ObjetosAPI(Resource):
+    def get(self):
+        verify_jwt_or_admin()
+        q = request.args.get('q')
+        sql = (
+            "SELECT o.id, o.nombre, o.categoria, o.descripcion, "
+            "DATE_FORMAT(o.fecha_creacion, '%Y-%m-%d %H:%i') as fecha_creacion, "
+            "(SELECT COUNT(*) FROM objetos_imagenes oi WHERE oi.objeto_id=o.id) AS img_count, "
+            "(SELECT oi2.id FROM objetos_imagenes oi2 WHERE oi2.objeto_id=o.id ORDER BY oi2.id ASC LIMIT 1) AS first_img_id "
+            "FROM objetos o"
+        )
+        params = []
+        if q:
+            sql += " WHERE o.nombre LIKE %s OR o.categoria LIKE %s"
+            params = [f"%{q}%", f"%{q}%"]
+        sql += " ORDER BY o.categoria, o.nombre"
+        rs = db_manager.execute_query(sql, params)
+        return {'objetos': rs}, 200
+
+    def post(self):
+        try:
+            logger_objetos.debug("Iniciando POST /api/objetos")
+            
+            # Permitir acceso con JWT o sesión web
+            contexto = contexto_auth()
+            if not contexto.autenticado:
+                logger_objetos.warning("Sin sesión web ni JWT válido")
+                return {'message': 'Autenticación requerida'}, 401
+            logger_objetos.debug("Autenticado por %s: user_id=%s", contexto.origen, contexto.user_id)
+            
+            data = request.get_json(silent=True) or {}
+            logger_objetos.debug("Datos recibidos: %s", data)
+            
+            nombre = (data.get('nombre') or '').strip()
+            categoria = (data.get('categoria') or '').strip()
+            descripcion = data.get('descripcion')
+            
+            if not nombre:
+                logger_objetos.warning("Nombre vacio")
+                return {'message': 'nombre requerido'}, 400
+            
+            logger_objetos.debug("Datos validados: nombre='%s', categoria='%s'", nombre, categoria)
+        except Exception as e:
+            logger_objetos.exception("ERROR CRITICO en inicio de POST: %s: %s", type(e).__name__, e)
+            return {'message': f'Error crítico: {str(e)}'}, 500
+        
+        try:
+            logger_objetos.debug("POST /api/objetos - nombre: '%s', categoria: '%s'", nombre, categoria)
+            
+            # Verificar si ya existe
+            rs_exist = db_manager.execute_query(
+                "SELECT id FROM objetos WHERE nombre=%s AND (categoria=%s OR (categoria IS NULL AND %s IS NULL))",
+                (nombre, categoria or None, categoria or None)
+            )
+            logger_objetos.debug("Verificacion existencia: %s", rs_exist)
+            
+            if rs_exist:
+                return {'message': f'Ya existe un objeto "{nombre}" en la categoría "{categoria or "Sin categoría"}". Use el registro existente o cambie el nombre.', 'id': rs_exist[0]['id'], 'existe': True}, 200
+            
+            # Crear nuevo objeto
+            logger_objetos.debug("Insertando objeto...")
+            db_manager.execute_query(
+                "INSERT INTO objetos (nombre, categoria, descripcion) VALUES (%s, %s, %s)",
+                (nombre, categoria or None, descripcion),
+            )
+            logger_objetos.debug("Objeto insertado")
+            
+            rs = db_manager.execute_query("SELECT id FROM objetos WHERE nombre=%s AND (categoria=%s OR (categoria IS NULL AND %s IS NULL)) ORDER BY id DESC LIMIT 1", (nombre, categoria or None, categoria or None))
+            logger_objetos.debug("ID recuperado: %s", rs)
+            notificar_cambio('objeto', rs[0]['id'] if rs else None)
+            
+            return {'message': 'Objeto creado exitosamente', 'id': rs[0]['id'] if rs else None}, 201
+        except Exception as e:
+            logger_objetos.exception("ERROR en POST /api/objetos: %s: %s", type(e).__name__, e)
+            
+            if '1062' in str(e) or 'Duplicate entry' in str(e):
+                return {'message': f'Ya existe un objeto con ese nombre y categoría. Use un nombre diferente o seleccione el existente de la lista.', 'duplicado': True}, 409
+            return {'message': f'Error creando objeto: {str(e)}'}, 500
+
+
+class ObjetoImagenAPI(Resource):
+    def get(self, objeto_id):
+        """Obtener lista de imágenes de un objeto"""
+        # Permitir acceso con JWT o sesión web
+        if not contexto_auth().autenticado:
+            return {'message': 'Autenticación requerida'}, 401
+        
+        try:
+            logger_objetos.debug("GET imagenes para objeto_id=%s", objeto_id)
+            rs = db_manager.execute_query(
+                "SELECT id, path, vista, notas, fuente, DATE_FORMAT(fecha_subida, '%Y-%m-%d %H:%i') as fecha_creacion FROM objetos_imagenes WHERE objeto_id=%s ORDER BY id DESC",
+                (objeto_id,)
+            )
+            logger_objetos.debug("Imagenes encontradas: %s", len(rs) if rs else 0)
+            return {'imagenes': rs or []}, 200
+        except Exception as e:
+            logger_objetos.exception("Error obteniendo imagenes: %s: %s", type(e).__name__, e)
+            return {'message': f'Error obteniendo imágenes: {str(e)}'}, 500
+    
+    def post(self, objeto_id):
+        # Permitir acceso con JWT o sesión web
+        if not contexto_auth().autenticado:
+            return {'message': 'Autenticación requerida'}, 401
+        
+        data = request.get_json(silent=True) or {}
+        img_b64 = data.get('image_base64')
+        notas = data.get('notas')
+        fuente = data.get('fuente', 'upload')
+        carpeta = (data.get('carpeta') or '').strip()
+        tipo_registro = data.get('tipo_registro', 'objeto')  # 'equipo' o 'objeto'
+        vista = (data.get('vista') or '').strip()  # superior/inferior/lateral_izquierda/lateral_derecha
+        if not img_b64:
+            return {'message': 'image_base64 requerido'}, 400
+        try:
+            logger_objetos.debug("Iniciando guardado de imagen para objeto %s", objeto_id)
+            logger_objetos.debug("Tipo registro: %s", tipo_registro)
+            logger_objetos.debug("Carpeta solicitada: '%s'", carpeta)
+            
+            # Si no hay carpeta especificada, usar nombre del objeto
+            rs_obj = None
+            if not carpeta:
+                rs_obj = db_manager.execute_query("SELECT nombre FROM objetos WHERE id=%s", (objeto_id,))
+                if rs_obj:
+                    carpeta = rs_obj[0]['nombre']
+                    logger_objetos.debug("Carpeta obtenida del objeto: '%s'", carpeta)
+            # Normalizar dataURL
+            if ',' in img_b64:
+                header, img_b64 = img_b64.split(',', 1)
+            blob = base64.b64decode(img_b64)
+            content_type = 'image/jpeg'
+            if 'data:image/' in (locals().get('header') or ''):
+                try:
+                    content_type = header.split(';')[0].split(':')[1]
+                except Exception:
+                    pass
+            # Guardar en disco
+            ext = '.jpg' if content_type=='image/jpeg' else ('.png' if content_type=='image/png' else '.img')
+            # Sanitizar subcarpeta opcional
+            def _sanitize_folder(name: str) -> str:
+                import re
+                name = name.replace('..','').replace('/', '').replace('\\','')
+                name = re.sub(r"[^A-Za-z0-9_\- ]+", '', name).strip()
+                name = re.sub(r"\s+", '_', name)
+                return name[:80]
+
+            safe_sub = _sanitize_folder(carpeta) if carpeta else ''
+            if vista:
+                safe_sub = _sanitize_folder(vista)
+            # si viene 'vista', usarla como subcarpeta (tiene prioridad)
+            if vista:
+                safe_sub = _sanitize_folder(vista)
+            # Determinar ruta base según tipo de registro y nombre
+            base_folder = 'equipos' if tipo_registro == 'equipo' else 'objetos'
+            # usar nombre del objeto/equipo como carpeta principal
+            if carpeta:
+                base_name = _sanitize_folder(carpeta)
+            elif rs_obj and len(rs_obj) > 0:
+                base_name = _sanitize_folder(rs_obj[0]['nombre'])
+            else:
+                base_name = f'objeto_{objeto_id}'
+            
+            dir_path = os.path.join('imagenes', base_folder, base_name)
+            if safe_sub:
+                dir_path = os.path.join(dir_path, safe_sub)
+            
+            logger_objetos.debug("Ruta completa calculada: %s", dir_path)
+            logger_objetos.debug("Directorio de trabajo actual: %s", os.getcwd())
+            logger_objetos.debug("Ruta absoluta: %s", os.path.abspath(dir_path))
+            
+            # Crear directorio con manejo de errores
+            try:
+                os.makedirs(dir_path, exist_ok=True)
+                logger_objetos.debug("Directorio creado/verificado: %s", dir_path)
+            except PermissionError:
+                return {'message': f'Sin permisos para crear directorio: {dir_path}'}, 500
+            except Exception as e:
+                return {'message': f'Error creando directorio {dir_path}: {str(e)}'}, 500
+            
+            # Guardar archivo con manejo de errores
+            filename = f"img_{datetime.now().strftime('%Y%m%d_%H%M%S')}{ext}"
+            file_path = os.path.join(dir_path, filename)
+            try:
+                with open(file_path, 'wb') as f:
+                    f.write(blob)
+                logger_objetos.info("Archivo guardado: %s (%s bytes)", file_path, len(blob))
+                
+                # Verificar que el archivo realmente existe
+                if os.path.exists(file_path):
+                    size = os.path.getsize(file_path)
+                    logger_objetos.debug("Verificacion: archivo existe con %s bytes", size)
+                else:
+                    logger_objetos.error("ERROR: archivo NO existe despues de guardarlo: %s", file_path)
+                    return {'message': f'Error: archivo no se guardó correctamente en {file_path}'}, 500
+                    
+            except PermissionError:
+                logger_objetos.error("ERROR de permisos: %s", file_path)
+                return {'message': f'Sin permisos para escribir archivo: {file_path}'}, 500
+            except OSError as e:
+                logger_objetos.error("ERROR del sistema: %s", e)
+                return {'message': f'Error del sistema guardando {file_path}: {str(e)}'}, 500
+            except Exception as e:
+                logger_objetos.error("ERROR inesperado: %s", e)
+                return {'message': f'Error inesperado guardando archivo: {str(e)}'}, 500
+            # Generar thumbnail (320px ancho máx) con manejo de errores
+            thumb_blob = None
+            try:
+                img_arr = np.frombuffer(blob, dtype=np.uint8)
+                im = cv2.imdecode(img_arr, cv2.IMREAD_COLOR)
+                if im is not None:
+                    h, w = im.shape[:2]
+                    scale = 320.0 / max(1.0, w)
+                    if scale < 1.0:
+                        im_res = cv2.resize(im, (int(w*scale), int(h*scale)))
+                    else:
+                        im_res = im
+                    ok, enc = cv2.imencode('.jpg', im_res, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
+                    if ok:
+                        thumb_blob = enc.tobytes()
+                        logger_objetos.debug("Thumbnail generado: %s bytes", len(thumb_blob))
+                    else:
+                        logger_objetos.warning("No se pudo codificar thumbnail")
+                else:
+                    logger_objetos.warning("No se pudo decodificar imagen para thumbnail")
+            except Exception as e:
+                logger_objetos.warning("Error generando thumbnail: %s", e)
+                # Continuar sin thumbnail
+            
+            # Guardar registro en BD con manejo de errores
+            try:
+                db_manager.execute_query(
+                    """
+                    INSERT INTO objetos_imagenes (objeto_id, path, thumbnail, fuente, notas, vista)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    """,
+                    (objeto_id, file_path.replace('\\','/'), thumb_blob, fuente, notas, vista),
+                )
+                logger_objetos.info("Registro guardado en BD para objeto %s", objeto_id)
+                notificar_cambio('objeto', objeto_id)
+                
+                # Listar contenido de la carpeta para verificar
+                try:
+                    parent_dir = os.path.dirname(file_path)
+                    files = os.listdir(parent_dir)
+                    logger_objetos.debug("Contenido de %s: %s", parent_dir, files)
+                except Exception as e:
+                    logger_objetos.warning("No se pudo listar directorio: %s", e)
+                
+                return {'message': 'Imagen almacenada exitosamente', 'path': file_path.replace('\\','/'), 'size_bytes': len(blob)}, 201
+            except Exception as e:
+                # Si falla BD, intentar eliminar archivo para evitar inconsistencias
+                try:
+                    os.remove(file_path)
+                    logger_objetos.warning("Archivo eliminado por error BD: %s", file_path)
+                except:
+                    pass
+                return {'message': f'Error guardando en base de datos: {str(e)}'}, 500
+        except Exception as e:
+            return {'message': f'Error guardando imagen: {str(e)}'}, 500
+
+
+api.add_resource(ObjetosAPI, '/api/objetos')
+
+@bp.route('/objetos/registrar')
+@require_login
+@require_level(4)  # Solo Administrador puede entrenar IA
+def objetos_registrar():
+    return render_template('objetos_registrar.html', user=session)
+
+@bp.route('/registro-completo')
+@require_login
+@require_level(4)  # Solo Administrador
+def registro_completo():
+    """Formulario unificado de registro de equipos/items con IA"""
+    # Obtener lista de laboratorios
+    query = "SELECT id, codigo, nombre FROM laboratorios WHERE estado = 'activo' ORDER BY nombre"
+    laboratorios = db_manager.execute_query(query)
+    return render_template('registro_completo.html', user=session, laboratorios=laboratorios)
+
+@bp.route('/registros-gestion')
+@require_login
+@require_level(4)  # Solo Administrador
+def registros_gestion():
+    """Página de gestión de registros"""
+    query = "SELECT id, codigo, nombre FROM laboratorios WHERE estado = 'activo' ORDER BY nombre"
+    laboratorios = db_manager.execute_query(query)
+    return render_template('registros_gestion.html', user=session, laboratorios=laboratorios)
+
+@bp.route('/api/registro-completo', methods=['POST'])
+@require_login
+@require_level(4)
+def api_registro_completo():
+    """API para guardar registro completo (equipo/item + fotos + IA)"""
+    import json
+    import uuid
+    import re
+    import base64
+    import io
+    from PIL import Image
+    
+    try:
+        # Obtener datos JSON
+        data = request.get_json()
+        
+        tipo_registro = data.get('tipo_registro')
+        nombre = data.get('nombre')
+        categoria = data.get('tipo_categoria')  # El frontend envía 'tipo_categoria'
+        descripcion = data.get('descripcion', '')
+        laboratorio_id = data.get('laboratorio_id')
+        ubicacion = data.get('ubicacion', '')
+        estado = data.get('estado', 'disponible')
+        cantidad = data.get('cantidad', 1)
+        fotos = data.get('fotos', {})
+        
+        # Validar campos obligatorios
+        if not all([nombre, categoria, laboratorio_id]):
+            return jsonify({'success': False, 'message': 'Faltan campos obligatorios'}), 400
+        
+        # Validar que tenga al menos la foto frontal
+        if 'frontal' not in fotos:
+            return jsonify({'success': False, 'message': 'Debe capturar al menos la foto frontal'}), 400
+        
+        # Pasos 1 a 4 en una transacción: commit al terminar, rollback si algo falla
+        with db_manager.transaction() as cursor:
+            # PASO 1: Crear registro en equipos o inventario
+            if tipo_registro == 'equipo':
+                # Crear equipo
+                equipo_id = f"EQ_{str(uuid.uuid4())[:8].upper()}"
+                
+                query_equipo = """
+                    INSERT INTO equipos (id, nombre, tipo, estado, ubicacion, laboratorio_id, especificaciones)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                """
+                cursor.execute(query_equipo, (
+                    equipo_id, nombre, categoria, estado, ubicacion, laboratorio_id,
+                    json.dumps({'descripcion': descripcion})
+                ))
+                registro_id = equipo_id
+                
+            else:  # item de inventario
+                # Generar ID único para el item
+                item_id = f"ITEM_{str(uuid.uuid4())[:8].upper()}"
+                
+                # Intentar insertar con ID generado
+                query_item = """
+                    INSERT INTO inventario (id, nombre, categoria, laboratorio_id)
+                    VALUES (%s, %s, %s, %s)
+                """
+                cursor.execute(query_item, (
+                    item_id, nombre, categoria, laboratorio_id
+                ))
+                registro_id = item_id
+            
+            # PASO 2: Si hay fotos, crear objeto para IA
+            objeto_id = None
+            if fotos:
+                query_objeto = """
+                    INSERT INTO objetos (nombre, categoria, descripcion, equipo_id)
+                    VALUES (%s, %s, %s, %s)
+                """
+                cursor.execute(query_objeto, (
+                    nombre, categoria, descripcion,
+                    equipo_id if tipo_registro == 'equipo' else None
+                ))
+                objeto_id = cursor.lastrowid
+                
+                # PASO 3: Guardar imágenes
+                # Estructura: imagenes/{tipo}/{nombre_objeto}/
+                
+                # Crear nombre de carpeta seguro
+                nombre_carpeta = nombre.lower().replace(' ', '_')
+                nombre_carpeta = re.sub(r'[^a-z0-9_]', '', nombre_carpeta)
+                
+                # Determinar directorio según tipo
+                tipo_dir = 'equipo' if tipo_registro == 'equipo' else 'item'
+                objeto_dir = os.path.join('imagenes', tipo_dir, nombre_carpeta)
+                os.makedirs(objeto_dir, exist_ok=True)
+                
+                for vista, imagen_base64 in fotos.items():
+                    # Decodificar imagen
+                    # Remover prefijo data:image
+                    if ',' in imagen_base64:
+                        imagen_base64 = imagen_base64.split(',')[1]
+                    
+                    imagen_data = base64.b64decode(imagen_base64)
+                    imagen = Image.open(io.BytesIO(imagen_data))
+                    
+                    # Guardar imagen con nombre de vista
+                    # Ejemplo: imagenes/equipo/microscopio_olympus/frontal.jpg
+                    filename = f"{vista}.jpg"
+                    filepath = os.path.join(objeto_dir, filename)
+                    imagen.save(filepath, 'JPEG', quality=85)
+                    
+                    # Insertar en base de datos
+                    query_imagen = """
+                        INSERT INTO objetos_imagenes (objeto_id, path, vista)
+                        VALUES (%s, %s, %s)
+                    """
+                    cursor.execute(query_imagen, (objeto_id, filepath, vista))
+                
+                # PASO 3.5: Crear archivo de metadatos para IA
+                # Obtener información del laboratorio
+                lab_query = "SELECT nombre, ubicacion FROM laboratorios WHERE id = %s"
+                lab_result = db_manager.execute_query(lab_query, (laboratorio_id,))
+                laboratorio_nombre = lab_result[0]['nombre'] if lab_result else None
+                laboratorio_ubicacion = lab_result[0]['ubicacion'] if lab_result else None
+                
+                metadatos = {
+                    'id': objeto_id,
+                    'nombre': nombre,
+                    'tipo': tipo_registro,
+                    'categoria': categoria,
+                    'descripcion': descripcion,
+                    'ubicacion': ubicacion,
+                    'laboratorio_id': laboratorio_id,
+                    'laboratorio_nombre': laboratorio_nombre,
+                    'laboratorio_ubicacion': laboratorio_ubicacion,
+                    'cantidad': cantidad if tipo_registro == 'item' else None,
+                    'estado': estado if tipo_registro == 'equipo' else None,
+                    'equipo_id': equipo_id if tipo_registro == 'equipo' else None,
+                    'fotos_capturadas': list(fotos.keys()),
+                    'total_fotos': len(fotos),
+                    'entrenado_ia': len(fotos) == 6,
+                    'ruta_imagenes': objeto_dir
+                }
+                
+                metadata_path = os.path.join(objeto_dir, 'metadata.json')
+                with open(metadata_path, 'w', encoding='utf-8') as f:
+                    json.dump(metadatos, f, indent=2, ensure_ascii=False)
+                
+                # PASO 4: Actualizar equipo con objeto_id y entrenado_ia
+                if tipo_registro == 'equipo' and objeto_id:
+                    entrenado_ia = len(fotos) == 6  # Solo si tiene las 6 vistas
+                    query_update = """
+                        UPDATE equipos 
+                        SET objeto_id = %s, entrenado_ia = %s
+                        WHERE id = %s
+                    """
+                    cursor.execute(query_update, (objeto_id, entrenado_ia, equipo_id))
+            
+        notificar_cambio('equipo' if tipo_registro == 'equipo' else 'inventario', registro_id,
+                         extra=[*etiquetas_cambio('objeto', objeto_id), f'laboratorio:{laboratorio_id}'])
+        
+        # Log de auditoría
+        try:
+            log_query = """
+                INSERT INTO logs_seguridad (usuario_id, accion, detalle, ip_origen, exitoso)
+                VALUES (%s, 'registro_completo', %s, %s, TRUE)
+            """
+            db_manager.execute_query(log_query, (
+                session.get('user_id'),
+                f"Registro completo: {nombre} ({tipo_registro})",
+                request.remote_addr
+            ))
+        except Exception:
+            pass
+        
+        return jsonify({
+            'success': True,
+            'message': 'Registro guardado exitosamente',
+            'id': registro_id,
+            'objeto_id': objeto_id,
+            'entrenado_ia': len(fotos) == 6 if fotos else False
+        }), 201
+            
+    except Exception as e:
+        logger_registros.exception("Error en registro completo: %s", e)
+        return jsonify({'success': False, 'message': f'Error al guardar: {str(e)}'}), 500
+
+@bp.route('/api/registros-completos')
+@require_login
+@require_level(4)
+def api_registros_completos():
+    """API para listar todos los registros (equipos + items)"""
+    try:
+        registros = []
+        
+        # Obtener equipos - solo columnas básicas
+        try:
+            query_equipos = """
+                SELECT e.id, e.nombre, e.tipo as categoria, e.estado,
+                    e.laboratorio_id, l.nombre as laboratorio_nombre
+                FROM equipos e
+                LEFT JOIN laboratorios l ON e.laboratorio_id = l.id
+                ORDER BY e.nombre
+            """
+            equipos = db_manager.execute_query(query_equipos) or []
+            
+            for eq in equipos:
+                eq['tipo'] = 'equipo'
+                # El estado ya viene de la BD, no lo sobrescribimos
+                eq['entrenado_ia'] = False
+                eq['foto_frontal'] = None
+                
+                # Buscar objeto asociado
+                query_obj = "SELECT id FROM objetos WHERE nombre = %s LIMIT 1"
+                obj = db_manager.execute_query(query_obj, (eq['nombre'],))
+                if obj:
+                    objeto_id = obj[0]['id']
+                    # Buscar foto frontal
+                    query_foto = "SELECT id FROM objetos_imagenes WHERE objeto_id = %s AND vista = 'frontal' LIMIT 1"
+                    foto = db_manager.execute_query(query_foto, (objeto_id,))
+                    if foto:
+                        eq['foto_frontal'] = f'/imagenes_objeto/{foto[0]["id"]}'
+                        eq['entrenado_ia'] = True
+                
+                registros.append(eq)
+        except Exception as e:
+            logger_registros.warning("Error obteniendo equipos: %s", e)
+        
+        # Obtener items - solo columnas básicas
+        try:
+            query_items = """
+                SELECT i.id, i.nombre, i.categoria, i.cantidad_actual as stock_actual,
+                       i.laboratorio_id, l.nombre as laboratorio_nombre
+                FROM inventario i
+                LEFT JOIN laboratorios l ON i.laboratorio_id = l.id
+                ORDER BY i.nombre
+            """
+            items = db_manager.execute_query(query_items) or []
+            
+            for item in items:
+                item['tipo'] = 'item'
+                # El stock_actual ya viene de la BD, no lo sobrescribimos
+                item['entrenado_ia'] = False
+                item['foto_frontal'] = None
+                
+                # Buscar objeto asociado
+                query_obj = "SELECT id FROM objetos WHERE nombre = %s LIMIT 1"
+                obj = db_manager.execute_query(query_obj, (item['nombre'],))
+                if obj:
+                    objeto_id = obj[0]['id']
+                    # Buscar foto frontal
+                    query_foto = "SELECT id FROM objetos_imagenes WHERE objeto_id = %s AND vista = 'frontal' LIMIT 1"
+                    foto = db_manager.execute_query(query_foto, (objeto_id,))
+                    if foto:
+                        item['foto_frontal'] = f'/imagenes_objeto/{foto[0]["id"]}'
+                        item['entrenado_ia'] = True
+                
+                registros.append(item)
+        except Exception as e:
+            logger_registros.warning("Error obteniendo items: %s", e)
+        
+        logger_registros.debug("Total registros encontrados: %s", len(registros))
+        return jsonify({'success': True, 'registros': registros})
+        
+    except Exception as e:
+        logger_registros.exception("Error listando registros: %s", e)
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@bp.route('/api/registro-detalle/<tipo>/<id>')
+@require_login
+@require_level(4)
+def api_registro_detalle(tipo, id):
+    """API para obtener detalles de un registro"""
+    try:
+        if tipo == 'equipo':
+            query = """
+                SELECT e.*, l.nombre as laboratorio_nombre, o.id as objeto_id
+                FROM equipos e
+                LEFT JOIN laboratorios l ON e.laboratorio_id = l.id
+                LEFT JOIN objetos o ON e.objeto_id = o.id
+                WHERE e.id = %s
+            """
+            registro = db_manager.execute_query(query, (id,))
+        else:
+            query = """
+                SELECT i.*, l.nombre as laboratorio_nombre, o.id as objeto_id
+                FROM inventario i
+                LEFT JOIN laboratorios l ON i.laboratorio_id = l.id
+                LEFT JOIN objetos o ON o.nombre = i.nombre
+                WHERE i.id = %s
+            """
+            registro = db_manager.execute_query(query, (id,))
+        
+        if not registro:
+            return jsonify({'success': False, 'message': 'Registro no encontrado'}), 404
+        
+        registro = registro[0]
+        registro['tipo'] = tipo
+        
+        # Obtener fotos
+        if registro.get('objeto_id'):
+            query_fotos = "SELECT id, path, vista FROM objetos_imagenes WHERE objeto_id = %s"
+            fotos = db_manager.execute_query(query_fotos, (registro['objeto_id'],))
+            registro['fotos'] = fotos
+        else:
+            registro['fotos'] = []
+        
+        return jsonify({'success': True, 'registro': registro})
+        
+    except Exception as e:
+        logger_registros.error("Error obteniendo detalle: %s", e)
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@bp.route('/api/registro-editar/<tipo>/<id>', methods=['GET'])
+@require_login
+@require_level(4)
+def api_registro_editar(tipo, id):
+    """API para obtener datos de un registro para edición"""
+    try:
+        if tipo == 'equipo':
+            query = """
+                SELECT e.*, l.nombre as laboratorio_nombre, o.id as objeto_id
+                FROM equipos e
+                LEFT JOIN laboratorios l ON e.laboratorio_id = l.id
+                LEFT JOIN objetos o ON e.objeto_id = o.id
+                WHERE e.id = %s
+            """
+        else:
+            query = """
+                SELECT i.*, l.nombre as laboratorio_nombre
+                FROM inventario i
+                LEFT JOIN laboratorios l ON i.laboratorio_id = l.id
+                WHERE i.id = %s
+            """
+        
+        result = db_manager.execute_query(query, (id,))
+        
+        if not result:
+            return jsonify({'success': False, 'message': 'Registro no encontrado'}), 404
+        
+        registro = result[0]
+        
+        # Obtener fotos si existen
+        if tipo == 'equipo' and registro.get('objeto_id'):
+            query_fotos = "SELECT id, path, vista FROM objetos_imagenes WHERE objeto_id = %s"
+            fotos = db_manager.execute_query(query_fotos, (registro['objeto_id'],))
+            registro['fotos'] = fotos
+        else:
+            registro['fotos'] = []
+        
+        return jsonify({'success': True, 'registro': registro})
+        
+    except Exception as e:
+        logger_registros.error("Error obteniendo registro para editar: %s", e)
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@bp.route('/api/registro-actualizar/<tipo>/<id>', methods=['PUT'])
+@require_login
+@require_level(4)
+def api_registro_actualizar(tipo, id):
+    """API para actualizar un registro"""
+    try:
+        data = request.get_json()
+        
+        if tipo == 'equipo':
+            query = """
+                UPDATE equipos 
+                SET nombre = %s, tipo = %s, descripcion = %s,
+                    ubicacion = %s, estado = %s, laboratorio_id = %s
+                WHERE id = %s
+            """
+            params = (
+                data.get('nombre'),
+                data.get('categoria'),  # Se mapea a 'tipo' en equipos
+                data.get('descripcion'),
+                data.get('ubicacion'),
+                data.get('estado'),
+                data.get('laboratorio_id'),
+                id
+            )
+        else:
+            query = """
+                UPDATE inventario 
+                SET nombre = %s, categoria = %s, descripcion = %s,
+                    ubicacion = %s, cantidad_actual = %s, laboratorio_id = %s
+                WHERE id = %s
+            """
+            params = (
+                data.get('nombre'),
+                data.get('categoria'),
+                data.get('descripcion'),
+                data.get('ubicacion'),
+                data.get('stock_actual'),
+                data.get('laboratorio_id'),
+                id
+            )
+        
+        db_manager.execute_query(query, params)
+        notificar_cambio('equipo' if tipo == 'equipo' else 'inventario', id)
+        
+        return jsonify({'success': True, 'message': 'Registro actualizado exitosamente'})
+        
+    except Exception as e:
+        logger_registros.error("Error actualizando registro: %s", e)
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@bp.route('/api/registro-eliminar/<tipo>/<id>', methods=['DELETE'])
+@require_login
+@require_level(4)
+def api_registro_eliminar(tipo, id):
+    """API para eliminar un registro"""
+    try:
+        with db_manager.transaction() as cursor:
+            if tipo == 'equipo':
+                # Obtener objeto_id antes de eliminar
+                query_obj = "SELECT objeto_id FROM equipos WHERE id = %s"
+                result = db_manager.execute_query(query_obj, (id,))
+                objeto_id = result[0]['objeto_id'] if result and result[0].get('objeto_id') else None
+                
+                # Eliminar equipo
+                cursor.execute("DELETE FROM equipos WHERE id = %s", (id,))
+            else:
+                # Buscar objeto asociado
+                query_obj = "SELECT o.id FROM objetos o INNER JOIN inventario i ON o.nombre = i.nombre WHERE i.id = %s"
+                result = db_manager.execute_query(query_obj, (id,))
+                objeto_id = result[0]['id'] if result else None
+                
+                # Eliminar item
+                cursor.execute("DELETE FROM inventario WHERE id = %s", (id,))
+            
+            # Si tiene objeto asociado, eliminar imágenes y objeto
+            if objeto_id:
+                cursor.execute("DELETE FROM objetos_imagenes WHERE objeto_id = %s", (objeto_id,))
+                cursor.execute("DELETE FROM objetos WHERE id = %s", (objeto_id,))
+        
+        notificar_cambio('equipo' if tipo == 'equipo' else 'inventario', id,
+                         extra=etiquetas_cambio('objeto', objeto_id) if objeto_id else ())
+        
+        return jsonify({'success': True, 'message': 'Registro eliminado exitosamente'})
+        
+    except Exception as e:
+        logger_registros.error("Error eliminando registro: %s", e)
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@bp.route('/imagenes_objeto/<int:imagen_id>')
+@require_login
+def servir_imagen_objeto(imagen_id):
+    """Servir imagen de objeto por ID"""
+    from flask import send_file
+    try:
+        query = "SELECT path FROM objetos_imagenes WHERE id = %s"
+        result = db_manager.execute_query(query, (imagen_id,))
+        if result and result[0].get('path'):
+            path = result[0]['path']
+            # Asegurar que la ruta sea absoluta
+            if not os.path.isabs(path):
+                path = os.path.join(os.getcwd(), path)
+            if os.path.exists(path):
+                return send_file(path, mimetype='image/jpeg')
+        return "Imagen no encontrada", 404
+    except Exception as e:
+        logger_registros.error("Error sirviendo imagen: %s", e)
+        return "Error al cargar imagen", 500
+
+
+@bp.route('/api/reemplazar-imagen', methods=['POST'])
+@require_login
+@require_level(4)
+def api_reemplazar_imagen():
+    """API para reemplazar una imagen existente"""
+    try:
+        # Obtener datos del formulario
+        imagen_id = request.form.get('imagen_id')
+        vista = request.form.get('vista')
+        objeto_id = request.form.get('objeto_id')
+        archivo = request.files.get('imagen')
+        
+        if not all([imagen_id, vista, objeto_id, archivo]):
+            return jsonify({'success': False, 'message': 'Faltan datos requeridos'}), 400
+        
+        # Obtener la ruta actual de la imagen
+        query_old = "SELECT path FROM objetos_imagenes WHERE id = %s"
+        result = db_manager.execute_query(query_old, (imagen_id,))
+        
+        if not result:
+            return jsonify({'success': False, 'message': 'Imagen no encontrada'}), 404
+        
+        old_path = result[0]['path']
+        
+        # Crear directorio si no existe
+        objeto_dir = os.path.join('imagenes', 'objetos')
+        os.makedirs(objeto_dir, exist_ok=True)
+        
+        # Generar nombre de archivo único
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"obj_{objeto_id}_{vista}_{timestamp}.jpg"
+        new_path = os.path.join(objeto_dir, filename)
+        
+        # Guardar nueva imagen
+        archivo.save(new_path)
+        
+        # Actualizar ruta en base de datos
+        query_update = "UPDATE objetos_imagenes SET path = %s WHERE id = %s"
+        db_manager.execute_query(query_update, (new_path, imagen_id))
+        
+        # Eliminar imagen antigua si existe y es diferente
+        if old_path and os.path.exists(old_path) and old_path != new_path:
+            try:
+                os.remove(old_path)
+                logger_registros.info("Imagen antigua eliminada: %s", old_path)
+            except Exception as e:
+                logger_registros.warning("No se pudo eliminar imagen antigua: %s", e)
+        
+        logger_registros.info("Imagen reemplazada: %s -> %s", imagen_id, new_path)
+        notificar_cambio('objeto', objeto_id)
+        
+        return jsonify({
+            'success': True, 
+            'message': 'Imagen reemplazada exitosamente',
+            'new_path': new_path
+        })
+        
+    except Exception as e:
+        logger_registros.exception("Error reemplazando imagen: %s", e)
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# =============================
+# OBJETOS: Gestión individual (GET, PUT, DELETE)
+# =============================
+
+class ObjetoAPI(Resource):
+    def get(self, objeto_id: int):
+        # Permitir acceso con JWT o sesión web
+        if not contexto_auth().autenticado:
+            return {'message': 'Autenticación requerida'}, 401
+        
+        rs = db_manager.execute_query(
+            "SELECT id, nombre, categoria, descripcion, DATE_FORMAT(fecha_creacion, '%Y-%m-%d %H:%i') as fecha_creacion FROM objetos WHERE id=%s",
+            (objeto_id,)
+        )
+        if not rs:
+            return {'message': 'Objeto no encontrado'}, 404
+        return {'objeto': rs[0]}, 200
+
+    def put(self, objeto_id: int):
+        verify_jwt_in_request()
+        data = request.get_json(silent=True) or {}
+        nombre = (data.get('nombre') or '').strip()
+        categoria = (data.get('categoria') or '').strip() or None
+        descripcion = data.get('descripcion')
+        if not nombre:
+            return {'message': 'nombre requerido'}, 400
+        # Verificar duplicado con otro ID
+        rs_exist = db_manager.execute_query(
+            "SELECT id FROM objetos WHERE nombre=%s AND (categoria=%s OR (categoria IS NULL AND %s IS NULL)) AND id<>%s",
+            (nombre, categoria, categoria, objeto_id)
+        )
+        if rs_exist:
+            return {'message': 'Ya existe otro objeto con ese nombre y categoría'}, 409
+        db_manager.execute_query(
+            "UPDATE objetos SET nombre=%s, categoria=%s, descripcion=%s WHERE id=%s",
+            (nombre, categoria, descripcion, objeto_id)
+        )
+        notificar_cambio('objeto', objeto_id)
+        return {'message': 'Objeto actualizado'}, 200
+
+    def delete(self, objeto_id: int):
+        verify_jwt_in_request()
+        # Obtener imágenes para limpiar archivos
+        rs = db_manager.execute_query("SELECT path FROM objetos_imagenes WHERE objeto_id=%s", (objeto_id,))
+        for row in rs or []:
+            p = row.get('path')
+            if p and os.path.exists(p):
+                try:
+                    os.remove(p)
+                    logger_objetos.info("Archivo eliminado: %s", p)
+                except Exception as e:
+                    logger_objetos.warning("No se pudo eliminar archivo %s: %s", p, e)
+        # Borrar objeto (CASCADE borra objetos_imagenes)
+        db_manager.execute_query("DELETE FROM objetos WHERE id=%s", (objeto_id,))
+        notificar_cambio('objeto', objeto_id)
+        # Intentar eliminar carpeta base si queda vacía
+        for base in ('imagenes/objetos', 'imagenes/equipos'):
+            base_dir = os.path.join(base, str(objeto_id))
+            try:
+                os.rmdir(base_dir)
+            except Exception:
+                pass
+        return {'message': 'Objeto eliminado'}, 200
+
+api.add_resource(ObjetoAPI, '/api/objetos/<int:objeto_id>')
+
+@bp.route('/objetos/gestion')
+@require_login
+@require_level(3)
+def objetos_gestion():
+    return render_template('objetos_gestion.html', user=session)
+
+# =============================
+# OBJETOS: Listado de imágenes y thumbnails
+# =============================
+
+# Unificar ObjetoImagenAPI (POST) y ObjetoImagenesAPI (GET) en una sola clase
+# Ya está definida arriba como ObjetoImagenAPI con método post()
+# Ahora agregamos el método get() a la misma clase
+# Buscar la clase ObjetoImagenAPI arriba y agregar el método get()
+
+api.add_resource(ObjetoImagenAPI, '/api/objetos/<int:objeto_id>/imagenes')
+
+@bp.get('/api/objetos/imagen_thumb/<int:img_id>')
+def objeto_imagen_thumb(img_id: int):
+    # No requiere JWT para facilitar renderizado de miniaturas; restringe a logged-in vía sesión si se desea
+    row = db_manager.execute_query("SELECT thumbnail, content_type FROM objetos_imagenes WHERE id=%s", (img_id,))
+    if not row or row[0]['thumbnail'] is None:
+        return jsonify({'message': 'Thumbnail no disponible'}), 404
+    ct = row[0]['content_type'] or 'image/jpeg'
+    return current_app.response_class(response=row[0]['thumbnail'], status=200, mimetype=ct)
+
+@bp.get('/api/objetos/<int:objeto_id>/vistas_status')
+def objeto_vistas_status(objeto_id: int):
+    try:
+        rs = db_manager.execute_query("SELECT nombre FROM objetos WHERE id=%s", (objeto_id,))
+        if not rs:
+            return jsonify({'message': 'Objeto no encontrado'}), 404
+        nombre = rs[0]['nombre']
+    except Exception as e:
+        return jsonify({'message': f'Error consultando objeto: {e}'}), 500
+
+    import re
+    def san(s: str) -> str:
+        s = (s or '').lower().replace('..','').replace('/','').replace('\\','')
+        s = re.sub(r"[^a-z0-9_\- ]+", '', s).strip()
+        s = re.sub(r"\s+", '_', s)
+        return s
+
+    base = os.path.join('imagenes', 'objetos', san(nombre))
+    required = ['frontal','posterior','superior','inferior','lateral_derecha','lateral_izquierda']
+    completed = []
+    files = {}
+    if os.path.isdir(base):
+        for v in required:
+            vdir = os.path.join(base, v)
+            if os.path.isdir(vdir):
+                imgs = [f for f in os.listdir(vdir) if f.lower().endswith(('.jpg','.jpeg','.png'))]
+                if imgs:
+                    completed.append(v)
+                    files[v] = [os.path.join(vdir, f).replace('\\','/') for f in imgs]
+    missing = [v for v in required if v not in completed]
+    return jsonify({
+        'objeto_id': objeto_id,
+        'nombre': nombre,
+        'required': required,
+        'completed': completed,
+        'missing': missing,
+        'count': len(completed),
+        'files': files,
+    }), 200
+
+
+api.add_resource(LaboratoriosAPI, '/api/laboratorios')
+api.add_resource(LaboratorioAPI, '/api/laboratorios/<int:laboratorio_id>')
+api.add_resource(EquiposAPI, '/api/equipos')
+api.add_resource(EquipoAPI, '/api/equipos/<string:equipo_id>')
+api.add_resource(InventarioAPI, '/api/inventario')
+api.add_resource(ReservasAPI, '/api/reservas')
+api.add_resource(ReservaAPI, '/api/reservas/<string:reserva_id>')
+api.add_resource(UsuariosAPI, '/api/usuarios')
+api.add_resource(EstadisticasAPI, '/api/estadisticas')
+api.add_resource(ComandosVozAPI, '/api/voz/comando')
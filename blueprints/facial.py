@@ -0,0 +1,649 @@
+# -*- coding: utf-8 -*-
+"""
+Blueprint Facial: Login y Registro por Reconocimiento Facial
+Sistema de Laboratorios - Centro Minero SENA
+Rutas de cómputo intensivo con OpenCV; pueden servirse desde un pool de workers aparte.
+"""
+
+import base64
+import json
+import os
+import threading
+import time
+
+from flask import Blueprint, current_app, request, jsonify, session
+from flask_restful import Resource
+
+from blueprints.comun import (ApiRest, cv2, np, bus_cambios, db_manager, logger_facial, notificar_cambio,
+                              usuarios_cache, require_login, require_level, BASE_DIR, LOG_MUESTREO_BUCLES)
+from utils.enrolamiento_facial import (EnrolamientoFacial, ErrorEnrolamiento, SQL_DEPURAR_ENCODINGS,
+                                       SQL_INSERTAR_ENCODING, leer_archivo_subido)
+from utils.deteccion_rostros import DetectorRostros
+from utils.indice_embeddings import IndiceEmbeddings
+from utils.login_facial_continuo import ControlCarga, NoncesLocal, NoncesMySQL, SesionLoginContinuo, TokensLogin
+
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
+
+bp = Blueprint('facial', __name__)
+api = ApiRest(bp)
+
+# Índice de rostros en memoria: histograma normalizado de cada usuario con rostro_data.
+# Evita decodificar todos los BLOB en cada login; se precarga antes del fork de los
+# workers (wsgi.py) y se reconstruye tras un cambio de usuarios. Cada ROSTROS_TTL_S sólo
+# se compara una firma de la tabla: si no cambió, el índice heredado del maestro se sigue
+# compartiendo por copy-on-write en lugar de reconstruirse en cada worker.
+ROSTROS_TTL_S = float(os.getenv('FACIAL_INDEX_TTL', '60'))
+_indice_rostros = {'usuarios': None, 'verificado': 0.0, 'firma': None}
+_indice_rostros_lock = threading.Lock()
+
+
+def _histograma_rostro(gray):
+    gray = cv2.resize(gray, (200, 200))  # Normalizar tamaño
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
+    return cv2.normalize(hist, hist).flatten()
+
+
+def _cargar_indice_rostros():
+    query = "SELECT id, nombre, tipo, nivel_acceso, rostro_data FROM usuarios WHERE rostro_data IS NOT NULL AND activo = TRUE"
+    usuarios = []
+    for user in db_manager.execute_query(query) or []:
+        stored_img = cv2.imdecode(np.frombuffer(user.pop('rostro_data'), np.uint8), cv2.IMREAD_GRAYSCALE)
+        if stored_img is None:
+            logger_facial.debug("Usuario %s: No se pudo decodificar imagen", user['nombre'])
+            continue
+        user['histograma'] = _histograma_rostro(stored_img)
+        usuarios.append(user)
+    return usuarios
+
+
+def _firma_rostros():
+    # Usuarios activos con rostro y tamaño de cada imagen, sin traer los BLOB
+    filas = db_manager.execute_query(
+        "SELECT COUNT(*) AS total, SUM(CRC32(CONCAT(id, ':', LENGTH(rostro_data)))) AS suma "
+        "FROM usuarios WHERE rostro_data IS NOT NULL AND activo = TRUE")
+    fila = filas[0] if filas else {}
+    return [str(fila.get('total')), str(fila.get('suma'))]
+
+
+def indice_rostros():
+    """Usuarios activos con rostro registrado y su histograma precalculado"""
+    indice = _indice_rostros
+    if indice['usuarios'] is not None and time.monotonic() - indice['verificado'] < ROSTROS_TTL_S:
+        return indice['usuarios']
+    with _indice_rostros_lock:
+        if indice['usuarios'] is not None and time.monotonic() - indice['verificado'] < ROSTROS_TTL_S:
+            return indice['usuarios']
+        try:
+            firma = _firma_rostros()
+        except Exception as e:
+            logger_facial.warning("No se pudo verificar la firma del índice de rostros: %s", e)
+            firma = None
+        if indice['usuarios'] is None or firma is None or firma != indice['firma']:
+            inicio = time.perf_counter()
+            usuarios = _cargar_indice_rostros()
+            indice.update(usuarios=usuarios, firma=firma)
+            logger_facial.info("Índice de rostros cargado: %s usuarios en %.0f ms",
+                               len(usuarios), (time.perf_counter() - inicio) * 1000)
+        indice['verificado'] = time.monotonic()
+        return indice['usuarios']
+
+
+# Índice de embeddings: encodings 128-d de face_recognition (varios por usuario, tabla
+# usuarios_facial) en una matriz float32 persistida en disco. Sin face_recognition instalado
+# el login sigue por histogramas.
+EMBEDDINGS_RUTA = os.getenv('FACIAL_EMBEDDINGS_PATH') or os.path.join(BASE_DIR, 'cache', 'embeddings_rostros.npz')
+EMBEDDINGS_TOLERANCIA = float(os.getenv('FACIAL_TOLERANCE', '0.5'))
+EMBEDDINGS_TOP_K = int(os.getenv('FACIAL_TOP_K', '5'))
+EMBEDDINGS_MAX_POR_USUARIO = int(os.getenv('FACIAL_MAX_ENCODINGS', '5'))
+# Detección sobre una copia reducida del cuadro y, por cliente, alrededor del rostro del intento anterior
+detector_rostros = DetectorRostros(
+    ancho_deteccion=int(os.getenv('FACIAL_DETECTION_WIDTH', '480')),
+    seguimiento=os.getenv('FACIAL_ROI_TRACKING', '1') == '1',
+    roi_ttl_s=float(os.getenv('FACIAL_ROI_TTL_S', '10')),
+    ancho_verificacion=int(os.getenv('FACIAL_ROI_CHECK_WIDTH', '320')),
+)
+CLAVE_ROI = 'roi_facial'
+# El enrolamiento por HTTP ocupa el hilo del worker hasta terminar: pool de 1 o 2 procesos y
+# lotes pequeños; las cohortes completas van por scripts/enrolar_rostros.py
+ENROLAMIENTO_PROCESOS = min(max(int(os.getenv('FACIAL_ENROLL_PROCESSES', '2')), 1), 2)
+ENROLAMIENTO_MAX_IMAGENES = int(os.getenv('FACIAL_ENROLL_MAX_IMAGES', '100'))
+ENROLAMIENTO_CALIDAD_MINIMA = float(os.getenv('FACIAL_MIN_QUALITY', '35'))
+# Login facial continuo (WebSocket): cada conexión ocupa un hilo del worker mientras la cámara está abierta
+CONTINUO_VENTANA = int(os.getenv('FACIAL_STREAM_WINDOW', '5'))
+CONTINUO_VOTOS = int(os.getenv('FACIAL_STREAM_VOTES', '3'))
+CONTINUO_MAX_CUADROS = int(os.getenv('FACIAL_STREAM_MAX_FRAMES', '300'))
+CONTINUO_DURACION_S = float(os.getenv('FACIAL_STREAM_MAX_SECONDS', '60'))
+CONTINUO_INACTIVIDAD_S = float(os.getenv('FACIAL_STREAM_IDLE_SECONDS', '10'))
+control_continuo = ControlCarga(max_conexiones=int(os.getenv('FACIAL_STREAM_MAX_CONNECTIONS', '2')),
+                                max_simultaneos=int(os.getenv('FACIAL_STREAM_CONCURRENT', '2')))
+# Nonces de los tokens ya canjeados en MySQL para que el token sirva una sola vez entre todos los
+# workers ('local' sólo vale con un único proceso)
+tokens_login = TokensLogin(
+    vigencia_s=float(os.getenv('FACIAL_STREAM_TOKEN_TTL_S', '30')),
+    nonces=NoncesLocal() if os.getenv('FACIAL_STREAM_NONCES', 'mysql') == 'local' else NoncesMySQL(db_manager),
+)
+_indice_embeddings = {'indice': None, 'verificado': 0.0}
+_indice_embeddings_lock = threading.Lock()
+_motor_facial = {'gestor': None, 'disponible': None}
+
+
+def motor_embeddings():
+    """FacialRecognitionManager si face_recognition está instalado; None en otro caso"""
+    if _motor_facial['disponible'] is None:
+        with _indice_embeddings_lock:
+            if _motor_facial['disponible'] is None:
+                try:
+                    from modules.facial_recognition_module import FacialRecognitionManager
+                    _motor_facial['gestor'] = FacialRecognitionManager()
+                    _motor_facial['disponible'] = True
+                except ImportError as e:
+                    logger_facial.info("face_recognition no disponible (%s): login facial por histogramas", e)
+                    _motor_facial['disponible'] = False
+    return _motor_facial['gestor']
+
+
+def _firma_embeddings():
+    filas = db_manager.execute_query(
+        "SELECT COUNT(*) AS total, MAX(id) AS ultimo, MAX(fecha_actualizacion) AS actualizado "
+        "FROM usuarios_facial WHERE activo = TRUE")
+    fila = filas[0] if filas else {}
+    return [str(fila.get('total')), str(fila.get('ultimo')), str(fila.get('actualizado'))]
+
+
+def _construir_indice_embeddings(firma):
+    filas = db_manager.execute_query(
+        "SELECT usuario_id, encoding_facial FROM usuarios_facial WHERE activo = TRUE ORDER BY usuario_id, id") or []
+    indice = IndiceEmbeddings.desde_filas(((f['usuario_id'], f['encoding_facial']) for f in filas), firma)
+    try:
+        indice.guardar(EMBEDDINGS_RUTA)
+    except OSError as e:
+        logger_facial.warning("No se pudo guardar el índice de embeddings en %s: %s", EMBEDDINGS_RUTA, e)
+    return indice
+
+
+def indice_embeddings():
+    """
+    Índice de encodings vigente
+
+    Cada ROSTROS_TTL_S (o tras un cambio de usuarios) se compara la firma de usuarios_facial
+    con la del índice: si coincide no se hace nada; si otro worker ya reconstruyó el archivo
+    con esa firma se carga del disco; sólo en otro caso se relee la tabla.
+    """
+    estado = _indice_embeddings
+    if estado['indice'] is not None and time.monotonic() - estado['verificado'] < ROSTROS_TTL_S:
+        return estado['indice']
+    with _indice_embeddings_lock:
+        if estado['indice'] is not None and time.monotonic() - estado['verificado'] < ROSTROS_TTL_S:
+            return estado['indice']
+        inicio = time.perf_counter()
+        try:
+            firma = _firma_embeddings()
+        except Exception as e:
+            # Sin tabla usuarios_facial (migrations/facial_tables_admin.sql): índice vacío hasta el próximo TTL
+            logger_facial.warning("Índice de embeddings no disponible: %s", e)
+            estado.update(indice=IndiceEmbeddings(), verificado=time.monotonic())
+            return estado['indice']
+        indice, origen = estado['indice'], 'memoria'
+        if indice is None or indice.firma != firma:
+            try:
+                indice, origen = IndiceEmbeddings.cargar(EMBEDDINGS_RUTA), 'disco'
+            except Exception as e:
+                logger_facial.warning("Índice de embeddings en disco ilegible: %s", e)
+                indice = None
+            if indice is None or indice.firma != firma:
+                indice, origen = _construir_indice_embeddings(firma), 'base de datos'
+        estado.update(indice=indice, verificado=time.monotonic())
+        logger_facial.info("Índice de embeddings (%s): %s encodings de %s usuarios en %.1f ms", origen,
+                           len(indice), len(indice.usuarios), (time.perf_counter() - inicio) * 1000)
+        return indice
+
+
+def _reducir(img, ancho_max=640):
+    alto, ancho = img.shape[:2]
+    if ancho <= ancho_max:
+        return img
+    escala = ancho_max / ancho
+    return cv2.resize(img, (ancho_max, int(alto * escala)))
+
+
+def _identificar_por_embedding(gestor, indice, img):
+    """
+    Buscar el rostro de la imagen en el índice de embeddings
+
+    Returns:
+        tuple: (usuario, distancia) si hay coincidencia dentro de la tolerancia,
+            (None, mensaje) si la imagen no sirve, (None, None) si no hay coincidencia
+    """
+    # Reducir una sola vez: detección y encoding trabajan sobre las mismas coordenadas
+    rgb = cv2.cvtColor(_reducir(img), cv2.COLOR_BGR2RGB)
+    rostros = gestor.detect_faces(rgb)
+    if not rostros:
+        return None, 'No se detectó ningún rostro en la imagen'
+    if len(rostros) > 1:
+        return None, 'Se detectaron múltiples rostros. Solo debe aparecer tu rostro'
+    encoding = gestor.generate_face_encoding(rgb, rostros[0]['location'])
+    if encoding is None:
+        return None, None
+    candidatos = indice.buscar(encoding, k=EMBEDDINGS_TOP_K)
+    logger_facial.debug("Lista corta por embedding: %s", candidatos)
+    for usuario_id, distancia in candidatos:
+        if distancia > EMBEDDINGS_TOLERANCIA:
+            break
+        usuario = usuarios_cache.obtener(usuario_id)
+        if usuario and usuario.get('activo'):
+            return usuario, distancia
+    return None, None
+
+
+def _guardar_embedding(gestor, user_id, img, caja):
+    """Añadir el encoding del rostro registrado y dejar activos sólo los últimos EMBEDDINGS_MAX_POR_USUARIO"""
+    x, y, w, h = (int(v) for v in caja)
+    encoding = gestor.generate_face_encoding(cv2.cvtColor(img, cv2.COLOR_BGR2RGB), (y, x + w, y + h, x))
+    if encoding is None:
+        return False
+    db_manager.execute_query(SQL_INSERTAR_ENCODING,
+                             (user_id, json.dumps([float(v) for v in encoding]), 0.0, 'Registro facial'))
+    db_manager.execute_query(SQL_DEPURAR_ENCODINGS, (user_id, user_id, EMBEDDINGS_MAX_POR_USUARIO))
+    return True
+
+
+@bus_cambios.suscribir('usuarios')
+def invalidar_indice_rostros(*_evento):
+    """Forzar la recarga del índice en el próximo login facial (suscrito a cambios de usuarios)"""
+    with _indice_rostros_lock:
+        _indice_rostros['usuarios'] = None
+    # El de embeddings sólo revisa su firma: si nada cambió en usuarios_facial no se reconstruye
+    _indice_embeddings['verificado'] = 0.0
+
+
+def _login_facial_exitoso(usuario, detalle, confianza):
+    session['user_id'] = usuario['id']
+    session['user_name'] = usuario['nombre']
+    session['user_type'] = usuario['tipo']
+    session['user_level'] = usuario['nivel_acceso']
+    
+    log_query = """
+        INSERT INTO logs_seguridad (usuario_id, accion, detalle, ip_origen, exitoso)
+        VALUES (%s, 'login_facial', %s, %s, TRUE)
+    """
+    try:
+        db_manager.execute_query(log_query, (usuario['id'], f'Login facial exitoso ({detalle})', request.remote_addr))
+    except Exception:
+        pass
+    
+    return jsonify({
+        'success': True, 
+        'message': f'Bienvenido {usuario["nombre"]}',
+        'confidence': f'{confianza:.1f}%'
+    })
+
+
+def identificar_cuadro(img, roi=None):
+    """
+    Identificar al usuario de un cuadro (lo usan /login_facial y el login facial continuo)
+
+    Args:
+        img: Cuadro BGR decodificado
+        roi: Estado de ROI del intento anterior del mismo cliente (o None)
+
+    Returns:
+        tuple: (resultado, nuevo estado de ROI). resultado es {'usuario', 'detalle',
+            'confianza'} si hubo coincidencia o {'mensaje', 'no_reconocido'} si no
+    """
+    # Con face_recognition: una búsqueda vectorizada en el índice de embeddings
+    con_embedding = frozenset()
+    gestor = motor_embeddings()
+    if gestor is not None:
+        indice = indice_embeddings()
+        if len(indice):
+            con_embedding = indice.usuarios
+            usuario, resultado = _identificar_por_embedding(gestor, indice, img)
+            if usuario is not None:
+                return {'usuario': usuario, 'detalle': f'distancia embedding: {resultado:.3f}',
+                        'confianza': (1.0 - resultado) * 100}, roi
+            if resultado is not None:
+                return {'mensaje': resultado, 'no_reconocido': False}, roi
+    
+    # Detectar rostro usando Haar Cascade (copia reducida; primero junto al rostro del intento anterior)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    faces, modo, roi = detector_rostros.detectar(gray, roi)
+    logger_facial.debug("Detección %s: %s rostros", modo, len(faces))
+    
+    if len(faces) == 0:
+        return {'mensaje': 'No se detectó ningún rostro en la imagen', 'no_reconocido': False}, roi
+    
+    if len(faces) > 1:
+        return {'mensaje': 'Se detectaron múltiples rostros. Solo debe aparecer tu rostro', 'no_reconocido': False}, roi
+    
+    # Extraer región del rostro
+    (x, y, w, h) = faces[0]
+    face_roi = gray[y:y+h, x:x+w]
+    
+    # Calcular histograma del rostro capturado (mismo preprocesado que el índice)
+    hist_captured = _histograma_rostro(face_roi)
+    
+    # Usuarios con rostro registrado (histogramas precalculados en el índice); quienes ya
+    # tienen embeddings sólo se aceptan por esa vía
+    users = [u for u in indice_rostros() if str(u['id']) not in con_embedding]
+    
+    if not users and not con_embedding:
+        return {'mensaje': 'No hay usuarios con reconocimiento facial registrado', 'no_reconocido': False}, roi
+    
+    # Comparar con cada usuario registrado
+    best_match = None
+    best_similarity = 0
+    threshold = 0.45  # Umbral de similitud (0-1, mayor = más similar) - Reducido para ser más permisivo
+    
+    logger_facial.debug("Comparando con %s usuarios registrados...", len(users))
+    
+    for user in users:
+        try:
+            hist_stored = user['histograma']
+            
+            # Usar múltiples métodos de comparación para mayor precisión
+            correl = cv2.compareHist(hist_captured, hist_stored, cv2.HISTCMP_CORREL)
+            chisqr = cv2.compareHist(hist_captured, hist_stored, cv2.HISTCMP_CHISQR)
+            intersect = cv2.compareHist(hist_captured, hist_stored, cv2.HISTCMP_INTERSECT)
+            
+            # Normalizar chi-square (menor es mejor, invertir)
+            chisqr_norm = 1.0 / (1.0 + chisqr / 1000.0)
+            
+            # Normalizar intersección (0-1)
+            intersect_norm = intersect / 200.0  # Normalizar por tamaño de imagen
+            
+            # Combinar métodos (promedio ponderado)
+            similarity = (correl * 0.5) + (chisqr_norm * 0.2) + (intersect_norm * 0.3)
+            
+            logger_facial.debug(
+                "Usuario %s: correlación=%.4f chi2=%.2f (norm %.4f) intersección=%.2f (norm %.4f) similitud=%.4f umbral=%s",
+                user['nombre'], correl, chisqr, chisqr_norm, intersect, intersect_norm, similarity, threshold,
+                extra={'muestra': LOG_MUESTREO_BUCLES},
+            )
+            
+            # Si la similitud supera el umbral y es la mejor hasta ahora
+            if similarity > threshold and similarity > best_similarity:
+                best_similarity = similarity
+                best_match = user
+                logger_facial.debug("✓ NUEVO MEJOR MATCH!")
+                
+        except Exception as e:
+            logger_facial.exception("Error comparando con usuario %s: %s", user.get('nombre', 'unknown'), e)
+            continue
+    
+    logger_facial.debug("Mejor coincidencia: %s", best_match['nombre'] if best_match else 'Ninguna')
+    logger_facial.debug("Similitud final: %.4f", best_similarity)
+    
+    # Si se encontró una coincidencia
+    if best_match:
+        # Nombre, tipo y nivel vigentes: el índice sólo se reconstruye cuando cambian los rostros
+        usuario = usuarios_cache.obtener(best_match['id'])
+        if usuario and usuario.get('activo'):
+            confidence = best_similarity * 100  # Convertir a porcentaje
+            return {'usuario': usuario, 'detalle': f'similitud: {confidence:.1f}%', 'confianza': confidence}, roi
+    
+    return {'mensaje': 'Rostro no reconocido. Acceso denegado.', 'no_reconocido': True}, roi
+
+
+def _registrar_login_fallido():
+    log_query = """
+        INSERT INTO logs_seguridad (usuario_id, accion, detalle, ip_origen, exitoso)
+        VALUES (NULL, 'login_facial_fallido', 'Rostro no reconocido', %s, FALSE)
+    """
+    try:
+        db_manager.execute_query(log_query, (request.remote_addr,))
+    except Exception:
+        pass
+
+
+@bp.route('/login_facial', methods=['POST'])
+def login_facial():
+    """Login facial: embeddings de face_recognition si está instalado; histogramas OpenCV para el resto"""
+    try:
+        data = request.get_json()
+        image_base64 = data.get('image')
+        
+        if not image_base64:
+            return jsonify({'success': False, 'message': 'No se recibió imagen'})
+        
+        # Remover prefijo data:image si existe
+        if ',' in image_base64:
+            image_base64 = image_base64.split(',')[1]
+        
+        # Decodificar imagen
+        image_data = base64.b64decode(image_base64)
+        nparr = np.frombuffer(image_data, np.uint8)
+        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        
+        if img is None:
+            return jsonify({'success': False, 'message': 'No se pudo procesar la imagen'})
+        
+        resultado, roi = identificar_cuadro(img, session.get(CLAVE_ROI))
+        if roi is not None:
+            session[CLAVE_ROI] = roi
+        elif CLAVE_ROI in session:
+            session.pop(CLAVE_ROI)
+        
+        if 'usuario' in resultado:
+            return _login_facial_exitoso(resultado['usuario'], resultado['detalle'], resultado['confianza'])
+        
+        # No se encontró coincidencia
+        if resultado['no_reconocido']:
+            _registrar_login_fallido()
+        return jsonify({'success': False, 'message': resultado['mensaje']})
+        
+    except Exception as e:
+        logger_facial.exception("Error en login facial: %s", e)
+        return jsonify({'success': False, 'message': f'Error en el sistema: {str(e)}'})
+
+def atender_login_continuo(ws):
+    """
+    Login facial continuo: recibe cuadros JPEG binarios y responde un JSON por cuadro
+
+    Si llegaron varios cuadros mientras se analizaba el anterior sólo se analiza el más
+    reciente. Al reconocer al usuario se envía un token de un solo uso que el navegador
+    canjea en /login_facial/confirmar.
+    """
+    if not control_continuo.abrir():
+        ws.send(json.dumps({'estado': 'ocupado', 'mensaje': 'Servidor ocupado, use la captura manual'}))
+        return
+    sesion = SesionLoginContinuo(identificar_cuadro, control_continuo, CONTINUO_VENTANA, CONTINUO_VOTOS,
+                                 CONTINUO_MAX_CUADROS, CONTINUO_DURACION_S)
+    try:
+        while True:
+            cuadro = ws.receive(timeout=CONTINUO_INACTIVIDAD_S)
+            if cuadro is None or sesion.terminada:
+                ws.send(json.dumps(sesion.respuesta('fin', mensaje='Tiempo de reconocimiento agotado')))
+                break
+            # Cuadros que llegaron mientras se analizaba el anterior: sólo vale el más reciente
+            descartados = 0
+            siguiente = ws.receive(timeout=0)
+            while siguiente is not None:
+                cuadro, descartados = siguiente, descartados + 1
+                siguiente = ws.receive(timeout=0)
+            if descartados:
+                sesion.descartar(descartados)
+            if not isinstance(cuadro, bytes):
+                continue
+
+            respuesta = sesion.procesar(cuadro)
+            if respuesta['estado'] == 'reconocido':
+                usuario, detalle, confianza = (respuesta.pop(k) for k in ('usuario', 'detalle', 'confianza'))
+                respuesta.update(nombre=usuario['nombre'], confianza=f'{confianza:.1f}%',
+                                 token=tokens_login.emitir(current_app.secret_key, usuario['id'], detalle, confianza))
+            ws.send(json.dumps(respuesta))
+            if respuesta['estado'] == 'reconocido':
+                break
+    finally:
+        control_continuo.cerrar()
+        logger_facial.debug("Login continuo: %s cuadros recibidos, %s analizados, %s omitidos",
+                            sesion.recibidos, sesion.procesados, sesion.omitidos)
+        if sesion.reconocido is None and sesion.no_reconocidos:
+            _registrar_login_fallido()
+
+
+if Sock is not None:
+    Sock().route('/ws/login_facial', bp=bp)(atender_login_continuo)
+    LOGIN_CONTINUO_DISPONIBLE = True
+else:
+    LOGIN_CONTINUO_DISPONIBLE = False
+    logger_facial.info("flask-sock no instalado: login facial continuo deshabilitado (se usa /login_facial)")
+
+
+@bp.route('/login_facial/confirmar', methods=['POST'])
+def confirmar_login_facial():
+    """Canjear el token del login facial continuo por la sesión web"""
+    token = (request.get_json(silent=True) or {}).get('token')
+    datos = tokens_login.canjear(current_app.secret_key, token) if token else None
+    if datos is None:
+        return jsonify({'success': False, 'message': 'Token de acceso facial inválido o vencido'}), 401
+    usuario = usuarios_cache.obtener(datos['u'])
+    if not usuario or not usuario.get('activo'):
+        return jsonify({'success': False, 'message': 'Usuario no disponible'}), 403
+    return _login_facial_exitoso(usuario, f"{datos['d']}, continuo", datos['c'])
+
+
+# Implementación de API de registro facial
+class FacialRegistrationAPI(Resource):
+    """API para registrar rostro de usuario"""
+    
+    def post(self):
+        """Registrar rostro de usuario"""
+        try:
+            data = request.get_json()
+            user_id = data.get('user_id')
+            image_base64 = data.get('image')
+            
+            if not user_id or not image_base64:
+                return {'success': False, 'message': 'Faltan datos requeridos (user_id, image)'}, 400
+            
+            # Remover prefijo data:image si existe
+            if ',' in image_base64:
+                image_base64 = image_base64.split(',')[1]
+            
+            # Decodificar imagen
+            image_data = base64.b64decode(image_base64)
+            nparr = np.frombuffer(image_data, np.uint8)
+            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            
+            if img is None:
+                return {'success': False, 'message': 'No se pudo procesar la imagen'}, 400
+            
+            # Detectar rostro
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            faces, _, _ = detector_rostros.detectar(gray)
+            
+            if len(faces) == 0:
+                return {'success': False, 'message': 'No se detectó ningún rostro en la imagen'}, 400
+            
+            if len(faces) > 1:
+                return {'success': False, 'message': 'Se detectaron múltiples rostros. Solo debe aparecer un rostro'}, 400
+            
+            # Extraer rostro y guardar
+            (x, y, w, h) = faces[0]
+            face_roi = img[y:y+h, x:x+w]
+            
+            # Redimensionar para almacenamiento
+            face_roi = cv2.resize(face_roi, (200, 200))
+            
+            # Convertir a JPEG para almacenar
+            _, buffer = cv2.imencode('.jpg', face_roi)
+            face_blob = buffer.tobytes()
+            
+            # Actualizar usuario en la base de datos
+            update_query = """
+                UPDATE usuarios 
+                SET rostro_data = %s
+                WHERE id = %s
+            """
+            
+            try:
+                db_manager.execute_query(update_query, (face_blob, user_id))
+                embedding = False
+                gestor = motor_embeddings()
+                if gestor is not None:
+                    try:
+                        embedding = _guardar_embedding(gestor, user_id, img, faces[0])
+                    except Exception as e:
+                        # El rostro ya quedó guardado: el login seguirá por histograma para este usuario
+                        logger_facial.warning("No se pudo guardar el embedding de %s: %s", user_id, e)
+                notificar_cambio('usuario', user_id)
+                
+                # Log de auditoría
+                log_query = """
+                    INSERT INTO logs_seguridad (usuario_id, accion, detalle, ip_origen, exitoso)
+                    VALUES (%s, 'registro_facial', 'Rostro registrado exitosamente', %s, TRUE)
+                """
+                try:
+                    db_manager.execute_query(log_query, (user_id, request.remote_addr))
+                except:
+                    pass
+                
+                return {
+                    'success': True,
+                    'message': 'Rostro registrado exitosamente',
+                    'user_id': user_id,
+                    'embedding': embedding
+                }, 200
+                
+            except Exception as e:
+                logger_facial.error("Error guardando rostro en BD: %s", e)
+                return {'success': False, 'message': f'Error guardando en base de datos: {str(e)}'}, 500
+                
+        except Exception as e:
+            logger_facial.exception("Error en registro facial: %s", e)
+            return {'success': False, 'message': f'Error desconocido: {str(e)}'}, 500
+
+
+@bp.route('/api/facial/enrolamiento', methods=['POST'])
+@require_login
+@require_level(4)
+def enrolamiento_masivo():
+    """
+    Enrolamiento facial desde un ZIP/TAR (campo 'archivo') con fotos nombradas por id de usuario
+
+    Sólo para lotes pequeños (FACIAL_ENROLL_MAX_IMAGES): corre dentro de la petición con un
+    pool de FACIAL_ENROLL_PROCESSES (1 o 2) procesos. Una ficha completa se enrola con
+    scripts/enrolar_rostros.py, que usa todos los núcleos.
+    """
+    archivo = request.files.get('archivo')
+    if not archivo or not archivo.filename:
+        return jsonify({'success': False, 'message': 'Debe adjuntar un archivo ZIP o TAR en el campo "archivo"'}), 400
+
+    try:
+        calidad_minima = float(request.form.get('calidad_minima', ENROLAMIENTO_CALIDAD_MINIMA))
+        enrolamiento = EnrolamientoFacial(db_manager, procesos=ENROLAMIENTO_PROCESOS, calidad_minima=calidad_minima,
+                                          max_encodings_usuario=EMBEDDINGS_MAX_POR_USUARIO,
+                                          max_imagenes=ENROLAMIENTO_MAX_IMAGENES)
+        resultado = enrolamiento.enrolar(leer_archivo_subido(archivo), archivo.filename)
+    except (ErrorEnrolamiento, ValueError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        logger_facial.exception("Error en enrolamiento masivo: %s", e)
+        return jsonify({'success': False, 'message': f'Error en el enrolamiento: {str(e)}'}), 500
+    if resultado['usuarios_registrados']:
+        notificar_cambio('usuario')
+
+    # Log de auditoría
+    try:
+        log_query = """
+            INSERT INTO logs_seguridad (usuario_id, accion, detalle, ip_origen, exitoso)
+            VALUES (%s, 'enrolamiento_facial', %s, %s, TRUE)
+        """
+        detalle = (f"Enrolamiento masivo ({archivo.filename}): {resultado['usuarios_registrados']} usuarios, "
+                   f"{resultado['rechazadas']} imágenes rechazadas")
+        db_manager.execute_query(log_query, (session.get('user_id'), detalle, request.remote_addr))
+    except Exception:
+        pass
+
+    resultado['success'] = resultado['usuarios_registrados'] > 0 or resultado['total_imagenes'] == 0
+    return jsonify(resultado), 200
+
+
+FACIAL_API_AVAILABLE = True
+logger_facial.info("Modulo de reconocimiento facial cargado (OpenCV; embeddings si face_recognition está instalado)")
+
+
+api.add_resource(FacialRegistrationAPI, '/api/facial/register')
@@ -0,0 +1,528 @@
+# -*- coding: utf-8 -*-
+"""
+Blueprint Núcleo: Autenticación y Dashboard
+Sistema de Laboratorios - Centro Minero SENA
+Inicio de sesión, registro, recuperación de contraseña, accesibilidad y dashboard.
+Se registra siempre: las demás áreas redirigen aquí (login/dashboard).
+"""
+
+from datetime import datetime, timedelta
+
+from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for, flash
+from flask_restful import Resource, reqparse
+from flask_jwt_extended import create_access_token
+
+from blueprints.comun import (ApiRest, cache_sistema, cola_correo, db_manager, logger_auth, notificar_cambio,
+                              require_login, usuarios_cache)
+from utils.correo_saliente import LimiteCorreoExcedido
+
+bp = Blueprint('nucleo', __name__)
+api = ApiRest(bp)
+
+# =====================================================================
+# RUTAS WEB - INTERFAZ DE USUARIO
+# =====================================================================
+
+@bp.route('/')
+def index():
+    if 'user_id' in session:
+        return redirect(url_for('nucleo.dashboard'))
+    return render_template('login.html')
+
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        user_id = request.form.get('user_id', '').strip()
+        password = request.form.get('password', '').strip()
+        
+        # Validar que se ingresaron ambos campos
+        if not user_id or not password:
+            flash('Por favor ingresa usuario y contraseña', 'error')
+            return render_template('login.html')
+        
+        # Buscar usuario con contraseña
+        query = "SELECT id, nombre, tipo, nivel_acceso, activo, password_hash FROM usuarios WHERE id = %s AND activo = TRUE"
+        users = db_manager.execute_query(query, (user_id,))
+        
+        if users:
+            user = users[0]
+            stored_password = user.get('password_hash', '')
+            
+            # Validar contraseña (comparación directa por ahora, en producción usar hashing)
+            if stored_password and stored_password == password:
+                # Login exitoso
+                session['user_id'] = user['id']
+                session['user_name'] = user['nombre']
+                session['user_type'] = user['tipo']
+                session['user_level'] = user['nivel_acceso']
+                
+                log_query = (
+                    """
+                    INSERT INTO logs_seguridad (usuario_id, accion, detalle, ip_origen, exitoso)
+                    VALUES (%s, 'login_web', 'Login exitoso desde interfaz web', %s, TRUE)
+                    """
+                )
+                try:
+                    db_manager.execute_query(log_query, (user['id'], request.remote_addr))
+                except Exception:
+                    pass
+                
+                flash(f"Bienvenido {user['nombre']}", 'success')
+                return redirect(url_for('nucleo.dashboard'))
+            else:
+                # Contraseña incorrecta
+                flash('Usuario o contraseña incorrectos', 'error')
+                log_query = (
+                    """
+                    INSERT INTO logs_seguridad (usuario_id, accion, detalle, ip_origen, exitoso)
+                    VALUES (%s, 'login_web_fallido', 'Contraseña incorrecta', %s, FALSE)
+                    """
+                )
+                try:
+                    db_manager.execute_query(log_query, (user_id, request.remote_addr))
+                except Exception:
+                    pass
+        else:
+            # Usuario no encontrado
+            flash('Usuario o contraseña incorrectos', 'error')
+    
+    return render_template('login.html')
+
+
+@bp.route('/registro', methods=['GET', 'POST'])
+def registro():
+    """Página de registro de nuevos usuarios"""
+    if request.method == 'POST':
+        user_id = request.form.get('user_id', '').strip()
+        nombre = request.form.get('nombre', '').strip()
+        email = request.form.get('email', '').strip()
+        password = request.form.get('password', '')
+        confirm_password = request.form.get('confirm_password', '')
+        user_level = request.form.get('user_level', '')
+        
+        # Validaciones
+        if not all([user_id, nombre, email, password, user_level]):
+            flash('Todos los campos son requeridos', 'error')
+            return render_template('registro.html')
+        
+        if password != confirm_password:
+            flash('Las contraseñas no coinciden', 'error')
+            return render_template('registro.html')
+        
+        if len(password) < 6:
+            flash('La contraseña debe tener al menos 6 caracteres', 'error')
+            return render_template('registro.html')
+        
+        # Verificar si el usuario ya existe
+        check_query = "SELECT id FROM usuarios WHERE id = %s OR email = %s"
+        existing = db_manager.execute_query(check_query, (user_id, email))
+        if existing:
+            flash('El ID de usuario o correo ya están registrados', 'error')
+            return render_template('registro.html')
+        
+        # Determinar tipo según nivel
+        tipo_map = {'1': 'aprendiz', '2': 'instructor', '3': 'administrador'}
+        tipo = tipo_map.get(user_level, 'aprendiz')
+        
+        # Insertar nuevo usuario con contraseña
+        insert_query = """
+            INSERT INTO usuarios (id, nombre, email, password_hash, tipo, nivel_acceso, activo)
+            VALUES (%s, %s, %s, %s, %s, %s, TRUE)
+        """
+        try:
+            db_manager.execute_query(insert_query, (user_id, nombre, email, password, tipo, int(user_level)))
+            notificar_cambio('usuario', user_id)
+            flash(f'Cuenta creada exitosamente. Bienvenido {nombre}!', 'success')
+            
+            # Auto-login
+            session['user_id'] = user_id
+            session['user_name'] = nombre
+            session['user_type'] = tipo
+            session['user_level'] = int(user_level)
+            
+            return redirect(url_for('nucleo.dashboard'))
+        except Exception as e:
+            flash(f'Error al crear la cuenta: {str(e)}', 'error')
+            return render_template('registro.html')
+    
+    return render_template('registro.html')
+
+@bp.route('/logout')
+def logout():
+    if 'user_id' in session:
+        log_query = (
+            """
+            INSERT INTO logs_seguridad (usuario_id, accion, detalle, ip_origen, exitoso)
+            VALUES (%s, 'logout_web', 'Logout desde interfaz web', %s, TRUE)
+            """
+        )
+        try:
+            db_manager.execute_query(log_query, (session['user_id'], request.remote_addr))
+        except Exception:
+            pass
+    session.clear()
+    flash('Sesión cerrada exitosamente', 'info')
+    return redirect(url_for('nucleo.login'))
+
+
+@bp.route('/api/accesibilidad/toggle', methods=['POST'])
+def accesibilidad_toggle():
+    """API para activar/desactivar opciones de accesibilidad"""
+    data = request.get_json()
+    opcion = data.get('opcion')
+    valor = data.get('valor')
+    
+    if 'accesibilidad' not in session:
+        session['accesibilidad'] = {}
+    
+    session['accesibilidad'][opcion] = valor
+    session.modified = True
+    
+    return jsonify({'success': True, 'opcion': opcion, 'valor': valor})
+
+
+@bp.route('/recuperar-contrasena', methods=['GET', 'POST'])
+def recuperar_contrasena():
+    """Módulo de recuperación de contraseña - Enviar código por correo"""
+    if request.method == 'POST':
+        email = request.form.get('email', '').strip()
+        
+        if not email:
+            flash('Por favor ingresa tu correo electrónico', 'error')
+            return render_template('recuperar_contrasena.html')
+        
+        # Verificar que el usuario existe
+        query = "SELECT id, nombre, email FROM usuarios WHERE email = %s AND activo = TRUE"
+        users = db_manager.execute_query(query, (email,))
+        
+        if users:
+            user = users[0]
+            
+            # Generar código de 6 dígitos
+            import random
+            codigo = ''.join([str(random.randint(0, 9)) for _ in range(6)])
+            expiry = datetime.now() + timedelta(minutes=15)  # Código válido por 15 minutos
+            
+            # Debug: Mostrar código generado
+            logger_auth.debug("Código generado para %s: '%s' (len: %s)", user['id'], codigo, len(codigo))
+            logger_auth.debug("Expira en: %s", expiry)
+            
+            # Guardar código en sesión
+            user_id = user["id"]
+            codigo_anterior = session.get(f'reset_code_{user_id}')
+            session[f'reset_code_{user_id}'] = {
+                'code': codigo,
+                'expiry': expiry.isoformat(),
+                'email': email
+            }
+            
+            logger_auth.debug("Código guardado en sesión: %s", session.get(f'reset_code_{user_id}'))
+            
+            # Encolar el correo con el código (el envío SMTP ocurre en segundo plano)
+            try:
+                enviar_codigo_recuperacion(user['email'], user['nombre'], codigo)
+                flash('Se ha enviado un código de verificación a tu correo electrónico. Revisa tu bandeja de entrada.', 'success')
+                # Redirigir a la página de verificación de código
+                return redirect(url_for('nucleo.verificar_codigo', user_id=user['id']))
+            except LimiteCorreoExcedido as e:
+                # El correo no sale: conservar el último código enviado
+                if codigo_anterior:
+                    session[f'reset_code_{user_id}'] = codigo_anterior
+                else:
+                    session.pop(f'reset_code_{user_id}', None)
+                flash(str(e), 'warning')
+            except Exception as e:
+                logger_auth.exception("Error encolando correo: %s", e)
+                flash(f'No se pudo enviar el correo. Error: {str(e)}', 'error')
+        else:
+            # Por seguridad, no revelar si el email existe o no
+            flash('Si el correo está registrado, recibirás un código de verificación en tu bandeja de entrada.', 'info')
+    
+    return render_template('recuperar_contrasena.html')
+
+
+def enviar_codigo_recuperacion(email, nombre, codigo):
+    """Encolar el código de verificación de 6 dígitos (el hilo de cola_correo lo envía)"""
+    logger_auth.debug("Encolando código de recuperación para: %s", email)
+
+    # Contenido HTML del correo con código
+    html = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <style>
+            body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+            .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+            .header {{ background: linear-gradient(135deg, #1e5128 0%, #2d6a4f 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
+            .content {{ background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }}
+            .code-box {{ background: #fff; border: 3px dashed #2d6a4f; padding: 20px; text-align: center; margin: 20px 0; border-radius: 10px; }}
+            .code {{ font-size: 36px; font-weight: bold; color: #1e5128; letter-spacing: 8px; font-family: 'Courier New', monospace; }}
+            .footer {{ text-align: center; margin-top: 20px; color: #666; font-size: 12px; }}
+            .warning {{ background: #fff3cd; border-left: 4px solid #ffc107; padding: 15px; margin: 20px 0; border-radius: 5px; }}
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <div class="header">
+                <h1>🔐 Código de Verificación</h1>
+            </div>
+            <div class="content">
+                <p>Hola <strong>{nombre}</strong>,</p>
+                <p>Recibimos una solicitud para restablecer la contraseña de tu cuenta en el Sistema de Gestión de Laboratorios del Centro Minero SENA.</p>
+                
+                <div class="code-box">
+                    <p style="margin: 0; font-size: 14px; color: #666;">Tu código de verificación es:</p>
+                    <div class="code">{codigo}</div>
+                </div>
+                
+                <div class="warning">
+                    <strong>⏰ Este código expirará en 15 minutos.</strong>
+                </div>
+                
+                <p>Ingresa este código en la página de recuperación de contraseña para continuar.</p>
+                <p>Si no solicitaste este cambio, puedes ignorar este correo de forma segura.</p>
+                
+                <hr style="border: none; border-top: 1px solid #ddd; margin: 20px 0;">
+                
+                <p style="font-size: 12px; color: #666;">
+                    <strong>Consejos de seguridad:</strong><br>
+                    • No compartas este código con nadie<br>
+                    • El personal de SENA nunca te pedirá este código<br>
+                    • Si no reconoces esta solicitud, cambia tu contraseña inmediatamente
+                </p>
+            </div>
+            <div class="footer">
+                <p>© 2025 Centro Minero SENA - Sistema de Gestión de Laboratorios</p>
+                <p>Este es un correo automático, por favor no respondas a este mensaje.</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+    
+    cola_correo.encolar(email, 'Código de Recuperación - Centro Minero SENA', html)
+
+
+def enviar_correo_recuperacion(email, nombre, reset_link):
+    """Encolar el correo con el enlace de recuperación de contraseña"""
+    logger_auth.debug("Encolando enlace de recuperación para: %s", email)
+
+    # Contenido HTML del correo
+    html = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <style>
+            body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+            .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+            .header {{ background: linear-gradient(135deg, #1e5128 0%, #2d6a4f 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
+            .content {{ background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }}
+            .button {{ display: inline-block; padding: 15px 30px; background: #2d6a4f; color: white; text-decoration: none; border-radius: 5px; margin: 20px 0; }}
+            .footer {{ text-align: center; margin-top: 20px; color: #666; font-size: 12px; }}
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <div class="header">
+                <h1>🔐 Recuperación de Contraseña</h1>
+            </div>
+            <div class="content">
+                <p>Hola <strong>{nombre}</strong>,</p>
+                <p>Recibimos una solicitud para restablecer la contraseña de tu cuenta en el Sistema de Gestión de Laboratorios del Centro Minero SENA.</p>
+                <p>Haz clic en el siguiente botón para crear una nueva contraseña:</p>
+                <p style="text-align: center;">
+                    <a href="{reset_link}" class="button">Restablecer Contraseña</a>
+                </p>
+                <p><strong>Este enlace expirará en 1 hora.</strong></p>
+                <p>Si no solicitaste este cambio, puedes ignorar este correo de forma segura.</p>
+                <hr>
+                <p style="font-size: 12px; color: #666;">
+                    Si el botón no funciona, copia y pega este enlace en tu navegador:<br>
+                    <a href="{reset_link}">{reset_link}</a>
+                </p>
+            </div>
+            <div class="footer">
+                <p>© 2025 Centro Minero SENA - Sistema de Gestión de Laboratorios</p>
+                <p>Este es un correo automático, por favor no respondas a este mensaje.</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+    
+    cola_correo.encolar(email, 'Recuperación de Contraseña - Centro Minero SENA', html)
+
+
+@bp.route('/verificar-codigo/<user_id>', methods=['GET', 'POST'])
+def verificar_codigo(user_id):
+    """Verificar código de 6 dígitos"""
+    code_data = session.get(f'reset_code_{user_id}')
+    
+    if not code_data:
+        flash('Sesión expirada. Solicita un nuevo código.', 'error')
+        return redirect(url_for('nucleo.recuperar_contrasena'))
+    
+    # Verificar expiración
+    expiry = datetime.fromisoformat(code_data['expiry'])
+    if datetime.now() > expiry:
+        session.pop(f'reset_code_{user_id}', None)
+        flash('El código ha expirado. Solicita uno nuevo.', 'error')
+        return redirect(url_for('nucleo.recuperar_contrasena'))
+    
+    if request.method == 'POST':
+        codigo_ingresado = request.form.get('codigo', '').strip().replace(' ', '').replace('-', '')
+        
+        if not codigo_ingresado:
+            flash('Por favor ingresa el código', 'error')
+            return render_template('verificar_codigo.html', user_id=user_id, email=code_data.get('email', ''))
+        
+        # Debug: Imprimir códigos para comparación
+        codigo_esperado = str(code_data['code']).strip()
+        logger_auth.debug("Código ingresado: '%s' (len: %s)", codigo_ingresado, len(codigo_ingresado))
+        logger_auth.debug("Código esperado: '%s' (len: %s)", codigo_esperado, len(codigo_esperado))
+        logger_auth.debug("Comparación: %s == %s -> %s", codigo_ingresado, codigo_esperado, codigo_ingresado == codigo_esperado)
+        
+        if codigo_ingresado == codigo_esperado:
+            # Código correcto, marcar como verificado
+            session[f'code_verified_{user_id}'] = True
+            flash('Código verificado correctamente', 'success')
+            return redirect(url_for('nucleo.restablecer_contrasena', user_id=user_id))
+        else:
+            flash(f'Código incorrecto. Verifica e intenta nuevamente.', 'error')
+            return render_template('verificar_codigo.html', user_id=user_id, email=code_data.get('email', ''))
+    
+    return render_template('verificar_codigo.html', user_id=user_id, email=code_data.get('email', ''))
+
+
+@bp.route('/restablecer-contrasena/<user_id>', methods=['GET', 'POST'])
+def restablecer_contrasena(user_id):
+    """Restablecer contraseña después de verificar código"""
+    # Verificar que el código fue verificado
+    if not session.get(f'code_verified_{user_id}'):
+        flash('Primero debes verificar el código', 'error')
+        return redirect(url_for('nucleo.recuperar_contrasena'))
+    
+    if request.method == 'POST':
+        nueva_contrasena = request.form.get('nueva_contrasena')
+        confirmar_contrasena = request.form.get('confirmar_contrasena')
+        
+        if not nueva_contrasena or not confirmar_contrasena:
+            flash('Todos los campos son requeridos', 'error')
+            return render_template('restablecer_contrasena.html', user_id=user_id)
+        
+        if nueva_contrasena != confirmar_contrasena:
+            flash('Las contraseñas no coinciden', 'error')
+            return render_template('restablecer_contrasena.html', user_id=user_id)
+        
+        if len(nueva_contrasena) < 6:
+            flash('La contraseña debe tener al menos 6 caracteres', 'error')
+            return render_template('restablecer_contrasena.html', user_id=user_id)
+        
+        # Actualizar contraseña en la base de datos
+        # Nota: En producción, usar bcrypt para hashear la contraseña
+        try:
+            update_query = "UPDATE usuarios SET password_hash = %s WHERE id = %s"
+            db_manager.execute_query(update_query, (nueva_contrasena, user_id))
+            notificar_cambio('usuario', user_id)
+            
+            # Limpiar sesión
+            session.pop(f'reset_code_{user_id}', None)
+            session.pop(f'code_verified_{user_id}', None)
+            
+            flash('Contraseña actualizada exitosamente. Ahora puedes iniciar sesión.', 'success')
+            return redirect(url_for('nucleo.login'))
+        except Exception as e:
+            flash(f'Error al actualizar contraseña: {str(e)}', 'error')
+    
+    return render_template('restablecer_contrasena.html', user_id=user_id)
+
+@bp.route('/dashboard')
+@require_login
+def dashboard():
+    stats = get_dashboard_stats()
+    return render_template('dashboard.html', stats=stats, user=session)
+
+# =====================================================================
+# FUNCIONES DE APOYO PARA VISTAS
+# =====================================================================
+
+@cache_sistema.cacheado('estadisticas_dashboard', ttl_config='cache_estadisticas_dashboard',
+                        etiquetas=('equipos', 'inventario', 'reservas', 'laboratorios'))
+def get_dashboard_stats():
+    """Estadísticas mejoradas del dashboard con datos reales (cacheadas: no modificar el dict)"""
+    stats = {}
+    
+    # Equipos por estado
+    eq = db_manager.execute_query("SELECT estado, COUNT(*) cantidad FROM equipos GROUP BY estado")
+    stats['equipos_estado'] = {r['estado']: r['cantidad'] for r in eq} if eq else {}
+    
+    # Total de equipos activos (excluyendo fuera de servicio)
+    activos = db_manager.execute_query("SELECT COUNT(*) cantidad FROM equipos WHERE estado != 'fuera_servicio'")
+    stats['equipos_activos'] = activos[0]['cantidad'] if activos else 0
+    
+    # Equipos disponibles (más útil que críticos)
+    disp = db_manager.execute_query("SELECT COUNT(*) cantidad FROM equipos WHERE estado = 'disponible'")
+    stats['equipos_disponibles'] = disp[0]['cantidad'] if disp else 0
+    
+    # Items con stock bajo (más flexible que crítico)
+    bajo = db_manager.execute_query("SELECT COUNT(*) cantidad FROM inventario WHERE cantidad_actual <= (cantidad_minima * 1.5)")
+    stats['inventario_bajo'] = bajo[0]['cantidad'] if bajo else 0
+    
+    # Items bien abastecidos (información positiva)
+    bien = db_manager.execute_query("SELECT COUNT(*) cantidad FROM inventario WHERE cantidad_actual > cantidad_minima")
+    stats['inventario_bien'] = bien[0]['cantidad'] if bien else 0
+    
+    # Reservas próximas (incluye programadas y activas, sin filtro de fecha estricto)
+    prox = db_manager.execute_query("SELECT COUNT(*) cantidad FROM reservas WHERE estado IN ('activa', 'programada')")
+    stats['reservas_proximas'] = prox[0]['cantidad'] if prox else 0
+    
+    # Total de laboratorios activos
+    labs = db_manager.execute_query("SELECT COUNT(*) cantidad FROM laboratorios WHERE estado = 'activo'")
+    stats['total_laboratorios'] = labs[0]['cantidad'] if labs else 0
+    
+    # Total de items en inventario
+    total_inv = db_manager.execute_query("SELECT COUNT(*) cantidad FROM inventario")
+    stats['total_inventario'] = total_inv[0]['cantidad'] if total_inv else 0
+    
+    return stats
+
+# =====================================================================
+# API REST - ENDPOINTS PRINCIPALES
+# =====================================================================
+
+class AuthAPI(Resource):
+    def post(self):
+        parser = reqparse.RequestParser()
+        parser.add_argument('user_id', required=True, help='ID de usuario requerido')
+        args = parser.parse_args()
+        # Misma caché que valida cada petición: sin consulta si el usuario se vio hace poco
+        user = usuarios_cache.obtener(args['user_id'])
+        if user and user.get('activo'):
+            access_token = create_access_token(
+                identity=user['id'],
+                additional_claims={'nombre': user['nombre'], 'tipo': user['tipo'], 'nivel': user['nivel_acceso']},
+            )
+            try:
+                log_query = (
+                    """
+                    INSERT INTO logs_seguridad (usuario_id, accion, detalle, ip_origen, exitoso)
+                    VALUES (%s, 'login_api', 'Login exitoso desde API', %s, TRUE)
+                    """
+                )
+                db_manager.execute_query(log_query, (user['id'], request.remote_addr))
+            except Exception:
+                pass
+            return {
+                'access_token': access_token,
+                'user': {
+                    'id': user['id'],
+                    'nombre': user['nombre'],
+                    'tipo': user['tipo'],
+                    'nivel_acceso': user['nivel_acceso'],
+                },
+            }, 200
+        return {'message': 'Usuario no encontrado o inactivo'}, 401
+
+
+api.add_resource(AuthAPI, '/api/auth')
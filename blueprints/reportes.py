@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+Blueprint Reportes: Página de Reportes y Descargas PDF/Excel
+Sistema de Laboratorios - Centro Minero SENA
+El generador (reportlab/openpyxl) se importa en la primera descarga.
+"""
+
+from datetime import datetime
+
+from flask import Blueprint, render_template, request, session, redirect, url_for, flash, send_file
+
+from blueprints.comun import cache_sistema, db_manager, require_login, require_level
+
+bp = Blueprint('reportes', __name__)
+
+@bp.route('/reportes')
+@require_login
+@require_level(2)
+def reportes():
+    reportes_data = get_reportes_data()
+    return render_template('reportes.html', reportes=reportes_data, user=session)
+
+
+@bp.route('/reportes/descargar/pdf')
+@require_login
+@require_level(2)
+def descargar_reporte_pdf():
+    """Descargar reporte en formato PDF"""
+    try:
+        # Obtener parámetros de fecha
+        fecha_inicio = request.args.get('fecha_inicio')
+        fecha_fin = request.args.get('fecha_fin')
+        
+        # Obtener datos del reporte
+        data = obtener_datos_completos_reporte(fecha_inicio, fecha_fin)
+        
+        # Generar PDF
+        from utils.report_generator import report_generator
+        pdf_buffer = report_generator.generar_pdf_estadisticas(data, fecha_inicio, fecha_fin)
+        
+        # Nombre del archivo
+        fecha_actual = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"reporte_laboratorio_{fecha_actual}.pdf"
+        
+        return send_file(
+            pdf_buffer,
+            mimetype='application/pdf',
+            as_attachment=True,
+            download_name=filename
+        )
+    except Exception as e:
+        flash(f'Error al generar el reporte PDF: {str(e)}', 'error')
+        return redirect(url_for('reportes.reportes'))
+
+
+@bp.route('/reportes/descargar/excel')
+@require_login
+@require_level(2)
+def descargar_reporte_excel():
+    """Descargar reporte en formato Excel"""
+    try:
+        # Obtener parámetros de fecha
+        fecha_inicio = request.args.get('fecha_inicio')
+        fecha_fin = request.args.get('fecha_fin')
+        
+        # Obtener datos del reporte
+        data = obtener_datos_completos_reporte(fecha_inicio, fecha_fin)
+        
+        # Generar Excel
+        from utils.report_generator import report_generator
+        excel_buffer = report_generator.generar_excel_estadisticas(data, fecha_inicio, fecha_fin)
+        
+        # Nombre del archivo
+        fecha_actual = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"reporte_laboratorio_{fecha_actual}.xlsx"
+        
+        return send_file(
+            excel_buffer,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            as_attachment=True,
+            download_name=filename
+        )
+    except Exception as e:
+        flash(f'Error al generar el reporte Excel: {str(e)}', 'error')
+        return redirect(url_for('reportes.reportes'))
+
+@cache_sistema.cacheado('inventario_critico', ttl_config='cache_inventario_critico', etiquetas=('inventario',))
+def inventario_critico():
+    """Items con stock en o bajo el mínimo, del más deficitario al menos"""
+    q = (
+        """
+        SELECT nombre, categoria, cantidad_actual, cantidad_minima
+        FROM inventario
+        WHERE cantidad_actual <= cantidad_minima
+        ORDER BY (cantidad_actual - cantidad_minima)
+        """
+    )
+    return db_manager.execute_query(q) or []
+
+
+# 'comandos_voz' lo emite ComandosVozAPI; historial_uso no tiene escritores en la aplicación (se carga
+# por fuera, p. ej. scripts de mantenimiento), así que esos cambios se ven al vencer cache_reportes_diarios
+@cache_sistema.cacheado('reportes_diarios', ttl_config='cache_reportes_diarios',
+                        etiquetas=('equipos', 'inventario', 'usuarios', 'historial_uso', 'comandos_voz'))
+def get_reportes_data():
+    data = {}
+    q1 = (
+        """
+        SELECT e.nombre, COUNT(h.id) usos
+        FROM equipos e
+        LEFT JOIN historial_uso h ON e.id = h.equipo_id AND h.fecha_uso >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)
+        GROUP BY e.id, e.nombre
+        ORDER BY usos DESC
+        LIMIT 10
+        """
+    )
+    data['uso_equipos'] = db_manager.execute_query(q1)
+    data['inventario_bajo'] = inventario_critico()
+    q3 = (
+        """
+        SELECT u.nombre, u.tipo, COUNT(c.id) comandos
+        FROM usuarios u
+        LEFT JOIN comandos_voz c ON u.id = c.usuario_id AND c.fecha >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)
+        GROUP BY u.id, u.nombre, u.tipo
+        ORDER BY comandos DESC
+        LIMIT 10
+        """
+    )
+    data['usuarios_activos'] = db_manager.execute_query(q3)
+    return data
+
+
+@cache_sistema.cacheado('reporte_completo', ttl_config='cache_reportes_diarios',
+                        etiquetas=('equipos', 'inventario', 'usuarios', 'reservas', 'historial_uso', 'comandos_voz'))
+def obtener_datos_completos_reporte(fecha_inicio=None, fecha_fin=None):
+    """
+    Obtener todos los datos necesarios para generar un reporte completo
+    
+    Args:
+        fecha_inicio: Fecha de inicio del período (formato YYYY-MM-DD)
+        fecha_fin: Fecha de fin del período (formato YYYY-MM-DD)
+    
+    Returns:
+        dict: Diccionario con todos los datos del reporte
+    """
+    data = {}
+    
+    # Estadísticas generales
+    # Total de equipos
+    total_eq = db_manager.execute_query("SELECT COUNT(*) as total FROM equipos")
+    data['total_equipos'] = total_eq[0]['total'] if total_eq else 0
+    
+    # Equipos activos (excluyendo fuera de servicio)
+    activos_eq = db_manager.execute_query("SELECT COUNT(*) as total FROM equipos WHERE estado != 'fuera_servicio'")
+    data['equipos_activos'] = activos_eq[0]['total'] if activos_eq else 0
+    
+    # Total de usuarios
+    total_users = db_manager.execute_query("SELECT COUNT(*) as total FROM usuarios WHERE activo = TRUE")
+    data['total_usuarios'] = total_users[0]['total'] if total_users else 0
+    
+    # Total de reservas
+    total_res = db_manager.execute_query("SELECT COUNT(*) as total FROM reservas")
+    data['total_reservas'] = total_res[0]['total'] if total_res else 0
+    
+    # Reservas activas
+    activas_res = db_manager.execute_query("SELECT COUNT(*) as total FROM reservas WHERE estado = 'activa'")
+    data['reservas_activas'] = activas_res[0]['total'] if activas_res else 0
+    
+    # Total de items en inventario
+    total_inv = db_manager.execute_query("SELECT COUNT(*) as total FROM inventario")
+    data['total_items'] = total_inv[0]['total'] if total_inv else 0
+    
+    # Items con stock bajo
+    bajo_inv = db_manager.execute_query("SELECT COUNT(*) as total FROM inventario WHERE cantidad_actual <= cantidad_minima")
+    data['items_stock_bajo'] = bajo_inv[0]['total'] if bajo_inv else 0
+    
+    # Equipos más utilizados (con filtro de fecha si se proporciona)
+    if fecha_inicio and fecha_fin:
+        q_equipos = """
+            SELECT e.nombre, COUNT(h.id) as usos
+            FROM equipos e
+            LEFT JOIN historial_uso h ON e.id = h.equipo_id 
+                AND h.fecha_uso BETWEEN %s AND %s
+            GROUP BY e.id, e.nombre
+            ORDER BY usos DESC
+            LIMIT 10
+        """
+        data['equipos_mas_usados'] = db_manager.execute_query(q_equipos, (fecha_inicio, fecha_fin)) or []
+    else:
+        q_equipos = """
+            SELECT e.nombre, COUNT(h.id) as usos
+            FROM equipos e
+            LEFT JOIN historial_uso h ON e.id = h.equipo_id 
+                AND h.fecha_uso >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
+            GROUP BY e.id, e.nombre
+            ORDER BY usos DESC
+            LIMIT 10
+        """
+        data['equipos_mas_usados'] = db_manager.execute_query(q_equipos) or []
+    
+    # Usuarios más activos (con filtro de fecha si se proporciona)
+    if fecha_inicio and fecha_fin:
+        q_usuarios = """
+            SELECT u.nombre, u.tipo, COUNT(c.id) as comandos
+            FROM usuarios u
+            LEFT JOIN comandos_voz c ON u.id = c.usuario_id 
+                AND c.fecha BETWEEN %s AND %s
+            WHERE u.activo = TRUE
+            GROUP BY u.id, u.nombre, u.tipo
+            ORDER BY comandos DESC
+            LIMIT 10
+        """
+        data['usuarios_activos'] = db_manager.execute_query(q_usuarios, (fecha_inicio, fecha_fin)) or []
+    else:
+        q_usuarios = """
+            SELECT u.nombre, u.tipo, COUNT(c.id) as comandos
+            FROM usuarios u
+            LEFT JOIN comandos_voz c ON u.id = c.usuario_id 
+                AND c.fecha >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)
+            WHERE u.activo = TRUE
+            GROUP BY u.id, u.nombre, u.tipo
+            ORDER BY comandos DESC
+            LIMIT 10
+        """
+        data['usuarios_activos'] = db_manager.execute_query(q_usuarios) or []
+    
+    # Inventario con stock bajo
+    data['inventario_bajo'] = inventario_critico()
+    
+    return data
@@ -0,0 +1,1431 @@
+# -*- coding: utf-8 -*-
+"""
+Blueprint Visión: Reconocimiento Visual por Cámara e IA Avanzada
+Sistema de Laboratorios - Centro Minero SENA
+Entrenamiento y reconocimiento (ORB/FLANN), plantillas de equipos y endpoints de IA.
+Sólo API: pensado para montarse en un pool de workers dedicado a OpenCV.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+import base64
+import importlib.util
+import json
+import os
+import threading
+import time
+
+from flask import Blueprint, current_app, request, jsonify
+from flask_restful import Resource
+from flask_jwt_extended import verify_jwt_in_request
+
+from blueprints.comun import (ApiRest, cv2, np, db_manager, logger, logger_vision, LOG_MUESTREO_BUCLES,
+                              IMG_ROOT, bus_cambios, verify_jwt_or_admin,
+                              _decode_image_base64, _safe_imread)
+from utils.detectores import detectores
+
+bp = Blueprint('vision', __name__)
+api = ApiRest(bp)
+
+# =====================================================================
+# API DE RECONOCIMIENTO VISUAL
+# =====================================================================
+
+class VisualTrainingAPI(Resource):
+    """API para entrenar el reconocimiento visual (versión mejorada con metadata completa)"""
+    
+    def post(self):
+        """Agregar imagen de entrenamiento para un equipo o item"""
+        data = request.get_json(silent=True) or {}
+        item_type = data.get('item_type')  # 'equipo' o 'item'
+        item_id = data.get('item_id')
+        image_base64 = data.get('image_base64')
+        description = data.get('description', '')
+        view_angle = data.get('view_angle', 'frontal')
+        
+        if not item_type or item_type not in ['equipo', 'item']:
+            return {'message': 'item_type debe ser "equipo" o "item"'}, 400
+        if not item_id:
+            return {'message': 'item_id es requerido'}, 400
+        if not image_base64:
+            return {'message': 'image_base64 es requerido'}, 400
+        
+        try:
+            # Decodificar imagen base64
+            if ',' in image_base64:
+                image_base64 = image_base64.split(',')[1]
+            
+            image_data = base64.b64decode(image_base64)
+            nparr = np.frombuffer(image_data, np.uint8)
+            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            
+            if image is None:
+                return {'message': 'No se pudo decodificar la imagen'}, 400
+            
+            # Obtener detalles del item desde la base de datos
+            item_details = {}
+            if item_type == 'equipo':
+                query = "SELECT id, nombre, tipo, estado, ubicacion, especificaciones FROM equipos WHERE id = %s"
+                result = db_manager.execute_query(query, (item_id,))
+                if result:
+                    item_details = result[0]
+                    # Parsear especificaciones JSON
+                    if item_details.get('especificaciones'):
+                        try:
+                            item_details['especificaciones'] = json.loads(item_details['especificaciones'])
+                        except:
+                            item_details['especificaciones'] = {}
+            else:
+                query = "SELECT id, nombre, categoria, cantidad_actual, unidad, ubicacion FROM inventario WHERE id = %s"
+                result = db_manager.execute_query(query, (item_id,))
+                if result:
+                    item_details = result[0]
+            
+            if not item_details:
+                return {'message': f'{item_type} con ID {item_id} no encontrado en la base de datos'}, 404
+            
+            # Guardar imagen de entrenamiento
+            base_dir = os.path.join('imagenes', 'entrenamiento', item_type, str(item_id))
+            os.makedirs(base_dir, exist_ok=True)
+            
+            filename = f"{view_angle}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
+            filepath = os.path.join(base_dir, filename)
+            cv2.imwrite(filepath, image)
+            bus_cambios.notificar('plantillas', f'{item_type}:{item_id}')
+            
+            # Extraer características ORB para verificación
+            orb = detectores.obtener('orb_500')
+            keypoints, descriptors = orb.detectAndCompute(image, None)
+            num_features = len(keypoints) if keypoints else 0
+            
+            # Guardar metadatos completos incluyendo detalles del item
+            metadata = {
+                'description': description,
+                'view_angle': view_angle,
+                'filepath': filepath,
+                'training_date': datetime.now().isoformat(),
+                'num_features': num_features,
+                'item_details': item_details  # Incluir todos los detalles del item
+            }
+            
+            metadata_file = os.path.join(base_dir, 'metadata.json')
+            if os.path.exists(metadata_file):
+                with open(metadata_file, 'r', encoding='utf-8') as f:
+                    all_metadata = json.load(f)
+            else:
+                all_metadata = []
+            
+            all_metadata.append(metadata)
+            
+            with open(metadata_file, 'w', encoding='utf-8') as f:
+                json.dump(all_metadata, f, indent=2, ensure_ascii=False)
+            
+            return {
+                'message': 'Imagen de entrenamiento guardada exitosamente',
+                'filepath': filepath,
+                'num_features': num_features,
+                'total_images': len(all_metadata),
+                'item_details': item_details
+            }, 200
+                
+        except Exception as e:
+            logger_vision.exception("Error en entrenamiento visual: %s: %s", type(e).__name__, e)
+            return {'message': f'Error procesando imagen: {str(e)}'}, 500
+
+class VisualRecognitionAPI(Resource):
+    """API para reconocer equipos e items por imagen (versión simplificada)"""
+    
+    def post(self):
+        """Reconocer equipo o item en una imagen"""
+        data = request.get_json(silent=True) or {}
+        image_base64 = data.get('image_base64')
+        confidence_threshold = data.get('confidence_threshold', 0.3)
+        
+        if not image_base64:
+            return {'message': 'image_base64 es requerido'}, 400
+        
+        try:
+            # Decodificar imagen base64
+            if ',' in image_base64:
+                image_base64 = image_base64.split(',')[1]
+            
+            image_data = base64.b64decode(image_base64)
+            nparr = np.frombuffer(image_data, np.uint8)
+            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            
+            if image is None:
+                return {'message': 'No se pudo decodificar la imagen'}, 400
+            
+            # Buscar coincidencias en imágenes de entrenamiento usando comparación simple
+            result = self._simple_recognition(image, confidence_threshold)
+            
+            if not result['success']:
+                return {'message': result['message']}, 400
+            
+            # Si se reconoció algo, obtener detalles actualizados de la base de datos
+            if result['recognized']:
+                item_details = None
+                
+                # Primero intentar usar metadata guardada (tiene toda la info)
+                if result.get('metadata'):
+                    metadata = result['metadata']
+                    
+                    # Si tiene item_details (formato antiguo de entrenamiento)
+                    if metadata.get('item_details'):
+                        item_details = metadata['item_details']
+                        item_details['tipo_item'] = result['item_type']
+                        item_details['from_cache'] = True
+                    
+                    # Si tiene la metadata del registro (formato nuevo)
+                    elif metadata.get('id') or metadata.get('nombre'):
+                        item_details = {
+                            'id': metadata.get('id'),
+                            'nombre': metadata.get('nombre'),
+                            'categoria': metadata.get('categoria'),
+                            'descripcion': metadata.get('descripcion'),
+                            'ubicacion': metadata.get('ubicacion'),
+                            'laboratorio_id': metadata.get('laboratorio_id'),
+                            'tipo_item': result['item_type'],
+                            'from_cache': True
+                        }
+                        
+                        # Agregar campos específicos según tipo
+                        if result['item_type'] == 'equipo':
+                            item_details['estado'] = metadata.get('estado', 'disponible')
+                            item_details['equipo_id'] = metadata.get('equipo_id')
+                        else:
+                            item_details['cantidad_actual'] = metadata.get('cantidad')
+                
+                # Intentar obtener datos actualizados de la base de datos
+                # Primero necesitamos el ID real del item
+                db_id = None
+                
+                # Si metadata tiene el ID, usarlo
+                if result.get('metadata') and result['metadata'].get('id'):
+                    db_id = result['metadata']['id']
+                # Si item_id es numérico, usarlo directamente
+                elif result['item_id'].isdigit():
+                    db_id = result['item_id']
+                # Si no, buscar por nombre en la metadata
+                elif result.get('metadata') and result['metadata'].get('nombre'):
+                    nombre = result['metadata']['nombre']
+                    if result['item_type'] == 'equipo':
+                        search_query = "SELECT id FROM equipos WHERE nombre = %s LIMIT 1"
+                    else:
+                        search_query = "SELECT id FROM inventario WHERE nombre = %s LIMIT 1"
+                    search_result = db_manager.execute_query(search_query, (nombre,))
+                    if search_result:
+                        db_id = search_result[0]['id']
+                
+                # Obtener datos frescos de la BD si tenemos el ID
+                if db_id:
+                    if result['item_type'] == 'equipo':
+                        equipo_query = """
+                            SELECT e.id, e.nombre, e.tipo, e.estado, e.ubicacion, e.especificaciones,
+                                   e.laboratorio_id, l.nombre as laboratorio_nombre, l.ubicacion as laboratorio_ubicacion,
+                                   e.equipo_id, e.marca, e.modelo, e.numero_serie, e.observaciones,
+                                   DATE_FORMAT(e.fecha_creacion, '%Y-%m-%d %H:%i') as fecha_creacion
+                            FROM equipos e
+                            LEFT JOIN laboratorios l ON e.laboratorio_id = l.id
+                            WHERE e.id = %s
+                        """
+                        equipo_data = db_manager.execute_query(equipo_query, (db_id,))
+                        if equipo_data:
+                            fresh_details = equipo_data[0]
+                            # Parsear especificaciones JSON
+                            if fresh_details.get('especificaciones'):
+                                try:
+                                    fresh_details['especificaciones'] = json.loads(fresh_details['especificaciones'])
+                                except:
+                                    fresh_details['especificaciones'] = {}
+                            fresh_details['tipo_item'] = 'equipo'
+                            fresh_details['from_cache'] = False
+                            item_details = fresh_details
+                    
+                    elif result['item_type'] == 'item':
+                        item_query = """
+                            SELECT i.id, i.nombre, i.categoria, i.cantidad_actual, i.unidad, i.ubicacion,
+                                   i.laboratorio_id, l.nombre as laboratorio_nombre, l.ubicacion as laboratorio_ubicacion,
+                                   i.cantidad_minima, i.descripcion, i.proveedor,
+                                   DATE_FORMAT(i.fecha_registro, '%Y-%m-%d %H:%i') as fecha_registro
+                            FROM inventario i
+                            LEFT JOIN laboratorios l ON i.laboratorio_id = l.id
+                            WHERE i.id = %s
+                        """
+                        item_data = db_manager.execute_query(item_query, (db_id,))
+                        if item_data:
+                            fresh_details = item_data[0]
+                            fresh_details['tipo_item'] = 'item'
+                            fresh_details['from_cache'] = False
+                            item_details = fresh_details
+                
+                # Si no se pudo obtener de BD pero tenemos metadata, enriquecer con info de laboratorio
+                if not item_details or item_details.get('from_cache'):
+                    if item_details and item_details.get('laboratorio_id'):
+                        lab_query = "SELECT id, nombre, ubicacion FROM laboratorios WHERE id = %s"
+                        lab_data = db_manager.execute_query(lab_query, (item_details['laboratorio_id'],))
+                        if lab_data:
+                            item_details['laboratorio_nombre'] = lab_data[0]['nombre']
+                            item_details['laboratorio_ubicacion'] = lab_data[0]['ubicacion']
+                
+                return {
+                    'recognized': True,
+                    'confidence': result['confidence'],
+                    'item_type': result['item_type'],
+                    'item_id': result['item_id'],
+                    'details': item_details,
+                    'matches': result.get('matches', 0),
+                    'training_metadata': result.get('metadata', {})  # Metadata del entrenamiento
+                }, 200
+            else:
+                return {
+                    'recognized': False,
+                    'message': 'No se encontraron coincidencias suficientes. Entrene más imágenes de este item.',
+                    'best_score': result.get('best_score', 0)
+                }, 200
+                
+        except Exception as e:
+            logger_vision.exception("Error en reconocimiento: %s: %s", type(e).__name__, e)
+            return {'message': f'Error en reconocimiento: {str(e)}'}, 500
+    
+    def _simple_recognition(self, query_image, threshold=0.3):
+        """Reconocimiento mejorado usando ORB con metadata completa"""
+        try:
+            logger_vision.debug("Iniciando reconocimiento visual...")
+            logger_vision.debug("Umbral de confianza: %s", threshold)
+            
+            # Usar ORB para detectar características
+            orb = detectores.obtener('orb_500')
+            bf = detectores.obtener('bf_hamming')
+            kp1, des1 = orb.detectAndCompute(query_image, None)
+            
+            logger_vision.debug("Características detectadas en imagen query: %s keypoints", len(kp1) if kp1 else 0)
+            
+            if des1 is None:
+                return {'success': True, 'recognized': False, 'message': 'No se detectaron características en la imagen'}
+            
+            best_match = None
+            best_score = 0
+            best_metadata = None
+            
+            # BUSCAR EN DOS UBICACIONES:
+            # 1. imagenes/entrenamiento/{tipo}/{id}/ (imágenes de entrenamiento manual)
+            # 2. imagenes/{tipo}/{nombre}/ (imágenes del módulo de registro)
+            
+            search_paths = []
+            
+            # Crear directorios si no existen
+            os.makedirs('imagenes/entrenamiento/equipo', exist_ok=True)
+            os.makedirs('imagenes/entrenamiento/item', exist_ok=True)
+            os.makedirs('imagenes/equipo', exist_ok=True)
+            os.makedirs('imagenes/item', exist_ok=True)
+            
+            # Ruta 1: Entrenamiento manual
+            training_base = 'imagenes/entrenamiento'
+            if os.path.exists(training_base):
+                for item_type in ['equipo', 'item']:
+                    type_dir = os.path.join(training_base, item_type)
+                    if os.path.exists(type_dir):
+                        try:
+                            for item_id in os.listdir(type_dir):
+                                item_dir = os.path.join(type_dir, item_id)
+                                if os.path.isdir(item_dir):
+                                    search_paths.append({
+                                        'path': item_dir,
+                                        'type': item_type,
+                                        'id': item_id,
+                                        'source': 'training'
+                                    })
+                        except (OSError, PermissionError) as e:
+                            logger_vision.warning("Error accediendo a %s: %s", type_dir, e)
+                            continue
+            
+            # Ruta 2: Registro de equipos/items
+            registro_base = 'imagenes'
+            for item_type in ['equipo', 'item']:
+                type_dir = os.path.join(registro_base, item_type)
+                if os.path.exists(type_dir):
+                    try:
+                        for nombre_carpeta in os.listdir(type_dir):
+                            item_dir = os.path.join(type_dir, nombre_carpeta)
+                            if os.path.isdir(item_dir):
+                                search_paths.append({
+                                    'path': item_dir,
+                                    'type': item_type,
+                                    'id': nombre_carpeta,
+                                    'source': 'registro'
+                                })
+                    except (OSError, PermissionError) as e:
+                        logger_vision.warning("Error accediendo a %s: %s", type_dir, e)
+                        continue
+            
+            logger_vision.debug("Total de carpetas a buscar: %s", len(search_paths))
+            for sp in search_paths:
+                logger_vision.debug("- %s/%s (fuente: %s)", sp['type'], sp['id'], sp['source'], extra={'muestra': LOG_MUESTREO_BUCLES})
+            
+            if not search_paths:
+                return {'success': True, 'recognized': False, 'message': 'No hay imágenes registradas. Registre equipos/items con fotos primero.'}
+            
+            # Buscar en todas las rutas
+            total_comparisons = 0
+            for search_info in search_paths:
+                item_dir = search_info['path']
+                item_type = search_info['type']
+                item_id = search_info['id']
+                
+                logger_vision.debug("Buscando en: %s", item_dir)
+                
+                # Cargar metadata del item
+                metadata_file = os.path.join(item_dir, 'metadata.json')
+                item_metadata = None
+                if os.path.exists(metadata_file):
+                    try:
+                        with open(metadata_file, 'r', encoding='utf-8') as f:
+                            metadata_content = json.load(f)
+                            # Si es una lista (formato entrenamiento), usar el último
+                            if isinstance(metadata_content, list):
+                                item_metadata = metadata_content[-1] if metadata_content else None
+                            # Si es un dict (formato registro), usar directamente
+                            elif isinstance(metadata_content, dict):
+                                item_metadata = metadata_content
+                        logger_vision.debug("Metadata cargada: %s", item_metadata.get('nombre', 'N/A') if item_metadata else 'None')
+                    except Exception as e:
+                        logger_vision.warning("Error leyendo metadata de %s: %s", metadata_file, e)
+                
+                # Comparar con todas las imágenes de este item
+                try:
+                    images_in_dir = [f for f in os.listdir(item_dir) if f.endswith(('.jpg', '.jpeg', '.png'))]
+                    logger_vision.debug("Imágenes encontradas: %s -> %s", len(images_in_dir), images_in_dir)
+                except (OSError, PermissionError) as e:
+                    logger_vision.warning("Error listando imágenes en %s: %s", item_dir, e)
+                    continue
+                
+                for img_file in images_in_dir:
+                    img_path = os.path.join(item_dir, img_file)
+                    train_img = cv2.imread(img_path)
+                    if train_img is None:
+                        logger_vision.warning("No se pudo leer imagen: %s", img_path)
+                        continue
+                    
+                    kp2, des2 = orb.detectAndCompute(train_img, None)
+                    if des2 is None:
+                        logger_vision.warning("No se detectaron características en: %s", img_file)
+                        continue
+                    
+                    # Comparar características
+                    matches = bf.match(des1, des2)
+                    
+                    # Calcular score basado en número de coincidencias
+                    score = len(matches) / max(len(kp1), len(kp2))
+                    total_comparisons += 1
+                    
+                    logger_vision.debug("%s: %s matches, score=%.4f (kp_train=%s)", img_file, len(matches), score, len(kp2),
+                                        extra={'muestra': LOG_MUESTREO_BUCLES})
+                    
+                    if score > best_score:
+                        best_score = score
+                        best_match = {
+                            'item_type': item_type,
+                            'item_id': item_id,
+                            'matches': len(matches),
+                            'score': score,
+                            'source': search_info['source'],
+                            'image_path': img_path
+                        }
+                        best_metadata = item_metadata
+                        logger_vision.debug("*** NUEVO MEJOR MATCH! ***")
+            
+            logger_vision.debug("Total de comparaciones realizadas: %s", total_comparisons)
+            logger_vision.debug("Mejor score encontrado: %.4f", best_score)
+            logger_vision.debug("Umbral requerido: %.4f", threshold)
+            logger_vision.debug("¿Supera umbral?: %s", best_score >= threshold)
+            
+            if best_match and best_score >= threshold:
+                return {
+                    'success': True,
+                    'recognized': True,
+                    'item_type': best_match['item_type'],
+                    'item_id': best_match['item_id'],
+                    'confidence': best_score,
+                    'matches': best_match['matches'],
+                    'metadata': best_metadata  # Incluir metadata guardada
+                }
+            else:
+                return {
+                    'success': True,
+                    'recognized': False,
+                    'best_score': best_score,
+                    'message': f'Mejor coincidencia: {best_score:.2%} (umbral: {threshold:.2%}). Entrena más imágenes del item.'
+                }
+                
+        except Exception as e:
+            return {'success': False, 'message': str(e)}
+
+class VisualStatsAPI(Resource):
+    """API para estadísticas del sistema visual (simplificado)"""
+    
+    def get(self):
+        """Obtener estadísticas del entrenamiento y registro"""
+        try:
+            stats = {
+                'equipos_entrenados': 0,
+                'items_entrenados': 0,
+                'equipos_registrados': 0,
+                'items_registrados': 0,
+                'total_imagenes': 0,
+                'imagenes_entrenamiento': 0,
+                'imagenes_registro': 0
+            }
+            
+            # Crear directorios si no existen
+            os.makedirs('imagenes/entrenamiento/equipo', exist_ok=True)
+            os.makedirs('imagenes/entrenamiento/item', exist_ok=True)
+            os.makedirs('imagenes/equipo', exist_ok=True)
+            os.makedirs('imagenes/item', exist_ok=True)
+            
+            # Contar imágenes de entrenamiento manual
+            training_base = 'imagenes/entrenamiento'
+            if os.path.exists(training_base):
+                for item_type in ['equipo', 'item']:
+                    type_dir = os.path.join(training_base, item_type)
+                    if os.path.exists(type_dir):
+                        try:
+                            items = [d for d in os.listdir(type_dir) if os.path.isdir(os.path.join(type_dir, d))]
+                            if item_type == 'equipo':
+                                stats['equipos_entrenados'] = len(items)
+                            else:
+                                stats['items_entrenados'] = len(items)
+                            
+                            for item_id in items:
+                                item_dir = os.path.join(type_dir, item_id)
+                                try:
+                                    images = [f for f in os.listdir(item_dir) if f.endswith(('.jpg', '.jpeg', '.png'))]
+                                    count = len(images)
+                                    stats['imagenes_entrenamiento'] += count
+                                    stats['total_imagenes'] += count
+                                except (OSError, PermissionError):
+                                    continue
+                        except (OSError, PermissionError):
+                            continue
+            
+            # Contar imágenes de registro
+            registro_base = 'imagenes'
+            for item_type in ['equipo', 'item']:
+                type_dir = os.path.join(registro_base, item_type)
+                if os.path.exists(type_dir):
+                    try:
+                        items = [d for d in os.listdir(type_dir) if os.path.isdir(os.path.join(type_dir, d))]
+                        if item_type == 'equipo':
+                            stats['equipos_registrados'] = len(items)
+                        else:
+                            stats['items_registrados'] = len(items)
+                        
+                        for nombre_carpeta in items:
+                            item_dir = os.path.join(type_dir, nombre_carpeta)
+                            try:
+                                images = [f for f in os.listdir(item_dir) if f.endswith(('.jpg', '.jpeg', '.png'))]
+                                count = len(images)
+                                stats['imagenes_registro'] += count
+                                stats['total_imagenes'] += count
+                            except (OSError, PermissionError):
+                                continue
+                    except (OSError, PermissionError):
+                        continue
+            
+            return {'stats': stats}, 200
+        except Exception as e:
+            logger_vision.exception("Error en VisualStatsAPI: %s", e)
+            return {'message': f'Error obteniendo estadísticas: {str(e)}'}, 500
+
+class VisualManagementAPI(Resource):
+    """API para gestión de datos de entrenamiento (simplificado)"""
+    
+    def delete(self):
+        """Eliminar datos de entrenamiento"""
+        data = request.get_json(silent=True) or {}
+        item_type = data.get('item_type')
+        item_id = data.get('item_id')
+        
+        if not item_type or item_type not in ['equipo', 'item']:
+            return {'message': 'item_type debe ser "equipo" o "item"'}, 400
+        if not item_id:
+            return {'message': 'item_id es requerido'}, 400
+        
+        try:
+            import shutil
+            item_dir = os.path.join('imagenes', 'entrenamiento', item_type, str(item_id))
+            
+            if not os.path.exists(item_dir):
+                return {'message': 'No se encontraron datos de entrenamiento para este item'}, 404
+            
+            # Contar archivos antes de eliminar
+            files = [f for f in os.listdir(item_dir) if f.endswith(('.jpg', '.jpeg', '.png'))]
+            deleted_count = len(files)
+            
+            # Eliminar directorio completo
+            shutil.rmtree(item_dir)
+            bus_cambios.notificar('plantillas', f'{item_type}:{item_id}')
+            
+            return {
+                'message': f'Datos de entrenamiento eliminados exitosamente',
+                'deleted_files': deleted_count
+            }, 200
+                
+        except Exception as e:
+            return {'message': f'Error eliminando datos: {str(e)}'}, 500
+
+# =============================
+# INTEGRACIÓN DE IA AVANZADA
+# =============================
+
+# Inicializar sistema de IA avanzada (TensorFlow/DeepSpeech): se crea en el primer uso
+# o al arrancar si AI_MODE=preload; AI_MODE=off lo desactiva
+AI_MANAGER = None
+AI_AVAILABLE = importlib.util.find_spec('modules.ai_integration') is not None
+AI_MODE = os.getenv('AI_MODE', 'lazy').lower()
+_ai_lock = threading.Lock()
+
+
+def initialize_ai_system():
+    global AI_MANAGER, AI_AVAILABLE
+    if AI_MANAGER is not None or not AI_AVAILABLE or AI_MODE == 'off':
+        return AI_MANAGER
+    with _ai_lock:
+        if AI_MANAGER is None and AI_AVAILABLE:
+            try:
+                from modules.ai_integration import create_ai_manager
+                from blueprints.crud import procesar_comando_voz
+            except ImportError as e:
+                logger.warning("Modulos de IA no disponibles: %s", e)
+                AI_AVAILABLE = False
+                return None
+            AI_MANAGER = create_ai_manager(procesar_comando_voz, IMG_ROOT)
+            if AI_MANAGER:
+                logger.info("Sistema de IA avanzada inicializado")
+                # Iniciar control por voz si está disponible
+                if AI_MANAGER.voice_ai_enabled:
+                    AI_MANAGER.start_voice_control()
+                    logger.info("Control por voz avanzado activado")
+            else:
+                # No reintentar en cada petición
+                AI_AVAILABLE = False
+                logger.warning("Sistema de IA no disponible, usando metodos tradicionales")
+    return AI_MANAGER
+
+
+def get_ai_manager():
+    """AI_MANAGER inicializado bajo demanda (None si la IA no está disponible)"""
+    return AI_MANAGER if AI_MANAGER is not None else initialize_ai_system()
+
+def _load_template_images():
+    templates = []
+
+    # Utilidad para sanitizar carpeta->nombre
+    import re
+    def san(s: str) -> str:
+        s = (s or '').lower().replace('..','').replace('/','').replace('\\','')
+        s = re.sub(r"[^a-z0-9_\- ]+", '', s).strip()
+        s = re.sub(r"\s+", '_', s)
+        return s
+
+    # 1) Plantillas de EQUIPOS por nombre (mapeadas a id)
+    base_eq = os.path.join(IMG_ROOT, 'equipos')
+    if os.path.isdir(base_eq):
+        try:
+            rs = db_manager.execute_query("SELECT id, nombre FROM equipos") or []
+        except Exception:
+            rs = []
+        name_to_id = { san(r['nombre']): str(r['id']) for r in rs }
+        for entry in os.listdir(base_eq):
+            folder_path = os.path.join(base_eq, entry)
+            if not os.path.isdir(folder_path):
+                continue
+            eid_or_key = name_to_id.get(san(entry))  # si None, trataremos como OBJETO por nombre de carpeta
+            for root, _, files in os.walk(folder_path):
+                for fn in files:
+                    if not fn.lower().endswith(('.jpg', '.jpeg', '.png')):
+                        continue
+                    path = os.path.join(root, fn)
+                    img = _safe_imread(path)
+                    if img is None:
+                        continue
+                    templates.append((eid_or_key if eid_or_key else san(entry), img))
+            # no hacer break: recorrer todas las subcarpetas (superior/inferior/etc.)
+
+    # 2) Plantillas de OBJETOS por nombre (clave = nombre carpeta)
+    base_obj = os.path.join(IMG_ROOT, 'objetos')
+    if os.path.isdir(base_obj):
+        for entry in os.listdir(base_obj):
+            folder_path = os.path.join(base_obj, entry)
+            if not os.path.isdir(folder_path):
+                continue
+            key = entry  # usamos nombre de carpeta
+            for root, _, files in os.walk(folder_path):
+                for fn in files:
+                    if not fn.lower().endswith(('.jpg', '.jpeg', '.png')):
+                        continue
+                    path = os.path.join(root, fn)
+                    img = _safe_imread(path)
+                    if img is None:
+                        continue
+                    templates.append((key, img))
+            # no hacer break: recorrer todas las subcarpetas (superior/inferior/etc.)
+
+    # 3) Plantillas de OBJETOS desde BD (BLOB)
+    try:
+        rows = db_manager.execute_query(
+            """
+            SELECT o.nombre, oi.imagen
+            FROM objetos_imagenes oi
+            JOIN objetos o ON o.id = oi.objeto_id
+            """
+        ) or []
+        for r in rows:
+            blob = r.get('imagen')
+            if not blob:
+                continue
+            img_arr = np.frombuffer(blob, dtype=np.uint8)
+            img = cv2.imdecode(img_arr, cv2.IMREAD_COLOR)
+            if img is None:
+                continue
+            templates.append((san(r['nombre']), img))
+    except Exception:
+        pass
+
+    # 4) Plantillas desde cualquier otra carpeta top-level dentro de 'imagenes/'
+    base_root = IMG_ROOT
+    if os.path.isdir(base_root):
+        for entry in os.listdir(base_root):
+            if entry in ('equipos','objetos'):
+                continue
+            folder_path = os.path.join(base_root, entry)
+            if not os.path.isdir(folder_path):
+                continue
+            key = san(entry)
+            for root, _, files in os.walk(folder_path):
+                for fn in files:
+                    if not fn.lower().endswith(('.jpg', '.jpeg', '.png')):
+                        continue
+                    path = os.path.join(root, fn)
+                    img = cv2.imread(path, cv2.IMREAD_COLOR)
+                    if img is None:
+                        continue
+                    templates.append((key, img))
+
+    return templates
+
+# Endpoint de diagnóstico: lista carpetas y archivos detectados por visión
+@bp.get('/api/vision/debug_templates')
+def vision_debug_templates():
+    report = {'equipos': {}, 'objetos': {}, 'otros': {}}
+    import re
+    def san(s: str) -> str:
+        s = (s or '').lower().replace('..','').replace('/','').replace('\\','')
+        s = re.sub(r"[^a-z0-9_\- ]+", '', s).strip()
+        s = re.sub(r"\s+", '_', s)
+        return s
+    # Equipos
+    base_eq = os.path.join('imagenes', 'equipos')
+    if os.path.isdir(base_eq):
+        try:
+            rs = db_manager.execute_query("SELECT id, nombre FROM equipos") or []
+        except Exception:
+            rs = []
+        name_to_id = { san(r['nombre']): str(r['id']) for r in rs }
+        for entry in os.listdir(base_eq):
+            folder_path = os.path.join(base_eq, entry)
+            if not os.path.isdir(folder_path):
+                continue
+            eid = name_to_id.get(san(entry))
+            info = {'equipo_id': eid, 'path': folder_path, 'files': []}
+            for root, _, files in os.walk(folder_path):
+                for fn in files:
+                    if fn.lower().endswith(('.jpg','.jpeg','.png')):
+                        info['files'].append(os.path.join(root, fn).replace('\\','/'))
+            report['equipos'][entry] = info
+    # Objetos (FS y BD)
+    base_obj = os.path.join('imagenes', 'objetos')
+    if os.path.isdir(base_obj):
+        for entry in os.listdir(base_obj):
+            folder_path = os.path.join(base_obj, entry)
+            if not os.path.isdir(folder_path):
+                continue
+            info = {'path': folder_path, 'files': []}
+            for root, _, files in os.walk(folder_path):
+                for fn in files:
+                    if fn.lower().endswith(('.jpg','.jpeg','.png')):
+                        info['files'].append(os.path.join(root, fn).replace('\\','/'))
+            report['objetos'][entry] = info
+    # Otros top-level bajo imagenes/
+    base_root = 'imagenes'
+    if os.path.isdir(base_root):
+        for entry in os.listdir(base_root):
+            if entry in ('equipos','objetos'):
+                continue
+            folder_path = os.path.join(base_root, entry)
+            if not os.path.isdir(folder_path):
+                continue
+            info = {'path': folder_path, 'files': []}
+            for root, _, files in os.walk(folder_path):
+                for fn in files:
+                    if fn.lower().endswith(('.jpg','.jpeg','.png')):
+                        info['files'].append(os.path.join(root, fn).replace('\\','/'))
+            report['otros'][entry] = info
+    # Resumen desde BD
+    try:
+        db_rows = db_manager.execute_query("SELECT o.nombre, COUNT(oi.id) c FROM objetos o LEFT JOIN objetos_imagenes oi ON oi.objeto_id=o.id GROUP BY o.id, o.nombre") or []
+        report['objetos_db'] = { r['nombre']: r['c'] for r in db_rows }
+    except Exception:
+        report['objetos_db'] = {}
+    return jsonify(report), 200
+
+# Conteo de plantillas cargadas (para depurar casos "no se encontraron plantillas")
+@bp.get('/api/vision/debug_counts')
+def vision_debug_counts():
+    templates = _load_template_images_slim(max_per_key=12)
+    return jsonify({
+        'total_templates': len(templates),
+        'cwd': os.getcwd(),
+        'img_root': IMG_ROOT,
+    }), 200
+
+
+def _match_orb_flann(frame: np.ndarray, templates, min_good=10):
+    try:
+        orb = detectores.obtener('orb_1500')
+        kp1, des1 = orb.detectAndCompute(frame, None)
+        if des1 is None:
+            return None
+        flann = detectores.obtener('flann_lsh')
+        best = None  # (key, score)
+        for eid, tmpl in templates:
+            kp2, des2 = orb.detectAndCompute(tmpl, None)
+            if des2 is None:
+                continue
+            matches = flann.knnMatch(des1, des2, k=2)
+            good = []
+            # LSH puede devolver menos de 2 vecinos para un descriptor: se omite en la prueba de razón
+            for par in matches:
+                if len(par) == 2 and par[0].distance < 0.7 * par[1].distance:
+                    good.append(par[0])
+            score = len(good)
+            if best is None or score > best[1]:
+                best = (eid, score)
+        if best:
+            if best[1] >= min_good:
+                return {'equipo_id': best[0], 'score': int(best[1]), 'passed': True}
+            else:
+                return {'equipo_id': best[0], 'score': int(best[1]), 'passed': False}
+        return None
+    except Exception:
+        return None
+
+
+@bp.post('/api/vision/match')
+def vision_match():
+    # No exigimos JWT por ahora, pero se puede agregar verify_jwt_in_request()
+    data = request.get_json(silent=True) or {}
+    img_b64 = data.get('image_base64')
+    if not img_b64:
+        return jsonify({'message': 'image_base64 requerido'}), 400
+    
+    # Intentar con IA avanzada primero
+    ai_manager = get_ai_manager()
+    if ai_manager and ai_manager.vision_ai_enabled:
+        try:
+            ai_result = ai_manager.detect_objects_advanced(img_b64)
+            if ai_result.get('success'):
+                detection = ai_result['detection_result']
+                if detection.get('detected'):
+                    # Buscar en BD si es un objeto conocido
+                    key = detection['class']
+                    import re
+                    def san(s: str) -> str:
+                        s = (s or '').lower().replace('..','').replace('/','').replace('\\','')
+                        s = re.sub(r"[^a-z0-9_\- ]+", '', s).strip()
+                        s = re.sub(r"\s+", '_', s)
+                        return s
+                    
+                    # Buscar objeto por nombre
+                    objs = db_manager.execute_query("SELECT id, nombre, categoria, descripcion FROM objetos") or []
+                    found = None
+                    for o in objs:
+                        if san(o['nombre']) == san(key):
+                            found = o; break
+                    
+                    if found:
+                        return jsonify({
+                            'tipo': 'objeto',
+                            'objeto': found,
+                            'match': {
+                                'equipo_id': key,
+                                'score': int(detection['confidence'] * 100),
+                                'passed': detection['confidence'] > 0.5,
+                                'ai_enhanced': True,
+                                'method': 'tensorflow'
+                            },
+                            'message': f'🤖 IA: {detection["class"]} (confianza: {detection["confidence"]:.2f})'
+                        }), 200
+                    else:
+                        return jsonify({
+                            'tipo': 'sugerencia',
+                            'categoria': 'objeto',
+                            'key': key,
+                            'match': {
+                                'equipo_id': key,
+                                'score': int(detection['confidence'] * 100),
+                                'passed': False,
+                                'ai_enhanced': True,
+                                'method': 'tensorflow'
+                            },
+                            'message': f'🤖 IA detectó: {key} (no registrado en BD)'
+                        }), 200
+        except Exception as e:
+            logger_vision.warning("Error en IA de visión: %s", e)
+    
+    # Fallback a método tradicional
+    frame = _decode_image_base64(img_b64)
+    frame = _preprocess_for_orb(frame)
+    if frame is None:
+        return jsonify({'message': 'Imagen inválida'}), 400
+    templates = obtener_plantillas(max_per_key=12)
+    if not templates:
+        return jsonify({'message': 'No hay plantillas en imagenes/equipos u objetos'}), 404
+    match = _match_orb_flann(frame, templates)
+    if not match:
+        return jsonify({'message': 'Sin coincidencias'}), 200
+
+    key = str(match.get('equipo_id'))
+    # Si key es numérica, tratamos como equipo
+    if key.isdigit():
+        rs = db_manager.execute_query("SELECT id, nombre, estado, ubicacion FROM equipos WHERE id=%s", (key,))
+        if not rs:
+            if match and match.get('passed') is False:
+                return jsonify({'tipo': 'sugerencia', 'categoria': 'equipo', 'key': key, 'score': match.get('score'), 'message': 'Sugerencia de equipo (baja confianza)'}), 200
+            return jsonify({'match': match, 'message': 'Coincidencia de equipo, pero no encontrado en BD'}), 200
+        if match.get('passed'):
+            return jsonify({'tipo': 'equipo', 'equipo': rs[0], 'match': match, 'message': 'Coincidencia de equipo encontrada'}), 200
+        else:
+            return jsonify({'tipo': 'sugerencia', 'categoria': 'equipo', 'equipo': rs[0], 'match': match, 'message': 'Sugerencia de equipo (baja confianza)'}), 200
+
+    # Caso objeto: key es nombre de carpeta. Buscar objeto por nombre saneado
+    import re
+    def san(s: str) -> str:
+        s = (s or '').lower().replace('..','').replace('/','').replace('\\','')
+        s = re.sub(r"[^a-z0-9_\- ]+", '', s).strip()
+        s = re.sub(r"\s+", '_', s)
+        return s
+    objs = db_manager.execute_query("SELECT id, nombre, categoria, descripcion FROM objetos") or []
+    found = None
+    for o in objs:
+        if san(o['nombre']) == san(key):
+            found = o; break
+    if found:
+        if match.get('passed'):
+            return jsonify({'tipo': 'objeto', 'objeto': found, 'match': match, 'message': 'Coincidencia de objeto encontrada'}), 200
+        else:
+            return jsonify({'tipo': 'sugerencia', 'categoria': 'objeto', 'objeto': found, 'match': match, 'message': 'Sugerencia de objeto (baja confianza)'}), 200
+    # No está en BD pero hay key (nombre de carpeta)
+    if not key.isdigit():
+        return jsonify({'tipo': 'sugerencia', 'categoria': 'objeto', 'key': key, 'match': match, 'message': 'Sugerencia de objeto por carpeta (no mapeada a BD)'}), 200
+    return jsonify({'match': match, 'message': 'Coincidencia encontrada, pero no mapeada a BD'}), 200
+
+@bp.post('/api/vision/equipos/<int:equipo_id>/plantilla')
+def vision_equipo_plantilla(equipo_id: int):
+    try:
+        verify_jwt_in_request()
+    except Exception:
+        # permitir sin JWT si se desea, pero en producción es mejor exigirlo
+        pass
+    data = request.get_json(silent=True) or {}
+    img_b64 = data.get('image_base64')
+    carpeta = (data.get('carpeta') or '').strip()
+    if not img_b64:
+        return jsonify({'message': 'image_base64 requerido'}), 400
+    # decode
+    try:
+        if ',' in img_b64:
+            _, img_b64 = img_b64.split(',', 1)
+        blob = base64.b64decode(img_b64)
+    except Exception as e:
+        return jsonify({'message': f'Base64 inválido: {e}'}), 400
+
+    # sanitize folder
+    def _sanitize(name: str) -> str:
+        import re
+        name = (name or '').replace('..','').replace('/','').replace('\\','')
+        name = re.sub(r"[^A-Za-z0-9_\- ]+", '', name).strip()
+        name = re.sub(r"\s+", '_', name)
+        return name[:80]
+
+    sub = _sanitize(carpeta)
+    # obtener nombre del equipo para usarlo como carpeta
+    try:
+        rs_eq = db_manager.execute_query("SELECT nombre FROM equipos WHERE id=%s", (equipo_id,))
+        eq_name = rs_eq[0]['nombre'] if rs_eq else str(equipo_id)
+    except Exception:
+        eq_name = str(equipo_id)
+    eq_folder = _sanitize(eq_name)
+    dir_path = os.path.join('imagenes', 'equipos', eq_folder)
+    if sub:
+        dir_path = os.path.join(dir_path, sub)
+    try:
+        os.makedirs(dir_path, exist_ok=True)
+    except Exception as e:
+        return jsonify({'message': f'No se pudo crear carpeta {dir_path}: {e}'}), 500
+
+    filename = f"tpl_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
+    file_path = os.path.join(dir_path, filename)
+    try:
+        with open(file_path, 'wb') as f:
+            f.write(blob)
+    except Exception as e:
+        return jsonify({'message': f'No se pudo escribir archivo: {e}'}), 500
+
+    bus_cambios.notificar('plantillas', f'equipo:{equipo_id}')
+    return jsonify({'message': 'Plantilla guardada', 'path': file_path.replace('\\','/')}), 201
+
+@bp.get('/api/vision/equipos/<int:equipo_id>/plantillas')
+def vision_equipo_listar_plantillas(equipo_id: int):
+    # mapear id -> nombre carpeta
+    try:
+        rs = db_manager.execute_query("SELECT nombre FROM equipos WHERE id=%s", (equipo_id,))
+        name = rs[0]['nombre'] if rs else str(equipo_id)
+    except Exception:
+        name = str(equipo_id)
+    import re
+    name_sanitized = re.sub(r"\s+", '_', re.sub(r"[^A-Za-z0-9_\- ]+", '', name)).strip()
+    base_dir = os.path.join('imagenes', 'equipos', name_sanitized)
+    resultado = []
+    if not os.path.exists(base_dir):
+        return jsonify({'plantillas': []}), 200
+    for root, _, files in os.walk(base_dir):
+        for fn in files:
+            if fn.lower().endswith(('.jpg', '.jpeg', '.png')):
+                rel_dir = os.path.relpath(root, base_dir)
+                rel_path = fn if rel_dir == '.' else os.path.join(rel_dir, fn)
+                resultado.append({'file': rel_path.replace('\\','/')})
+    return jsonify({'plantillas': resultado}), 200
+
+@bp.get('/api/vision/equipos/plantilla_image')
+def vision_equipo_plantilla_image():
+    from urllib.parse import unquote
+    equipo_id = request.args.get('equipo_id')
+    rel_file = request.args.get('f') or ''
+    try:
+        eid = int(equipo_id)
+    except Exception:
+        return jsonify({'message': 'equipo_id inválido'}), 400
+    safe_rel = unquote(rel_file).replace('..','').replace('\\','/')
+    # traducir a carpeta por nombre
+    try:
+        rs = db_manager.execute_query("SELECT nombre FROM equipos WHERE id=%s", (eid,))
+        name = rs[0]['nombre'] if rs else str(eid)
+    except Exception:
+        name = str(eid)
+    import re
+    name_sanitized = re.sub(r"\s+", '_', re.sub(r"[^A-Za-z0-9_\- ]+", '', name)).strip()
+    base_dir = os.path.join('imagenes', 'equipos', name_sanitized)
+    abs_path = os.path.abspath(os.path.join(base_dir, safe_rel))
+    if not abs_path.startswith(os.path.abspath(base_dir)):
+        return jsonify({'message': 'Ruta no permitida'}), 400
+    if not os.path.exists(abs_path):
+        return jsonify({'message': 'Archivo no encontrado'}), 404
+    try:
+        with open(abs_path, 'rb') as f:
+            data = f.read()
+        ct = 'image/jpeg' if abs_path.lower().endswith(('.jpg','.jpeg')) else 'image/png'
+        return current_app.response_class(response=data, status=200, mimetype=ct)
+    except Exception as e:
+        return jsonify({'message': f'Error leyendo archivo: {e}'}), 500
+
+def _preprocess_for_orb(img: np.ndarray) -> np.ndarray:
+    try:
+        if img is None:
+            return img
+        h, w = img.shape[:2]
+        maxw = 640
+        if w > maxw:
+            scale = maxw/float(w)
+            img = cv2.resize(img, (int(w*scale), int(h*scale)))
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if len(img.shape)==3 else img
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+        eq = clahe.apply(gray)
+        return eq
+    except Exception:
+        return img
+
+
+def _load_template_images_slim(max_per_key: int = 12):
+    """
+    Carga plantillas SOLO de objetos registrados por admin (si existe reconocer=1),
+    primero desde BD (objetos_imagenes.imagen) y luego desde FS imagenes/objetos/<slug>/...
+    Limita el número de imágenes por objeto para evitar sobrecarga.
+    Devuelve lista de tuplas (key, img_preprocesada_grayscale).
+    """
+    import re, os, cv2, numpy as np
+    templates = []
+    allow = set()
+    # construir allow desde BD si es posible
+    try:
+        rows = db_manager.execute_query("SELECT nombre FROM objetos WHERE reconocer=1") or []
+        allow = { re.sub(r"\s+", '_', re.sub(r"[^a-z0-9_\- ]+", '', (r['nombre'] or '').lower())).strip() for r in rows }
+    except Exception:
+        try:
+            rows = db_manager.execute_query("SELECT nombre FROM objetos") or []
+            allow = { re.sub(r"\s+", '_', re.sub(r"[^a-z0-9_\- ]+", '', (r['nombre'] or '').lower())).strip() for r in rows }
+        except Exception:
+            allow = set()
+
+    counts = {}
+
+    # 1) Desde BD
+    try:
+        rows = db_manager.execute_query("""
+            SELECT o.nombre, oi.imagen
+            FROM objetos_imagenes oi
+            JOIN objetos o ON o.id = oi.objeto_id
+        """) or []
+        for r in rows:
+            nm = (r.get('nombre') or '').lower()
+            key = re.sub(r"\s+", '_', re.sub(r"[^a-z0-9_\- ]+", '', nm)).strip()
+            if allow and key not in allow:
+                continue
+            if counts.get(key, 0) >= max_per_key:
+                continue
+            blob = r.get('imagen')
+            if not blob:
+                continue
+            arr = np.frombuffer(blob, dtype=np.uint8)
+            img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
+            if img is None:
+                continue
+            img = _preprocess_for_orb(img)
+            templates.append((key, img))
+            counts[key] = counts.get(key, 0) + 1
+    except Exception:
+        pass
+
+    # 2) Desde FS: imagenes/objetos/<carpeta>/**
+    try:
+        base = os.path.join(IMG_ROOT, 'objetos')
+        if os.path.isdir(base):
+            for entry in os.listdir(base):
+                folder_path = os.path.join(base, entry)
+                if not os.path.isdir(folder_path):
+                    continue
+                key = re.sub(r"\s+", '_', re.sub(r"[^a-z0-9_\- ]+", '', (entry or '').lower())).strip()
+                if allow and key not in allow:
+                    continue
+                for root, _, files in os.walk(folder_path):
+                    for fn in files:
+                        if not fn.lower().endswith(('.jpg', '.jpeg', '.png')):
+                            continue
+                        if counts.get(key, 0) >= max_per_key:
+                            break
+                        path = os.path.join(root, fn)
+                        img = cv2.imread(path, cv2.IMREAD_COLOR)
+                        if img is None:
+                            continue
+                        img = _preprocess_for_orb(img)
+                        templates.append((key, img))
+                        counts[key] = counts.get(key, 0) + 1
+    except Exception:
+        pass
+
+    # 3) Desde FS: imagenes/equipo/<carpeta>/**
+    try:
+        base_equipo = os.path.join(IMG_ROOT, 'equipo')
+        if os.path.isdir(base_equipo):
+            for entry in os.listdir(base_equipo):
+                folder_path = os.path.join(base_equipo, entry)
+                if not os.path.isdir(folder_path):
+                    continue
+                key = re.sub(r"\s+", '_', re.sub(r"[^a-z0-9_\- ]+", '', (entry or '').lower())).strip()
+                for root, _, files in os.walk(folder_path):
+                    for fn in files:
+                        if not fn.lower().endswith(('.jpg', '.jpeg', '.png')):
+                            continue
+                        if counts.get(key, 0) >= max_per_key:
+                            break
+                        path = os.path.join(root, fn)
+                        img = cv2.imread(path, cv2.IMREAD_COLOR)
+                        if img is None:
+                            continue
+                        img = _preprocess_for_orb(img)
+                        templates.append((key, img))
+                        counts[key] = counts.get(key, 0) + 1
+                        logger_vision.debug("Plantilla cargada: %s desde %s", key, path, extra={'muestra': LOG_MUESTREO_BUCLES})
+    except Exception as e:
+        logger_vision.warning("Error cargando plantillas de equipos: %s", e)
+
+    # 4) Desde FS: imagenes/item/<carpeta>/**
+    try:
+        base_item = os.path.join(IMG_ROOT, 'item')
+        if os.path.isdir(base_item):
+            for entry in os.listdir(base_item):
+                folder_path = os.path.join(base_item, entry)
+                if not os.path.isdir(folder_path):
+                    continue
+                key = re.sub(r"\s+", '_', re.sub(r"[^a-z0-9_\- ]+", '', (entry or '').lower())).strip()
+                for root, _, files in os.walk(folder_path):
+                    for fn in files:
+                        if not fn.lower().endswith(('.jpg', '.jpeg', '.png')):
+                            continue
+                        if counts.get(key, 0) >= max_per_key:
+                            break
+                        path = os.path.join(root, fn)
+                        img = cv2.imread(path, cv2.IMREAD_COLOR)
+                        if img is None:
+                            continue
+                        img = _preprocess_for_orb(img)
+                        templates.append((key, img))
+                        counts[key] = counts.get(key, 0) + 1
+                        logger_vision.debug("Plantilla cargada: %s desde %s", key, path, extra={'muestra': LOG_MUESTREO_BUCLES})
+    except Exception as e:
+        logger_vision.warning("Error cargando plantillas de items: %s", e)
+
+    logger_vision.debug("Total plantillas cargadas: %s", len(templates))
+    return templates
+
+
+# Índice de plantillas ORB en memoria: evita decodificar y preprocesar todas las imágenes
+# en cada /api/vision/match. Se precarga antes del fork de los workers (wsgi.py) para
+# compartirlo por copy-on-write y se reconstruye al invalidarlo. Cada PLANTILLAS_TTL_S sólo
+# se compara una firma (conteos en BD y stat de los archivos, sin decodificar): si no
+# cambió, el worker sigue usando el índice heredado del maestro.
+PLANTILLAS_TTL_S = float(os.getenv('VISION_TEMPLATES_TTL', '300'))
+_indice_plantillas = {'plantillas': None, 'verificado': 0.0, 'max_per_key': None, 'firma': None}
+_indice_plantillas_lock = threading.Lock()
+
+
+def _firma_plantillas():
+    """Firma de las fuentes de _load_template_images_slim: objetos reconocibles, imágenes en BD y archivos"""
+    firma = []
+    for consulta in ("SELECT COUNT(*) AS total, MAX(id) AS ultimo FROM objetos_imagenes",
+                     "SELECT COUNT(*) AS total, MAX(id) AS ultimo FROM objetos WHERE reconocer=1"):
+        try:
+            fila = (db_manager.execute_query(consulta) or [{}])[0]
+            firma.append(f"{fila.get('total')}/{fila.get('ultimo')}")
+        except Exception:
+            firma.append(None)
+    for carpeta in ('objetos', 'equipo', 'item'):
+        total = tamano = modificado = 0
+        for root, _, files in os.walk(os.path.join(IMG_ROOT, carpeta)):
+            for fn in files:
+                if not fn.lower().endswith(('.jpg', '.jpeg', '.png')):
+                    continue
+                try:
+                    st = os.stat(os.path.join(root, fn))
+                except OSError:
+                    continue
+                total += 1
+                tamano += st.st_size
+                modificado = max(modificado, st.st_mtime_ns)
+        firma.append(f'{total}/{tamano}/{modificado}')
+    return firma
+
+
+def obtener_plantillas(max_per_key: int = 12):
+    """Plantillas (key, img) desde el índice en memoria, cargándolas si no hay o cambiaron sus fuentes"""
+    indice = _indice_plantillas
+
+    def vigente():
+        return (indice['plantillas'] is not None and indice['max_per_key'] == max_per_key
+                and time.monotonic() - indice['verificado'] < PLANTILLAS_TTL_S)
+
+    if vigente():
+        return indice['plantillas']
+    with _indice_plantillas_lock:
+        if vigente():
+            return indice['plantillas']
+        firma = _firma_plantillas()
+        if indice['plantillas'] is None or indice['max_per_key'] != max_per_key or indice['firma'] != firma:
+            inicio = time.perf_counter()
+            plantillas = _load_template_images_slim(max_per_key=max_per_key)
+            indice.update(plantillas=plantillas, max_per_key=max_per_key, firma=firma)
+            logger_vision.info("Índice de plantillas cargado: %s plantillas en %.0f ms",
+                               len(plantillas), (time.perf_counter() - inicio) * 1000)
+        indice['verificado'] = time.monotonic()
+        return indice['plantillas']
+
+
+@bus_cambios.suscribir(('objetos', 'plantillas'))
+def invalidar_plantillas(*_evento):
+    """Forzar la recarga del índice en el próximo reconocimiento (suscrito a cambios de objetos/plantillas)"""
+    with _indice_plantillas_lock:
+        _indice_plantillas['plantillas'] = None
+
+
+@bp.get('/api/vision/debug_counts_fast')
+def vision_debug_counts_fast():
+    ...
+    """
+    Recorre imagenes/ y cuenta archivos sin decodificarlos. Responde rápido.
+    """
+    import os
+    report = {'root': IMG_ROOT, 'objetos': {}, 'equipos': {}, 'otros': {}}
+    base = IMG_ROOT
+    if not os.path.isdir(base):
+        return jsonify({'root': IMG_ROOT, 'message': 'IMG_ROOT no existe'}), 200
+
+    def count_dir(d):
+        c = 0
+        for _, _, files in os.walk(d):
+            for fn in files:
+                if fn.lower().endswith(('.jpg', '.jpeg', '.png')):
+                    c += 1
+        return c
+
+    # objetos
+    obj_dir = os.path.join(base, 'objetos')
+    if os.path.isdir(obj_dir):
+        for entry in os.listdir(obj_dir):
+            f = os.path.join(obj_dir, entry)
+            if os.path.isdir(f):
+                report['objetos'][entry] = count_dir(f)
+
+    # equipos
+    eq_dir = os.path.join(base, 'equipos')
+    if os.path.isdir(eq_dir):
+        for entry in os.listdir(eq_dir):
+            f = os.path.join(eq_dir, entry)
+            if os.path.isdir(f):
+                report['equipos'][entry] = count_dir(f)
+
+    # otros
+    for entry in os.listdir(base):
+        if entry in ('objetos','equipos'):
+            continue
+        f = os.path.join(base, entry)
+        if os.path.isdir(f):
+            report['otros'][entry] = count_dir(f)
+
+    # desde BD
+    try:
+        db_rows = db_manager.execute_query("SELECT o.nombre, COUNT(oi.id) c FROM objetos o LEFT JOIN objetos_imagenes oi ON oi.objeto_id=o.id GROUP BY o.id, o.nombre") or []
+        report['objetos_db'] = { r['nombre']: r['c'] for r in db_rows }
+    except Exception:
+        report['objetos_db'] = {}
+
+    return jsonify(report), 200
+
+# =============================
+# ENDPOINTS DE IA AVANZADA
+# =============================
+
+@bp.get('/api/ai/status')
+def ai_status():
+    """Estado del sistema de IA avanzada"""
+    if AI_MANAGER:
+        status = AI_MANAGER.get_ai_status()
+        return jsonify(status), 200
+    else:
+        return jsonify({
+            'ai_available': False,
+            'message': 'Sistema de IA no inicializado'
+        }), 200
+
+
+@bp.post('/api/ai/voice/process')
+def ai_voice_process():
+    """Procesar comando de voz con IA avanzada"""
+    try:
+        verify_jwt_in_request()
+    except Exception:
+        return jsonify({'message': 'Token requerido'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    audio_b64 = data.get('audio_base64')
+    
+    if not audio_b64:
+        return jsonify({'message': 'audio_base64 requerido'}), 400
+    
+    ai_manager = get_ai_manager()
+    if ai_manager and ai_manager.voice_ai_enabled:
+        try:
+            # Decodificar audio
+            if ',' in audio_b64:
+                audio_b64 = audio_b64.split(',')[1]
+            
+            audio_bytes = base64.b64decode(audio_b64)
+            audio_array = np.frombuffer(audio_bytes, dtype=np.int16)
+            
+            # Procesar con IA
+            result = ai_manager.process_voice_command(audio_array)
+            return jsonify(result), 200
+            
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'error': f'Error procesando audio: {str(e)}',
+                'ai_enhanced': True
+            }), 500
+    else:
+        return jsonify({
+            'success': False,
+            'error': 'IA de voz no disponible',
+            'ai_enhanced': False
+        }), 503
+
+
+@bp.post('/api/ai/vision/train')
+def ai_vision_train():
+    """Entrenar modelo de visión personalizado"""
+    try:
+        verify_jwt_or_admin()
+    except Exception:
+        return jsonify({'message': 'Permisos de admin requeridos'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    training_path = data.get('training_data_path', 'training_data')
+    epochs = data.get('epochs', 10)
+    
+    ai_manager = get_ai_manager()
+    if ai_manager and ai_manager.vision_ai_enabled:
+        try:
+            result = ai_manager.train_custom_vision_model(training_path, epochs)
+            return jsonify(result), 200
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'error': f'Error entrenando modelo: {str(e)}'
+            }), 500
+    else:
+        return jsonify({
+            'success': False,
+            'error': 'IA de visión no disponible'
+        }), 503
+
+
+@bp.get('/api/ai/stats')
+def ai_stats():
+    """Estadísticas detalladas del sistema de IA"""
+    try:
+        verify_jwt_in_request()
+    except Exception:
+        return jsonify({'message': 'Token requerido'}), 401
+    
+    if AI_MANAGER:
+        stats = AI_MANAGER.get_ai_status()
+        
+        # Añadir estadísticas adicionales
+        stats['system_info'] = {
+            'ai_modules_available': AI_AVAILABLE,
+            'tensorflow_available': 'tensorflow' in str(type(AI_MANAGER.vision_detector)) if AI_MANAGER.vision_detector else False,
+            'deepspeech_available': 'deepspeech' in str(type(AI_MANAGER.voice_processor)) if AI_MANAGER.voice_processor else False
+        }
+        
+        return jsonify(stats), 200
+    else:
+        return jsonify({
+            'ai_available': False,
+            'message': 'Sistema de IA no disponible'
+        }), 200
+
+
+api.add_resource(VisualTrainingAPI, '/api/visual/training')
+api.add_resource(VisualRecognitionAPI, '/api/visual/recognize')
+api.add_resource(VisualStatsAPI, '/api/visual/stats')
+api.add_resource(VisualManagementAPI, '/api/visual/management')
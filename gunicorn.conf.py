@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Configuración de Gunicorn (pre-fork con hilos)
+Sistema de Laboratorios - Centro Minero SENA
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Cada worker es un proceso con WEB_THREADS hilos (gthread): las peticiones de E/S
+(MySQL, plantillas) se atienden en paralelo dentro del worker y el trabajo de OpenCV,
+que libera el GIL, se reparte entre procesos. La aplicación se carga en el maestro
+(preload_app) antes del fork.
+
+Variables de entorno:
+    WEB_BIND              Dirección de escucha (0.0.0.0:5000)
+    WEB_WORKERS           Procesos worker (núcleos de CPU)
+    WEB_THREADS           Hilos por worker (4); DB_POOL_SIZE debe ser >= WEB_THREADS
+    WEB_TIMEOUT           Segundos antes de reiniciar un worker bloqueado (60)
+    WEB_GRACEFUL_TIMEOUT  Segundos para terminar peticiones en curso al reiniciar (30)
+    WEB_KEEPALIVE         Segundos de keep-alive HTTP (5)
+    WEB_MAX_REQUESTS      Reciclar el worker tras N peticiones, 0 = nunca (1000)
+    OPENCV_THREADS        Hilos internos de OpenCV por worker (1)
+    METRICS_MULTIPROC_DIR Carpeta donde los workers vuelcan sus métricas para que /metrics
+                          devuelva las de todos (/dev/shm/laboratorio_metricas_<puerto>)
+"""
+
+import gc
+import glob
+import multiprocessing
+import os
+import re
+
+bind = os.getenv('WEB_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', '4'))
+timeout = int(os.getenv('WEB_TIMEOUT', '60'))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('WEB_KEEPALIVE', '5'))
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', '1000'))
+max_requests_jitter = max_requests // 10
+preload_app = True
+# Latido de los workers en memoria (evita bloqueos por disco lento en /tmp)
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+accesslog = os.getenv('WEB_ACCESS_LOG') or None
+errorlog = '-'
+
+# El maestro no arranca hilos (logging, escucha de cambios, correo): no sobreviven al fork y
+# podrían dejar locks tomados en los workers. Cada worker los arranca en post_fork.
+os.environ['BACKGROUND_THREADS'] = '0'
+
+# Antes de precargar la aplicación, que lee la variable en create_app; una carpeta por pool
+# (WEB_BIND) para que cada uno exponga sólo sus workers
+os.environ.setdefault('METRICS_MULTIPROC_DIR', os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else '/tmp', 'laboratorio_metricas_' + re.sub(r'\W+', '_', bind)))
+
+
+def on_starting(server):
+    # Archivos de workers de una ejecución anterior
+    for ruta in glob.glob(os.path.join(os.environ['METRICS_MULTIPROC_DIR'], 'metricas_*')):
+        os.remove(ruta)
+
+
+def when_ready(server):
+    # Congelar los objetos ya creados (app, índices): el GC de los workers no los recorre
+    # y las páginas de memoria siguen compartidas tras el fork
+    gc.freeze()
+    server.log.info("Aplicación precargada; %s workers x %s hilos", workers, threads)
+
+
+def post_fork(server, worker):
+    from blueprints.comun import cv2, db_manager
+    from web_app import iniciar_hilos
+
+    # Las conexiones MySQL no sobreviven al fork; los hilos de fondo se arrancan aquí, por
+    # worker, con la configuración de la app precargada (LOG_LEVEL, MAIL_QUEUE)
+    db_manager.reset_after_fork()
+    iniciar_hilos(server.app.wsgi())
+    if cv2.cargado:
+        # Con varios workers x hilos, los hilos internos de OpenCV sólo compiten por CPU
+        cv2.setNumThreads(int(os.getenv('OPENCV_THREADS', '1')))
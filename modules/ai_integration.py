@@ -221,8 +221,12 @@ class AISystemManager:
         
         # Estadísticas de visión
         if self.vision_detector:
+            cache = getattr(self.vision_detector, 'prediction_cache', None)
+            server = getattr(self.vision_detector, 'inference_server', None)
             status['vision_ai']['stats'] = {
-                'cache_size': len(getattr(self.vision_detector, 'prediction_cache', {})),
+                'cache_size': len(cache) if cache is not None else 0,
+                'cache': cache.get_stats() if hasattr(cache, 'get_stats') else {},
+                'inference': server.get_stats() if server is not None else {},
                 'model_initialized': self.vision_detector.is_initialized
             }
         
@@ -270,6 +274,13 @@ class AISystemManager:
                 self.vision_detector.prediction_cache.clear()
             except:
                 pass
+            
+            # Terminar los hilos del servidor de inferencia por lotes
+            if getattr(self.vision_detector, 'inference_server', None) is not None:
+                try:
+                    self.vision_detector.inference_server.close()
+                except Exception as e:
+                    logger.error(f"Error cerrando servidor de inferencia: {e}")
         
         logger.info("Sistema de IA cerrado")
 
@@ -9,26 +9,249 @@ import cv2
 import numpy as np
 import json
 import time
+import hashlib
 import logging
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 import base64
+import copy
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class PredictionCache:
+    """
+    Caché LRU de predicciones con límite de entradas y TTL
+    
+    La clave es un resumen blake2b de la imagen completa. Con key_mode='perceptual' es un
+    dHash de 256 bits: cuadros casi idénticos de una cámara fija comparten la predicción
+    (pequeños cambios de ruido o compresión no cambian la clave).
+    """
+    
+    def __init__(self, max_size=100, ttl=300.0, key_mode='content'):
+        if key_mode not in ('content', 'perceptual'):
+            raise ValueError(f"key_mode inválido: {key_mode}")
+        self.max_size = max_size
+        self.ttl = ttl
+        self.key_mode = key_mode
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+    
+    def key(self, image):
+        """Clave de una imagen (ndarray o base64); None si no se puede calcular"""
+        if isinstance(image, str):
+            if self.key_mode == 'perceptual':
+                return None  # Requiere la imagen decodificada
+            if ',' in image:
+                image = image.split(',', 1)[1]
+            return 'c' + hashlib.blake2b(image.encode('ascii', 'ignore'), digest_size=16).hexdigest()
+        if self.key_mode == 'perceptual':
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+            small = cv2.resize(gray, (17, 16), interpolation=cv2.INTER_AREA)
+            return 'p' + np.packbits(small[:, 1:] > small[:, :-1]).tobytes().hex()
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{image.shape}{image.dtype}".encode())
+        digest.update(np.ascontiguousarray(image).data)
+        return 'c' + digest.hexdigest()
+    
+    def get(self, key):
+        """Predicción guardada (marcada como usada recientemente) o None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] < time.monotonic():
+                del self._entries[key]
+                self.stats['expirations'] += 1
+                entry = None
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[0]
+    
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def get_stats(self):
+        """Aciertos, fallos, desalojos, vencidas, tamaño y tasa de aciertos"""
+        consultas = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'key_mode': self.key_mode,
+            'hit_rate': round(self.stats['hits'] / consultas, 3) if consultas else 0.0
+        }
+
+class BatchQueueFull(RuntimeError):
+    """La cola del servidor de inferencia alcanzó su límite"""
+
+class BatchInferenceServer:
+    """
+    Servidor de inferencia por micro-lotes
+    
+    Las peticiones (una imagen preprocesada cada una) entran a una cola y reciben un Future.
+    Cada hilo trabajador toma la primera petición pendiente, espera hasta `batch_window_ms`
+    a que lleguen más (como mucho `max_batch`) y las ejecuta juntas en una sola invocación.
+    Cada trabajador construye su propio ejecutor con `runner_factory` (un intérprete TFLite
+    no puede usarse desde dos hilos a la vez). Los hilos arrancan con la primera petición
+    del proceso, de modo que el servidor sobrevive al fork de los workers de gunicorn.
+    """
+    
+    def __init__(self, runner_factory, workers=1, max_batch=8, batch_window_ms=5.0, max_queue=256):
+        """
+        Args:
+            runner_factory: Función sin argumentos que devuelve runner(lista de entradas) -> lista de salidas
+            workers: Hilos trabajadores (un ejecutor por hilo)
+            max_batch: Tamaño máximo de lote
+            batch_window_ms: Espera máxima para completar un lote desde que llega su primera petición
+            max_queue: Peticiones pendientes antes de rechazar (BatchQueueFull)
+        """
+        self.runner_factory = runner_factory
+        self.workers = max(1, workers)
+        self.max_batch = max(1, max_batch)
+        self.batch_window = max(0.0, batch_window_ms) / 1000.0
+        self.max_queue = max_queue
+        self._queue = None
+        self._threads = []
+        self._pid = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'rejected': 0, 'batches': 0, 'items': 0, 'errors': 0, 'largest_batch': 0,
+                      'inference_ms': 0.0}
+    
+    def submit(self, item):
+        """Encolar una entrada; devuelve un Future con su salida"""
+        future = Future()
+        cola = self._ensure_started()
+        try:
+            cola.put_nowait((item, future))
+        except queue.Full:
+            self.stats['rejected'] += 1
+            raise BatchQueueFull(f"Cola de inferencia llena ({self.max_queue} pendientes)")
+        self.stats['requests'] += 1
+        return future
+    
+    def infer(self, item, timeout=None):
+        """Encolar y esperar la salida"""
+        return self.submit(item).result(timeout)
+    
+    def _ensure_started(self):
+        if self._pid == os.getpid() and not self._closed:
+            return self._queue
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Servidor de inferencia cerrado")
+            if self._pid != os.getpid():
+                # Primer uso en este proceso (los hilos del padre no existen tras el fork)
+                self._queue = queue.Queue(maxsize=self.max_queue)
+                self._threads = [threading.Thread(target=self._work, args=(self._queue,), daemon=True,
+                                                  name=f'inferencia-lotes-{i}') for i in range(self.workers)]
+                for hilo in self._threads:
+                    hilo.start()
+                self._pid = os.getpid()
+        return self._queue
+    
+    def _work(self, cola):
+        try:
+            runner = self.runner_factory()
+        except Exception as e:
+            logger.error(f"No se pudo crear el ejecutor de inferencia: {e}")
+            runner = None
+        while True:
+            primero = cola.get()
+            if primero is None:
+                break
+            lote = [primero]
+            limite = time.monotonic() + self.batch_window
+            while len(lote) < self.max_batch:
+                restante = limite - time.monotonic()
+                try:
+                    siguiente = cola.get(timeout=restante) if restante > 0 else cola.get_nowait()
+                except queue.Empty:
+                    break
+                if siguiente is None:
+                    cola.put(None)  # Aviso de cierre para después de este lote
+                    break
+                lote.append(siguiente)
+            self._run(runner, lote)
+    
+    def _run(self, runner, lote):
+        activos = [(item, future) for item, future in lote if future.set_running_or_notify_cancel()]
+        if not activos:
+            return
+        inicio = time.perf_counter()
+        try:
+            if runner is None:
+                raise RuntimeError("Ejecutor de inferencia no disponible")
+            salidas = runner([item for item, _ in activos])
+            if len(salidas) != len(activos):
+                raise RuntimeError(f"El ejecutor devolvió {len(salidas)} salidas para {len(activos)} entradas")
+        except Exception as e:
+            self.stats['errors'] += 1
+            for _, future in activos:
+                future.set_exception(e)
+            return
+        self.stats['batches'] += 1
+        self.stats['items'] += len(activos)
+        self.stats['largest_batch'] = max(self.stats['largest_batch'], len(activos))
+        self.stats['inference_ms'] += (time.perf_counter() - inicio) * 1000
+        for (_, future), salida in zip(activos, salidas):
+            future.set_result(salida)
+    
+    def close(self, timeout=5.0):
+        """Terminar los trabajadores después de atender lo ya encolado"""
+        with self._lock:
+            self._closed = True
+            if self._pid != os.getpid():
+                return
+            for _ in self._threads:
+                self._queue.put(None)
+        for hilo in self._threads:
+            hilo.join(timeout)
+    
+    def get_stats(self):
+        """Peticiones, lotes, tamaño medio de lote y tiempo de inferencia"""
+        lotes = self.stats['batches']
+        return {
+            **self.stats,
+            'inference_ms': round(self.stats['inference_ms'], 1),
+            'avg_batch': round(self.stats['items'] / lotes, 2) if lotes else 0.0,
+            'pending': self._queue.qsize() if self._pid == os.getpid() else 0,
+            'workers': self.workers
+        }
+
 class TensorFlowObjectDetector:
     """
     Detector de objetos usando TensorFlow/TensorFlow Lite
     Optimizado para equipos de laboratorio
     """
     
-    def __init__(self, model_path=None, labels_path=None, use_lite=True):
+    def __init__(self, model_path=None, labels_path=None, use_lite=True, cache_size=100, cache_ttl=300.0,
+                 cache_key_mode='content', interpreters=1, interpreter_threads=1, max_batch=8, batch_window_ms=5.0,
+                 inference_timeout=10.0):
         self.model_path = model_path or 'models/lab_equipment_model.tflite'
         self.labels_path = labels_path or 'models/lab_equipment_labels.txt'
         self.use_lite = use_lite
-        self.interpreter = None
         self.labels = []
         self.input_details = None
         self.output_details = None
@@ -39,28 +262,41 @@ class TensorFlowObjectDetector:
         self.confidence_threshold = 0.5
         self.nms_threshold = 0.4
         
-        # Cache para mejorar rendimiento
-        self.prediction_cache = {}
-        self.cache_max_size = 100
+        # Cache para mejorar rendimiento (LRU con TTL, clave por contenido de la imagen)
+        self.prediction_cache = PredictionCache(cache_size, cache_ttl, cache_key_mode)
+        
+        # Inferencia por micro-lotes: pool de intérpretes, cada uno con num_threads hilos
+        self.interpreters = interpreters
+        self.interpreter_threads = interpreter_threads
+        self.max_batch = max_batch
+        self.batch_window_ms = batch_window_ms
+        self.inference_timeout = inference_timeout
+        self.inference_server = None
+        self._tflite = None
         
     def initialize(self):
         """Inicializar el modelo TensorFlow"""
+        # Las predicciones guardadas y los intérpretes del pool son del modelo anterior
+        self.prediction_cache.clear()
+        if self.inference_server is not None:
+            self.inference_server.close()
+            self.inference_server = None
         try:
             if self.use_lite:
                 import tflite_runtime.interpreter as tflite
+                self._tflite = tflite
                 
                 if not os.path.exists(self.model_path):
                     logger.warning(f"Modelo no encontrado: {self.model_path}")
                     return self._initialize_fallback_model()
                 
-                # Cargar modelo TensorFlow Lite
+                # Validar el modelo y leer sus detalles de entrada y salida; sin allocate_tensors
+                # y sin guardarlo: cada trabajador del pool crea y reserva su propio intérprete
                 logger.info("Cargando modelo TensorFlow Lite...")
-                self.interpreter = tflite.Interpreter(model_path=self.model_path)
-                self.interpreter.allocate_tensors()
-                
-                # Obtener detalles de entrada y salida
-                self.input_details = self.interpreter.get_input_details()
-                self.output_details = self.interpreter.get_output_details()
+                interpreter = tflite.Interpreter(model_path=self.model_path)
+                self.input_details = interpreter.get_input_details()
+                self.output_details = interpreter.get_output_details()
+                del interpreter
                 
             else:
                 import tensorflow as tf
@@ -71,6 +307,13 @@ class TensorFlowObjectDetector:
             # Cargar etiquetas
             self._load_labels()
             
+            self.inference_server = BatchInferenceServer(
+                self._create_batch_runner,
+                workers=self.interpreters if self.use_lite else 1,
+                max_batch=self.max_batch,
+                batch_window_ms=self.batch_window_ms
+            )
+            
             self.is_initialized = True
             logger.info("TensorFlow inicializado correctamente")
             return True
@@ -181,11 +424,24 @@ class TensorFlowObjectDetector:
             return None
         
         try:
+            # La clave perceptual se calcula sobre la imagen decodificada
+            if isinstance(image, str) and self.prediction_cache.key_mode == 'perceptual':
+                image = self._decode_base64_image(image)
+                if image is None:
+                    return None
+            
             # Verificar cache
             image_hash = self._get_image_hash(image)
-            if image_hash in self.prediction_cache:
-                logger.info("Usando predicción desde cache")
-                return self.prediction_cache[image_hash]
+            cached = self.prediction_cache.get(image_hash) if image_hash is not None else None
+            if cached is not None:
+                logger.debug("Usando predicción desde cache")
+                # Copia profunda: quien recibe el resultado puede modificar sus listas sin tocar la cache
+                return dict(copy.deepcopy(cached), cached=True)
+            
+            if isinstance(image, str):
+                image = self._decode_base64_image(image)
+                if image is None:
+                    return None
             
             # Preprocesar imagen
             processed_image = self.preprocess_image(image)
@@ -208,7 +464,8 @@ class TensorFlowObjectDetector:
                 results['inference_time'] = inference_time
                 
                 # Guardar en cache
-                self._update_cache(image_hash, results)
+                if image_hash is not None:
+                    self._update_cache(image_hash, results)
             
             logger.info(f"Detección completada en {inference_time:.3f}s")
             return results
@@ -218,19 +475,9 @@ class TensorFlowObjectDetector:
             return None
     
     def _run_tensorflow_inference(self, processed_image):
-        """Ejecutar inferencia con TensorFlow"""
+        """Ejecutar inferencia con TensorFlow (agrupada en lotes con las peticiones concurrentes)"""
         try:
-            if self.use_lite:
-                # TensorFlow Lite
-                self.interpreter.set_tensor(self.input_details[0]['index'], processed_image)
-                self.interpreter.invoke()
-                
-                # Obtener predicciones
-                predictions = self.interpreter.get_tensor(self.output_details[0]['index'])[0]
-                
-            else:
-                # TensorFlow completo
-                predictions = self.model.predict(processed_image)[0]
+            predictions = self.inference_server.infer(processed_image[0], timeout=self.inference_timeout)
             
             # Procesar predicciones
             results = self._process_predictions(predictions)
@@ -240,6 +487,42 @@ class TensorFlowObjectDetector:
             logger.error(f"Error en inferencia TensorFlow: {e}")
             return None
     
+    def _create_batch_runner(self):
+        """Ejecutor de lotes de un hilo del servidor de inferencia (con su propio intérprete)"""
+        if not self.use_lite:
+            # Keras: un solo trabajador usa el modelo cargado
+            return lambda batch: list(self.model.predict(np.stack(batch), verbose=0))
+        
+        interpreter = self._tflite.Interpreter(model_path=self.model_path, num_threads=self.interpreter_threads)
+        interpreter.allocate_tensors()
+        input_detail = interpreter.get_input_details()[0]
+        output_index = interpreter.get_output_details()[0]['index']
+        state = {'batch': int(input_detail['shape'][0]), 'resizable': True}
+        
+        def run(batch):
+            data = np.stack(batch)
+            if state['resizable'] and len(batch) != state['batch']:
+                try:
+                    interpreter.resize_tensor_input(input_detail['index'], [len(batch), *input_detail['shape'][1:]])
+                    interpreter.allocate_tensors()
+                    state['batch'] = len(batch)
+                except (ValueError, RuntimeError) as e:
+                    # Modelo exportado con lote fijo: una invocación por imagen en este intérprete
+                    logger.info(f"El modelo no admite lotes variables ({e}); se invoca por imagen")
+                    state['resizable'] = False
+            if state['batch'] == len(batch):
+                interpreter.set_tensor(input_detail['index'], data)
+                interpreter.invoke()
+                return list(interpreter.get_tensor(output_index))
+            outputs = []
+            for sample in data:
+                interpreter.set_tensor(input_detail['index'], sample[np.newaxis])
+                interpreter.invoke()
+                outputs.append(interpreter.get_tensor(output_index)[0])
+            return outputs
+        
+        return run
+    
     def _process_predictions(self, predictions):
         """Procesar predicciones del modelo"""
         try:
@@ -284,24 +567,18 @@ class TensorFlowObjectDetector:
             return None
     
     def _get_image_hash(self, image):
-        """Generar hash de imagen para cache"""
+        """Generar clave de cache de la imagen completa (None = no cachear)"""
         try:
-            if isinstance(image, str):
-                return hash(image[:100])  # Hash de primeros 100 chars si es base64
-            else:
-                return hash(image.tobytes()[:1000])  # Hash de primeros 1000 bytes
-        except:
-            return hash(str(time.time()))
+            return self.prediction_cache.key(image)
+        except Exception as e:
+            logger.warning(f"No se pudo calcular la clave de cache: {e}")
+            return None
     
     def _update_cache(self, image_hash, results):
         """Actualizar cache de predicciones"""
         try:
-            if len(self.prediction_cache) >= self.cache_max_size:
-                # Eliminar entrada más antigua
-                oldest_key = next(iter(self.prediction_cache))
-                del self.prediction_cache[oldest_key]
-            
-            self.prediction_cache[image_hash] = results
+            # Se guarda una copia: el objeto devuelto al llamador no comparte nada con la cache
+            self.prediction_cache.put(image_hash, copy.deepcopy(results))
             
         except Exception as e:
             logger.error(f"Error actualizando cache: {e}")
@@ -585,7 +862,15 @@ def initialize_advanced_vision(img_root_path):
         models_dir.mkdir(exist_ok=True)
         
         # Inicializar detector
-        detector = TensorFlowObjectDetector()
+        detector = TensorFlowObjectDetector(
+            cache_size=int(os.getenv('VISION_CACHE_SIZE', '100')),
+            cache_ttl=float(os.getenv('VISION_CACHE_TTL', '300')),
+            cache_key_mode=os.getenv('VISION_CACHE_KEY', 'content'),
+            interpreters=int(os.getenv('VISION_INTERPRETERS', '1')),
+            interpreter_threads=int(os.getenv('VISION_INTERPRETER_THREADS', '1')),
+            max_batch=int(os.getenv('VISION_BATCH_MAX', '8')),
+            batch_window_ms=float(os.getenv('VISION_BATCH_WINDOW_MS', '5'))
+        )
         
         if not detector.initialize():
             logger.warning("Fallback a detección básica")
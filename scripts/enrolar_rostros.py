@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Enrolamiento facial masivo desde una carpeta o un archivo ZIP/TAR
+
+Uso: py -3.11 scripts/enrolar_rostros.py fotos_ficha_2567890/
+     py -3.11 scripts/enrolar_rostros.py cohorte.zip --procesos 4 --reporte rechazos.json
+
+Cada imagen debe llamarse con el id del usuario (1098765432.jpg; varias fotos del mismo
+usuario: 1098765432__2.jpg). Los workers en ejecución toman los rostros nuevos al vencer
+FACIAL_INDEX_TTL.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+from utils.base_datos import DatabaseManager
+from utils.enrolamiento_facial import EnrolamientoFacial, ErrorEnrolamiento
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Enrolamiento facial masivo')
+    parser.add_argument('origen', help='Carpeta o archivo .zip/.tar/.tar.gz con las fotos')
+    parser.add_argument('--procesos', type=int, default=None, help='Procesos del pool (por defecto, núcleos disponibles)')
+    parser.add_argument('--lote', type=int, default=200, help='Usuarios por transacción')
+    parser.add_argument('--calidad-minima', type=float, default=float(os.getenv('FACIAL_MIN_QUALITY', '35')))
+    parser.add_argument('--reporte', help='Guardar el resultado completo (con rechazos) en este JSON')
+    args = parser.parse_args()
+
+    load_dotenv('.env_produccion')
+    enrolamiento = EnrolamientoFacial(DatabaseManager(), procesos=args.procesos, tamano_lote=args.lote,
+                                      calidad_minima=args.calidad_minima,
+                                      max_encodings_usuario=int(os.getenv('FACIAL_MAX_ENCODINGS', '5')))
+    try:
+        resultado = enrolamiento.enrolar(args.origen)
+    except ErrorEnrolamiento as e:
+        print(f"❌ {e}")
+        return 1
+
+    print(f"📷 Imágenes: {resultado['total_imagenes']} | aceptadas: {resultado['aceptadas']} | "
+          f"rechazadas: {resultado['rechazadas']}")
+    print(f"👥 Usuarios registrados: {resultado['usuarios_registrados']} en {resultado['lotes']} lotes "
+          f"({resultado['con_encoding']} encodings, calidad media {resultado['calidad_media']})")
+    print(f"⏱️  {resultado['duracion_s']} s con {resultado['procesos']} procesos")
+    for rechazo in resultado['rechazos'][:20]:
+        print(f"   - {rechazo['archivo']}: {rechazo['motivo']}")
+    if resultado['rechazadas'] > 20:
+        print(f"   ... y {resultado['rechazadas'] - 20} más")
+    if args.reporte:
+        with open(args.reporte, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        print(f"📝 Reporte guardado en {args.reporte}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
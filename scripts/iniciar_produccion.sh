@@ -0,0 +1,11 @@
+#!/bin/bash
+# Inicio en producción (Linux) con Gunicorn: workers pre-fork con hilos (ver gunicorn.conf.py)
+# Uso: scripts/iniciar_produccion.sh [grupos]   p. ej. "vision,facial" para un pool dedicado
+cd "$(dirname "$0")/.." || exit 1
+if [ -f .venv/bin/activate ]; then
+    source .venv/bin/activate
+fi
+if [ -n "$1" ]; then
+    export APP_BLUEPRINTS="$1"
+fi
+exec gunicorn -c gunicorn.conf.py wsgi:application
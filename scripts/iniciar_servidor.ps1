@@ -78,7 +78,9 @@ switch ($Modo.ToLower()) {
         Write-Host "Presione Ctrl+C para detener" -ForegroundColor Gray
         Write-Host ""
         
-        gunicorn -w $Workers -b "${HostAddress}:${Puerto}" wsgi:application
+        $env:WEB_WORKERS = "$Workers"
+        $env:WEB_BIND = "${HostAddress}:${Puerto}"
+        gunicorn -c gunicorn.conf.py wsgi:application
     }
     
     "development" {
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de la caché LRU de predicciones del detector de visión (no requiere MySQL ni TensorFlow)
+"""
+
+import base64
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+import pytest
+
+from benchmarks.datos_sinteticos import imagen_sintetica
+from modules.vision_ai_module import PredictionCache, TensorFlowObjectDetector
+
+
+def test_lru_por_uso_reciente_y_ttl():
+    cache = PredictionCache(max_size=2, ttl=60)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # 'a' pasa a ser la más reciente
+    cache.put('c', 3)
+    assert cache.get('b') is None and cache.get('a') == 1 and cache.get('c') == 3
+
+    vencida = PredictionCache(ttl=0.05)
+    vencida.put('a', 1)
+    time.sleep(0.1)
+    assert vencida.get('a') is None and len(vencida) == 0
+    assert cache.get_stats()['evictions'] == 1 and vencida.get_stats()['expirations'] == 1
+    assert cache.get_stats()['hit_rate'] == 0.75
+
+    with pytest.raises(ValueError):
+        PredictionCache(key_mode='md5')
+
+
+def test_clave_por_contenido_completo_y_perceptual():
+    cache = PredictionCache()
+    cuadro = np.full((480, 640, 3), 90, np.uint8)
+    otro = cuadro.copy()
+    otro[-1, -1] = 0  # Difiere sólo en el último píxel
+    assert cache.key(cuadro) == cache.key(cuadro.copy())
+    assert cache.key(cuadro) != cache.key(otro)
+    b64 = base64.b64encode(cv2.imencode('.png', cuadro)[1].tobytes()).decode()
+    assert cache.key(b64) == cache.key('data:image/png;base64,' + b64)
+
+    perceptual = PredictionCache(key_mode='perceptual')
+    escena = imagen_sintetica(3, 640)
+    ruido = np.clip(escena.astype(np.int16) + np.random.default_rng(0).integers(-2, 3, escena.shape), 0, 255)
+    assert perceptual.key(escena) == perceptual.key(ruido.astype(np.uint8))
+    assert perceptual.key(escena) != perceptual.key(imagen_sintetica(4, 640))
+    assert perceptual.key(b64) is None
+
+
+def test_detector_reutiliza_la_prediccion_de_la_misma_imagen():
+    detector = TensorFlowObjectDetector(model_path='no_existe.tflite', cache_size=10)
+    detector.initialize()
+    escena = imagen_sintetica(5, 320)
+    b64 = base64.b64encode(cv2.imencode('.png', escena)[1].tobytes()).decode()
+
+    primera = detector.detect_objects(b64)
+    assert primera is not None and 'cached' not in primera
+    segunda = detector.detect_objects(b64)
+    assert segunda['cached'] and segunda['confidence'] == primera['confidence']
+    segunda['message'] = 'modificado'
+    assert detector.detect_objects(b64)['message'] == primera['message']
+
+    distinta = escena.copy()
+    distinta[-10:] = 0
+    assert 'cached' not in detector.detect_objects(distinta)
+    assert detector.prediction_cache.get_stats()['hits'] == 2 and len(detector.prediction_cache) == 2
+
+    detector.initialize()
+    assert len(detector.prediction_cache) == 0
+
+
+def test_modificar_un_resultado_no_altera_la_cache():
+    detector = TensorFlowObjectDetector(model_path='no_existe.tflite', cache_size=10)
+    detector.initialize()
+    detector.fallback_classifier.classify = lambda imagen: {
+        'detected': True, 'detections': [{'class': 'taladro', 'bbox': [1, 2, 3, 4]}]}
+    escena = imagen_sintetica(6, 320)
+
+    primera = detector.detect_objects(escena)
+    primera['detections'][0]['class'] = 'modificado'
+    primera['detections'].append({'class': 'extra'})
+    segunda = detector.detect_objects(escena)
+    assert segunda['cached'] and segunda['detections'] == [{'class': 'taladro', 'bbox': [1, 2, 3, 4]}]
+
+    segunda['detections'][0]['bbox'][0] = 99
+    assert detector.detect_objects(escena)['detections'][0]['bbox'] == [1, 2, 3, 4]
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de la caché de vistas calculadas (no requiere MySQL ni Redis)
+"""
+
+import os
+import sys
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.cache_sistema import CacheSistema, deserializar, serializar
+
+
+class ConfiguracionFalsa:
+    """Sólo responde a la lectura de configuracion_sistema"""
+
+    def __init__(self, valores):
+        self.valores = valores
+        self.lecturas = 0
+
+    def execute_query(self, query, params=None):
+        self.lecturas += 1
+        return [{'clave': k, 'valor': v} for k, v in self.valores.items()]
+
+
+class AlmacenMemoria:
+    """Almacén compartido en memoria con la interfaz de AlmacenMySQL/AlmacenRedis"""
+
+    nombre = 'memoria'
+
+    def __init__(self):
+        self.datos = {}
+
+    def obtener(self, clave):
+        return self.datos.get(clave)
+
+    def guardar(self, clave, tipo, valor, ttl, etiquetas):
+        self.datos[clave] = deserializar(serializar({'v': valor, 'e': sorted(etiquetas)}))
+
+    def invalidar(self, *etiquetas):
+        self.datos = {c: d for c, d in self.datos.items() if not set(etiquetas) & set(d['e'])}
+
+    def vaciar(self):
+        self.datos.clear()
+
+
+def test_decorador_aciertos_fallos_y_etiquetas():
+    cache = CacheSistema()
+    llamadas = []
+
+    @cache.cacheado('equipos_por_lab', ttl=60, etiquetas=lambda lab: ('equipos', f'laboratorio:{lab}'))
+    def equipos_por_lab(lab):
+        llamadas.append(lab)
+        return [{'lab': lab}]
+
+    assert equipos_por_lab(1) == equipos_por_lab(1) == [{'lab': 1}]
+    equipos_por_lab(2)
+    assert llamadas == [1, 2]
+
+    cache.invalidar('laboratorio:1')
+    equipos_por_lab(1)
+    equipos_por_lab(2)
+    assert llamadas == [1, 2, 1]
+
+    equipos_por_lab.invalidar()
+    equipos_por_lab(2)
+    assert llamadas == [1, 2, 1, 2]
+
+    stats = cache.estadisticas()
+    assert stats['aciertos_local'] == 2 and stats['fallos'] == 4
+    assert stats['por_nombre']['equipos_por_lab'] == {'aciertos': 2, 'fallos': 4}
+
+
+def test_lru_expulsa_la_menos_usada():
+    cache = CacheSistema(max_entradas=2)
+    cache.guardar('a', 1, 60, ('t',))
+    cache.guardar('b', 2, 60)
+    cache.obtener('a')
+    cache.guardar('c', 3, 60)
+    assert cache.obtener('b') == (False, None)
+    assert cache.obtener('a') == (True, 1)
+    assert cache.estadisticas()['expulsiones'] == 1
+    cache.invalidar('t')
+    assert cache.obtener('a') == (False, None)
+
+
+def test_ttl_desde_configuracion_sistema():
+    db = ConfiguracionFalsa({'cache_equipos_disponibles': '120', 'cache_reportes_diarios': '0'})
+    cache = CacheSistema(db)
+    assert cache.ttl('cache_equipos_disponibles') == 120
+    assert cache.ttl('cache_inventario_critico') == 600  # valor por defecto
+    assert cache.ttl('cache_reportes_diarios') == 0
+    assert db.lecturas == 1
+
+    llamadas = []
+
+    @cache.cacheado('reportes', ttl_config='cache_reportes_diarios')
+    def reportes():
+        llamadas.append(1)
+        return {}
+
+    reportes()
+    reportes()
+    assert len(llamadas) == 2  # TTL 0: desactivada
+
+
+def test_almacen_compartido_entre_workers():
+    almacen = AlmacenMemoria()
+    worker_a = CacheSistema(almacen=almacen)
+    worker_b = CacheSistema(almacen=almacen)
+    valor = [{'fecha': datetime(2025, 10, 1, 8, 30), 'dia': date(2025, 10, 1),
+              'costo': Decimal('12.50'), 'duracion': timedelta(hours=2)}]
+
+    worker_a.guardar('k', valor, 300, ('inventario',), 'vista')
+    assert worker_b.obtener('k') == (True, valor)
+    assert worker_b.estadisticas()['aciertos_compartido'] == 1
+
+    worker_b.invalidar('inventario')
+    assert almacen.datos == {}
+    assert worker_b.obtener('k') == (False, None)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas del contexto de autorización y la caché de usuarios (no requiere MySQL)
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify, session
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required
+
+from utils.contexto_auth import CacheUsuarios, contexto_actual, token_revocado
+from utils.eventos_cambio import BusCambios
+
+
+class UsuariosFalsos:
+    """Tabla usuarios en memoria que cuenta las consultas"""
+
+    def __init__(self):
+        self.filas = {'U1': {'id': 'U1', 'nombre': 'Ana', 'tipo': 'admin', 'nivel_acceso': 4, 'activo': 1},
+                      'U2': {'id': 'U2', 'nombre': 'Luis', 'tipo': 'aprendiz', 'nivel_acceso': 1, 'activo': 1}}
+        self.consultas = 0
+
+    def execute_query(self, query, params=None):
+        self.consultas += 1
+        fila = self.filas.get(params[0])
+        return [dict(fila)] if fila else []
+
+
+def _app():
+    db = UsuariosFalsos()
+    usuarios = CacheUsuarios(db, ttl_s=60)
+    bus = BusCambios()
+    bus.suscribir(('usuario:*', 'usuarios'), usuarios.al_cambiar)
+
+    app = Flask(__name__)
+    app.secret_key = 'prueba'
+    app.config['JWT_SECRET_KEY'] = 'prueba-jwt-con-longitud-suficiente-32b'
+    jwt = JWTManager(app)
+    jwt.token_in_blocklist_loader(lambda cabecera, datos: token_revocado(usuarios, datos))
+
+    @app.route('/entrar/<user_id>')
+    def entrar(user_id):
+        session['user_id'] = user_id
+        session['user_level'] = 1
+        return 'ok'
+
+    @app.route('/yo')
+    def yo():
+        contexto = contexto_actual(usuarios)
+        assert contexto_actual(usuarios) is contexto
+        return jsonify({'id': contexto.user_id, 'nivel': contexto.nivel, 'origen': contexto.origen,
+                        'admin': contexto.es_admin, 'revocado': contexto.revocado,
+                        'nivel_sesion': session.get('user_level')})
+
+    @app.route('/api/protegida')
+    @jwt_required()
+    def protegida():
+        return jsonify({'id': contexto_actual(usuarios).user_id})
+
+    return app, db, usuarios, bus
+
+
+def test_cache_con_ttl_ausencias_e_invalidacion():
+    db = UsuariosFalsos()
+    usuarios = CacheUsuarios(db, ttl_s=60)
+    assert usuarios.obtener('U1')['nivel_acceso'] == 4
+    assert usuarios.obtener('U1')['nivel_acceso'] == 4
+    assert usuarios.obtener('X9') is None
+    assert usuarios.obtener('X9') is None
+    assert db.consultas == 2
+
+    usuarios.al_cambiar(['usuario:U1', 'usuarios'])
+    usuarios.obtener('U1')
+    usuarios.obtener('X9')
+    assert db.consultas == 3
+    usuarios.al_cambiar(['usuarios'])
+    usuarios.obtener('X9')
+    assert db.consultas == 4
+
+
+def test_sesion_con_nivel_actualizado_y_revocacion_inmediata():
+    app, db, usuarios, bus = _app()
+    cliente = app.test_client()
+    cliente.get('/entrar/U1')
+
+    datos = cliente.get('/yo').get_json()
+    assert datos == {'id': 'U1', 'nivel': 4, 'origen': 'sesion', 'admin': True, 'revocado': False,
+                     'nivel_sesion': 4}
+    cliente.get('/yo')
+    assert db.consultas == 1
+
+    db.filas['U1']['activo'] = 0
+    bus.cambio('usuario', 'U1')
+    datos = cliente.get('/yo').get_json()
+    assert datos['id'] is None and datos['revocado'] is True
+    with cliente.session_transaction() as s:
+        assert 'user_id' not in s
+
+
+def test_jwt_de_usuario_inactivo_se_rechaza():
+    app, db, usuarios, bus = _app()
+    with app.app_context():
+        token = create_access_token(identity='U2', additional_claims={'nivel': 1})
+    cabeceras = {'Authorization': f'Bearer {token}'}
+    cliente = app.test_client()
+
+    respuesta = cliente.get('/api/protegida', headers=cabeceras)
+    assert respuesta.status_code == 200 and respuesta.get_json() == {'id': 'U2'}
+    assert cliente.get('/yo', headers=cabeceras).get_json()['origen'] == 'jwt'
+
+    db.filas['U2']['activo'] = 0
+    bus.cambio('usuario', 'U2')
+    assert cliente.get('/api/protegida', headers=cabeceras).status_code == 401
+    assert cliente.get('/yo', headers=cabeceras).get_json()['id'] is None
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de la cola de correo saliente contra un servidor SMTP local (no requiere MySQL)
+"""
+
+import os
+import socketserver
+import sys
+import threading
+from email import message_from_bytes
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from utils.correo_saliente import ColaCorreo, LimiteCorreoExcedido, RemitenteSMTP
+
+
+class ManejadorSMTP(socketserver.StreamRequestHandler):
+    """SMTP mínimo: EHLO/MAIL/RCPT/DATA/NOOP/RSET/QUIT, sin TLS ni autenticación"""
+
+    def responder(self, linea):
+        self.wfile.write(linea.encode() + b'\r\n')
+
+    def handle(self):
+        servidor = self.server
+        servidor.conexiones += 1
+        self.responder('220 local SMTP')
+        destinatarios = []
+        while True:
+            linea = self.rfile.readline()
+            if not linea:
+                return
+            comando = linea.decode().strip()
+            verbo = comando.split(' ', 1)[0].upper()
+            if verbo in ('EHLO', 'HELO'):
+                self.responder('250 local')
+            elif verbo == 'MAIL':
+                destinatarios = []
+                self.responder('250 OK')
+            elif verbo == 'RCPT':
+                direccion = comando.split(':', 1)[1].strip().strip('<>')
+                codigo = servidor.rechazos.get(direccion)
+                if codigo:
+                    self.responder(f'{codigo} rechazado')
+                else:
+                    destinatarios.append(direccion)
+                    self.responder('250 OK')
+            elif verbo == 'DATA':
+                self.responder('354 fin con .')
+                datos = b''
+                while True:
+                    linea = self.rfile.readline()
+                    if linea in (b'.\r\n', b''):
+                        break
+                    datos += linea
+                servidor.recibidos.append((destinatarios, message_from_bytes(datos)))
+                self.responder('250 aceptado')
+                if servidor.cerrar_tras_envio:
+                    return
+            elif verbo in ('NOOP', 'RSET'):
+                self.responder('250 OK')
+            elif verbo == 'QUIT':
+                self.responder('221 adiós')
+                return
+            else:
+                self.responder('502 no implementado')
+
+
+class ServidorSMTP(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), ManejadorSMTP)
+        self.conexiones = 0
+        self.recibidos = []
+        self.rechazos = {}
+        self.cerrar_tras_envio = False
+
+
+class AlmacenMemoria:
+    """Cola en memoria con la interfaz de AlmacenCorreoMySQL"""
+
+    def __init__(self):
+        self.filas = []
+
+    def crear_tabla(self):
+        pass
+
+    def insertar(self, destinatario, asunto, html, texto):
+        self.filas.append({'id': len(self.filas) + 1, 'destinatario': destinatario, 'asunto': asunto,
+                           'html': html, 'texto': texto, 'estado': 'pendiente', 'intentos': 0, 'espera': 0})
+
+    def recientes(self, destinatario, ventana_s):
+        return sum(1 for f in self.filas if f['destinatario'] == destinatario and f['estado'] != 'fallido')
+
+    def reclamar(self, token, lote, bloqueo_s):
+        listos = [f for f in self.filas if f['estado'] == 'pendiente' and f['espera'] == 0][:lote]
+        for f in listos:
+            f['estado'] = 'enviando'
+        return [dict(f) for f in listos]
+
+    def _fila(self, correo_id):
+        return self.filas[correo_id - 1]
+
+    def marcar_enviado(self, correo_id):
+        self._fila(correo_id).update(estado='enviado', intentos=self._fila(correo_id)['intentos'] + 1)
+
+    def reprogramar(self, correo_id, intentos, espera_s, error):
+        self._fila(correo_id).update(estado='pendiente', intentos=intentos, espera=espera_s, error=error)
+
+    def marcar_fallido(self, correo_id, intentos, error):
+        self._fila(correo_id).update(estado='fallido', intentos=intentos, error=error)
+
+    def resumen(self):
+        estados = {}
+        for f in self.filas:
+            estados[f['estado']] = estados.get(f['estado'], 0) + 1
+        return estados
+
+
+@pytest.fixture
+def servidor():
+    srv = ServidorSMTP()
+    hilo = threading.Thread(target=srv.serve_forever, daemon=True)
+    hilo.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def _cola(servidor, **opciones):
+    remitente = RemitenteSMTP('127.0.0.1', servidor.server_address[1], tls='none', remitente='lab@sena.edu.co')
+    return ColaCorreo(AlmacenMemoria(), remitente, **opciones)
+
+
+def test_lote_por_una_sola_conexion(servidor):
+    cola = _cola(servidor, limite_destinatario=0)
+    for i in range(3):
+        cola.almacen.insertar(f'aprendiz{i}@sena.edu.co', 'Código', f'<p>Hola <b>{i}</b></p>', None)
+
+    assert cola.vaciar() == 3
+    assert servidor.conexiones == 1
+    destinatarios, msg = servidor.recibidos[0]
+    assert destinatarios == ['aprendiz0@sena.edu.co']
+    assert msg['From'] == 'Centro Minero SENA <lab@sena.edu.co>'
+    assert msg.get_content_type() == 'multipart/alternative'
+    assert 'Hola 0' in msg.get_payload()[0].get_payload()
+    assert cola.almacen.resumen() == {'enviado': 3}
+    cola.remitente.cerrar()
+
+
+def test_reintento_con_espera_y_rechazo_permanente(servidor):
+    servidor.rechazos = {'lleno@sena.edu.co': 452, 'noexiste@sena.edu.co': 550}
+    cola = _cola(servidor, espera_base_s=30)
+    cola.almacen.insertar('lleno@sena.edu.co', 'A', '<p>a</p>', None)
+    cola.almacen.insertar('noexiste@sena.edu.co', 'B', '<p>b</p>', None)
+    cola.almacen.insertar('ok@sena.edu.co', 'C', '<p>c</p>', None)
+
+    cola.procesar_lote()
+    temporal, permanente, enviado = cola.almacen.filas
+    assert temporal['estado'] == 'pendiente' and temporal['intentos'] == 1 and temporal['espera'] == 30
+    assert permanente['estado'] == 'fallido'
+    assert enviado['estado'] == 'enviado'
+    assert cola.espera_reintento(3) == 120
+    assert cola.stats['reintentos'] == 1 and cola.stats['fallidos'] == 1
+    cola.remitente.cerrar()
+
+
+def test_reconecta_si_el_servidor_cierra(servidor):
+    servidor.cerrar_tras_envio = True
+    cola = _cola(servidor, limite_destinatario=0)
+    cola.almacen.insertar('a@sena.edu.co', 'A', '<p>a</p>', None)
+    cola.almacen.insertar('b@sena.edu.co', 'B', '<p>b</p>', None)
+
+    cola.vaciar()
+    assert cola.almacen.resumen() == {'enviado': 2}
+    assert cola.remitente.stats['reconexiones'] == 1
+
+
+def test_limite_por_destinatario(servidor):
+    cola = _cola(servidor, limite_destinatario=2)
+    cola.encolar('a@sena.edu.co', 'A', '<p>1</p>')
+    cola.encolar('a@sena.edu.co', 'A', '<p>2</p>')
+    with pytest.raises(LimiteCorreoExcedido):
+        cola.encolar('a@sena.edu.co', 'A', '<p>3</p>')
+    cola.encolar('b@sena.edu.co', 'B', '<p>1</p>')
+    assert len(cola.almacen.filas) == 3 and cola.stats['limitados'] == 1
+    # Encolar no arranca el hilo de envío: eso queda para iniciar() (MAIL_QUEUE)
+    assert not cola.estadisticas()['hilo_activo'] and cola.almacen.resumen() == {'pendiente': 3}
+    cola.vaciar()
+    assert cola.almacen.resumen() == {'enviado': 3}
+    cola.remitente.cerrar()
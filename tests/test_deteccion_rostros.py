@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de la detección de rostros reducida y con seguimiento de ROI (no requiere MySQL)
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from benchmarks.datos_sinteticos import rostro_sintetico
+from utils.deteccion_rostros import DetectorRostros, detectar_escalado, ventana_roi
+
+
+def _cuadro_720p(x=700, y=200, tamano=320):
+    cuadro = np.full((720, 1280), 200, np.uint8)
+    cuadro[y:y + tamano, x:x + tamano] = cv2.cvtColor(rostro_sintetico(7, tamano), cv2.COLOR_BGR2GRAY)
+    return cuadro
+
+
+def _iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    return ix * iy / float(aw * ah + bw * bh - ix * iy)
+
+
+def test_cajas_reducidas_en_coordenadas_originales():
+    cuadro = _cuadro_720p()
+    completas = detectar_escalado(cuadro, 0)
+    reducidas = detectar_escalado(cuadro, 480)
+    assert len(completas) == 1 and len(reducidas) == 1
+    assert _iou(completas[0], reducidas[0]) > 0.7
+    x, y, w, h = reducidas[0]
+    assert 650 < x < 800 and 150 < y < 300
+
+
+def test_seguimiento_de_roi_y_regreso_al_cuadro_completo():
+    detector = DetectorRostros(ancho_deteccion=480)
+    cuadro = _cuadro_720p()
+    cajas, modo, roi = detector.detectar(cuadro)
+    assert modo == 'completa' and len(cajas) == 1 and roi['cuadro'] == [1280, 720]
+
+    cajas_roi, modo, roi = detector.detectar(cuadro, roi)
+    assert modo == 'roi' and _iou(cajas[0], cajas_roi[0]) > 0.7
+
+    # El rostro se movió fuera de la ventana: se busca en el cuadro completo
+    movido = _cuadro_720p(x=60, y=300)
+    cajas, modo, roi = detector.detectar(movido, roi)
+    assert modo == 'completa' and len(cajas) == 1 and cajas[0][0] < 300
+    assert detector.stats['roi_aciertos'] == 1 and detector.stats['roi_fallos'] == 1
+
+
+def test_roi_sobre_un_rostro_no_oculta_a_otra_persona():
+    detector = DetectorRostros(ancho_deteccion=480)
+    _, _, roi = detector.detectar(_cuadro_720p())
+
+    # Entra una segunda persona fuera de la ventana del ROI
+    cuadro = _cuadro_720p()
+    cuadro[300:620, 60:380] = _cuadro_720p(x=60, y=300)[300:620, 60:380]
+    x0, y0, x1, y1 = ventana_roi(roi['caja'], 1280, 720)
+    assert x0 > 380
+    cajas, modo, roi = detector.detectar(cuadro, roi)
+    assert len(cajas) == 2 and modo == 'completa' and roi is None
+    assert detector.stats['roi_multiples'] == 1 and detector.stats['roi_aciertos'] == 0
+
+
+def test_roi_vencido_o_de_otro_tamano_se_ignora():
+    detector = DetectorRostros(ancho_deteccion=480, roi_ttl_s=5)
+    cuadro = _cuadro_720p()
+    _, _, roi = detector.detectar(cuadro)
+    assert detector.detectar(cuadro, dict(roi, t=time.time() - 60))[1] == 'completa'
+    assert detector.detectar(cuadro, dict(roi, cuadro=[640, 480]))[1] == 'completa'
+    assert detector.detectar(cuadro, {'caja': 'basura'})[1] == 'completa'
+    assert DetectorRostros(seguimiento=False).detectar(cuadro)[2] is None
+    assert ventana_roi((10, 10, 100, 100), 1280, 720) == (0, 0, 160, 160)
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas del registro de detectores OpenCV (no requiere MySQL)
+"""
+
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import pytest
+
+from benchmarks.datos_sinteticos import rostro_sintetico
+from utils.detectores import RegistroDetectores, detectores
+
+
+def test_una_instancia_por_hilo_reutilizada():
+    registro = RegistroDetectores()
+    registro.registrar('orb', lambda: cv2.ORB_create(nfeatures=100))
+    principal = registro.obtener('orb')
+    assert registro.obtener('orb') is principal
+
+    otros = []
+    hilo = threading.Thread(target=lambda: otros.extend([registro.obtener('orb'), registro.obtener('orb')]))
+    hilo.start()
+    hilo.join()
+    assert otros[0] is otros[1] and otros[0] is not principal
+    assert registro.estadisticas()['creados'] == 2 and registro.estadisticas()['reutilizados'] == 2
+
+
+def test_compartido_por_proceso_y_reinicio_tras_fork():
+    registro = RegistroDetectores()
+    registro.registrar('flann', object, por_hilo=False)
+    compartido = registro.obtener('flann')
+    resultado = []
+    hilo = threading.Thread(target=lambda: resultado.append(registro.obtener('flann')))
+    hilo.start()
+    hilo.join()
+    assert resultado == [compartido]
+
+    registro._pid = -1  # Simula el primer uso en un worker recién creado
+    assert registro.obtener('flann') is not compartido
+
+    with pytest.raises(KeyError):
+        registro.obtener('sift')
+
+
+def test_clasificador_haar_compartido_detecta_rostro():
+    gris = cv2.cvtColor(rostro_sintetico(7), cv2.COLOR_BGR2GRAY)
+    clasificador = detectores.obtener('rostros_haar')
+    assert detectores.obtener('rostros_haar') is clasificador
+    assert len(clasificador.detectMultiScale(gris, scaleFactor=1.1, minNeighbors=5, minSize=(100, 100))) == 1
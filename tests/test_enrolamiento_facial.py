@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas del enrolamiento facial masivo (no requiere MySQL)
+"""
+
+import io
+import os
+import sys
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+import pytest
+
+from benchmarks.datos_sinteticos import rostro_sintetico
+from utils.enrolamiento_facial import (EnrolamientoFacial, ErrorEnrolamiento, iterar_imagenes, procesar_imagen,
+                                       usuario_desde_archivo)
+
+
+class CursorFalso:
+    def __init__(self, db):
+        self.db = db
+
+    def executemany(self, sql, filas):
+        if 'rostro_data' in sql and any(usuario == self.db.falla_con for _, usuario in filas):
+            raise RuntimeError('fallo simulado')
+        self.db.pendientes.append((sql, list(filas)))
+
+    def close(self):
+        pass
+
+
+class ConexionFalsa:
+    def __init__(self, db):
+        self.db = db
+
+    def start_transaction(self):
+        self.db.pendientes = []
+
+    def cursor(self):
+        return CursorFalso(self.db)
+
+    def commit(self):
+        self.db.transacciones.append(self.db.pendientes)
+
+    def rollback(self):
+        self.db.pendientes = []
+
+    def close(self):
+        pass
+
+
+class BaseFalsa:
+    def __init__(self, usuarios, falla_con=None):
+        self.usuarios = usuarios
+        self.falla_con = falla_con
+        self.transacciones = []
+        self.pendientes = []
+
+    def execute_query(self, query, params=None):
+        return [{'id': u} for u in self.usuarios] if 'FROM usuarios' in query else []
+
+    def get_connection(self):
+        return ConexionFalsa(self)
+
+
+def procesar_falso(tarea):
+    """La 'imagen' es el texto '<calidad>' o 'nada' (sin rostro)"""
+    nombre, fuente, calidad_minima = tarea
+    contenido = fuente.decode()
+    if contenido == 'nada':
+        return {'archivo': nombre, 'calidad': 0.0, 'plantilla': None, 'encoding': None,
+                'motivo': 'No se detectó ningún rostro'}
+    calidad = float(contenido)
+    return {'archivo': nombre, 'calidad': calidad, 'plantilla': contenido.encode(), 'encoding': [calidad] * 128,
+            'motivo': None if calidad >= calidad_minima else 'Calidad insuficiente'}
+
+
+def _zip(archivos):
+    datos = io.BytesIO()
+    with zipfile.ZipFile(datos, 'w') as z:
+        for nombre, contenido in archivos.items():
+            z.writestr(nombre, contenido)
+    datos.seek(0)
+    return datos
+
+
+def test_usuario_desde_archivo():
+    assert usuario_desde_archivo('fotos/1098765432.JPG') == '1098765432'
+    assert usuario_desde_archivo('ficha\\MON_001__2.png') == 'MON_001'
+    assert usuario_desde_archivo('lista.csv') is None
+    assert usuario_desde_archivo('.oculto.jpg') is None
+
+
+def test_iterar_zip_y_carpeta(tmp_path):
+    archivo = _zip({'cohorte/U1.jpg': b'a', '__MACOSX/cohorte/._U1.jpg': b'x', 'leeme.txt': b't', 'U2.png': b'b' * 50})
+    entradas = list(iterar_imagenes(archivo, 'cohorte.zip', max_bytes=10))
+    assert entradas == [('cohorte/U1.jpg', b'a'), ('U2.png', None)]
+
+    (tmp_path / 'sub').mkdir()
+    (tmp_path / 'sub' / 'U3.jpeg').write_bytes(b'c')
+    (tmp_path / 'notas.txt').write_text('x')
+    assert list(iterar_imagenes(str(tmp_path))) == [(os.path.join('sub', 'U3.jpeg'), str(tmp_path / 'sub' / 'U3.jpeg'))]
+
+
+def test_enrolar_elige_la_mejor_foto_y_escribe_por_lotes():
+    db = BaseFalsa(['U1', 'U2', 'U3'])
+    archivo = _zip({'U1.jpg': b'50', 'u1__2.jpg': b'80', 'U2.jpg': b'nada', 'U3.jpg': b'10', 'U3__2.jpg': b'60',
+                    'X9.jpg': b'90'})
+    enrolamiento = EnrolamientoFacial(db, procesos=0, tamano_lote=1, calidad_minima=35, procesar=procesar_falso)
+    resultado = enrolamiento.enrolar(archivo, 'cohorte.zip')
+
+    assert resultado['total_imagenes'] == 6
+    assert resultado['aceptadas'] == 3 and resultado['usuarios_registrados'] == 2 and resultado['lotes'] == 2
+    assert {(r['archivo'], r['motivo']) for r in resultado['rechazos']} == {
+        ('U2.jpg', 'No se detectó ningún rostro'), ('U3.jpg', 'Calidad insuficiente'), ('X9.jpg', 'Usuario no existe')}
+    rostros = [fila for t in db.transacciones for sql, filas in t if 'rostro_data' in sql for fila in filas]
+    assert sorted(rostros) == [(b'60', 'U3'), (b'80', 'U1')]
+    encodings = [fila for t in db.transacciones for sql, filas in t if 'INSERT INTO usuarios_facial' in sql
+                 for fila in filas]
+    assert len(encodings) == 3
+
+
+def test_lote_fallido_se_reintenta_por_usuario():
+    db = BaseFalsa(['U1', 'U2', 'U3'], falla_con='U2')
+    archivo = _zip({'U1.jpg': b'50', 'U2.jpg': b'60', 'U3.jpg': b'70'})
+    resultado = EnrolamientoFacial(db, procesos=0, procesar=procesar_falso).enrolar(archivo, 'cohorte.zip')
+    assert resultado['usuarios_registrados'] == 2
+    assert resultado['rechazos'] == [{'archivo': 'U2.jpg', 'usuario_id': 'U2',
+                                      'motivo': 'Error guardando en base de datos: fallo simulado'}]
+
+
+def test_tope_de_imagenes_aborta_sin_escribir():
+    db = BaseFalsa(['U1', 'U2', 'U3'])
+    archivo = _zip({'U1.jpg': b'50', 'U2.jpg': b'60', 'U3.jpg': b'70'})
+    enrolamiento = EnrolamientoFacial(db, procesos=0, procesar=procesar_falso, max_imagenes=2)
+    with pytest.raises(ErrorEnrolamiento, match='scripts/enrolar_rostros.py'):
+        enrolamiento.enrolar(archivo, 'cohorte.zip')
+    assert db.transacciones == []
+
+
+def test_pool_de_procesos_rechaza_imagenes_sin_rostro():
+    vacia = cv2.imencode('.jpg', np.full((300, 300, 3), 128, np.uint8))[1].tobytes()
+    archivo = _zip({'U1.jpg': vacia, 'U2.jpg': b'no es una imagen'})
+    resultado = EnrolamientoFacial(BaseFalsa(['U1', 'U2']), procesos=2).enrolar(archivo, 'cohorte.zip')
+    assert resultado['procesos'] == 2 and resultado['usuarios_registrados'] == 0
+    assert {r['motivo'] for r in resultado['rechazos']} == {'No se detectó ningún rostro', 'Imagen ilegible'}
+    assert procesar_imagen(('U1.jpg', vacia, 35))['motivo'] == 'No se detectó ningún rostro'
+
+
+def test_procesar_imagen_con_rostro():
+    foto = cv2.imencode('.jpg', rostro_sintetico(3, 480))[1].tobytes()
+    resultado = procesar_imagen(('U1.jpg', foto, 35))
+    assert resultado['motivo'] is None and resultado['calidad'] >= 35
+    plantilla = cv2.imdecode(np.frombuffer(resultado['plantilla'], np.uint8), cv2.IMREAD_COLOR)
+    assert plantilla.shape == (200, 200, 3)
+    assert procesar_imagen(('U1.jpg', foto, 99))['motivo'].startswith('Calidad insuficiente')
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de la notificación de cambios (no requiere MySQL ni Redis)
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.cache_sistema import CacheSistema
+from utils.eventos_cambio import BusCambios, etiquetas_cambio
+
+
+def test_etiquetas_de_entidad_y_coleccion():
+    assert etiquetas_cambio('equipo', 'EQ-1') == ['equipo:EQ-1', 'equipos']
+    assert etiquetas_cambio('laboratorio', None) == ['laboratorios']
+    assert etiquetas_cambio('inventario', 7, 8) == ['inventario:7', 'inventario:8', 'inventario']
+
+
+def test_suscriptores_por_patron():
+    bus = BusCambios()
+    recibidos = []
+    bus.suscribir('equipo:*', lambda etiquetas, remoto: recibidos.append(('entidad', etiquetas)))
+    bus.suscribir(('objetos', 'plantillas'), lambda etiquetas, remoto: recibidos.append(('vision', etiquetas)))
+
+    bus.cambio('equipo', 'EQ-1', extra=['plantillas'])
+    bus.cambio('reserva', 'R-1')
+    assert recibidos == [('entidad', ['equipo:EQ-1']), ('vision', ['plantillas'])]
+    assert bus.stats['eventos'] == 2 and bus.stats['entregas'] == 2
+
+
+def test_un_suscriptor_fallido_no_bloquea_a_los_demas():
+    bus = BusCambios()
+    recibidos = []
+
+    @bus.suscribir('*')
+    def falla(etiquetas, remoto):
+        raise RuntimeError('caído')
+
+    bus.suscribir('usuarios', lambda etiquetas, remoto: recibidos.append(etiquetas))
+    bus.cambio('usuario', 'U1')
+    assert recibidos == [['usuarios']]
+    assert bus.stats['errores'] == 1
+
+
+def test_cache_suscrita_se_invalida_por_entidad():
+    bus = BusCambios()
+    cache = CacheSistema()
+    bus.suscribir('*', lambda etiquetas, remoto: cache.invalidar(*etiquetas, solo_local=remoto))
+    llamadas = []
+
+    @cache.cacheado('laboratorio_detalle', ttl=300, etiquetas=lambda lab_id: (f'laboratorio:{lab_id}',))
+    def detalle(lab_id):
+        llamadas.append(lab_id)
+        return {'id': lab_id}
+
+    detalle(1)
+    detalle(2)
+    bus.cambio('laboratorio', 1)
+    detalle(1)
+    detalle(2)
+    assert llamadas == [1, 2, 1]
+
+
+def test_comando_de_voz_invalida_los_reportes(monkeypatch):
+    from blueprints import crud
+    from blueprints.comun import bus_cambios
+    from web_app import create_app
+
+    recibidos = []
+    monkeypatch.setattr(crud.db_manager, 'execute_query', lambda query, params=None: None)
+    monkeypatch.setattr(bus_cambios, '_suscriptores', list(bus_cambios._suscriptores))
+    bus_cambios.suscribir('comandos_voz', lambda etiquetas, remoto: recibidos.append(etiquetas))
+
+    app = create_app({'MAIL_QUEUE': '0', 'REQUEST_PROFILER': '0'}, grupos=['crud'])
+    respuesta = app.test_client().post('/api/voz/comando', json={'comando': 'ir a inventario'})
+    assert respuesta.status_code == 200 and recibidos == [['comandos_voz']]
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de la exportación masiva y de DatabaseManager.stream_query/iter_query (no requiere MySQL)
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+from datetime import datetime
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from utils.base_datos import DatabaseManager
+from utils.exportacion_datos import ErrorExportacion, construir_consulta, generar_exportacion
+
+COLUMNAS = ('id', 'nombre', 'costo', 'fecha_registro')
+
+
+class ConexionFalsa:
+    """Cursor no bufferizado que entrega `filas` con fetchmany y registra lo que se cierra"""
+
+    def __init__(self, filas, columnas=COLUMNAS):
+        self.filas = list(filas)
+        self.columnas = columnas
+        self.eventos = []
+        self.consultas = []
+
+    def cursor(self, dictionary=False, named_tuple=False, buffered=True):
+        conexion = self
+
+        class Cursor:
+            description = None
+
+            def execute(self, sql, params=None):
+                conexion.consultas.append((sql, params))
+                self.description = [(c, None) for c in conexion.columnas]
+                self._pendientes = list(conexion.filas)
+
+            def fetchmany(self, tamano):
+                bloque, self._pendientes = self._pendientes[:tamano], self._pendientes[tamano:]
+                conexion.eventos.append(('fetchmany', len(bloque)))
+                if dictionary:
+                    return [dict(zip(conexion.columnas, fila)) for fila in bloque]
+                return bloque
+
+            def close(self):
+                conexion.eventos.append('cursor_cerrado')
+        return Cursor()
+
+    def close(self):
+        self.eventos.append('devuelta')
+
+
+def _gestor(conexion):
+    db = DatabaseManager()
+    db.get_connection = lambda: conexion
+    return db
+
+
+def _filas(n):
+    return [(i, f'Equipo {i}', Decimal('10.50'), datetime(2025, 3, 1, 8, i % 60)) for i in range(1, n + 1)]
+
+
+def test_filtros_de_laboratorio_y_fechas():
+    sql, parametros = construir_consulta('reservas', laboratorio='LAB-01', desde='2025-03-01', hasta='2025-03-31')
+    assert 'e.laboratorio_id = %s OR e.laboratorio_id IN (SELECT id FROM laboratorios WHERE codigo = %s)' in sql
+    assert 'r.fecha_inicio >= %s AND r.fecha_inicio < %s' in sql and sql.endswith('ORDER BY r.fecha_inicio')
+    # hasta es inclusivo: el límite es el día siguiente
+    assert parametros == ('LAB-01', 'LAB-01', datetime(2025, 3, 1), datetime(2025, 4, 1))
+
+    sql, parametros = construir_consulta('equipos')
+    assert 'WHERE' not in sql and parametros == ()
+    with pytest.raises(ErrorExportacion):
+        construir_consulta('usuarios')
+    with pytest.raises(ErrorExportacion):
+        construir_consulta('equipos', desde='01/03/2025')
+    with pytest.raises(ErrorExportacion):
+        generar_exportacion(_gestor(ConexionFalsa([])), 'equipos', formato='xml')
+
+
+def test_csv_vacio_lleva_encabezado():
+    conexion = ConexionFalsa([])
+    datos = b''.join(generar_exportacion(_gestor(conexion), 'equipos', desde='2030-01-01'))
+    assert datos.decode('utf-8').splitlines() == [','.join(COLUMNAS)]
+    assert conexion.consultas[0][1] == (datetime(2030, 1, 1),)
+    assert conexion.eventos[-2:] == ['cursor_cerrado', 'devuelta']
+
+
+def test_csv_y_ndjson_por_bloques():
+    conexion = ConexionFalsa(_filas(5))
+    texto = b''.join(generar_exportacion(_gestor(conexion), 'equipos', tamano_bloque=2)).decode('utf-8')
+    filas = list(csv.reader(io.StringIO(texto)))
+    assert filas[0] == list(COLUMNAS) and len(filas) == 6
+    assert filas[1] == ['1', 'Equipo 1', '10.50', '2025-03-01T08:01:00']
+    assert [e for e in conexion.eventos if e[0] == 'fetchmany'] == [('fetchmany', 2)] * 2 + [('fetchmany', 1),
+                                                                                              ('fetchmany', 0)]
+
+    texto = b''.join(generar_exportacion(_gestor(ConexionFalsa(_filas(3))), 'equipos', formato='ndjson'))
+    registros = [json.loads(linea) for linea in texto.decode('utf-8').splitlines()]
+    assert len(registros) == 3
+    assert registros[2] == {'id': 3, 'nombre': 'Equipo 3', 'costo': '10.50', 'fecha_registro': '2025-03-01T08:03:00'}
+    assert b''.join(generar_exportacion(_gestor(ConexionFalsa([])), 'equipos', formato='ndjson')) == b''
+
+
+def test_gzip_al_vuelo_se_descomprime_igual():
+    plano = b''.join(generar_exportacion(_gestor(ConexionFalsa(_filas(300))), 'equipos', tamano_buffer=1024))
+    partes = list(generar_exportacion(_gestor(ConexionFalsa(_filas(300))), 'equipos', comprimir=True,
+                                      tamano_buffer=1024))
+    assert len(partes) > 1 and gzip.decompress(b''.join(partes)) == plano
+    vacio = b''.join(generar_exportacion(_gestor(ConexionFalsa([])), 'equipos', comprimir=True))
+    assert gzip.decompress(vacio).decode('utf-8').strip() == ','.join(COLUMNAS)
+
+
+def test_descarga_abandonada_cierra_cursor_y_conexion():
+    conexion = ConexionFalsa(_filas(50))
+    generador = generar_exportacion(_gestor(conexion), 'equipos', tamano_bloque=5, tamano_buffer=64)
+    next(generador)
+    assert 'devuelta' not in conexion.eventos
+    generador.close()
+    # Cerrada a mitad de la tabla, sin leer el resto de las filas
+    assert conexion.eventos[-2:] == ['cursor_cerrado', 'devuelta'] and ('fetchmany', 0) not in conexion.eventos
+
+
+def test_stream_query_e_iter_query():
+    conexion = ConexionFalsa(_filas(5))
+    db = _gestor(conexion)
+    bloques = list(db.stream_query('SELECT * FROM equipos', chunk_size=2, row_type='tuple', with_columns=True))
+    assert bloques[0] == COLUMNAS and [len(b) for b in bloques[1:]] == [2, 2, 1]
+    assert conexion.eventos[-2:] == ['cursor_cerrado', 'devuelta']
+
+    filas = list(db.iter_query('SELECT * FROM equipos', chunk_size=2))
+    assert [f['id'] for f in filas] == [1, 2, 3, 4, 5] and filas[0]['nombre'] == 'Equipo 1'
+
+    # El llamador deja de leer a mitad: la conexión vuelve al pool al cerrar el generador
+    conexion = ConexionFalsa(_filas(5))
+    iterador = _gestor(conexion).iter_query('SELECT * FROM equipos', chunk_size=2)
+    assert next(iterador)['id'] == 1
+    iterador.close()
+    assert conexion.eventos == [('fetchmany', 2), 'cursor_cerrado', 'devuelta']
+
+    with pytest.raises(ValueError):
+        next(db.stream_query('SELECT 1', row_type='lista'))
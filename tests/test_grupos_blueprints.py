@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de create_app: pools con sólo algunos grupos de blueprints e hilos de fondo (no requiere MySQL)
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import render_template
+
+from utils import registro_log
+from web_app import create_app, iniciar_hilos
+
+CONFIG = {'MAIL_QUEUE': '0', 'REQUEST_PROFILER': '0', 'SESSION_BACKEND': 'cookie'}
+ADMIN = {'user_id': 'U1', 'user_name': 'Ana', 'user_type': 'admin', 'user_level': 4}
+
+
+def _dashboard(app):
+    with app.test_request_context('/dashboard'):
+        return render_template('dashboard.html', stats={}, user=ADMIN)
+
+
+def test_pool_sin_crud_renderiza_las_paginas_de_nucleo():
+    app = create_app(dict(CONFIG), grupos=['vision', 'facial'])
+    assert app.jinja_env.globals['grupos_montados'] == ['nucleo', 'vision', 'facial']
+
+    respuesta = app.test_client().get('/no-existe')
+    assert respuesta.status_code == 404 and b'/dashboard' in respuesta.data
+    html = _dashboard(app)
+    assert '/laboratorios' not in html and '/reportes' not in html and '/logout' in html
+
+
+def test_todos_los_grupos_enlazan_sus_paginas():
+    html = _dashboard(create_app(dict(CONFIG)))
+    assert '/laboratorios' in html and '/reportes' in html and '/backup' in html
+
+
+def test_sin_hilos_de_fondo_hasta_iniciar_hilos(monkeypatch):
+    from blueprints.comun import cola_correo
+    arranques = []
+    monkeypatch.setattr(cola_correo, 'iniciar', lambda: arranques.append(1))
+
+    # Maestro de gunicorn con preload_app: nada de hilos antes del fork
+    app = create_app(dict(CONFIG, MAIL_QUEUE='1', BACKGROUND_THREADS='0'), grupos=['nucleo'])
+    assert registro_log._listener is None and arranques == []
+
+    # post_fork en cada worker, con la configuración de la app
+    iniciar_hilos(app)
+    assert registro_log._listener is not None and arranques == [1]
+    iniciar_hilos(create_app(dict(CONFIG, BACKGROUND_THREADS='0'), grupos=['nucleo']))
+    assert arranques == [1]
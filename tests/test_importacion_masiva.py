@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de lectura y validación de la importación masiva (no requiere MySQL)
+"""
+
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.importacion_masiva import leer_filas_csv, validar_fila, normalizar_encabezado
+
+LABORATORIOS = {'1': 1, 'LAB-QUI': 1, '2': 2}
+
+
+def test_csv_con_punto_y_coma():
+    """El separador ';' (Excel en español) se detecta automáticamente"""
+    contenido = "Nombre;Tipo;Laboratorio Código\nMicroscopio;optico;LAB-QUI\n;;\nBalanza;medicion;2\n"
+    filas = list(leer_filas_csv(io.BytesIO(contenido.encode('utf-8'))))
+    assert len(filas) == 2
+    assert filas[0]['nombre'] == 'Microscopio'
+    assert filas[0]['laboratorio_id'] == 'LAB-QUI'
+
+
+def test_normalizar_encabezado():
+    assert normalizar_encabezado(' Cantidad Mínima ') == 'cantidad_minima'
+    assert normalizar_encabezado('Stock') == 'cantidad_actual'
+
+
+def test_validar_equipo_valido():
+    valores, errores = validar_fila('equipos', {'nombre': 'Centrífuga', 'tipo': 'separacion', 'laboratorio_id': 'lab-qui'}, LABORATORIOS)
+    assert errores == []
+    assert valores['laboratorio_id'] == 1
+    assert valores['estado'] == 'disponible'
+    assert valores['id'].startswith('EQ-')
+
+
+def test_validar_equipo_errores_por_fila():
+    valores, errores = validar_fila('equipos', {'nombre': '', 'tipo': 'x', 'laboratorio_id': '99', 'estado': 'roto'}, LABORATORIOS)
+    assert valores is None
+    assert len(errores) == 3
+
+
+def test_validar_inventario_conversiones():
+    fila = {'nombre': 'Etanol', 'laboratorio_id': '1', 'cantidad_actual': '10', 'costo_unitario': '12,50',
+            'fecha_vencimiento': '31/12/2026'}
+    valores, errores = validar_fila('inventario', fila, LABORATORIOS)
+    assert errores == []
+    assert valores['cantidad_actual'] == 10
+    assert str(valores['costo_unitario']) == '12.50'
+    assert valores['fecha_vencimiento'].year == 2026
+    assert valores['id'].startswith('INV-')
+
+
+def test_validar_inventario_cantidad_invalida():
+    valores, errores = validar_fila('inventario', {'nombre': 'Etanol', 'laboratorio_id': '1', 'cantidad_actual': 'diez'}, LABORATORIOS)
+    assert valores is None
+    assert 'cantidad_actual' in errores[0]
+
+
+if __name__ == '__main__':
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
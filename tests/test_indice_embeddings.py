@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas del índice de embeddings faciales (no requiere MySQL)
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from utils.indice_embeddings import IndiceEmbeddings
+
+
+def _filas(usuarios=50, por_usuario=3, semilla=7):
+    rng = np.random.default_rng(semilla)
+    filas = []
+    for u in range(usuarios):
+        centro = rng.normal(size=128)
+        for _ in range(por_usuario):
+            filas.append((f'U{u}', centro + rng.normal(scale=0.05, size=128)))
+    return filas
+
+
+def test_busqueda_vectorizada_igual_a_fuerza_bruta():
+    filas = _filas()
+    indice = IndiceEmbeddings.desde_filas(filas)
+    consulta = filas[10][1] + 0.01
+
+    esperadas = np.array([np.linalg.norm(np.asarray(v, dtype=np.float32) - consulta) for _, v in filas])
+    assert np.allclose(indice.distancias(consulta), esperadas, atol=1e-3)
+
+    mejor = {}
+    for (usuario, _), d in zip(filas, esperadas):
+        mejor[usuario] = min(d, mejor.get(usuario, np.inf))
+    top = sorted(mejor.items(), key=lambda par: par[1])[:5]
+    resultado = indice.buscar(consulta, k=5)
+    assert [u for u, _ in resultado] == [u for u, _ in top]
+    assert resultado[0][0] == 'U3'
+
+
+def test_varios_encodings_por_usuario_no_repiten_en_el_top_k():
+    filas = _filas(usuarios=4, por_usuario=10)
+    indice = IndiceEmbeddings.desde_filas(filas)
+    resultado = indice.buscar(filas[0][1], k=3)
+    assert len(resultado) == 3
+    assert len({u for u, _ in resultado}) == 3
+    assert indice.usuarios == {'U0', 'U1', 'U2', 'U3'}
+
+
+def test_guardar_y_cargar_con_firma(tmp_path):
+    firma = {'filas': 150, 'ultimo_id': 150, 'actualizado': '2025-10-01 08:30:00'}
+    indice = IndiceEmbeddings.desde_filas(_filas(), firma=firma)
+    ruta = str(tmp_path / 'cache' / 'embeddings.npz')
+    indice.guardar(ruta)
+
+    cargado = IndiceEmbeddings.cargar(ruta)
+    assert cargado.firma == firma
+    assert cargado.matriz.dtype == np.float32 and cargado.matriz.shape == (150, 128)
+    assert cargado.buscar(indice.matriz[42], k=1) == indice.buscar(indice.matriz[42], k=1)
+    assert IndiceEmbeddings.cargar(str(tmp_path / 'no_existe.npz')) is None
+
+
+def test_desde_filas_descarta_encodings_invalidos():
+    vector = np.ones(128)
+    indice = IndiceEmbeddings.desde_filas([
+        ('U1', json.dumps(vector.tolist())),
+        ('U2', [1.0, 2.0, 3.0]),
+        ('U3', 'no es json'),
+        (7, vector),
+    ])
+    assert list(indice.ids) == ['U1', '7']
+    assert IndiceEmbeddings().buscar(vector) == []
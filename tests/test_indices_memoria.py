@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de la verificación por firma de los índices de rostros y plantillas (no requiere MySQL)
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from blueprints import facial, vision
+
+
+class TablaFalsa:
+    """execute_query que devuelve la fila de firma actual"""
+
+    def __init__(self, fila):
+        self.fila = fila
+
+    def execute_query(self, query, params=None):
+        return [dict(self.fila)]
+
+
+@pytest.fixture
+def rostros(monkeypatch):
+    tabla = TablaFalsa({'total': 2, 'suma': 123})
+    cargas = []
+    monkeypatch.setattr(facial, 'db_manager', tabla)
+    monkeypatch.setattr(facial, '_cargar_indice_rostros', lambda: cargas.append(1) or [{'id': len(cargas)}])
+    monkeypatch.setattr(facial, 'ROSTROS_TTL_S', 0)
+    monkeypatch.setattr(facial, '_indice_rostros', {'usuarios': None, 'verificado': 0.0, 'firma': None})
+    return tabla, cargas
+
+
+def test_rostros_solo_se_reconstruyen_si_cambia_la_firma(rostros):
+    tabla, cargas = rostros
+    primero = facial.indice_rostros()
+    assert facial.indice_rostros() is primero and len(cargas) == 1
+
+    tabla.fila = {'total': 3, 'suma': 456}
+    assert facial.indice_rostros() is not primero and len(cargas) == 2
+
+    facial.invalidar_indice_rostros()
+    facial.indice_rostros()
+    assert len(cargas) == 3
+
+
+def test_plantillas_solo_se_reconstruyen_si_cambian_sus_fuentes(monkeypatch, tmp_path):
+    cargas = []
+    monkeypatch.setattr(vision, 'db_manager', TablaFalsa({'total': 1, 'ultimo': 7}))
+    monkeypatch.setattr(vision, 'IMG_ROOT', str(tmp_path))
+    monkeypatch.setattr(vision, '_load_template_images_slim',
+                        lambda max_per_key: cargas.append(max_per_key) or [('taladro', len(cargas))])
+    monkeypatch.setattr(vision, 'PLANTILLAS_TTL_S', 0)
+    monkeypatch.setattr(vision, '_indice_plantillas',
+                        {'plantillas': None, 'verificado': 0.0, 'max_per_key': None, 'firma': None})
+    carpeta = tmp_path / 'objetos' / 'taladro'
+    carpeta.mkdir(parents=True)
+    (carpeta / 'a.jpg').write_bytes(b'jpg')
+
+    primero = vision.obtener_plantillas()
+    assert vision.obtener_plantillas() is primero and cargas == [12]
+
+    (carpeta / 'b.jpg').write_bytes(b'jpg')
+    assert vision.obtener_plantillas() is not primero and len(cargas) == 2
+    vision.obtener_plantillas(max_per_key=4)
+    assert cargas[-1] == 4
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas del servidor de inferencia por micro-lotes del detector de visión (no requiere MySQL ni TensorFlow)
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+
+from modules.vision_ai_module import BatchInferenceServer, BatchQueueFull, TensorFlowObjectDetector
+
+
+class InterpreteFalso:
+    """Intérprete TFLite mínimo: la salida de cada imagen es [media, 1 - media]"""
+
+    def __init__(self, model_path, num_threads=1, lote_fijo=False):
+        self.num_threads = num_threads
+        self.lote_fijo = lote_fijo
+        self.forma = [1, 4, 4, 3]
+        self.invocaciones = []
+        self.entrada = None
+
+    def allocate_tensors(self):
+        pass
+
+    def get_input_details(self):
+        return [{'index': 0, 'shape': np.array(self.forma), 'dtype': np.float32}]
+
+    def get_output_details(self):
+        return [{'index': 1}]
+
+    def resize_tensor_input(self, indice, forma):
+        if self.lote_fijo:
+            raise ValueError('lote fijo')
+        self.forma = list(forma)
+
+    def set_tensor(self, indice, datos):
+        assert list(datos.shape) == self.forma
+        self.entrada = datos
+
+    def invoke(self):
+        self.invocaciones.append(len(self.entrada))
+
+    def get_tensor(self, indice):
+        media = self.entrada.mean(axis=(1, 2, 3))
+        return np.stack([media, 1 - media], axis=1)
+
+
+def test_agrupa_peticiones_concurrentes_y_respeta_el_orden():
+    lotes = []
+
+    def fabrica():
+        def ejecutar(lote):
+            lotes.append(len(lote))
+            time.sleep(0.01)
+            return [x * 10 for x in lote]
+        return ejecutar
+
+    servidor = BatchInferenceServer(fabrica, workers=1, max_batch=4, batch_window_ms=20)
+    with ThreadPoolExecutor(8) as pool:
+        resultados = list(pool.map(lambda x: servidor.infer(x, timeout=5), range(16)))
+    servidor.close()
+    assert resultados == [x * 10 for x in range(16)]
+    assert max(lotes) == 4 and len(lotes) < 16
+    stats = servidor.get_stats()
+    assert stats['items'] == 16 and stats['batches'] == len(lotes) and stats['avg_batch'] > 1
+
+
+def test_un_ejecutor_por_trabajador_y_errores_por_lote():
+    hilos = set()
+
+    def fabrica():
+        hilos.add(threading.current_thread().name)
+
+        def ejecutar(lote):
+            if 'falla' in lote:
+                raise RuntimeError('inferencia fallida')
+            return lote
+        return ejecutar
+
+    servidor = BatchInferenceServer(fabrica, workers=2, max_batch=1, batch_window_ms=0)
+    assert servidor.infer('a', timeout=5) == 'a'
+    with pytest.raises(RuntimeError, match='inferencia fallida'):
+        servidor.infer('falla', timeout=5)
+    servidor.close()
+    assert len(hilos) == 2 and servidor.get_stats()['errors'] == 1
+    with pytest.raises(RuntimeError):
+        servidor.submit('b')
+
+
+def test_cola_llena_rechaza_sin_bloquear():
+    liberar = threading.Event()
+
+    def fabrica():
+        def ejecutar(lote):
+            liberar.wait(5)
+            return lote
+        return ejecutar
+
+    servidor = BatchInferenceServer(fabrica, max_batch=1, batch_window_ms=0, max_queue=1)
+    primero = servidor.submit(1)
+    time.sleep(0.05)  # El trabajador tomó la primera y queda bloqueado en el ejecutor
+    segundo = servidor.submit(2)
+    with pytest.raises(BatchQueueFull):
+        servidor.submit(3)
+    liberar.set()
+    assert primero.result(5) == 1 and segundo.result(5) == 2
+    assert servidor.get_stats()['rejected'] == 1
+    servidor.close()
+
+
+@pytest.mark.parametrize('lote_fijo', [False, True])
+def test_ejecutor_tflite_por_lotes(lote_fijo):
+    detector = TensorFlowObjectDetector(interpreter_threads=3)
+    creados = []
+
+    class ModuloFalso:
+        @staticmethod
+        def Interpreter(model_path, num_threads):
+            creados.append(InterpreteFalso(model_path, num_threads, lote_fijo))
+            return creados[-1]
+
+    detector._tflite = ModuloFalso
+    ejecutar = detector._create_batch_runner()
+    lote = [np.full((4, 4, 3), v, np.float32) for v in (0.2, 0.6, 0.9)]
+    salidas = ejecutar(lote)
+    assert [round(float(s[0]), 3) for s in salidas] == [0.2, 0.6, 0.9]
+    assert creados[0].num_threads == 3
+    assert creados[0].invocaciones == ([1, 1, 1] if lote_fijo else [3])
+
+
+def test_initialize_no_reserva_un_interprete_fuera_del_pool(tmp_path, monkeypatch):
+    creados = []
+
+    class InterpreteContado(InterpreteFalso):
+        def allocate_tensors(self):
+            self.invocaciones.append('allocate')
+
+    class ModuloFalso:
+        @staticmethod
+        def Interpreter(model_path, num_threads=1):
+            creados.append(InterpreteContado(model_path, num_threads))
+            return creados[-1]
+
+    paquete = type(sys)('tflite_runtime')
+    paquete.interpreter = ModuloFalso
+    monkeypatch.setitem(sys.modules, 'tflite_runtime', paquete)
+    monkeypatch.setitem(sys.modules, 'tflite_runtime.interpreter', ModuloFalso)
+    (tmp_path / 'modelo.tflite').write_bytes(b'tflite')
+    (tmp_path / 'etiquetas.txt').write_text('taladro\nmicroscopio', encoding='utf-8')
+
+    detector = TensorFlowObjectDetector(str(tmp_path / 'modelo.tflite'), str(tmp_path / 'etiquetas.txt'))
+    assert detector.initialize() and not getattr(detector, 'use_fallback', False)
+    assert detector.input_details[0]['index'] == 0 and detector.labels == ['taladro', 'microscopio']
+    assert not hasattr(detector, 'interpreter') and creados[0].invocaciones == []
+
+    salidas = detector.inference_server.infer(np.full((4, 4, 3), 0.5, np.float32), timeout=5)
+    detector.inference_server.close()
+    assert round(float(salidas[0]), 3) == 0.5
+    assert len(creados) == 2 and creados[1].invocaciones[0] == 'allocate'
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas del login facial continuo: votación, omisión de cuadros y tokens (no requiere MySQL)
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from utils.login_facial_continuo import ControlCarga, NoncesMySQL, SesionLoginContinuo, TokensLogin, VotacionRostros
+
+CUADRO = cv2.imencode('.jpg', np.full((120, 160, 3), 128, np.uint8))[1].tobytes()
+USUARIO = {'id': 'U1', 'nombre': 'Ana'}
+
+
+def identificador(resultados):
+    """identificar_cuadro falso: devuelve los resultados en orden y pasa el ROI como contador"""
+    pendientes = list(resultados)
+
+    def identificar(img, roi):
+        assert img.shape == (120, 160, 3)
+        usuario = pendientes.pop(0)
+        if usuario is None:
+            return {'mensaje': 'Rostro no reconocido. Acceso denegado.', 'no_reconocido': True}, None
+        return {'usuario': usuario, 'detalle': 'similitud', 'confianza': 60.0 + len(pendientes)}, (roi or 0) + 1
+    return identificar
+
+
+def test_votacion_por_ventana():
+    votacion = VotacionRostros(ventana=3, minimo_votos=2)
+    assert votacion.agregar('U1') is None
+    assert votacion.agregar(None) is None
+    assert votacion.agregar('U2') is None
+    assert votacion.agregar('U2') == 'U2'
+    assert votacion.votos('U2') == 2 and votacion.votos('U1') == 0
+
+
+def test_reconoce_tras_varios_cuadros_con_la_mejor_confianza():
+    sesion = SesionLoginContinuo(identificador([USUARIO, None, USUARIO, USUARIO]), ventana=5, minimo_votos=3)
+    estados = [sesion.procesar(CUADRO)['estado'] for _ in range(3)]
+    assert estados == ['analizando', 'sin_coincidencia', 'analizando']
+    assert sesion.roi == 1 and sesion.no_reconocidos == 1
+
+    respuesta = sesion.procesar(CUADRO)
+    assert respuesta['estado'] == 'reconocido' and respuesta['usuario'] is USUARIO
+    assert respuesta['confianza'] == 63.0 and sesion.terminada
+    assert sesion.procesar(CUADRO)['estado'] == 'fin'
+
+
+def test_cuadros_omitidos_bajo_carga_e_invalidos():
+    control = ControlCarga(max_conexiones=1, max_simultaneos=1)
+    assert control.abrir() and not control.abrir()
+    sesion = SesionLoginContinuo(identificador([USUARIO]), control)
+
+    assert control.intentar()  # Otra conexión está analizando un cuadro
+    assert sesion.procesar(CUADRO)['estado'] == 'omitido'
+    control.liberar()
+    assert sesion.procesar(b'no es una imagen')['estado'] == 'invalido'
+    sesion.descartar(3)
+    respuesta = sesion.procesar(CUADRO)
+    assert respuesta['estado'] == 'analizando'
+    assert (respuesta['recibidos'], respuesta['procesados'], respuesta['omitidos']) == (6, 1, 4)
+    control.cerrar()
+    assert control.estadisticas()['abiertas'] == 0 and control.estadisticas()['rechazadas'] == 1
+
+
+def test_limite_de_cuadros_y_duracion():
+    sesion = SesionLoginContinuo(identificador([None, None]), max_cuadros=2)
+    sesion.procesar(CUADRO)
+    sesion.procesar(CUADRO)
+    assert sesion.terminada and sesion.procesar(CUADRO)['estado'] == 'fin'
+    assert SesionLoginContinuo(identificador([]), duracion_max_s=0).terminada
+
+
+def test_token_de_un_solo_uso():
+    tokens = TokensLogin(vigencia_s=30)
+    token = tokens.emitir('secreto', 'U1', 'similitud: 61.0%', 61.04)
+    assert tokens.canjear('otro-secreto', token) is None
+    datos = tokens.canjear('secreto', token)
+    assert (datos['u'], datos['d'], datos['c']) == ('U1', 'similitud: 61.0%', 61.0)
+    assert tokens.canjear('secreto', token) is None
+    assert tokens.canjear('secreto', token + 'x') is None
+
+    # Canjes simultáneos del mismo token: sólo uno gana
+    token = tokens.emitir('secreto', 'U1', 'similitud', 60)
+    resultados = []
+    hilos = [threading.Thread(target=lambda: resultados.append(tokens.canjear('secreto', token))) for _ in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert sum(r is not None for r in resultados) == 1
+
+
+def test_token_vencido():
+    tokens = TokensLogin(vigencia_s=1)
+    token = tokens.emitir('secreto', 'U1', 'similitud', 60)
+    time.sleep(2.1)
+    assert tokens.canjear('secreto', token) is None
+
+
+class TablaNonces:
+    """login_facial_nonces en memoria: INSERT IGNORE devuelve 0 filas si la clave existe"""
+
+    def __init__(self):
+        self.nonces = set()
+        self.falla = False
+
+    def execute_query(self, query, params=None):
+        if self.falla:
+            raise ConnectionError('MySQL caído')
+        if query.startswith('INSERT IGNORE'):
+            if params[0] in self.nonces:
+                return 0
+            self.nonces.add(params[0])
+            return 1
+        return 0
+
+
+def test_token_de_un_solo_uso_entre_workers():
+    tabla = TablaNonces()
+    worker_a = TokensLogin(vigencia_s=30, nonces=NoncesMySQL(tabla))
+    worker_b = TokensLogin(vigencia_s=30, nonces=NoncesMySQL(tabla))
+    token = worker_a.emitir('secreto', 'U1', 'similitud', 60)
+    assert worker_b.canjear('secreto', token)['u'] == 'U1'
+    assert worker_a.canjear('secreto', token) is None
+
+    # Sin registro compartido no se puede garantizar el uso único: se rechaza
+    tabla.falla = True
+    assert worker_a.canjear('secreto', worker_a.emitir('secreto', 'U1', 'similitud', 60)) is None
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas del registro de métricas: combinación entre workers y acceso al endpoint (no requiere MySQL)
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from utils.metricas import RegistroMetricas
+
+
+def aplicacion(registro, **opciones):
+    app = Flask(__name__)
+    registro.init_app(app, **opciones)
+
+    @app.route('/hola')
+    def hola():
+        return 'hola'
+    return app
+
+
+def test_combina_las_series_de_todos_los_workers(tmp_path):
+    registro = RegistroMetricas(directorio=str(tmp_path))
+    cliente = aplicacion(registro).test_client()
+    cliente.get('/hola')
+
+    # Archivo de otro worker (otro PID) con su propio contador
+    otro = RegistroMetricas(directorio=str(tmp_path / 'otro'))
+    otro.peticiones.inc('hola', 'GET', 200, cantidad=5)
+    otro.volcar()
+    datos = json.loads((tmp_path / 'otro' / f'metricas_{os.getpid()}.json').read_text(encoding='utf-8'))
+    datos['pid'] = 999999
+    datos['bloques'] = [[n, a, t, [m.replace(f'worker="{os.getpid()}"', 'worker="999999"') for m in muestras]]
+                        for n, a, t, muestras in datos['bloques']]
+    (tmp_path / 'metricas_999999.json').write_text(json.dumps(datos), encoding='utf-8')
+
+    texto = cliente.get('/metrics').get_data(as_text=True)
+    assert texto.count('# TYPE laboratorio_http_requests_total counter') == 1
+    assert f'laboratorio_http_requests_total{{worker="{os.getpid()}",endpoint="hola",method="GET",status="200"}} 1' in texto
+    assert 'laboratorio_http_requests_total{worker="999999",endpoint="hola",method="GET",status="200"} 5' in texto
+    assert 'laboratorio_uptime_seconds{worker="999999"}' in texto
+
+    # Un worker que dejó de volcar (terminado o reciclado) desaparece
+    datos['t'] -= registro.antiguedad_max_s + 1
+    (tmp_path / 'metricas_999999.json').write_text(json.dumps(datos), encoding='utf-8')
+    assert 'worker="999999"' not in cliente.get('/metrics').get_data(as_text=True)
+    assert not (tmp_path / 'metricas_999999.json').exists()
+
+
+def test_sin_directorio_expone_solo_este_proceso():
+    cliente = aplicacion(RegistroMetricas()).test_client()
+    cliente.get('/hola')
+    texto = cliente.get('/metrics').get_data(as_text=True)
+    assert 'laboratorio_http_requests_total{endpoint="hola",method="GET",status="200"} 1' in texto
+    assert 'worker=' not in texto
+
+
+def test_acceso_por_direccion_o_token():
+    cliente = aplicacion(RegistroMetricas()).test_client()
+    assert cliente.get('/metrics').status_code == 200
+    assert cliente.get('/metrics', environ_base={'REMOTE_ADDR': '10.0.0.7'}).status_code == 401
+    # Reenviada por un proxy local: el cliente real es desconocido
+    assert cliente.get('/metrics', headers={'X-Forwarded-For': '10.0.0.7'}).status_code == 401
+
+    red = aplicacion(RegistroMetricas(), permitidas=['10.0.0.0/24']).test_client()
+    assert red.get('/metrics', environ_base={'REMOTE_ADDR': '10.0.0.7'}).status_code == 200
+    assert red.get('/metrics').status_code == 401
+
+    con_token = aplicacion(RegistroMetricas(), token='s3creto').test_client()
+    assert con_token.get('/metrics').status_code == 401
+    assert con_token.get('/metrics', headers={'Authorization': 'Bearer s3creto',
+                                              'X-Forwarded-For': '10.0.0.7'}).status_code == 200
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas del perfilado de peticiones bajo demanda (no requiere MySQL)
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from utils.perfilado_peticiones import PerfiladorPeticiones, registrar_consulta
+
+
+def _app(directorio, permitido=True, **opciones):
+    app = Flask(__name__)
+    perfilado = PerfiladorPeticiones(str(directorio), intervalo_ms=1, autorizar=lambda: permitido,
+                                     **opciones).init_app(app)
+
+    @app.route('/lenta')
+    def lenta():
+        registrar_consulta("SELECT * FROM usuarios WHERE password_hash = 'secreto'", 12.5, 1)
+        fin = time.perf_counter() + 0.03
+        while time.perf_counter() < fin:
+            pass
+        return 'ok'
+
+    return app, perfilado
+
+
+def test_sin_bandera_no_perfila(tmp_path):
+    app, perfilado = _app(tmp_path)
+    respuesta = app.test_client().get('/lenta')
+    assert 'X-Perfil-Id' not in respuesta.headers
+    assert perfilado.listar() == []
+
+
+def test_perfil_muestreo_con_consultas(tmp_path):
+    app, perfilado = _app(tmp_path)
+    respuesta = app.test_client().get('/lenta?_perfilar=1')
+    perfil_id = respuesta.headers['X-Perfil-Id']
+
+    perfil = perfilado.obtener(perfil_id)
+    assert perfil['modo'] == 'muestreo' and perfil['endpoint'] == 'lenta'
+    assert perfil['consultas_total'] == 1
+    assert perfil['consultas'][0]['sql'] == 'SELECT * FROM usuarios WHERE password_hash = ?'
+    with open(perfilado.ruta_archivo(perfil_id, 'folded'), encoding='utf-8') as f:
+        lineas = f.read().splitlines()
+    assert perfil['muestras'] > 0
+    assert any('lenta (test_perfilado_peticiones.py' in linea for linea in lineas)
+    assert 'consultas' not in perfilado.listar()[0]
+
+
+def test_perfil_cprofile_por_cabecera(tmp_path):
+    app, perfilado = _app(tmp_path)
+    perfil_id = app.test_client().get('/lenta', headers={'X-Perfilar': 'cprofile'}).headers['X-Perfil-Id']
+    assert perfilado.obtener(perfil_id)['archivo'] == 'prof'
+    assert perfilado.ruta_archivo(perfil_id, 'prof') is not None
+
+
+def test_sin_permiso_se_ignora(tmp_path):
+    app, perfilado = _app(tmp_path, permitido=False)
+    assert 'X-Perfil-Id' not in app.test_client().get('/lenta?_perfilar=1').headers
+    assert perfilado.listar() == []
+
+
+def test_buffer_circular_y_rutas_invalidas(tmp_path):
+    app, perfilado = _app(tmp_path, max_perfiles=3)
+    cliente = app.test_client()
+    ids = [cliente.get('/lenta?_perfilar=1').headers['X-Perfil-Id'] for _ in range(5)]
+
+    assert [p['id'] for p in perfilado.listar()] == ids[:1:-1]
+    assert len(os.listdir(tmp_path)) == 6
+    assert perfilado.obtener('../../etc/passwd') is None
+    assert perfilado.ruta_archivo(ids[-1], 'json') is None
+    perfilado.eliminar_todos()
+    assert os.listdir(tmp_path) == []
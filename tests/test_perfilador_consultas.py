@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de la instrumentación de consultas SQL (no requiere MySQL)
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.perfilador_consultas import PerfiladorConsultas, huella_sql
+
+
+def test_huella_agrupa_literales_y_marcadores():
+    a = huella_sql("SELECT * FROM equipos\n   WHERE id = 'EQ-1' AND costo > 10 LIMIT 5")
+    b = huella_sql("SELECT * FROM equipos WHERE id = %s AND costo > %s LIMIT 20")
+    assert a == b == "SELECT * FROM equipos WHERE id = ? AND costo > ? LIMIT ?"
+
+
+def test_huella_colapsa_listas_in():
+    assert huella_sql("SELECT 1 FROM t1 WHERE x IN (1, 2, 3)") == huella_sql("SELECT 1 FROM t1 WHERE x IN (%s,%s)")
+    assert 't1' in huella_sql("SELECT 1 FROM t1")
+
+
+def test_resumen_percentiles_y_rutas():
+    perfilador = PerfiladorConsultas(umbral_lento_ms=1000)
+    for ms in range(1, 101):
+        perfilador.registrar("SELECT * FROM inventario WHERE id = %s", (ms,), float(ms), 1, 'inventario')
+    perfilador.registrar("SELECT COUNT(*) FROM equipos", None, 5.0, 1, 'dashboard')
+
+    resumen = perfilador.resumen('total_ms')
+    assert resumen[0]['ejecuciones'] == 100
+    assert resumen[0]['p50_ms'] in (50.0, 51.0)
+    assert resumen[0]['p99_ms'] >= 99.0
+    assert resumen[0]['rutas'][0] == {'ruta': 'inventario', 'ejecuciones': 100}
+    assert perfilador.lentas() == []
+
+
+def test_consulta_lenta_con_explain_limitado():
+    llamadas = []
+
+    def explicar(sql, params):
+        llamadas.append(sql)
+        return [{'type': 'ALL', 'rows': 1000}]
+
+    perfilador = PerfiladorConsultas(umbral_lento_ms=10, explicar=explicar)
+    perfilador.registrar("SELECT * FROM reservas WHERE estado = %s", ('activa',), 50.0, 3, 'reservas')
+    perfilador.registrar("SELECT * FROM reservas WHERE estado = %s", ('activa',), 60.0, 3, 'reservas')
+    perfilador.registrar("UPDATE reservas SET estado = %s", ('x',), 60.0, 3, 'reservas')
+
+    lentas = perfilador.lentas()
+    assert len(lentas) == 3
+    # Un solo EXPLAIN por huella dentro del intervalo y nunca para escrituras
+    assert len(llamadas) == 1
+    assert lentas[-1]['plan'] == [{'type': 'ALL', 'rows': 1000}]
+
+
+if __name__ == '__main__':
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de las sesiones en el servidor (no requiere MySQL)
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, session
+
+from utils.sesiones_servidor import AlmacenSesionesLocal, InterfazSesionServidor
+
+
+def _app(**opciones):
+    app = Flask(__name__)
+    app.secret_key = 'prueba'
+    almacen = AlmacenSesionesLocal()
+    app.session_interface = InterfazSesionServidor(almacen, **opciones)
+
+    @app.route('/entrar')
+    def entrar():
+        session['user_id'] = 'U1'
+        session['accesibilidad'] = {'alto_contraste': True}
+        session['reset_code_U1'] = {'code': '123456', 'expiry': datetime(2025, 10, 1, 8, 30).isoformat()}
+        return 'ok'
+
+    @app.route('/visitar')
+    def visitar():
+        session['idioma'] = 'es'
+        return 'anónimo'
+
+    @app.route('/leer')
+    def leer():
+        return session.get('user_id') or '-'
+
+    @app.route('/estatica')
+    def estatica():
+        return 'sin sesión'
+
+    @app.route('/salir')
+    def salir():
+        session.clear()
+        return 'adiós'
+
+    return app, almacen
+
+
+def _cookie(respuesta):
+    return next((c for c in respuesta.headers.getlist('Set-Cookie') if c.startswith('session=')), None)
+
+
+def test_cookie_compacta_y_datos_en_el_servidor():
+    app, almacen = _app()
+    cliente = app.test_client()
+    cookie = _cookie(cliente.get('/entrar'))
+    valor = cookie.split(';')[0].split('=', 1)[1]
+
+    # La cookie lleva sólo el id firmado; los datos quedan en el almacén
+    assert len(valor) < 60 and 'reset_code' not in valor
+    assert almacen.cargar(valor.rsplit('.', 1)[0]) is not None and len(almacen) == 1
+    assert cliente.get('/leer').text == 'U1'
+    with cliente.session_transaction() as s:
+        assert s['reset_code_U1'] == {'code': '123456', 'expiry': '2025-10-01T08:30:00'}
+
+
+def test_carga_diferida_y_sin_escrituras_innecesarias():
+    app, _ = _app()
+    interfaz = app.session_interface
+    cliente = app.test_client()
+    cliente.get('/entrar')
+    escrituras = interfaz.stats['escrituras']
+
+    respuesta = cliente.get('/estatica')
+    assert interfaz.stats['cargas'] == 0 and _cookie(respuesta) is None
+    cliente.get('/leer')
+    assert interfaz.stats['cargas'] == 1
+    assert interfaz.stats['escrituras'] == escrituras
+
+
+def _valor(respuesta):
+    return _cookie(respuesta).split(';')[0].split('=', 1)[1]
+
+
+def test_login_rota_el_identificador_de_sesion():
+    app, almacen = _app()
+    cliente = app.test_client()
+    anonima = _valor(cliente.get('/visitar'))
+    autenticada = _valor(cliente.get('/entrar'))
+    assert autenticada != anonima and len(almacen) == 1
+    assert app.session_interface.stats['rotadas'] == 1
+    assert cliente.get('/leer').text == 'U1'
+
+    # El mismo usuario no vuelve a rotar; el identificador anterior al login ya no sirve
+    respuesta = cliente.get('/entrar')
+    assert _cookie(respuesta) is None or _valor(respuesta) == autenticada
+    cliente.set_cookie('session', anonima)
+    assert cliente.get('/leer').text == '-'
+
+
+def test_sin_cookie_no_se_envia_set_cookie():
+    app, _ = _app()
+    cliente = app.test_client()
+    for ruta in ('/estatica', '/leer', '/static/no-existe.css'):
+        assert cliente.get(ruta).headers.getlist('Set-Cookie') == []
+
+    # Una cookie que ya no sirve sí se borra
+    cliente.set_cookie('session', 'inventado.firma')
+    assert 'Expires=Thu, 01 Jan 1970' in _cookie(cliente.get('/estatica'))
+
+
+def test_logout_borra_la_sesion_y_firma_invalida():
+    app, almacen = _app()
+    cliente = app.test_client()
+    cliente.get('/entrar')
+    respuesta = cliente.get('/salir')
+    assert len(almacen) == 0
+    assert 'Expires=Thu, 01 Jan 1970' in _cookie(respuesta)
+
+    cliente.set_cookie('session', 'inventado.firma')
+    assert cliente.get('/leer').text == '-'
+
+
+def test_expiracion_y_barrido():
+    app, almacen = _app(duracion=timedelta(seconds=1), barrido_s=0)
+    cliente = app.test_client()
+    cliente.get('/entrar')
+    time.sleep(1.1)
+    assert cliente.get('/leer').text == '-'
+    assert len(almacen) == 0
+    assert app.session_interface.stats['purgadas'] == 1
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de DatabaseManager.transaction: commit, rollback y devolución de la conexión (no requiere MySQL)
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from utils.base_datos import DatabaseManager
+
+
+class ConexionFalsa:
+    def __init__(self, falla_rollback=False):
+        self.eventos = []
+        self.falla_rollback = falla_rollback
+
+    def start_transaction(self):
+        self.eventos.append('inicio')
+
+    def cursor(self):
+        conexion = self
+
+        class Cursor:
+            def execute(self, sql, params=None):
+                conexion.eventos.append(sql)
+
+            def close(self):
+                conexion.eventos.append('cursor_cerrado')
+        return Cursor()
+
+    def commit(self):
+        self.eventos.append('commit')
+
+    def rollback(self):
+        self.eventos.append('rollback')
+        if self.falla_rollback:
+            raise RuntimeError('conexión perdida')
+
+    def close(self):
+        self.eventos.append('devuelta')
+
+
+def _gestor(conexion):
+    db = DatabaseManager()
+    db.get_connection = lambda: conexion
+    return db
+
+
+def test_commit_y_devolucion_al_pool():
+    conexion = ConexionFalsa()
+    with _gestor(conexion).transaction() as cursor:
+        cursor.execute('DELETE FROM equipos')
+    assert conexion.eventos == ['inicio', 'DELETE FROM equipos', 'commit', 'cursor_cerrado', 'devuelta']
+
+
+@pytest.mark.parametrize('falla_rollback', [False, True])
+def test_error_hace_rollback_y_devuelve_la_conexion(falla_rollback):
+    conexion = ConexionFalsa(falla_rollback)
+    with pytest.raises(ValueError):
+        with _gestor(conexion).transaction() as cursor:
+            cursor.execute('DELETE FROM equipos')
+            raise ValueError('fallo a mitad de la transacción')
+    assert 'commit' not in conexion.eventos
+    assert conexion.eventos[-3:] == ['rollback', 'cursor_cerrado', 'devuelta']
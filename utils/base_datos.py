@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de Conexión a Base de Datos
+Sistema de Laboratorios - Centro Minero SENA
+DatabaseManager compartido por todos los blueprints: pool de conexiones MySQL,
+sentencias preparadas cacheadas por conexión y lectura en streaming.
+"""
+
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import mysql.connector
+import mysql.connector.pooling
+from flask import has_request_context, request
+
+from utils.perfilado_peticiones import registrar_consulta
+
+
+class DatabaseManager:
+    def __init__(self):
+        self.config = {
+            'host': os.getenv('HOST', 'localhost'),
+            'user': os.getenv('USUARIO_PRODUCCION', 'laboratorio_prod'),
+            'password': os.getenv('PASSWORD_PRODUCCION', ''),
+            'database': os.getenv('BASE_DATOS', 'laboratorio_sistema'),
+            'charset': 'utf8mb4',
+            # Las conexiones se reutilizan desde el pool: sin autocommit un SELECT dejaría
+            # abierta una transacción con una instantánea vieja para el siguiente uso.
+            # Las operaciones de varias sentencias usan conn.start_transaction().
+            'autocommit': True,
+        }
+        self.pool_size = int(os.getenv('DB_POOL_SIZE', '10'))
+        # Sentencias preparadas del lado del servidor, cacheadas por conexión del pool
+        self.use_prepared = os.getenv('DB_PREPARED_STATEMENTS', '1') == '1'
+        self.prepared_min_uses = int(os.getenv('DB_PREPARED_MIN_USES', '2'))
+        self.prepared_max_per_connection = int(os.getenv('DB_PREPARED_MAX', '64'))
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._query_uses = {}
+        self._statement_caches = weakref.WeakKeyDictionary()
+        self.stats = {'prepared_executions': 0, 'prepares': 0, 'text_executions': 0}
+        # PerfiladorConsultas (utils.perfilador_consultas) o None para no instrumentar
+        self.profiler = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = mysql.connector.pooling.MySQLConnectionPool(
+                        pool_name='laboratorio_web',
+                        pool_size=self.pool_size,
+                        # Reiniciar la sesión al devolver la conexión descarta las sentencias preparadas
+                        pool_reset_session=False,
+                        **self.config,
+                    )
+        return self._pool
+
+    def get_connection(self):
+        if self.pool_size <= 0:
+            return mysql.connector.connect(**self.config)
+        try:
+            return self._get_pool().get_connection()
+        except mysql.connector.errors.PoolError:
+            # Pool agotado: conexión directa en lugar de fallar la petición
+            return mysql.connector.connect(**self.config)
+
+    def pool_status(self):
+        """Uso del pool de conexiones (None si aún no se ha creado)"""
+        if self._pool is None:
+            return None
+        available = self._pool._cnx_queue.qsize()
+        return {'size': self.pool_size, 'available': available, 'in_use': self.pool_size - available}
+
+    def reset_after_fork(self):
+        """
+        Olvidar el pool heredado del proceso padre (llamar en cada worker tras el fork)
+
+        Los sockets abiertos antes del fork (p. ej. al precargar índices) quedarían
+        compartidos entre workers; cada proceso crea su propio pool en el primer uso.
+        """
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._statement_caches = weakref.WeakKeyDictionary()
+
+    def _should_prepare(self, query, params):
+        """Preparar sólo SELECT que se repiten (evita preparar SQL dinámico de un solo uso)"""
+        if not self.use_prepared or not query.lstrip().upper().startswith('SELECT'):
+            return False
+        if not params and '%s' in query:
+            # Sin parámetros un '%s' literal (p. ej. DATE_FORMAT) se enviaría como marcador '?'
+            return False
+        uses = self._query_uses.get(query, 0) + 1
+        if len(self._query_uses) < 2048 or query in self._query_uses:
+            self._query_uses[query] = uses
+        return uses >= self.prepared_min_uses
+
+    def _prepared_cursor(self, conn, query):
+        """Cursor preparado (dictionary) para `query` en esta conexión física, creado una sola vez"""
+        raw = getattr(conn, '_cnx', None) or conn
+        with self._pool_lock:
+            cache = self._statement_caches.get(raw)
+            if cache is None or cache['connection_id'] != raw.connection_id:
+                # Conexión nueva o reconectada: las sentencias anteriores ya no existen en el servidor
+                cache = {'connection_id': raw.connection_id, 'cursors': OrderedDict()}
+                self._statement_caches[raw] = cache
+        cursors = cache['cursors']
+        entry = cursors.get(query)
+        if entry is not None:
+            cursors.move_to_end(query)
+            return entry
+        cursor = conn.cursor(prepared=True, dictionary=True)
+        # MySQLCursorPrepared compara la sentencia por identidad: se guarda el mismo objeto str
+        entry = (query, cursor)
+        cursors[query] = entry
+        self.stats['prepares'] += 1
+        while len(cursors) > self.prepared_max_per_connection:
+            _, (_, old_cursor) = cursors.popitem(last=False)
+            try:
+                old_cursor.close()
+            except Exception:
+                pass
+        return entry
+
+    def _discard_statements(self, conn):
+        raw = getattr(conn, '_cnx', None) or conn
+        with self._pool_lock:
+            cache = self._statement_caches.pop(raw, None)
+        for _, cursor in (cache['cursors'].values() if cache else ()):
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+    def _record_query(self, query, params, started, rows):
+        in_request = has_request_context()
+        if self.profiler is None and not in_request:
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if in_request:
+            # Petición perfilada bajo demanda (utils.perfilado_peticiones); sin efecto en las demás
+            registrar_consulta(query, elapsed_ms, rows)
+        if self.profiler is not None:
+            self.profiler.registrar(query, params, elapsed_ms, rows, request.endpoint if in_request else None)
+
+    @contextmanager
+    def transaction(self):
+        """Cursor dentro de una transacción: commit al salir del bloque, rollback si hay una
+        excepción y, en ambos casos, la conexión vuelve al pool"""
+        conn = self.get_connection()
+        try:
+            conn.start_transaction()
+            cursor = conn.cursor()
+            try:
+                yield cursor
+                conn.commit()
+            except BaseException:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+                raise
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+
+    def explain(self, query, params=None):
+        """EXPLAIN de una consulta (sin instrumentar ni preparar)"""
+        conn = self.get_connection()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute('EXPLAIN ' + query, params or ())
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def execute_query(self, query, params=None, prepared=None):
+        started = time.perf_counter()
+        result = self._execute(query, params, prepared)
+        self._record_query(query, params, started, len(result) if isinstance(result, list) else result)
+        return result
+
+    def _execute(self, query, params, prepared):
+        if prepared is None:
+            prepared = self._should_prepare(query, params)
+        conn = self.get_connection()
+        try:
+            if prepared:
+                try:
+                    statement, cursor = self._prepared_cursor(conn, query)
+                    cursor.execute(statement, tuple(params or ()))
+                    self.stats['prepared_executions'] += 1
+                    return cursor.fetchall()
+                except mysql.connector.errors.DatabaseError:
+                    # Sentencia no preparable o descartada por el servidor: ejecutar como texto
+                    self._discard_statements(conn)
+
+            cursor = conn.cursor(dictionary=True)
+            try:
+                cursor.execute(query, params or ())
+                self.stats['text_executions'] += 1
+                if query.strip().upper().startswith('SELECT'):
+                    result = cursor.fetchall()
+                else:
+                    conn.commit()
+                    result = cursor.rowcount
+                return result
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+
+    def stream_query(self, query, params=None, chunk_size=1000, row_type='dict', with_columns=False):
+        """Ejecuta un SELECT con cursor no bufferizado y entrega bloques de hasta chunk_size filas
+
+        row_type: 'dict', 'tuple' o 'namedtuple' (campos = nombres de columna).
+        with_columns: entregar primero la tupla de nombres de columna del cursor, también
+        cuando la consulta no devuelve filas.
+        La conexión se mantiene abierta hasta agotar o cerrar el generador.
+        """
+        if row_type not in ('dict', 'tuple', 'namedtuple'):
+            raise ValueError(f"row_type no soportado: {row_type}")
+        conn = self.get_connection()
+        if row_type == 'dict':
+            cursor = conn.cursor(dictionary=True, buffered=False)
+        elif row_type == 'namedtuple':
+            cursor = conn.cursor(named_tuple=True, buffered=False)
+        else:
+            cursor = conn.cursor(buffered=False)
+        started = time.perf_counter()
+        total_rows = 0
+        try:
+            cursor.execute(query, params or ())
+            if with_columns:
+                yield tuple(columna[0] for columna in cursor.description or ())
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                total_rows += len(rows)
+                yield rows
+        finally:
+            # La duración incluye el tiempo de consumo de las filas por el llamador
+            self._record_query(query, params, started, total_rows)
+            # Si el consumidor abandona el generador quedan filas sin leer en el cursor
+            try:
+                cursor.close()
+            except Exception:
+                pass
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def iter_query(self, query, params=None, chunk_size=1000, row_type='dict'):
+        """Igual que stream_query pero entrega las filas una a una"""
+        for rows in self.stream_query(query, params, chunk_size, row_type):
+            yield from rows
+
@@ -0,0 +1,434 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de Caché de Consultas y Vistas Calculadas
+Sistema de Laboratorios - Centro Minero SENA
+LRU en memoria por proceso con TTL leído de configuracion_sistema (claves cache_*,
+creadas por utils/optimizacion_rendimiento.py), almacén compartido opcional entre
+workers (tabla cache_sistema o Redis), contadores de aciertos/fallos e invalidación
+explícita por etiqueta.
+
+Uso:
+    @cache_sistema.cacheado('equipos_reservables', ttl_config='cache_equipos_disponibles',
+                            etiquetas=('equipos',))
+    def equipos_reservables(): ...
+
+    cache_sistema.invalidar('equipos')   # o, mejor, bus_cambios.cambio('equipo', id)
+
+Los valores se devuelven sin copiar desde la LRU: quien los recibe no debe modificarlos.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, time as hora, timedelta
+from decimal import Decimal
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+# TTL (segundos) usados si la clave no existe en configuracion_sistema; mismos valores
+# que siembra optimizacion_rendimiento.configurar_cache_sistema()
+TTL_DEFECTO = {
+    'cache_equipos_disponibles': 300,
+    'cache_inventario_critico': 600,
+    'cache_usuarios_activos': 1800,
+    'cache_reportes_diarios': 3600,
+    'cache_estadisticas_dashboard': 30,
+}
+
+
+# =====================================================================
+# SERIALIZACIÓN (almacenes compartidos)
+# =====================================================================
+
+class _CodificadorJSON(json.JSONEncoder):
+    """Conserva los tipos que devuelve mysql.connector (fechas, DECIMAL, TIME, BLOB)"""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return {'__t': 'datetime', 'v': o.isoformat()}
+        if isinstance(o, date):
+            return {'__t': 'date', 'v': o.isoformat()}
+        if isinstance(o, hora):
+            return {'__t': 'time', 'v': o.isoformat()}
+        if isinstance(o, timedelta):
+            return {'__t': 'timedelta', 'v': o.total_seconds()}
+        if isinstance(o, Decimal):
+            return {'__t': 'decimal', 'v': str(o)}
+        if isinstance(o, (bytes, bytearray)):
+            return {'__t': 'bytes', 'v': base64.b64encode(o).decode('ascii')}
+        if isinstance(o, (set, frozenset)):
+            return list(o)
+        return super().default(o)
+
+
+_DECODIFICADORES = {
+    'datetime': datetime.fromisoformat,
+    'date': date.fromisoformat,
+    'time': hora.fromisoformat,
+    'timedelta': lambda v: timedelta(seconds=v),
+    'decimal': Decimal,
+    'bytes': base64.b64decode,
+}
+
+
+def _objeto(d):
+    tipo = d.get('__t')
+    if tipo in _DECODIFICADORES and len(d) == 2:
+        return _DECODIFICADORES[tipo](d['v'])
+    return d
+
+
+def serializar(valor):
+    return json.dumps(valor, cls=_CodificadorJSON, ensure_ascii=False, separators=(',', ':'))
+
+
+def deserializar(texto):
+    return json.loads(texto, object_hook=_objeto)
+
+
+# =====================================================================
+# ALMACENES COMPARTIDOS
+# =====================================================================
+
+class AlmacenMySQL:
+    """Almacén compartido sobre la tabla cache_sistema (id, tipo, datos JSON, fecha_expiracion)"""
+
+    nombre = 'mysql'
+
+    def __init__(self, db_manager, tabla='cache_sistema'):
+        self.db = db_manager
+        self.tabla = tabla
+
+    def obtener(self, clave):
+        """{'v': valor, 'e': etiquetas} o None si no existe o expiró"""
+        filas = self.db.execute_query(
+            f"SELECT datos FROM {self.tabla} WHERE id = %s AND fecha_expiracion > NOW()", (clave,))
+        if not filas:
+            return None
+        datos = filas[0]['datos']
+        return deserializar(datos) if datos is not None else None
+
+    def guardar(self, clave, tipo, valor, ttl, etiquetas):
+        # Las etiquetas viajan dentro del JSON para poder invalidar sin columna adicional
+        datos = serializar({'v': valor, 'e': sorted(etiquetas)})
+        self.db.execute_query(
+            f"""
+            INSERT INTO {self.tabla} (id, tipo, datos, fecha_creacion, fecha_expiracion, hits)
+            VALUES (%s, %s, %s, NOW(), DATE_ADD(NOW(), INTERVAL %s SECOND), 0)
+            ON DUPLICATE KEY UPDATE tipo = VALUES(tipo), datos = VALUES(datos),
+                fecha_creacion = VALUES(fecha_creacion), fecha_expiracion = VALUES(fecha_expiracion)
+            """,
+            (clave, tipo[:50], datos, int(ttl)),
+        )
+
+    def invalidar(self, *etiquetas):
+        condiciones = ' OR '.join(["JSON_CONTAINS(JSON_EXTRACT(datos, '$.e'), JSON_QUOTE(%s))"] * len(etiquetas))
+        self.db.execute_query(f"DELETE FROM {self.tabla} WHERE {condiciones}", etiquetas)
+
+    def purgar_expirados(self):
+        return self.db.execute_query(f"DELETE FROM {self.tabla} WHERE fecha_expiracion <= NOW()")
+
+    def vaciar(self):
+        self.db.execute_query(f"DELETE FROM {self.tabla}")
+
+
+class AlmacenRedis:
+    """Almacén compartido en Redis (paquete opcional 'redis'); las etiquetas son conjuntos de claves"""
+
+    nombre = 'redis'
+
+    def __init__(self, url='redis://localhost:6379/0', prefijo='laboratorio:cache:'):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("CACHE_BACKEND=redis requiere el paquete 'redis' (pip install redis)") from e
+        self.cliente = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.prefijo = prefijo
+
+    def obtener(self, clave):
+        datos = self.cliente.get(self.prefijo + clave)
+        return deserializar(datos) if datos is not None else None
+
+    def guardar(self, clave, tipo, valor, ttl, etiquetas):
+        tuberia = self.cliente.pipeline()
+        tuberia.set(self.prefijo + clave, serializar({'v': valor, 'e': sorted(etiquetas)}), ex=int(ttl))
+        for etiqueta in etiquetas:
+            conjunto = f'{self.prefijo}etiqueta:{etiqueta}'
+            tuberia.sadd(conjunto, clave)
+            # El conjunto debe sobrevivir a las entradas que referencia
+            tuberia.expire(conjunto, max(int(ttl), 86400))
+        tuberia.execute()
+
+    def invalidar(self, *etiquetas):
+        conjuntos = [f'{self.prefijo}etiqueta:{e}' for e in etiquetas]
+        claves = self.cliente.sunion(conjuntos)
+        if claves:
+            self.cliente.delete(*(self.prefijo + c.decode() for c in claves))
+        self.cliente.delete(*conjuntos)
+
+    def vaciar(self):
+        claves = list(self.cliente.scan_iter(self.prefijo + '*'))
+        if claves:
+            self.cliente.delete(*claves)
+
+
+def crear_almacen(tipo, db_manager=None, url=None):
+    """
+    Almacén compartido según CACHE_BACKEND
+
+    Args:
+        tipo: 'local' (sin almacén compartido), 'mysql' o 'redis'
+        db_manager: DatabaseManager para 'mysql'
+        url: URL de conexión para 'redis'
+
+    Returns:
+        AlmacenMySQL, AlmacenRedis o None
+    """
+    tipo = (tipo or 'local').strip().lower()
+    if tipo == 'local':
+        return None
+    if tipo == 'mysql':
+        return AlmacenMySQL(db_manager)
+    if tipo == 'redis':
+        return AlmacenRedis(url or 'redis://localhost:6379/0')
+    raise ValueError(f"CACHE_BACKEND no soportado: {tipo} (use local, mysql o redis)")
+
+
+# =====================================================================
+# CACHÉ
+# =====================================================================
+
+class _Entrada:
+    __slots__ = ('valor', 'expira', 'etiquetas')
+
+    def __init__(self, valor, expira, etiquetas):
+        self.valor = valor
+        self.expira = expira
+        self.etiquetas = etiquetas
+
+
+class CacheSistema:
+    """LRU en proceso con TTL, almacén compartido opcional y etiquetas de invalidación"""
+
+    def __init__(self, db_manager=None, almacen=None, max_entradas=1024, ttl_local_max=5,
+                 recarga_config_s=60):
+        """
+        Args:
+            db_manager: DatabaseManager para leer los TTL de configuracion_sistema (None: TTL_DEFECTO)
+            almacen: AlmacenMySQL/AlmacenRedis compartido entre workers, o None
+            max_entradas: Tamaño máximo de la LRU local
+            ttl_local_max: Con almacén compartido, segundos máximos de una entrada en la LRU
+                local; acota cuánto tarda un worker en ver la invalidación hecha por otro
+            recarga_config_s: Segundos entre relecturas de configuracion_sistema
+        """
+        self.db = db_manager
+        self.almacen = almacen
+        self.max_entradas = max_entradas
+        self.ttl_local_max = ttl_local_max
+        self.recarga_config_s = recarga_config_s
+        self._entradas = OrderedDict()
+        self._por_etiqueta = {}
+        self._lock = threading.Lock()
+        self._config = {}
+        self._config_leida = None
+        self._config_lock = threading.Lock()
+        self._contadores = {'aciertos_local': 0, 'aciertos_compartido': 0, 'fallos': 0,
+                            'expulsiones': 0, 'invalidaciones': 0, 'errores_almacen': 0}
+        self._por_nombre = {}
+
+    # ------------------------------------------------------------------
+    # TTL desde configuracion_sistema
+    # ------------------------------------------------------------------
+
+    def ttl(self, clave_config, defecto=60):
+        """Segundos de vida configurados para `clave_config` (0 desactiva la caché de esa vista)"""
+        if clave_config is None:
+            return defecto
+        ahora = time.monotonic()
+        if self.db is not None and (self._config_leida is None or ahora - self._config_leida >= self.recarga_config_s):
+            with self._config_lock:
+                if self._config_leida is None or ahora - self._config_leida >= self.recarga_config_s:
+                    self._config_leida = ahora
+                    try:
+                        filas = self.db.execute_query(
+                            "SELECT clave, valor FROM configuracion_sistema WHERE clave LIKE 'cache\\_%'") or []
+                        self._config = {f['clave']: f['valor'] for f in filas}
+                    except Exception as e:
+                        logger.warning("No se pudieron leer los TTL de configuracion_sistema: %s", e)
+        valor = self._config.get(clave_config)
+        try:
+            return max(0, int(float(valor)))
+        except (TypeError, ValueError):
+            return TTL_DEFECTO.get(clave_config, defecto)
+
+    # ------------------------------------------------------------------
+    # Operaciones básicas
+    # ------------------------------------------------------------------
+
+    def _contar(self, nombre, campo):
+        self._contadores[campo] += 1
+        if nombre:
+            por_nombre = self._por_nombre.setdefault(nombre, {'aciertos': 0, 'fallos': 0})
+            por_nombre['fallos' if campo == 'fallos' else 'aciertos'] += 1
+
+    def obtener(self, clave, nombre=None):
+        """
+        Buscar una clave en la LRU local y después en el almacén compartido
+
+        Returns:
+            tuple: (encontrado, valor)
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                if entrada.expira > ahora:
+                    self._entradas.move_to_end(clave)
+                    self._contar(nombre, 'aciertos_local')
+                    return True, entrada.valor
+                self._quitar(clave)
+
+        if self.almacen is not None:
+            try:
+                datos = self.almacen.obtener(clave)
+            except Exception as e:
+                self._error_almacen('obtener', e)
+                datos = None
+            if datos is not None:
+                self._guardar_local(clave, datos['v'], self.ttl_local_max, frozenset(datos.get('e', ())))
+                with self._lock:
+                    self._contar(nombre, 'aciertos_compartido')
+                return True, datos['v']
+
+        with self._lock:
+            self._contar(nombre, 'fallos')
+        return False, None
+
+    def guardar(self, clave, valor, ttl, etiquetas=(), nombre=None):
+        """Guardar un valor `ttl` segundos en la LRU local y, si existe, en el almacén compartido"""
+        etiquetas = frozenset(etiquetas)
+        if self.almacen is not None:
+            try:
+                self.almacen.guardar(clave, nombre or '', valor, ttl, etiquetas)
+            except Exception as e:
+                self._error_almacen('guardar', e)
+            ttl = min(ttl, self.ttl_local_max)
+        self._guardar_local(clave, valor, ttl, etiquetas)
+
+    def _guardar_local(self, clave, valor, ttl, etiquetas):
+        with self._lock:
+            if clave in self._entradas:
+                self._quitar(clave)
+            self._entradas[clave] = _Entrada(valor, time.monotonic() + ttl, etiquetas)
+            for etiqueta in etiquetas:
+                self._por_etiqueta.setdefault(etiqueta, set()).add(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._quitar(next(iter(self._entradas)))
+                self._contadores['expulsiones'] += 1
+
+    def _quitar(self, clave):
+        # Llamar con self._lock tomado
+        entrada = self._entradas.pop(clave, None)
+        if entrada is None:
+            return
+        for etiqueta in entrada.etiquetas:
+            claves = self._por_etiqueta.get(etiqueta)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del self._por_etiqueta[etiqueta]
+
+    def invalidar(self, *etiquetas, solo_local=False):
+        """
+        Descartar todas las entradas marcadas con alguna de las etiquetas
+
+        Args:
+            etiquetas: Etiquetas a invalidar
+            solo_local: No tocar el almacén compartido (el evento llegó de otro worker,
+                que ya lo invalidó)
+        """
+        if not etiquetas:
+            return
+        with self._lock:
+            for etiqueta in etiquetas:
+                for clave in list(self._por_etiqueta.get(etiqueta, ())):
+                    self._quitar(clave)
+            self._contadores['invalidaciones'] += 1
+        if self.almacen is not None and not solo_local:
+            try:
+                self.almacen.invalidar(*etiquetas)
+            except Exception as e:
+                self._error_almacen('invalidar', e)
+
+    def vaciar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._por_etiqueta.clear()
+        if self.almacen is not None:
+            try:
+                self.almacen.vaciar()
+            except Exception as e:
+                self._error_almacen('vaciar', e)
+
+    def _error_almacen(self, operacion, error):
+        # Un almacén caído no debe tumbar la petición: se sigue con la LRU local
+        with self._lock:
+            self._contadores['errores_almacen'] += 1
+        logger.warning("Caché compartida (%s) falló en %s: %s", self.almacen.nombre, operacion, error)
+
+    def estadisticas(self):
+        with self._lock:
+            datos = dict(self._contadores)
+            datos['entradas'] = len(self._entradas)
+            datos['por_nombre'] = {n: dict(v) for n, v in self._por_nombre.items()}
+        datos['max_entradas'] = self.max_entradas
+        datos['almacen'] = self.almacen.nombre if self.almacen is not None else 'local'
+        consultas = datos['aciertos_local'] + datos['aciertos_compartido'] + datos['fallos']
+        datos['tasa_aciertos'] = round((consultas - datos['fallos']) / consultas, 3) if consultas else None
+        return datos
+
+    # ------------------------------------------------------------------
+    # Decorador
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _clave(nombre, args, kwargs):
+        firma = repr((args, sorted(kwargs.items())))
+        # id de cache_sistema es VARCHAR(100)
+        return f"{nombre[:58]}:{hashlib.sha1(firma.encode('utf-8')).hexdigest()}"
+
+    def cacheado(self, nombre, ttl_config=None, etiquetas=(), ttl=None):
+        """
+        Decorador que cachea el resultado de una función según sus argumentos
+
+        Args:
+            nombre: Identificador de la vista (también se usa como etiqueta)
+            ttl_config: Clave de configuracion_sistema con el TTL en segundos
+            etiquetas: Etiquetas de invalidación, o función (*args, **kwargs) -> etiquetas
+            ttl: TTL fijo que ignora ttl_config
+
+        Los resultados None no se cachean. La función decorada expone .invalidar().
+        """
+        def decorador(funcion):
+            @wraps(funcion)
+            def envoltura(*args, **kwargs):
+                clave = self._clave(nombre, args, kwargs)
+                encontrado, valor = self.obtener(clave, nombre)
+                if encontrado:
+                    return valor
+                valor = funcion(*args, **kwargs)
+                segundos = ttl if ttl is not None else self.ttl(ttl_config)
+                if valor is not None and segundos > 0:
+                    marcas = etiquetas(*args, **kwargs) if callable(etiquetas) else etiquetas
+                    self.guardar(clave, valor, segundos, (nombre, *marcas), nombre)
+                return valor
+
+            envoltura.invalidar = lambda: self.invalidar(nombre)
+            envoltura.sin_cache = funcion
+            return envoltura
+        return decorador
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de Carga Diferida de Dependencias
+Sistema de Laboratorios - Centro Minero SENA
+Permite declarar módulos pesados (cv2, numpy, ...) a nivel de módulo sin importarlos
+hasta el primer acceso a uno de sus atributos.
+"""
+
+import importlib
+import threading
+import types
+
+_lock = threading.Lock()
+
+
+class ModuloDiferido(types.ModuleType):
+    """Sustituto de un módulo que lo importa en el primer acceso a un atributo"""
+
+    def __init__(self, nombre):
+        super().__init__(nombre)
+        self.__dict__['_modulo_real'] = None
+
+    def _cargar(self):
+        modulo = self.__dict__['_modulo_real']
+        if modulo is None:
+            with _lock:
+                modulo = self.__dict__['_modulo_real']
+                if modulo is None:
+                    modulo = importlib.import_module(self.__name__)
+                    # Copiar el espacio de nombres: los accesos siguientes no pasan por __getattr__
+                    self.__dict__.update(modulo.__dict__)
+                    self.__dict__['_modulo_real'] = modulo
+        return modulo
+
+    def __getattr__(self, atributo):
+        return getattr(self._cargar(), atributo)
+
+    def __dir__(self):
+        return dir(self._cargar())
+
+    @property
+    def cargado(self):
+        return self.__dict__['_modulo_real'] is not None
+
+    def __repr__(self):
+        estado = 'cargado' if self.cargado else 'sin cargar'
+        return f"<módulo diferido '{self.__name__}' ({estado})>"
+
+
+def modulo_diferido(nombre):
+    """
+    Declarar un módulo de importación diferida
+
+    Args:
+        nombre: Nombre del módulo (p. ej. 'cv2')
+
+    Returns:
+        ModuloDiferido: Objeto usable como el módulo real
+    """
+    return ModuloDiferido(nombre)
+
+
+def precargar(*modulos):
+    """Forzar la importación de módulos diferidos (p. ej. antes de hacer fork de los workers)"""
+    for modulo in modulos:
+        if isinstance(modulo, ModuloDiferido):
+            modulo._cargar()
+        else:
+            importlib.import_module(modulo)
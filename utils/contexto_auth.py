@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de Contexto de Autorización
+Sistema de Laboratorios - Centro Minero SENA
+Identidad de la petición construida una sola vez (sesión web o JWT) y validada contra una
+caché TTL de los registros de usuarios (nivel_acceso, activo). Los decoradores y los
+Resources consultan el mismo objeto en lugar de repetir verify_jwt_in_request() o leer
+la sesión por su cuenta.
+
+La caché se invalida por usuario con los eventos de cambio ('usuario:ID'). Al desactivar
+una cuenta o cambiar su nivel, la sesión web se cierra y los JWT emitidos se rechazan como
+revocados: en el worker que hizo el cambio, desde la siguiente petición; en los demás,
+en cuanto les llega el evento por Redis (CACHE_BACKEND=redis) o, sin Redis, cuando vence
+su entrada (ttl_s, AUTH_CACHE_TTL_S).
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, has_request_context, session
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+logger = logging.getLogger(__name__)
+
+CLAVE_CONTEXTO = '_contexto_auth'
+
+
+class CacheUsuarios:
+    """LRU con TTL de los campos de autorización de cada usuario"""
+
+    CONSULTA = "SELECT id, nombre, tipo, nivel_acceso, activo FROM usuarios WHERE id = %s"
+
+    def __init__(self, db_manager, ttl_s=60, max_entradas=4096):
+        self.db = db_manager
+        self.ttl_s = ttl_s
+        self.max_entradas = max_entradas
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'aciertos': 0, 'fallos': 0, 'invalidaciones': 0}
+
+    def obtener(self, user_id):
+        """
+        Registro del usuario (id, nombre, tipo, nivel_acceso, activo) o None si no existe
+
+        Las ausencias también se cachean: un usuario borrado sigue rechazado sin consultar.
+        """
+        if user_id is None:
+            return None
+        clave = str(user_id)
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is not None and entrada[0] > ahora:
+                self._datos.move_to_end(clave)
+                self.stats['aciertos'] += 1
+                return entrada[1]
+        self.stats['fallos'] += 1
+        filas = self.db.execute_query(self.CONSULTA, (clave,))
+        usuario = dict(filas[0]) if filas else None
+        self.guardar(clave, usuario)
+        return usuario
+
+    def guardar(self, user_id, usuario):
+        with self._lock:
+            self._datos[str(user_id)] = (time.monotonic() + self.ttl_s, usuario)
+            self._datos.move_to_end(str(user_id))
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._datos.pop(str(user_id), None)
+        self.stats['invalidaciones'] += len(user_ids)
+
+    def vaciar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def al_cambiar(self, etiquetas, remoto=False):
+        """Suscriptor de eventos de cambio: 'usuario:ID' invalida ese usuario, 'usuarios' sin IDs vacía"""
+        ids = [e.split(':', 1)[1] for e in etiquetas if e.startswith('usuario:')]
+        if ids:
+            self.invalidar(*ids)
+        elif 'usuarios' in etiquetas:
+            self.vaciar()
+
+
+class ContextoAuth:
+    """Identidad autorizada de la petición (anónima si user_id es None)"""
+
+    __slots__ = ('user_id', 'nombre', 'tipo', 'nivel', 'origen', 'revocado')
+
+    def __init__(self, user_id=None, nombre=None, tipo=None, nivel=0, origen=None, revocado=False):
+        self.user_id = user_id
+        self.nombre = nombre
+        self.tipo = tipo
+        self.nivel = nivel
+        self.origen = origen  # 'sesion', 'jwt' o None
+        self.revocado = revocado  # Había identidad pero el usuario ya no existe o está inactivo
+
+    @property
+    def autenticado(self):
+        return self.user_id is not None
+
+    @property
+    def es_admin(self):
+        return self.autenticado and (str(self.tipo or '').lower() == 'admin' or self.nivel >= 4)
+
+    def tiene_nivel(self, nivel_minimo):
+        return self.autenticado and self.nivel >= nivel_minimo
+
+    def __repr__(self):
+        return f'ContextoAuth({self.user_id!r}, nivel={self.nivel}, origen={self.origen!r})'
+
+
+def _identidad():
+    # La sesión web primero: las páginas y los fetch del frontend la llevan siempre; el JWT
+    # sólo se decodifica si no hay sesión
+    if session.get('user_id'):
+        return session['user_id'], 'sesion'
+    try:
+        verify_jwt_in_request(optional=True)
+        identidad = get_jwt_identity()
+    except Exception:
+        return None, None
+    return (identidad, 'jwt') if identidad is not None else (None, None)
+
+
+def construir_contexto(usuarios):
+    """Contexto de la petición actual validado contra la caché de usuarios"""
+    user_id, origen = _identidad()
+    if user_id is None:
+        return ContextoAuth()
+    try:
+        usuario = usuarios.obtener(user_id)
+    except Exception as e:
+        # Sin base de datos no se puede validar: se conserva lo que dice la sesión/el token
+        logger.warning("No se pudo validar el usuario %s: %s", user_id, e)
+        nivel = session.get('user_level', 0) if origen == 'sesion' else 0
+        return ContextoAuth(user_id, session.get('user_name'), session.get('user_type'), int(nivel or 0), origen)
+    if not usuario or not usuario.get('activo'):
+        return ContextoAuth(origen=origen, revocado=True)
+    contexto = ContextoAuth(usuario['id'], usuario.get('nombre'), usuario.get('tipo'),
+                            int(usuario.get('nivel_acceso') or 0), origen)
+    if origen == 'sesion':
+        _sincronizar_sesion(contexto)
+    return contexto
+
+
+def _sincronizar_sesion(contexto):
+    # Un cambio de nivel/tipo/nombre se refleja en la sesión (las plantillas la leen)
+    valores = {'user_level': contexto.nivel, 'user_type': contexto.tipo, 'user_name': contexto.nombre}
+    for clave, valor in valores.items():
+        if valor is not None and session.get(clave) != valor:
+            session[clave] = valor
+
+
+def contexto_actual(usuarios):
+    """Contexto de la petición (se construye una vez y queda en flask.g)"""
+    if not has_request_context():
+        return ContextoAuth()
+    contexto = g.get(CLAVE_CONTEXTO)
+    if contexto is None:
+        contexto = construir_contexto(usuarios)
+        if contexto.revocado and contexto.origen == 'sesion':
+            logger.info("Sesión cerrada: usuario %s inactivo o eliminado", session.get('user_id'))
+            session.clear()
+        setattr(g, CLAVE_CONTEXTO, contexto)
+    return contexto
+
+
+def token_revocado(usuarios, jwt_payload):
+    """Para token_in_blocklist_loader: JWT de un usuario inexistente o inactivo"""
+    try:
+        usuario = usuarios.obtener(jwt_payload.get('sub'))
+    except Exception as e:
+        logger.warning("No se pudo comprobar la revocación del token: %s", e)
+        return False
+    return not usuario or not usuario.get('activo')
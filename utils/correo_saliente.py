@@ -0,0 +1,437 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de Correo Saliente
+Sistema de Laboratorios - Centro Minero SENA
+Cola persistente de correos (tabla cola_correo) con un hilo de envío por worker que
+reutiliza una sola conexión SMTP autenticada para todo el lote, reintenta con espera
+exponencial y limita los correos por destinatario.
+
+La petición web sólo inserta la fila y vuelve; el saludo SMTP + STARTTLS + login
+(varios segundos con Gmail) se paga una vez por conexión en segundo plano. Varios
+workers pueden compartir la tabla: cada lote se reclama con un token antes de enviarse.
+
+Uso:
+    cola = ColaCorreo(AlmacenCorreoMySQL(db_manager), RemitenteSMTP.desde_entorno())
+    cola.iniciar()
+    cola.encolar('aprendiz@sena.edu.co', 'Código de recuperación', html)
+
+Para pruebas locales sin credenciales basta un servidor SMTP de desarrollo
+(p. ej. `python -m aiosmtpd -n -l localhost:1025` o MailHog) con SMTP_SERVER=localhost,
+SMTP_PORT=1025, SMTP_TLS=none y SMTP_FROM definido.
+"""
+
+import logging
+import os
+import re
+import smtplib
+import ssl
+import threading
+import time
+import uuid
+from email.message import EmailMessage
+from email.utils import formataddr
+
+logger = logging.getLogger(__name__)
+
+ESTADOS = ('pendiente', 'enviando', 'enviado', 'fallido')
+
+ESQUEMA_COLA = """
+CREATE TABLE IF NOT EXISTS {tabla} (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    destinatario VARCHAR(255) NOT NULL,
+    asunto VARCHAR(255) NOT NULL,
+    html MEDIUMTEXT,
+    texto MEDIUMTEXT,
+    estado ENUM('pendiente', 'enviando', 'enviado', 'fallido') NOT NULL DEFAULT 'pendiente',
+    intentos INT NOT NULL DEFAULT 0,
+    proximo_intento DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    reclamado_por CHAR(32) NULL,
+    reclamado_en DATETIME NULL,
+    ultimo_error VARCHAR(500) NULL,
+    fecha_creacion DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    fecha_envio DATETIME NULL,
+    INDEX idx_cola_correo_pendientes (estado, proximo_intento),
+    INDEX idx_cola_correo_destinatario (destinatario, fecha_creacion),
+    INDEX idx_cola_correo_lote (reclamado_por)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+
+class LimiteCorreoExcedido(Exception):
+    """El destinatario ya recibió el máximo de correos permitido en la ventana"""
+
+
+class CorreoNoConfigurado(Exception):
+    """Falta el servidor SMTP o el remitente"""
+
+
+def texto_plano(html):
+    """Versión de texto mínima de un cuerpo HTML (parte alternativa del mensaje)"""
+    texto = re.sub(r'(?is)<(style|script|head)\b.*?</\1>', '', html or '')
+    texto = re.sub(r'(?i)<br\s*/?>|</p>|</div>|</h\d>', '\n', texto)
+    texto = re.sub(r'<[^>]+>', '', texto)
+    return re.sub(r'\n\s*\n+', '\n\n', re.sub(r'[ \t]+', ' ', texto)).strip()
+
+
+class AlmacenCorreoMySQL:
+    """Cola persistente sobre la tabla cola_correo"""
+
+    def __init__(self, db_manager, tabla='cola_correo'):
+        self.db = db_manager
+        self.tabla = tabla
+
+    def crear_tabla(self):
+        self.db.execute_query(ESQUEMA_COLA.format(tabla=self.tabla))
+
+    def insertar(self, destinatario, asunto, html, texto):
+        self.db.execute_query(
+            f"INSERT INTO {self.tabla} (destinatario, asunto, html, texto) VALUES (%s, %s, %s, %s)",
+            (destinatario, asunto[:255], html, texto),
+        )
+
+    def recientes(self, destinatario, ventana_s):
+        """Correos (no fallidos) encolados para el destinatario en los últimos ventana_s segundos"""
+        filas = self.db.execute_query(
+            f"""
+            SELECT COUNT(*) AS total FROM {self.tabla}
+            WHERE destinatario = %s AND estado <> 'fallido'
+              AND fecha_creacion > DATE_SUB(NOW(), INTERVAL %s SECOND)
+            """,
+            (destinatario, int(ventana_s)),
+        )
+        return int(filas[0]['total']) if filas else 0
+
+    def reclamar(self, token, lote, bloqueo_s):
+        """
+        Marcar hasta `lote` correos vencidos como 'enviando' con el token y devolverlos
+
+        Las filas 'enviando' de un worker caído se recuperan tras bloqueo_s segundos.
+        """
+        self.db.execute_query(
+            f"""
+            UPDATE {self.tabla} SET estado = 'enviando', reclamado_por = %s, reclamado_en = NOW()
+            WHERE (estado = 'pendiente' AND proximo_intento <= NOW())
+               OR (estado = 'enviando' AND reclamado_en < DATE_SUB(NOW(), INTERVAL %s SECOND))
+            ORDER BY id LIMIT %s
+            """,
+            (token, int(bloqueo_s), int(lote)),
+        )
+        return self.db.execute_query(
+            f"""
+            SELECT id, destinatario, asunto, html, texto, intentos FROM {self.tabla}
+            WHERE reclamado_por = %s AND estado = 'enviando' ORDER BY id
+            """,
+            (token,),
+        ) or []
+
+    def marcar_enviado(self, correo_id):
+        self.db.execute_query(
+            f"""
+            UPDATE {self.tabla} SET estado = 'enviado', fecha_envio = NOW(), intentos = intentos + 1,
+                reclamado_por = NULL, ultimo_error = NULL
+            WHERE id = %s
+            """,
+            (correo_id,),
+        )
+
+    def reprogramar(self, correo_id, intentos, espera_s, error):
+        self.db.execute_query(
+            f"""
+            UPDATE {self.tabla} SET estado = 'pendiente', intentos = %s, reclamado_por = NULL,
+                proximo_intento = DATE_ADD(NOW(), INTERVAL %s SECOND), ultimo_error = %s
+            WHERE id = %s
+            """,
+            (intentos, int(espera_s), error[:500], correo_id),
+        )
+
+    def marcar_fallido(self, correo_id, intentos, error):
+        self.db.execute_query(
+            f"""
+            UPDATE {self.tabla} SET estado = 'fallido', intentos = %s, reclamado_por = NULL, ultimo_error = %s
+            WHERE id = %s
+            """,
+            (intentos, error[:500], correo_id),
+        )
+
+    def resumen(self):
+        filas = self.db.execute_query(f"SELECT estado, COUNT(*) AS total FROM {self.tabla} GROUP BY estado") or []
+        return {f['estado']: int(f['total']) for f in filas}
+
+
+class RemitenteSMTP:
+    """Conexión SMTP autenticada que se reutiliza entre envíos y se reabre al caerse"""
+
+    def __init__(self, servidor, puerto=587, usuario='', password='', tls='starttls', remitente=None,
+                 nombre_remitente='Centro Minero SENA', timeout=10, inactividad_s=60):
+        self.servidor = servidor
+        self.puerto = int(puerto)
+        self.usuario = usuario
+        self.password = password
+        self.tls = (tls or 'none').lower()
+        self.remitente = remitente or usuario
+        self.nombre_remitente = nombre_remitente
+        self.timeout = timeout
+        self.inactividad_s = inactividad_s
+        self._smtp = None
+        self._pid = None
+        self._ultimo_uso = 0.0
+        self.stats = {'conexiones': 0, 'enviados': 0, 'reconexiones': 0}
+
+    @classmethod
+    def desde_entorno(cls):
+        """SMTP_SERVER, SMTP_PORT, SMTP_USER, SMTP_PASSWORD, SMTP_TLS (starttls|ssl|none), SMTP_FROM"""
+        return cls(
+            os.getenv('SMTP_SERVER', 'smtp.gmail.com'),
+            os.getenv('SMTP_PORT', '587'),
+            os.getenv('SMTP_USER', ''),
+            os.getenv('SMTP_PASSWORD', ''),
+            os.getenv('SMTP_TLS', 'starttls'),
+            os.getenv('SMTP_FROM') or None,
+        )
+
+    @property
+    def configurado(self):
+        if not self.servidor or not self.remitente:
+            return False
+        # Con usuario hace falta contraseña; sin usuario se asume un relé sin autenticación
+        return not self.usuario or bool(self.password)
+
+    def _conectar(self):
+        contexto = ssl.create_default_context()
+        if self.tls == 'ssl':
+            smtp = smtplib.SMTP_SSL(self.servidor, self.puerto, timeout=self.timeout, context=contexto)
+        else:
+            smtp = smtplib.SMTP(self.servidor, self.puerto, timeout=self.timeout)
+            if self.tls == 'starttls':
+                smtp.starttls(context=contexto)
+        if self.usuario:
+            smtp.login(self.usuario, self.password)
+        self.stats['conexiones'] += 1
+        return smtp
+
+    def _conexion(self):
+        # Tras un fork el socket del proceso padre no se puede usar (ni cerrar con QUIT)
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._smtp = None
+        if self._smtp is not None and time.monotonic() - self._ultimo_uso > self.inactividad_s:
+            # El servidor probablemente cerró la sesión inactiva: comprobar antes de reutilizar
+            try:
+                self._smtp.noop()
+            except (smtplib.SMTPException, OSError):
+                self._descartar()
+        if self._smtp is None:
+            self._smtp = self._conectar()
+        return self._smtp
+
+    def _descartar(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.close()
+            except Exception:
+                pass
+        self._smtp = None
+
+    def construir(self, destinatario, asunto, html, texto=None):
+        msg = EmailMessage()
+        msg['Subject'] = asunto
+        msg['From'] = formataddr((self.nombre_remitente, self.remitente))
+        msg['To'] = destinatario
+        msg.set_content(texto or texto_plano(html))
+        if html:
+            msg.add_alternative(html, subtype='html')
+        return msg
+
+    def enviar(self, destinatario, asunto, html, texto=None):
+        """Enviar por la conexión abierta; si el servidor la cerró, reconectar una vez"""
+        msg = self.construir(destinatario, asunto, html, texto)
+        try:
+            self._conexion().send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            self._descartar()
+            self.stats['reconexiones'] += 1
+            self._conexion().send_message(msg)
+        except smtplib.SMTPAuthenticationError:
+            self._descartar()
+            raise
+        self._ultimo_uso = time.monotonic()
+        self.stats['enviados'] += 1
+
+    def cerrar_si_inactiva(self):
+        if self._smtp is not None and self._pid == os.getpid() \
+                and time.monotonic() - self._ultimo_uso > self.inactividad_s:
+            self.cerrar()
+
+    def cerrar(self):
+        if self._smtp is not None and self._pid == os.getpid():
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+        self._descartar()
+
+
+def es_error_permanente(error):
+    """Rechazos 5xx del destinatario o del mensaje: reintentar no sirve"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(codigo >= 500 for codigo, _mensaje in error.recipients.values())
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False  # Credenciales: se reintenta por si se corrigen
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+
+class ColaCorreo:
+    """Cola de correo con hilo de envío en segundo plano"""
+
+    def __init__(self, almacen, remitente, lote=20, intervalo_s=5.0, max_intentos=5, espera_base_s=30,
+                 espera_max_s=3600, limite_destinatario=3, ventana_destinatario_s=900, bloqueo_s=600):
+        """
+        Args:
+            almacen: AlmacenCorreoMySQL (o equivalente)
+            remitente: RemitenteSMTP
+            lote: Correos reclamados por vuelta (misma conexión SMTP)
+            intervalo_s: Espera entre vueltas sin trabajo (un encolado local despierta al hilo)
+            max_intentos: Intentos antes de marcar el correo como fallido
+            espera_base_s, espera_max_s: Espera exponencial entre reintentos (base * 2^(n-1), con tope)
+            limite_destinatario: Máximo de correos por destinatario dentro de la ventana (0 desactiva)
+            ventana_destinatario_s: Ventana del límite por destinatario
+            bloqueo_s: Tiempo tras el que un lote 'enviando' de un worker caído se vuelve a reclamar
+        """
+        self.almacen = almacen
+        self.remitente = remitente
+        self.lote = lote
+        self.intervalo_s = intervalo_s
+        self.max_intentos = max_intentos
+        self.espera_base_s = espera_base_s
+        self.espera_max_s = espera_max_s
+        self.limite_destinatario = limite_destinatario
+        self.ventana_destinatario_s = ventana_destinatario_s
+        self.bloqueo_s = bloqueo_s
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._pid = None
+        self._tabla_lista = False
+        self._lock = threading.Lock()
+        self.stats = {'encolados': 0, 'enviados': 0, 'reintentos': 0, 'fallidos': 0,
+                      'limitados': 0, 'errores_cola': 0}
+
+    def _preparar_tabla(self):
+        if not self._tabla_lista:
+            with self._lock:
+                if not self._tabla_lista:
+                    self.almacen.crear_tabla()
+                    self._tabla_lista = True
+
+    def espera_reintento(self, intentos):
+        return min(self.espera_base_s * 2 ** max(intentos - 1, 0), self.espera_max_s)
+
+    def encolar(self, destinatario, asunto, html, texto=None):
+        """
+        Guardar un correo para envío en segundo plano
+
+        Raises:
+            CorreoNoConfigurado: Sin servidor SMTP o remitente
+            LimiteCorreoExcedido: El destinatario superó limite_destinatario en la ventana
+        """
+        if not self.remitente.configurado:
+            raise CorreoNoConfigurado(
+                'Configuración de correo no disponible. Verifica SMTP_SERVER, SMTP_USER/SMTP_PASSWORD '
+                'o SMTP_FROM en .env_produccion')
+        destinatario = destinatario.strip()
+        self._preparar_tabla()
+        if self.limite_destinatario and \
+                self.almacen.recientes(destinatario, self.ventana_destinatario_s) >= self.limite_destinatario:
+            self.stats['limitados'] += 1
+            raise LimiteCorreoExcedido(
+                f'Se alcanzó el límite de {self.limite_destinatario} correos para este destinatario; '
+                f'intenta de nuevo en unos minutos')
+        self.almacen.insertar(destinatario, asunto, html, texto)
+        self.stats['encolados'] += 1
+        # Sólo despierta al hilo de este proceso si iniciar() lo arrancó; sin él la fila
+        # espera en la tabla al hilo de otro worker o a POST /api/admin/correo
+        self._despertar.set()
+
+    def procesar_lote(self):
+        """
+        Reclamar y enviar un lote por la misma conexión SMTP
+
+        Returns:
+            int: Correos reclamados (0 si la cola está vacía)
+        """
+        self._preparar_tabla()
+        correos = self.almacen.reclamar(uuid.uuid4().hex, self.lote, self.bloqueo_s)
+        for correo in correos:
+            intentos = int(correo.get('intentos') or 0) + 1
+            try:
+                self.remitente.enviar(correo['destinatario'], correo['asunto'], correo['html'], correo.get('texto'))
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+                if es_error_permanente(e) or intentos >= self.max_intentos:
+                    self.almacen.marcar_fallido(correo['id'], intentos, error)
+                    self.stats['fallidos'] += 1
+                    logger.error("Correo %s a %s descartado tras %s intentos: %s",
+                                 correo['id'], correo['destinatario'], intentos, error)
+                else:
+                    espera = self.espera_reintento(intentos)
+                    self.almacen.reprogramar(correo['id'], intentos, espera, error)
+                    self.stats['reintentos'] += 1
+                    logger.warning("Correo %s a %s falló (intento %s), reintento en %s s: %s",
+                                   correo['id'], correo['destinatario'], intentos, espera, error)
+                continue
+            self.almacen.marcar_enviado(correo['id'])
+            self.stats['enviados'] += 1
+            logger.info("Correo %s enviado a %s", correo['id'], correo['destinatario'])
+        return len(correos)
+
+    def vaciar(self, max_vueltas=100):
+        """Procesar lotes hasta que no quede trabajo vencido (scripts y pruebas)"""
+        total = 0
+        for _ in range(max_vueltas):
+            n = self.procesar_lote()
+            total += n
+            if not n:
+                break
+        return total
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            try:
+                # Lotes seguidos mientras haya trabajo; después se espera un encolado o el intervalo
+                while self.procesar_lote() >= self.lote:
+                    pass
+            except Exception as e:
+                self.stats['errores_cola'] += 1
+                logger.warning("Cola de correo no disponible: %s", e)
+            self.remitente.cerrar_si_inactiva()
+            self._despertar.wait(self.intervalo_s)
+            self._despertar.clear()
+        self.remitente.cerrar()
+
+    def _asegurar_hilo(self):
+        # El hilo no sobrevive al fork: cada worker arranca el suyo
+        if self._pid == os.getpid() and self._hilo is not None and self._hilo.is_alive():
+            return
+        self._pid = os.getpid()
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name='cola-correo', daemon=True)
+        self._hilo.start()
+
+    def iniciar(self):
+        """Arrancar el hilo de envío en este proceso (llamar de nuevo tras un fork)"""
+        if self.remitente.configurado:
+            self._asegurar_hilo()
+
+    def detener(self, timeout=5):
+        self._detener.set()
+        self._despertar.set()
+        if self._hilo is not None and self._pid == os.getpid():
+            self._hilo.join(timeout)
+
+    def estadisticas(self):
+        datos = dict(self.stats)
+        datos['smtp'] = dict(self.remitente.stats)
+        datos['hilo_activo'] = bool(self._hilo is not None and self._pid == os.getpid() and self._hilo.is_alive())
+        return datos
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de Detección de Rostros Multi-resolución
+Sistema de Laboratorios - Centro Minero SENA
+El costo de detectMultiScale crece con los píxeles del cuadro que envía la cámara (720p o
+más). Aquí la detección corre sobre una copia reducida (ancho_deteccion) con el tamaño
+mínimo escalado en proporción, de modo que el costo ya no depende de la resolución de la
+cámara, y las cajas se devuelven en coordenadas del cuadro original para recortar el
+rostro a resolución completa.
+
+Seguimiento de ROI (opcional): con la caja del intento anterior del mismo cliente, se
+busca primero sólo en una ventana alrededor de ella. Si ahí no aparece exactamente un
+rostro (el usuario se movió o se acercó demasiado, entró otra persona) se repite la
+búsqueda en el cuadro completo, así que un ROI equivocado sólo cuesta la búsqueda en la
+ventana. En la ventana sólo se prueban tamaños cercanos al del rostro anterior.
+
+Un acierto en la ventana no dice nada del resto del cuadro, donde puede haber entrado una
+segunda persona. Antes de aceptarlo se hace una pasada rápida sobre el cuadro completo
+más reducido (ancho_verificacion) que sólo cuenta rostros: si encuentra más de uno se
+devuelven esos, y el login los rechaza igual que sin seguimiento. El ROI ahorra así la
+pasada a ancho_deteccion, no la comprobación de rostros múltiples.
+"""
+
+import time
+
+from utils.carga_diferida import modulo_diferido
+from utils.detectores import detectores
+
+cv2 = modulo_diferido('cv2')
+
+# El clasificador frontal de OpenCV está entrenado con ventanas de 24x24
+TAMANO_MINIMO_HAAR = 24
+
+
+def detectar_escalado(gris, ancho_deteccion, tamano_minimo=100, tamano_maximo=None, scale_factor=1.1,
+                      min_neighbors=5, clasificador='rostros_haar'):
+    """
+    Detectar sobre una copia de ancho `ancho_deteccion` (0 = resolución original)
+
+    tamano_minimo y tamano_maximo (lado del rostro en píxeles de `gris`) se escalan junto
+    con la copia, de modo que la pirámide sólo recorre escalas que pueden contener un rostro.
+
+    Returns:
+        list: Cajas (x, y, w, h) en coordenadas de `gris`
+    """
+    alto, ancho = gris.shape[:2]
+    escala = 1.0
+    if ancho_deteccion and ancho > ancho_deteccion:
+        escala = ancho_deteccion / ancho
+        gris = cv2.resize(gris, (ancho_deteccion, max(1, int(round(alto * escala)))), interpolation=cv2.INTER_AREA)
+    minimo = max(TAMANO_MINIMO_HAAR, int(tamano_minimo * escala))
+    maximo = (0, 0)
+    if tamano_maximo:
+        lado = max(minimo, int(tamano_maximo * escala))
+        maximo = (lado, lado)
+    cajas = detectores.obtener(clasificador).detectMultiScale(
+        gris, scaleFactor=scale_factor, minNeighbors=min_neighbors, minSize=(minimo, minimo), maxSize=maximo)
+    return [_acotar(tuple(int(round(v / escala)) for v in caja), ancho, alto) for caja in cajas]
+
+
+def _acotar(caja, ancho, alto):
+    x, y, w, h = caja
+    x, y = max(0, min(x, ancho - 1)), max(0, min(y, alto - 1))
+    return x, y, max(1, min(w, ancho - x)), max(1, min(h, alto - y))
+
+
+def ventana_roi(caja, ancho, alto, margen=0.5):
+    """Ventana (x0, y0, x1, y1) alrededor de una caja, ampliada `margen` veces su tamaño por lado"""
+    x, y, w, h = caja
+    dx, dy = int(w * margen), int(h * margen)
+    return max(0, x - dx), max(0, y - dy), min(ancho, x + w + dx), min(alto, y + h + dy)
+
+
+class DetectorRostros:
+    """Detección reducida con seguimiento opcional de la región del rostro"""
+
+    def __init__(self, ancho_deteccion=480, tamano_minimo=100, seguimiento=True, margen_roi=0.5, roi_ttl_s=10.0,
+                 ancho_verificacion=320):
+        """
+        Args:
+            ancho_deteccion: Ancho de la copia reducida (0 = cuadro completo, como antes)
+            ancho_verificacion: Ancho de la pasada que busca otros rostros tras un acierto del ROI
+            tamano_minimo: Lado mínimo del rostro en píxeles del cuadro original
+            seguimiento: Usar el ROI del intento anterior si se proporciona
+            margen_roi: Ampliación de la ventana alrededor del ROI (fracción del lado del rostro)
+            roi_ttl_s: Antigüedad máxima de un ROI para reutilizarlo
+        """
+        self.ancho_deteccion = ancho_deteccion
+        self.tamano_minimo = tamano_minimo
+        self.seguimiento = seguimiento
+        self.margen_roi = margen_roi
+        self.roi_ttl_s = roi_ttl_s
+        self.ancho_verificacion = ancho_verificacion
+        if ancho_deteccion:
+            self.ancho_verificacion = min(ancho_verificacion or ancho_deteccion, ancho_deteccion)
+        self.stats = {'completas': 0, 'roi_aciertos': 0, 'roi_fallos': 0, 'roi_multiples': 0, 'ms_deteccion': 0.0}
+
+    def detectar(self, gris, roi=None):
+        """
+        Rostros del cuadro
+
+        Args:
+            gris: Cuadro en escala de grises a resolución original
+            roi: Estado devuelto por una llamada anterior del mismo cliente (o None)
+
+        Returns:
+            tuple: (cajas en coordenadas del cuadro, modo 'roi' o 'completa', nuevo estado de
+                ROI para guardar o None si no hubo exactamente un rostro)
+        """
+        inicio = time.perf_counter()
+        alto, ancho = gris.shape[:2]
+        cajas, modo = None, 'completa'
+        caja_previa = self._roi_vigente(roi, ancho, alto)
+        if caja_previa is not None:
+            x0, y0, x1, y1 = ventana_roi(caja_previa, ancho, alto, self.margen_roi)
+            # Entre dos intentos seguidos el rostro cambia poco de tamaño: sólo esas escalas
+            lado = caja_previa[2]
+            en_ventana = detectar_escalado(gris[y0:y1, x0:x1], self.ancho_deteccion,
+                                           max(self.tamano_minimo, int(lado / 1.5)), int(lado * 1.5))
+            if len(en_ventana) != 1:
+                self.stats['roi_fallos'] += 1
+            else:
+                # Nadie más en el cuadro: la pasada rápida no encuentra un segundo rostro
+                en_cuadro = detectar_escalado(gris, self.ancho_verificacion, self.tamano_minimo)
+                if len(en_cuadro) > 1:
+                    cajas = en_cuadro
+                    self.stats['roi_multiples'] += 1
+                else:
+                    x, y, w, h = en_ventana[0]
+                    cajas, modo = [(x + x0, y + y0, w, h)], 'roi'
+                    self.stats['roi_aciertos'] += 1
+        if cajas is None:
+            cajas = detectar_escalado(gris, self.ancho_deteccion, self.tamano_minimo)
+            self.stats['completas'] += 1
+        self.stats['ms_deteccion'] += (time.perf_counter() - inicio) * 1000
+
+        nuevo_roi = None
+        if self.seguimiento and len(cajas) == 1:
+            nuevo_roi = {'caja': [int(v) for v in cajas[0]], 'cuadro': [ancho, alto], 't': time.time()}
+        return cajas, modo, nuevo_roi
+
+    def _roi_vigente(self, roi, ancho, alto):
+        if not self.seguimiento or not isinstance(roi, dict):
+            return None
+        try:
+            caja = tuple(int(v) for v in roi['caja'])
+            vigente = list(roi['cuadro']) == [ancho, alto] and time.time() - float(roi['t']) <= self.roi_ttl_s
+        except (KeyError, TypeError, ValueError):
+            return None
+        if not vigente or len(caja) != 4 or min(caja[2:]) <= 0:
+            return None
+        return _acotar(caja, ancho, alto)
+
+    def estadisticas(self):
+        return {**self.stats, 'ms_deteccion': round(self.stats['ms_deteccion'], 1)}
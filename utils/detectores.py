@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de Registro de Detectores OpenCV
+Sistema de Laboratorios - Centro Minero SENA
+Los clasificadores Haar, ORB y los matchers BF/FLANN se construyen una sola vez y se
+reutilizan en lugar de crearse en cada petición (el CascadeClassifier, además, relee y
+parsea su XML de disco cada vez).
+
+Ninguno de estos objetos es seguro para usar desde varios hilos a la vez
+(detectMultiScale y los matchers guardan estado interno), así que por defecto cada hilo
+del worker tiene su propia instancia: se crea en la primera petición que atiende ese
+hilo y se reutiliza en las siguientes. Los objetos registrados con por_hilo=False se
+comparten en todo el proceso.
+
+Uso:
+    from utils.detectores import detectores
+    rostros = detectores.obtener('rostros_haar').detectMultiScale(gris, 1.1, 5)
+"""
+
+import os
+import threading
+import time
+
+from utils.carga_diferida import modulo_diferido
+
+cv2 = modulo_diferido('cv2')
+
+
+class DetectorNoDisponible(RuntimeError):
+    """El detector no pudo construirse (p. ej. XML del clasificador ausente)"""
+
+
+class RegistroDetectores:
+    """Fábricas de detectores con instancias por hilo (o por proceso) reutilizables"""
+
+    def __init__(self):
+        self._fabricas = {}
+        self._compartidos = {}
+        self._lock = threading.Lock()
+        self._locales = threading.local()
+        self._pid = os.getpid()
+        self.stats = {'creados': 0, 'reutilizados': 0, 'ms_construccion': 0.0}
+
+    def registrar(self, nombre, fabrica, por_hilo=True):
+        """
+        Args:
+            nombre: Clave con la que se pide el detector
+            fabrica: Función sin argumentos que construye el objeto
+            por_hilo: Una instancia por hilo (True) o una compartida por el proceso
+        """
+        self._fabricas[nombre] = (fabrica, por_hilo)
+        return fabrica
+
+    def _construir(self, nombre, fabrica):
+        inicio = time.perf_counter()
+        detector = fabrica()
+        self.stats['creados'] += 1
+        self.stats['ms_construccion'] += (time.perf_counter() - inicio) * 1000
+        return detector
+
+    def _verificar_proceso(self):
+        # Tras un fork los hilos del maestro no existen: se parte de cero en el worker
+        if os.getpid() != self._pid:
+            with self._lock:
+                if os.getpid() != self._pid:
+                    self._compartidos = {}
+                    self._locales = threading.local()
+                    self._pid = os.getpid()
+
+    def obtener(self, nombre):
+        """Instancia del detector para el hilo (o proceso) actual"""
+        try:
+            fabrica, por_hilo = self._fabricas[nombre]
+        except KeyError:
+            raise KeyError(f'Detector no registrado: {nombre}') from None
+        self._verificar_proceso()
+        if por_hilo:
+            instancias = self._locales.__dict__
+            detector = instancias.get(nombre)
+            if detector is None:
+                detector = instancias[nombre] = self._construir(nombre, fabrica)
+            else:
+                self.stats['reutilizados'] += 1
+            return detector
+        detector = self._compartidos.get(nombre)
+        if detector is None:
+            with self._lock:
+                detector = self._compartidos.get(nombre)
+                if detector is None:
+                    detector = self._compartidos[nombre] = self._construir(nombre, fabrica)
+                    return detector
+        self.stats['reutilizados'] += 1
+        return detector
+
+    def precargar(self, *nombres):
+        """Construir ya los detectores indicados (todos si no se indica ninguno) en el hilo actual"""
+        for nombre in nombres or tuple(self._fabricas):
+            self.obtener(nombre)
+
+    def fabricas(self):
+        """{nombre: (fabrica, por_hilo)} de los detectores registrados"""
+        return dict(self._fabricas)
+
+    def __contains__(self, nombre):
+        return nombre in self._fabricas
+
+    def estadisticas(self):
+        return {'registrados': len(self._fabricas), 'creados': self.stats['creados'],
+                'reutilizados': self.stats['reutilizados'],
+                'ms_construccion': round(self.stats['ms_construccion'], 1)}
+
+
+def clasificador_haar(archivo='haarcascade_frontalface_default.xml'):
+    """Clasificador Haar de los incluidos con OpenCV"""
+    clasificador = cv2.CascadeClassifier(cv2.data.haarcascades + archivo)
+    if clasificador.empty():
+        raise DetectorNoDisponible(f'No se pudo cargar el clasificador {archivo}')
+    return clasificador
+
+
+# Parámetros LSH de FLANN para descriptores binarios (ORB)
+FLANN_LSH_INDICE = dict(algorithm=6, table_number=12, key_size=20, multi_probe_level=2)
+FLANN_LSH_BUSQUEDA = dict(checks=50)
+
+detectores = RegistroDetectores()
+detectores.registrar('rostros_haar', clasificador_haar)
+detectores.registrar('orb_500', lambda: cv2.ORB_create(nfeatures=500))
+detectores.registrar('orb_1500', lambda: cv2.ORB_create(nfeatures=1500))
+detectores.registrar('bf_hamming', lambda: cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True))
+detectores.registrar('flann_lsh', lambda: cv2.FlannBasedMatcher(FLANN_LSH_INDICE, FLANN_LSH_BUSQUEDA))
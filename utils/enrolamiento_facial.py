@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de Enrolamiento Facial Masivo
+Sistema de Laboratorios - Centro Minero SENA
+Registra los rostros de una cohorte completa a partir de una carpeta o un archivo
+ZIP/TAR con una imagen por aprendiz, nombrada con su id de usuario ('1098765432.jpg';
+varias fotos de un mismo usuario con sufijo '__N': '1098765432__2.jpg').
+
+- Detección, recorte (200x200 JPEG, la misma plantilla del registro individual),
+  puntaje de calidad y encoding de face_recognition (si está instalado) en un pool de
+  procesos; cada proceso carga el clasificador Haar una sola vez (utils.detectores) y
+  detecta sobre una copia reducida (utils.deteccion_rostros).
+- Por usuario se conserva la foto de mejor calidad para rostro_data; los encodings de
+  todas las fotos aceptadas van a usuarios_facial.
+- Escrituras por lotes con executemany en una transacción; si un lote falla se
+  reintenta usuario por usuario para aislar el registro problemático.
+- Reporte con los rechazos por archivo (sin rostro, varios rostros, calidad baja,
+  usuario inexistente, imagen ilegible).
+"""
+
+import io
+import json
+import logging
+import os
+import tarfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from utils.carga_diferida import modulo_diferido
+from utils.deteccion_rostros import detectar_escalado
+
+cv2 = modulo_diferido('cv2')
+np = modulo_diferido('numpy')
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONES = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+SEPARADOR_SECUENCIA = '__'
+TAMANO_PLANTILLA = 200
+ANCHO_DETECCION = 1280
+
+SQL_ROSTRO = "UPDATE usuarios SET rostro_data = %s WHERE id = %s"
+SQL_INSERTAR_ENCODING = """
+    INSERT INTO usuarios_facial (usuario_id, encoding_facial, calidad_imagen, notas)
+    VALUES (%s, %s, %s, %s)
+"""
+# Deja activos sólo los N encodings más recientes del usuario
+SQL_DEPURAR_ENCODINGS = """
+    UPDATE usuarios_facial SET activo = FALSE
+    WHERE usuario_id = %s AND activo = TRUE AND id NOT IN (
+        SELECT id FROM (
+            SELECT id FROM usuarios_facial WHERE usuario_id = %s AND activo = TRUE ORDER BY id DESC LIMIT %s
+        ) recientes
+    )
+"""
+
+
+class ErrorEnrolamiento(Exception):
+    """Error que invalida el origen completo (formato, archivo ilegible)"""
+
+
+def usuario_desde_archivo(nombre):
+    """Id de usuario a partir del nombre de archivo ('fotos/U123__2.JPG' -> 'U123'); None si no es imagen"""
+    base = os.path.basename(str(nombre).replace('\\', '/'))
+    raiz, extension = os.path.splitext(base)
+    if extension.lower() not in EXTENSIONES or raiz.startswith('.'):
+        return None
+    raiz = raiz.split(SEPARADOR_SECUENCIA, 1)[0].strip()
+    return raiz or None
+
+
+def _ignorar(nombre):
+    return '__MACOSX/' in nombre or os.path.basename(nombre).startswith('.')
+
+
+def iterar_imagenes(origen, nombre_archivo=None, max_bytes=15 * 1024 * 1024):
+    """
+    Iterar las imágenes de una carpeta o de un archivo ZIP/TAR
+
+    Args:
+        origen: Ruta de una carpeta, ruta de un archivo o stream binario (p. ej.
+            request.files['archivo'].stream)
+        nombre_archivo: Nombre original del archivo, para detectar el formato de un stream
+        max_bytes: Las entradas más grandes se rechazan sin leerlas
+
+    Yields:
+        tuple: (nombre, fuente) donde fuente es la ruta del archivo (carpetas), los bytes
+            de la imagen o None si la entrada supera max_bytes
+    """
+    if isinstance(origen, str) and os.path.isdir(origen):
+        for raiz, carpetas, archivos in os.walk(origen):
+            carpetas.sort()
+            for nombre in sorted(archivos):
+                ruta = os.path.join(raiz, nombre)
+                if usuario_desde_archivo(nombre) and not _ignorar(nombre):
+                    yield os.path.relpath(ruta, origen), (ruta if os.path.getsize(ruta) <= max_bytes else None)
+        return
+
+    nombre_archivo = (nombre_archivo or (origen if isinstance(origen, str) else '')).lower()
+    if nombre_archivo.endswith('.zip'):
+        try:
+            with zipfile.ZipFile(origen) as archivo:
+                for info in archivo.infolist():
+                    if info.is_dir() or _ignorar(info.filename) or not usuario_desde_archivo(info.filename):
+                        continue
+                    yield info.filename, (archivo.read(info) if info.file_size <= max_bytes else None)
+        except zipfile.BadZipFile as e:
+            raise ErrorEnrolamiento(f'Archivo ZIP inválido: {e}')
+        return
+    if nombre_archivo.endswith(('.tar', '.tar.gz', '.tgz')):
+        try:
+            if isinstance(origen, str):
+                archivo = tarfile.open(origen, 'r:*')
+            else:
+                archivo = tarfile.open(fileobj=origen, mode='r:*')
+            with archivo:
+                for info in archivo:
+                    if not info.isfile() or _ignorar(info.name) or not usuario_desde_archivo(info.name):
+                        continue
+                    yield info.name, (archivo.extractfile(info).read() if info.size <= max_bytes else None)
+        except tarfile.TarError as e:
+            raise ErrorEnrolamiento(f'Archivo TAR inválido: {e}')
+        return
+    raise ErrorEnrolamiento('El origen debe ser una carpeta o un archivo .zip, .tar o .tar.gz')
+
+
+# --- Trabajo de cada proceso del pool -------------------------------------------------
+
+_trabajador = {'face_recognition': None}
+
+
+def _iniciar_trabajador():
+    # Un hilo de OpenCV por proceso: el paralelismo ya lo da el pool
+    try:
+        cv2.setNumThreads(1)
+    except Exception:
+        pass
+
+
+def _modulo_face_recognition():
+    if _trabajador['face_recognition'] is None:
+        try:
+            import face_recognition
+            _trabajador['face_recognition'] = face_recognition
+        except ImportError:
+            _trabajador['face_recognition'] = False
+    return _trabajador['face_recognition'] or None
+
+
+def detectar_rostros(img):
+    """Cajas (x, y, w, h) en coordenadas de img; la detección corre sobre una copia reducida"""
+    return detectar_escalado(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), ANCHO_DETECCION, tamano_minimo=100)
+
+
+def calidad_rostro(rostro_gris, ancho_rostro):
+    """
+    Puntaje 0-100 del recorte: nitidez (varianza del laplaciano), exposición, contraste y
+    tamaño del rostro en la foto original
+    """
+    nitidez = min(cv2.Laplacian(rostro_gris, cv2.CV_64F).var() / 300.0, 1.0)
+    exposicion = 1.0 - abs(float(rostro_gris.mean()) - 128.0) / 128.0
+    contraste = min(float(rostro_gris.std()) / 64.0, 1.0)
+    tamano = min(ancho_rostro / float(TAMANO_PLANTILLA), 1.0)
+    return round(100.0 * (0.4 * nitidez + 0.2 * exposicion + 0.2 * contraste + 0.2 * tamano), 1)
+
+
+def procesar_imagen(tarea):
+    """
+    Detectar, recortar y puntuar el rostro de una imagen (se ejecuta en el pool)
+
+    Args:
+        tarea: (nombre, fuente, calidad_minima), con fuente = ruta o bytes
+
+    Returns:
+        dict: archivo, calidad, plantilla (JPEG 200x200), encoding (lista o None) y
+            motivo (None si la imagen es aceptada)
+    """
+    nombre, fuente, calidad_minima = tarea
+    resultado = {'archivo': nombre, 'calidad': 0.0, 'plantilla': None, 'encoding': None, 'motivo': None}
+    try:
+        if isinstance(fuente, str):
+            with open(fuente, 'rb') as f:
+                fuente = f.read()
+        img = cv2.imdecode(np.frombuffer(fuente, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            resultado['motivo'] = 'Imagen ilegible'
+            return resultado
+        cajas = detectar_rostros(img)
+        if not cajas:
+            resultado['motivo'] = 'No se detectó ningún rostro'
+            return resultado
+        if len(cajas) > 1:
+            resultado['motivo'] = f'Se detectaron {len(cajas)} rostros'
+            return resultado
+
+        x, y, w, h = cajas[0]
+        recorte = cv2.resize(img[y:y + h, x:x + w], (TAMANO_PLANTILLA, TAMANO_PLANTILLA))
+        resultado['calidad'] = calidad_rostro(cv2.cvtColor(recorte, cv2.COLOR_BGR2GRAY), w)
+        if resultado['calidad'] < calidad_minima:
+            resultado['motivo'] = f"Calidad insuficiente ({resultado['calidad']:.1f} < {calidad_minima:.1f})"
+            return resultado
+        resultado['plantilla'] = cv2.imencode('.jpg', recorte)[1].tobytes()
+
+        face_recognition = _modulo_face_recognition()
+        if face_recognition is not None:
+            rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            encodings = face_recognition.face_encodings(rgb, [(y, x + w, y + h, x)], model='small')
+            if encodings:
+                resultado['encoding'] = [float(v) for v in encodings[0]]
+    except Exception as e:
+        resultado['motivo'] = f'Error procesando la imagen: {e}'
+    return resultado
+
+
+# --- Orquestación ---------------------------------------------------------------------
+
+class EnrolamientoFacial:
+    """Enrolamiento masivo con un pool de procesos y escrituras por lotes"""
+
+    def __init__(self, db_manager, procesos=None, tamano_lote=200, calidad_minima=35.0,
+                 max_encodings_usuario=5, max_rechazos_reportados=1000, procesar=procesar_imagen,
+                 max_imagenes=None):
+        """
+        Args:
+            db_manager: DatabaseManager (get_connection y execute_query)
+            procesos: Tamaño del pool (None = núcleos disponibles; 0 o 1 = en el mismo proceso)
+            tamano_lote: Usuarios por transacción
+            calidad_minima: Puntaje mínimo (0-100) para aceptar una foto
+            max_encodings_usuario: Encodings activos que se conservan por usuario
+            max_rechazos_reportados: Tope de rechazos detallados en el reporte
+            procesar: Función del pool (debe poder serializarse: definida a nivel de módulo)
+            max_imagenes: Tope de imágenes por origen (None = sin tope); si se supera se
+                aborta con ErrorEnrolamiento antes de escribir nada
+        """
+        self.db_manager = db_manager
+        self.procesos = (os.cpu_count() or 1) if procesos is None else procesos
+        self.tamano_lote = tamano_lote
+        self.calidad_minima = calidad_minima
+        self.max_encodings_usuario = max_encodings_usuario
+        self.max_rechazos_reportados = max_rechazos_reportados
+        self.procesar = procesar
+        self.max_imagenes = max_imagenes
+
+    def _cargar_usuarios(self):
+        """Mapa id en mayúsculas -> id real (MySQL compara los id sin distinguir mayúsculas)"""
+        filas = self.db_manager.execute_query("SELECT id FROM usuarios") or []
+        return {str(f['id']).upper(): f['id'] for f in filas}
+
+    def _tabla_encodings_disponible(self):
+        try:
+            self.db_manager.execute_query("SELECT 1 FROM usuarios_facial LIMIT 1")
+            return True
+        except Exception as e:
+            logger.warning("Sin tabla usuarios_facial, no se guardarán encodings: %s", e)
+            return False
+
+    def _rechazar(self, resultado, archivo, usuario_id, motivo):
+        resultado['rechazadas'] += 1
+        if len(resultado['rechazos']) < self.max_rechazos_reportados:
+            resultado['rechazos'].append({'archivo': archivo, 'usuario_id': usuario_id, 'motivo': motivo})
+        else:
+            resultado['rechazos_truncados'] = True
+
+    def _procesar_todo(self, tareas):
+        """Resultados de procesar cada tarea, con el pool acotado a unas pocas tareas en vuelo por proceso"""
+        if self.procesos <= 1:
+            _iniciar_trabajador()
+            for tarea in tareas:
+                yield tarea[0], self.procesar(tarea[1:])
+            return
+        with ProcessPoolExecutor(max_workers=self.procesos, mp_context=get_context('spawn'),
+                                 initializer=_iniciar_trabajador) as pool:
+            pendientes = deque()
+            for tarea in tareas:
+                pendientes.append((tarea[0], pool.submit(self.procesar, tarea[1:])))
+                # Ventana acotada: un archivo de miles de fotos no se carga entero en memoria
+                if len(pendientes) >= self.procesos * 4:
+                    usuario_id, futuro = pendientes.popleft()
+                    yield usuario_id, futuro.result()
+            while pendientes:
+                usuario_id, futuro = pendientes.popleft()
+                yield usuario_id, futuro.result()
+
+    def _escribir_lote(self, conn, lote, con_encodings, resultado):
+        """Guardar un lote de usuarios en una transacción; si falla, usuario por usuario"""
+        try:
+            self._escribir(conn, lote, con_encodings)
+            resultado['usuarios_registrados'] += len(lote)
+            resultado['lotes'] += 1
+            return
+        except Exception as e:
+            logger.warning("Lote de %s usuarios rechazado, se reintenta uno a uno: %s", len(lote), e)
+        for usuario_id, fotos in lote:
+            try:
+                self._escribir(conn, [(usuario_id, fotos)], con_encodings)
+                resultado['usuarios_registrados'] += 1
+            except Exception as e:
+                for foto in fotos:
+                    self._rechazar(resultado, foto['archivo'], usuario_id, f'Error guardando en base de datos: {e}')
+
+    def _escribir(self, conn, lote, con_encodings):
+        conn.start_transaction()
+        cursor = conn.cursor()
+        try:
+            cursor.executemany(SQL_ROSTRO, [(fotos[0]['plantilla'], usuario_id) for usuario_id, fotos in lote])
+            encodings = [(usuario_id, json.dumps(f['encoding']), f['calidad'], 'Enrolamiento masivo')
+                         for usuario_id, fotos in lote for f in fotos if f['encoding'] is not None]
+            if con_encodings and encodings:
+                cursor.executemany(SQL_INSERTAR_ENCODING, encodings)
+                cursor.executemany(SQL_DEPURAR_ENCODINGS, [(u, u, self.max_encodings_usuario)
+                                                           for u in sorted({e[0] for e in encodings})])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def enrolar(self, origen, nombre_archivo=None):
+        """
+        Enrolar todas las imágenes de una carpeta o archivo
+
+        Args:
+            origen: Carpeta, ruta de archivo ZIP/TAR o stream binario
+            nombre_archivo: Nombre original (para streams)
+
+        Returns:
+            dict: Resumen (imágenes, aceptadas, usuarios registrados, lotes, calidad media)
+                y la lista de rechazos por archivo
+        """
+        inicio = time.perf_counter()
+        usuarios = self._cargar_usuarios()
+        resultado = {
+            'origen': nombre_archivo or (origen if isinstance(origen, str) else ''),
+            'total_imagenes': 0,
+            'aceptadas': 0,
+            'rechazadas': 0,
+            'usuarios_registrados': 0,
+            'con_encoding': 0,
+            'lotes': 0,
+            'calidad_media': 0.0,
+            'procesos': max(self.procesos, 1),
+            'rechazos': [],
+            'rechazos_truncados': False,
+        }
+
+        def tareas():
+            for nombre, fuente in iterar_imagenes(origen, nombre_archivo):
+                resultado['total_imagenes'] += 1
+                if self.max_imagenes and resultado['total_imagenes'] > self.max_imagenes:
+                    raise ErrorEnrolamiento(
+                        f'El archivo tiene más de {self.max_imagenes} imágenes; para una cohorte completa '
+                        f'use scripts/enrolar_rostros.py')
+                usuario_id = usuarios.get(usuario_desde_archivo(nombre).upper())
+                if usuario_id is None:
+                    self._rechazar(resultado, nombre, usuario_desde_archivo(nombre), 'Usuario no existe')
+                elif fuente is None:
+                    self._rechazar(resultado, nombre, usuario_id, 'Imagen demasiado grande')
+                else:
+                    yield usuario_id, nombre, fuente, self.calidad_minima
+
+        # Fotos aceptadas por usuario, la de mejor calidad primero (va a rostro_data)
+        aceptadas = {}
+        for usuario_id, foto in self._procesar_todo(tareas()):
+            if foto['motivo']:
+                self._rechazar(resultado, foto['archivo'], usuario_id, foto['motivo'])
+                continue
+            aceptadas.setdefault(usuario_id, []).append(foto)
+            resultado['aceptadas'] += 1
+            resultado['con_encoding'] += foto['encoding'] is not None
+            resultado['calidad_media'] += foto['calidad']
+        if resultado['aceptadas']:
+            resultado['calidad_media'] = round(resultado['calidad_media'] / resultado['aceptadas'], 1)
+
+        if aceptadas:
+            con_encodings = resultado['con_encoding'] > 0 and self._tabla_encodings_disponible()
+            lista = [(usuario_id, sorted(fotos, key=lambda f: -f['calidad'])[:self.max_encodings_usuario])
+                     for usuario_id, fotos in aceptadas.items()]
+            conn = self.db_manager.get_connection()
+            try:
+                for i in range(0, len(lista), self.tamano_lote):
+                    self._escribir_lote(conn, lista[i:i + self.tamano_lote], con_encodings, resultado)
+            finally:
+                conn.close()
+
+        resultado['duracion_s'] = round(time.perf_counter() - inicio, 2)
+        logger.info("Enrolamiento facial %s: %s imágenes, %s usuarios registrados, %s rechazadas en %.1f s",
+                    resultado['origen'], resultado['total_imagenes'], resultado['usuarios_registrados'],
+                    resultado['rechazadas'], resultado['duracion_s'])
+        return resultado
+
+
+def leer_archivo_subido(archivo):
+    """Stream con posicionamiento para un FileStorage de Flask (ZIP necesita seek)"""
+    stream = archivo.stream
+    if hasattr(stream, 'seekable') and stream.seekable():
+        return stream
+    return io.BytesIO(stream.read())
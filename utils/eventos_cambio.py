@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de Notificación de Cambios
+Sistema de Laboratorios - Centro Minero SENA
+Cada escritura emite etiquetas de entidad y de colección (equipo:EQ-1 + equipos,
+laboratorio:3 + laboratorios, inventario, objetos, plantillas...). Las cachés y los
+índices en memoria (plantillas de visión, rostros) se suscriben a las etiquetas que
+les afectan en lugar de depender de que cada endpoint los conozca.
+
+Los suscriptores se ejecutan en el mismo hilo tras la escritura. Con un transporte
+(Redis pub/sub) los eventos llegan también a los demás workers; sin él, los otros
+procesos dependen del TTL de sus índices.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from fnmatch import fnmatchcase
+
+logger = logging.getLogger(__name__)
+
+# Entidad -> etiqueta de colección que también se emite
+COLECCIONES = {
+    'equipo': 'equipos',
+    'laboratorio': 'laboratorios',
+    'inventario': 'inventario',
+    'objeto': 'objetos',
+    'reserva': 'reservas',
+    'usuario': 'usuarios',
+}
+
+
+def etiquetas_cambio(entidad, *ids):
+    """
+    Etiquetas de un cambio en una entidad
+
+    Args:
+        entidad: 'equipo', 'laboratorio', 'inventario', 'objeto', 'reserva', 'usuario'...
+        ids: Identificadores afectados (None se ignora: p. ej. inserciones con AUTO_INCREMENT)
+
+    Returns:
+        list: ['equipo:EQ-1', ..., 'equipos']
+    """
+    etiquetas = [f'{entidad}:{i}' for i in ids if i is not None and i != '']
+    etiquetas.append(COLECCIONES.get(entidad, entidad))
+    return etiquetas
+
+
+class BusCambios:
+    """Publicación/suscripción en proceso de etiquetas de cambio"""
+
+    def __init__(self):
+        self._suscriptores = []
+        self._lock = threading.Lock()
+        self.transporte = None
+        self.stats = {'eventos': 0, 'eventos_remotos': 0, 'entregas': 0, 'errores': 0}
+
+    def suscribir(self, patrones, funcion=None, nombre=None):
+        """
+        Registrar una función llamada con (etiquetas, remoto) cuando cambie alguna etiqueta
+
+        Args:
+            patrones: Patrón o tupla de patrones fnmatch ('equipos', 'equipo:*', '*')
+            funcion: Función suscriptora; si se omite, se usa como decorador
+            nombre: Nombre para los logs (por defecto el de la función)
+        """
+        if isinstance(patrones, str):
+            patrones = (patrones,)
+
+        def registrar(f):
+            with self._lock:
+                self._suscriptores.append((tuple(patrones), f, nombre or getattr(f, '__name__', repr(f))))
+            return f
+        return registrar(funcion) if funcion is not None else registrar
+
+    def notificar(self, *etiquetas, remoto=False):
+        """Entregar las etiquetas a los suscriptores cuyos patrones coincidan y publicarlas en el transporte"""
+        etiquetas = list(dict.fromkeys(e for e in etiquetas if e))
+        if not etiquetas:
+            return
+        self.stats['eventos_remotos' if remoto else 'eventos'] += 1
+        with self._lock:
+            suscriptores = list(self._suscriptores)
+        for patrones, funcion, nombre in suscriptores:
+            coinciden = [e for e in etiquetas if any(fnmatchcase(e, p) for p in patrones)]
+            if not coinciden:
+                continue
+            try:
+                funcion(coinciden, remoto)
+                self.stats['entregas'] += 1
+            except Exception as e:
+                # Un suscriptor fallido no debe deshacer la escritura ya confirmada
+                self.stats['errores'] += 1
+                logger.warning("Suscriptor de cambios '%s' falló con %s: %s", nombre, coinciden, e)
+        if self.transporte is not None and not remoto:
+            try:
+                self.transporte.publicar(etiquetas)
+            except Exception as e:
+                self.stats['errores'] += 1
+                logger.warning("No se pudieron publicar los cambios %s: %s", etiquetas, e)
+
+    def cambio(self, entidad, *ids, extra=()):
+        """Atajo: notificar(*etiquetas_cambio(entidad, *ids), *extra)"""
+        self.notificar(*etiquetas_cambio(entidad, *ids), *extra)
+
+    def iniciar_transporte(self):
+        """Arrancar la escucha del transporte en este proceso (llamar de nuevo tras un fork)"""
+        if self.transporte is not None:
+            self.transporte.escuchar(self)
+
+
+class TransporteRedis:
+    """Reparte los eventos entre workers mediante Redis pub/sub (paquete opcional 'redis')"""
+
+    def __init__(self, url='redis://localhost:6379/0', canal='laboratorio:cambios'):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("El transporte de cambios por Redis requiere el paquete 'redis' (pip install redis)") from e
+        self.url = url
+        self.canal = canal
+        self._redis = redis
+        self._cliente = None
+        self._pid = None
+        self.origen = None
+
+    def _preparar(self):
+        # Tras un fork el socket y el identificador de origen no pueden compartirse
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._cliente = self._redis.Redis.from_url(self.url, socket_timeout=1, socket_connect_timeout=1)
+            self.origen = uuid.uuid4().hex
+            return True
+        return False
+
+    def publicar(self, etiquetas):
+        self._preparar()
+        self._cliente.publish(self.canal, json.dumps({'o': self.origen, 'e': etiquetas}))
+
+    def escuchar(self, bus):
+        if not self._preparar() and self._hilo_vivo():
+            return
+        self._hilo = threading.Thread(target=self._bucle, args=(bus, self.origen), name='cambios-redis', daemon=True)
+        self._hilo.start()
+
+    def _hilo_vivo(self):
+        hilo = getattr(self, '_hilo', None)
+        return hilo is not None and hilo.is_alive()
+
+    def _bucle(self, bus, origen):
+        while True:
+            try:
+                suscripcion = self._redis.Redis.from_url(self.url).pubsub(ignore_subscribe_messages=True)
+                suscripcion.subscribe(self.canal)
+                for mensaje in suscripcion.listen():
+                    datos = json.loads(mensaje['data'])
+                    if datos.get('o') != origen:
+                        bus.notificar(*datos.get('e', ()), remoto=True)
+            except Exception as e:
+                logger.warning("Escucha de cambios por Redis interrumpida: %s; reintentando en 5 s", e)
+                time.sleep(5)
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de Exportación Masiva de Datos
+Sistema de Laboratorios - Centro Minero SENA
+Exporta tablas completas (equipos, inventario, reservas, historial_uso) en CSV o NDJSON
+leyendo con cursor no bufferizado y fetchmany, para mantener memoria constante.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+FORMATOS = ('csv', 'ndjson')
+
+# Definición de cada exportación: consulta base, columna de fecha para el rango
+# y columna de laboratorio (reservas e historial lo toman del equipo asociado)
+EXPORTACIONES = {
+    'equipos': {
+        'sql': ("SELECT e.id, e.nombre, e.tipo, e.estado, e.ubicacion, e.laboratorio_id, "
+                "e.especificaciones, e.ultima_calibracion, e.proximo_mantenimiento, "
+                "e.fecha_adquisicion, e.proveedor, e.costo, e.fecha_registro "
+                "FROM equipos e"),
+        'fecha': 'e.fecha_registro',
+        'laboratorio': 'e.laboratorio_id',
+        'orden': 'e.id',
+    },
+    'inventario': {
+        'sql': ("SELECT i.id, i.nombre, i.categoria, i.cantidad_actual, i.cantidad_minima, "
+                "i.unidad, i.ubicacion, i.laboratorio_id, i.proveedor, i.costo_unitario, "
+                "i.fecha_vencimiento, i.fecha_registro "
+                "FROM inventario i"),
+        'fecha': 'i.fecha_registro',
+        'laboratorio': 'i.laboratorio_id',
+        'orden': 'i.id',
+    },
+    'reservas': {
+        'sql': ("SELECT r.id, r.usuario_id, r.equipo_id, e.nombre AS equipo_nombre, "
+                "e.laboratorio_id, r.fecha_inicio, r.fecha_fin, r.estado, r.notas "
+                "FROM reservas r LEFT JOIN equipos e ON r.equipo_id = e.id"),
+        'fecha': 'r.fecha_inicio',
+        'laboratorio': 'e.laboratorio_id',
+        'orden': 'r.fecha_inicio',
+    },
+    'historial_uso': {
+        'sql': ("SELECT h.id, h.equipo_id, e.nombre AS equipo_nombre, e.laboratorio_id, "
+                "h.usuario_id, h.fecha_uso, h.duracion_minutos, h.observaciones "
+                "FROM historial_uso h LEFT JOIN equipos e ON h.equipo_id = e.id"),
+        'fecha': 'h.fecha_uso',
+        'laboratorio': 'e.laboratorio_id',
+        'orden': 'h.fecha_uso',
+    },
+}
+
+
+class ErrorExportacion(Exception):
+    """Parámetros de exportación inválidos"""
+
+
+def _parsear_fecha(valor, campo):
+    try:
+        return datetime.strptime(valor.strip(), '%Y-%m-%d')
+    except (ValueError, AttributeError):
+        raise ErrorExportacion(f"{campo}: formato de fecha inválido (use AAAA-MM-DD)")
+
+
+def construir_consulta(tabla, laboratorio=None, desde=None, hasta=None):
+    """
+    Construye la consulta SQL parametrizada de una exportación
+
+    Args:
+        tabla: Nombre de la tabla a exportar (clave de EXPORTACIONES)
+        laboratorio: ID o código de laboratorio (opcional)
+        desde: Fecha inicial AAAA-MM-DD inclusive (opcional)
+        hasta: Fecha final AAAA-MM-DD inclusive (opcional)
+
+    Returns:
+        tuple: (sql, parametros)
+    """
+    definicion = EXPORTACIONES.get(tabla)
+    if not definicion:
+        raise ErrorExportacion(f"Tabla no exportable: {tabla}")
+
+    condiciones = []
+    parametros = []
+    if laboratorio:
+        condiciones.append(
+            f"({definicion['laboratorio']} = %s OR {definicion['laboratorio']} IN "
+            "(SELECT id FROM laboratorios WHERE codigo = %s))"
+        )
+        parametros.extend([laboratorio, laboratorio])
+    if desde:
+        condiciones.append(f"{definicion['fecha']} >= %s")
+        parametros.append(_parsear_fecha(desde, 'desde'))
+    if hasta:
+        condiciones.append(f"{definicion['fecha']} < %s")
+        parametros.append(_parsear_fecha(hasta, 'hasta') + timedelta(days=1))
+
+    sql = definicion['sql']
+    if condiciones:
+        sql += " WHERE " + " AND ".join(condiciones)
+    sql += f" ORDER BY {definicion['orden']}"
+    return sql, tuple(parametros)
+
+
+def _valor_serializable(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if isinstance(valor, (bytes, bytearray)):
+        return valor.decode('utf-8', errors='replace')
+    return valor
+
+
+def iterar_filas(db_manager, sql, parametros=(), tamano_bloque=1000):
+    """
+    Ejecuta la consulta con DatabaseManager.stream_query (cursor no bufferizado)
+
+    Yields:
+        tuple: (columnas, filas) por cada bloque de fetchmany; el primero sin filas, para
+            que la exportación lleve encabezado aunque la consulta no devuelva nada
+    """
+    bloques = db_manager.stream_query(sql, parametros, chunk_size=tamano_bloque, row_type='tuple',
+                                      with_columns=True)
+    try:
+        columnas = next(bloques, ())
+        yield columnas, []
+        for filas in bloques:
+            yield columnas, filas
+    finally:
+        # Cierra cursor y conexión también si el cliente abandona la descarga
+        bloques.close()
+
+
+def _serializar(bloques, formato, tamano_buffer):
+    """Convierte los bloques de filas en fragmentos de texto de ~tamano_buffer caracteres"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer) if formato == 'csv' else None
+    encabezado_escrito = False
+
+    for columnas, filas in bloques:
+        if formato == 'csv':
+            if not encabezado_escrito and columnas:
+                escritor.writerow(columnas)
+                encabezado_escrito = True
+            for fila in filas:
+                escritor.writerow([_valor_serializable(v) for v in fila])
+        else:
+            for fila in filas:
+                registro = {c: _valor_serializable(v) for c, v in zip(columnas, fila)}
+                buffer.write(json.dumps(registro, ensure_ascii=False))
+                buffer.write('\n')
+
+        if buffer.tell() >= tamano_buffer:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    resto = buffer.getvalue()
+    if resto:
+        yield resto
+
+
+def generar_exportacion(db_manager, tabla, formato='csv', laboratorio=None, desde=None, hasta=None,
+                        comprimir=False, tamano_bloque=1000, tamano_buffer=64 * 1024):
+    """
+    Generador de bytes de la exportación, apto para una respuesta Flask en streaming
+
+    Args:
+        db_manager: Instancia de DatabaseManager
+        tabla: equipos, inventario, reservas o historial_uso
+        formato: 'csv' o 'ndjson'
+        laboratorio: Filtro por ID o código de laboratorio
+        desde, hasta: Rango de fechas AAAA-MM-DD
+        comprimir: Si es True la salida se comprime con gzip al vuelo
+        tamano_bloque: Filas por fetchmany
+        tamano_buffer: Tamaño aproximado de cada fragmento enviado
+
+    Returns:
+        generator: Fragmentos en bytes
+    """
+    if formato not in FORMATOS:
+        raise ErrorExportacion(f"Formato no soportado: {formato}")
+    # Validar parámetros antes de abrir la conexión para poder responder 400
+    sql, parametros = construir_consulta(tabla, laboratorio, desde, hasta)
+
+    def _generar():
+        bloques = iterar_filas(db_manager, sql, parametros, tamano_bloque)
+        compresor = zlib.compressobj(6, zlib.DEFLATED, 31) if comprimir else None
+        try:
+            for texto in _serializar(bloques, formato, tamano_buffer):
+                datos = texto.encode('utf-8')
+                if compresor:
+                    datos = compresor.compress(datos)
+                    if not datos:
+                        continue
+                yield datos
+        finally:
+            bloques.close()
+        if compresor:
+            yield compresor.flush()
+
+    return _generar()
+
+
+def nombre_archivo(tabla, formato, comprimir=False):
+    """Nombre sugerido para la descarga"""
+    nombre = f"{tabla}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+    return nombre + '.gz' if comprimir else nombre
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de Importación Masiva
+Sistema de Laboratorios - Centro Minero SENA
+Carga equipos e items de inventario desde archivos CSV/XLSX por lotes
+"""
+
+import csv
+import io
+import json
+import uuid
+from datetime import datetime, date
+from decimal import Decimal, InvalidOperation
+
+
+ESTADOS_EQUIPO = ('disponible', 'en_uso', 'mantenimiento', 'fuera_servicio')
+
+# Definición de columnas por tipo de registro:
+# (columna, requerido, conversor)
+COLUMNAS = {
+    'equipos': [
+        ('id', False, 'texto'),
+        ('nombre', True, 'texto'),
+        ('tipo', True, 'texto'),
+        ('estado', False, 'estado'),
+        ('ubicacion', False, 'texto'),
+        ('laboratorio_id', True, 'laboratorio'),
+        ('especificaciones', False, 'especificaciones'),
+        ('ultima_calibracion', False, 'fecha'),
+        ('proximo_mantenimiento', False, 'fecha'),
+    ],
+    'inventario': [
+        ('id', False, 'texto'),
+        ('nombre', True, 'texto'),
+        ('categoria', False, 'texto'),
+        ('cantidad_actual', False, 'entero'),
+        ('cantidad_minima', False, 'entero'),
+        ('unidad', False, 'texto'),
+        ('ubicacion', False, 'texto'),
+        ('laboratorio_id', True, 'laboratorio'),
+        ('proveedor', False, 'texto'),
+        ('costo_unitario', False, 'decimal'),
+        ('fecha_vencimiento', False, 'fecha'),
+    ],
+}
+
+PREFIJOS_ID = {'equipos': 'EQ', 'inventario': 'INV'}
+
+# Alias de encabezados aceptados (normalizados) -> columna real
+ALIAS_COLUMNAS = {
+    'laboratorio': 'laboratorio_id',
+    'laboratorio_codigo': 'laboratorio_id',
+    'codigo_laboratorio': 'laboratorio_id',
+    'descripcion': 'especificaciones',
+    'stock': 'cantidad_actual',
+    'stock_actual': 'cantidad_actual',
+    'stock_minimo': 'cantidad_minima',
+}
+
+FORMATOS_FECHA = ('%Y-%m-%d', '%d/%m/%Y', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y %H:%M')
+
+
+class ErrorImportacion(Exception):
+    """Error que invalida el archivo completo (formato, encabezados)"""
+
+
+def normalizar_encabezado(nombre):
+    """Normalizar un encabezado de columna ('Cantidad Actual' -> 'cantidad_actual')"""
+    nombre = str(nombre or '').strip().lower().replace(' ', '_').replace('-', '_')
+    for origen, destino in (('á', 'a'), ('é', 'e'), ('í', 'i'), ('ó', 'o'), ('ú', 'u'), ('ñ', 'n')):
+        nombre = nombre.replace(origen, destino)
+    return ALIAS_COLUMNAS.get(nombre, nombre)
+
+
+def leer_filas_csv(stream, encoding='utf-8-sig'):
+    """
+    Iterar las filas de un CSV sin cargar el archivo completo en memoria
+
+    Detecta automáticamente el separador (',' o ';', habitual en Excel en español).
+
+    Yields:
+        dict: Fila con encabezados normalizados
+    """
+    texto = io.TextIOWrapper(stream, encoding=encoding, newline='')
+    muestra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.reader(texto, dialecto)
+    try:
+        encabezados = [normalizar_encabezado(h) for h in next(lector)]
+    except StopIteration:
+        return
+    for valores in lector:
+        if not any((v or '').strip() for v in valores):
+            continue
+        yield dict(zip(encabezados, valores))
+
+
+def leer_filas_xlsx(stream):
+    """
+    Iterar las filas de la primera hoja de un XLSX en modo de solo lectura
+
+    Yields:
+        dict: Fila con encabezados normalizados
+    """
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ErrorImportacion('openpyxl no está instalado; no se pueden leer archivos XLSX')
+
+    libro = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        hoja = libro.worksheets[0]
+        filas = hoja.iter_rows(values_only=True)
+        try:
+            encabezados = [normalizar_encabezado(h) for h in next(filas)]
+        except StopIteration:
+            return
+        for valores in filas:
+            if not any(v not in (None, '') for v in valores):
+                continue
+            yield dict(zip(encabezados, valores))
+    finally:
+        libro.close()
+
+
+def leer_filas(stream, nombre_archivo):
+    """Seleccionar el lector según la extensión del archivo"""
+    nombre = (nombre_archivo or '').lower()
+    if nombre.endswith('.csv'):
+        return leer_filas_csv(stream)
+    if nombre.endswith(('.xlsx', '.xlsm')):
+        return leer_filas_xlsx(stream)
+    raise ErrorImportacion('Formato no soportado. Use archivos .csv o .xlsx')
+
+
+def _texto(valor):
+    if valor is None:
+        return None
+    valor = str(valor).strip()
+    return valor or None
+
+
+def _convertir(tipo_valor, valor, laboratorios):
+    """Convertir un valor crudo al tipo de la columna. Lanza ValueError si no es válido."""
+    if tipo_valor == 'texto':
+        return _texto(valor)
+    if valor is None or (isinstance(valor, str) and not valor.strip()):
+        return None
+    if tipo_valor == 'entero':
+        if isinstance(valor, float) and valor.is_integer():
+            return int(valor)
+        try:
+            return int(str(valor).strip())
+        except ValueError:
+            raise ValueError(f'número entero inválido: {valor}')
+    if tipo_valor == 'decimal':
+        try:
+            return Decimal(str(valor).strip().replace(',', '.'))
+        except InvalidOperation:
+            raise ValueError(f'valor decimal inválido: {valor}')
+    if tipo_valor == 'fecha':
+        if isinstance(valor, datetime):
+            return valor.date()
+        if isinstance(valor, date):
+            return valor
+        texto = str(valor).strip()
+        for formato in FORMATOS_FECHA:
+            try:
+                return datetime.strptime(texto, formato).date()
+            except ValueError:
+                continue
+        raise ValueError(f'fecha inválida: {valor} (use AAAA-MM-DD o DD/MM/AAAA)')
+    if tipo_valor == 'estado':
+        estado = str(valor).strip().lower().replace(' ', '_')
+        if estado not in ESTADOS_EQUIPO:
+            raise ValueError(f'estado inválido: {valor} (valores: {", ".join(ESTADOS_EQUIPO)})')
+        return estado
+    if tipo_valor == 'especificaciones':
+        # Mismo formato que crear_equipo_web: {"descripcion": texto}
+        return json.dumps({'descripcion': str(valor).strip()}, ensure_ascii=False)
+    if tipo_valor == 'laboratorio':
+        clave = str(valor).strip()
+        if isinstance(valor, float) and valor.is_integer():
+            clave = str(int(valor))
+        lab_id = laboratorios.get(clave) or laboratorios.get(clave.upper())
+        if lab_id is None:
+            raise ValueError(f'laboratorio no existe: {valor}')
+        return lab_id
+    return valor
+
+
+def validar_fila(tipo, fila, laboratorios):
+    """
+    Validar y normalizar una fila del archivo
+
+    Args:
+        tipo: 'equipos' o 'inventario'
+        fila: dict con los valores crudos
+        laboratorios: dict {id o código de laboratorio -> id}
+
+    Returns:
+        tuple: (valores_normalizados | None, lista_de_errores)
+    """
+    errores = []
+    valores = {}
+    for columna, requerido, tipo_valor in COLUMNAS[tipo]:
+        try:
+            valor = _convertir(tipo_valor, fila.get(columna), laboratorios)
+        except (ValueError, TypeError) as e:
+            errores.append(f'{columna}: {e}')
+            continue
+        if requerido and valor is None:
+            errores.append(f'{columna} es requerido')
+            continue
+        valores[columna] = valor
+
+    if errores:
+        return None, errores
+
+    if tipo == 'equipos':
+        valores['estado'] = valores.get('estado') or 'disponible'
+        if valores.get('especificaciones') is None:
+            valores['especificaciones'] = json.dumps({'descripcion': ''})
+    else:
+        valores['cantidad_actual'] = valores.get('cantidad_actual') or 0
+        valores['cantidad_minima'] = valores.get('cantidad_minima') or 0
+        valores['unidad'] = valores.get('unidad') or 'unidad'
+        if valores['cantidad_actual'] < 0 or valores['cantidad_minima'] < 0:
+            return None, ['las cantidades no pueden ser negativas']
+
+    if not valores.get('id'):
+        valores['id'] = f"{PREFIJOS_ID[tipo]}-{uuid.uuid4().hex[:8].upper()}"
+    return valores, []
+
+
+class ImportadorMasivo:
+    """Importa equipos e inventario por lotes usando executemany en transacciones"""
+
+    def __init__(self, db_manager, tamano_lote=500, max_errores_reportados=1000):
+        self.db_manager = db_manager
+        self.tamano_lote = tamano_lote
+        self.max_errores_reportados = max_errores_reportados
+
+    def _cargar_laboratorios(self):
+        """Mapa {id, código} -> id de laboratorio, para validar sin consultar por fila"""
+        rows = self.db_manager.execute_query("SELECT id, codigo FROM laboratorios") or []
+        laboratorios = {}
+        for r in rows:
+            laboratorios[str(r['id'])] = r['id']
+            if r.get('codigo'):
+                laboratorios[str(r['codigo']).strip()] = r['id']
+                laboratorios[str(r['codigo']).strip().upper()] = r['id']
+        return laboratorios
+
+    def _sql_insert(self, tipo):
+        columnas = [c for c, _, _ in COLUMNAS[tipo]]
+        marcadores = ', '.join(['%s'] * len(columnas))
+        return f"INSERT INTO {tipo} ({', '.join(columnas)}) VALUES ({marcadores})", columnas
+
+    def _insertar_lote(self, conn, sql, columnas, lote, resultado):
+        """
+        Insertar un lote en una sola transacción. Si el lote falla (p. ej. ID duplicado),
+        se reintenta fila por fila para aislar los registros inválidos sin perder el resto.
+        """
+        conn.start_transaction()
+        cursor = conn.cursor()
+        try:
+            cursor.executemany(sql, [tuple(v[c] for c in columnas) for _, v in lote])
+            conn.commit()
+            resultado['insertados'] += len(lote)
+            return
+        except Exception:
+            conn.rollback()
+        finally:
+            cursor.close()
+
+        conn.start_transaction()
+        cursor = conn.cursor()
+        try:
+            for numero_fila, valores in lote:
+                try:
+                    cursor.execute(sql, tuple(valores[c] for c in columnas))
+                    resultado['insertados'] += 1
+                except Exception as e:
+                    self._registrar_error(resultado, numero_fila, [str(e)])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def _registrar_error(self, resultado, numero_fila, errores):
+        resultado['rechazados'] += 1
+        if len(resultado['errores']) < self.max_errores_reportados:
+            resultado['errores'].append({'fila': numero_fila, 'errores': errores})
+        else:
+            resultado['errores_truncados'] = True
+
+    def importar(self, tipo, stream, nombre_archivo):
+        """
+        Importar un archivo CSV/XLSX completo
+
+        Args:
+            tipo: 'equipos' o 'inventario'
+            stream: Archivo binario (p. ej. request.files['archivo'].stream)
+            nombre_archivo: Nombre original, para detectar el formato
+
+        Returns:
+            dict: Resumen con insertados, rechazados y errores por fila
+        """
+        if tipo not in COLUMNAS:
+            raise ErrorImportacion(f'Tipo no soportado: {tipo}')
+
+        filas = leer_filas(stream, nombre_archivo)
+        laboratorios = self._cargar_laboratorios()
+        sql, columnas = self._sql_insert(tipo)
+
+        resultado = {
+            'tipo': tipo,
+            'archivo': nombre_archivo,
+            'total_filas': 0,
+            'insertados': 0,
+            'rechazados': 0,
+            'lotes': 0,
+            'errores': [],
+            'errores_truncados': False,
+        }
+
+        conn = self.db_manager.get_connection()
+        try:
+            lote = []
+            # La fila 1 es el encabezado
+            for numero_fila, fila in enumerate(filas, start=2):
+                resultado['total_filas'] += 1
+                valores, errores = validar_fila(tipo, fila, laboratorios)
+                if errores:
+                    self._registrar_error(resultado, numero_fila, errores)
+                    continue
+                lote.append((numero_fila, valores))
+                if len(lote) >= self.tamano_lote:
+                    self._insertar_lote(conn, sql, columnas, lote, resultado)
+                    resultado['lotes'] += 1
+                    lote = []
+            if lote:
+                self._insertar_lote(conn, sql, columnas, lote, resultado)
+                resultado['lotes'] += 1
+        finally:
+            conn.close()
+
+        return resultado
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de Índice de Embeddings Faciales
+Sistema de Laboratorios - Centro Minero SENA
+Guarda los encodings de 128 dimensiones (face_recognition) de todos los usuarios en una
+sola matriz float32 (una fila por encoding; varios por usuario) y responde una búsqueda
+con un único producto matriz-vector: ||m - q||² = ||m||² - 2·m·q + ||q||², con las normas
+de la matriz precalculadas. De las filas más cercanas sale una lista corta de usuarios
+(top-k, la menor distancia de cada uno).
+
+El índice se persiste en un .npz junto con una firma del origen (conteo, último id y
+última actualización de usuarios_facial): un worker que encuentra el archivo con la firma
+vigente lo carga en milisegundos en lugar de releer y decodificar la tabla.
+"""
+
+import json
+import logging
+import os
+
+from utils.carga_diferida import modulo_diferido
+
+np = modulo_diferido('numpy')
+
+logger = logging.getLogger(__name__)
+
+VERSION_ARCHIVO = 1
+DIMENSION = 128
+
+
+class IndiceEmbeddings:
+    """Matriz float32 (N x D) de encodings y el usuario de cada fila"""
+
+    def __init__(self, matriz=None, ids=(), firma=None, dimension=DIMENSION):
+        self.dimension = dimension
+        if matriz is None:
+            matriz = np.zeros((0, dimension), dtype=np.float32)
+        self.matriz = np.ascontiguousarray(np.asarray(matriz, dtype=np.float32).reshape(-1, dimension))
+        self.ids = np.asarray(list(ids), dtype=str)
+        if len(self.ids) != len(self.matriz):
+            raise ValueError(f'{len(self.ids)} ids para {len(self.matriz)} encodings')
+        self.firma = firma
+        self._normas = np.einsum('ij,ij->i', self.matriz, self.matriz)
+        self.usuarios = frozenset(self.ids.tolist())
+
+    @classmethod
+    def desde_filas(cls, filas, firma=None, dimension=DIMENSION):
+        """
+        Construir desde pares (usuario_id, encoding)
+
+        El encoding puede ser una lista, un array o el JSON guardado en usuarios_facial;
+        los que no tengan la dimensión esperada se descartan.
+        """
+        ids, vectores = [], []
+        for usuario_id, encoding in filas:
+            try:
+                if isinstance(encoding, (str, bytes)):
+                    encoding = json.loads(encoding)
+                vector = np.asarray(encoding, dtype=np.float32).ravel()
+            except (TypeError, ValueError) as e:
+                logger.warning("Encoding ilegible del usuario %s: %s", usuario_id, e)
+                continue
+            if vector.shape[0] != dimension:
+                logger.warning("Encoding del usuario %s con %s dimensiones (se esperaban %s)",
+                               usuario_id, vector.shape[0], dimension)
+                continue
+            ids.append(str(usuario_id))
+            vectores.append(vector)
+        matriz = np.vstack(vectores) if vectores else None
+        return cls(matriz, ids, firma, dimension)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def distancias(self, encoding):
+        """Distancia euclídea del encoding a cada fila (un solo producto matriz-vector)"""
+        q = np.asarray(encoding, dtype=np.float32).ravel()
+        d2 = self._normas - 2.0 * (self.matriz @ q) + float(q @ q)
+        return np.sqrt(np.maximum(d2, 0.0, out=d2), out=d2)
+
+    def buscar(self, encoding, k=5, filas_por_usuario=8):
+        """
+        Usuarios más cercanos
+
+        Args:
+            encoding: Vector de consulta (128-d)
+            k: Usuarios en la lista corta
+            filas_por_usuario: Filas candidatas por usuario pedido antes de agrupar (con
+                varios encodings por usuario, las k filas más cercanas pueden ser de uno solo)
+
+        Returns:
+            list: [(usuario_id, distancia)] ordenada de menor a mayor distancia
+        """
+        n = len(self)
+        if not n or k <= 0:
+            return []
+        distancias = self.distancias(encoding)
+        m = min(n, k * filas_por_usuario)
+        candidatas = np.argpartition(distancias, m - 1)[:m] if m < n else np.arange(n)
+        candidatas = candidatas[np.argsort(distancias[candidatas], kind='stable')]
+        resultado, vistos = [], set()
+        for fila in candidatas:
+            usuario_id = self.ids[fila]
+            if usuario_id in vistos:
+                continue
+            vistos.add(usuario_id)
+            resultado.append((str(usuario_id), float(distancias[fila])))
+            if len(resultado) == k:
+                break
+        return resultado
+
+    def guardar(self, ruta):
+        """Escribir el índice de forma atómica (los demás workers nunca leen un archivo a medias)"""
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        temporal = f'{ruta}.{os.getpid()}.tmp'
+        with open(temporal, 'wb') as f:
+            np.savez(f, version=np.array(VERSION_ARCHIVO), matriz=self.matriz, ids=self.ids,
+                     firma=np.array(json.dumps(self.firma)))
+        os.replace(temporal, ruta)
+
+    @classmethod
+    def cargar(cls, ruta):
+        """Leer un índice guardado; None si no existe o es de otra versión"""
+        if not os.path.exists(ruta):
+            return None
+        with np.load(ruta, allow_pickle=False) as datos:
+            if int(datos['version']) != VERSION_ARCHIVO:
+                return None
+            matriz = datos['matriz']
+            return cls(matriz, datos['ids'], json.loads(str(datos['firma'])), matriz.shape[1])
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de Login Facial Continuo
+Sistema de Laboratorios - Centro Minero SENA
+Estado por conexión del canal de login facial por WebSocket: el navegador envía cuadros
+JPEG binarios (sin base64 ni JSON) mientras la cámara está abierta y el servidor los
+procesa a medida que llegan, con el ROI del rostro del cuadro anterior y una votación
+sobre los últimos cuadros: el usuario se acepta cuando aparece en `minimo_votos` de los
+últimos `ventana` cuadros procesados, en lugar de jugarse el acceso a una sola foto.
+
+Control de carga: si llegaron varios cuadros mientras se procesaba el anterior sólo se
+procesa el más reciente, y si el proceso ya está analizando su máximo de cuadros a la vez
+el cuadro se omite (el cliente sigue enviando; no se encola trabajo viejo).
+
+El acceso se completa con un token firmado de un solo uso y pocos segundos de vida que el
+navegador canjea por la sesión en una petición HTTP normal (la cookie de sesión no puede
+fijarse desde un WebSocket ya abierto). El uso se registra por nonce: en la tabla
+login_facial_nonces (NoncesMySQL, compartida por todos los workers) o, con un solo
+proceso, en memoria (NoncesLocal).
+"""
+
+import logging
+import secrets
+import threading
+import time
+from collections import Counter, deque
+
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+from utils.carga_diferida import modulo_diferido
+
+cv2 = modulo_diferido('cv2')
+np = modulo_diferido('numpy')
+
+logger = logging.getLogger(__name__)
+
+SAL_TOKEN = 'login-facial-continuo'
+
+ESQUEMA_NONCES = """
+CREATE TABLE IF NOT EXISTS {tabla} (
+    nonce VARCHAR(32) NOT NULL PRIMARY KEY,
+    expira DATETIME NOT NULL,
+    INDEX idx_nonces_expira (expira)
+) ENGINE=InnoDB DEFAULT CHARSET=ascii COLLATE=ascii_bin
+"""
+
+
+class ControlCarga:
+    """Límite de conexiones abiertas y de cuadros analizándose a la vez en el proceso"""
+
+    def __init__(self, max_conexiones=8, max_simultaneos=2):
+        self.max_conexiones = max_conexiones
+        self._conexiones = 0
+        self._lock = threading.Lock()
+        self._cupos = threading.BoundedSemaphore(max(1, max_simultaneos))
+        self.stats = {'conexiones': 0, 'rechazadas': 0, 'procesados': 0, 'omitidos': 0}
+
+    def abrir(self):
+        """Reservar una conexión; False si el proceso ya atiende el máximo"""
+        with self._lock:
+            if self._conexiones >= self.max_conexiones:
+                self.stats['rechazadas'] += 1
+                return False
+            self._conexiones += 1
+            self.stats['conexiones'] += 1
+            return True
+
+    def cerrar(self):
+        with self._lock:
+            self._conexiones = max(0, self._conexiones - 1)
+
+    def intentar(self):
+        """Cupo para analizar un cuadro ahora mismo (sin esperar)"""
+        if self._cupos.acquire(blocking=False):
+            return True
+        self.stats['omitidos'] += 1
+        return False
+
+    def liberar(self):
+        self.stats['procesados'] += 1
+        self._cupos.release()
+
+    def estadisticas(self):
+        return {**self.stats, 'abiertas': self._conexiones}
+
+
+class VotacionRostros:
+    """Votación sobre los últimos cuadros procesados (None = cuadro sin coincidencia)"""
+
+    def __init__(self, ventana=5, minimo_votos=3):
+        self.minimo_votos = minimo_votos
+        self._votos = deque(maxlen=ventana)
+
+    def agregar(self, usuario_id):
+        """Registrar el resultado de un cuadro; devuelve el usuario ganador o None"""
+        self._votos.append(usuario_id)
+        conteo = Counter(v for v in self._votos if v is not None)
+        if not conteo:
+            return None
+        ganador, votos = conteo.most_common(1)[0]
+        return ganador if votos >= self.minimo_votos else None
+
+    def votos(self, usuario_id):
+        return sum(1 for v in self._votos if v == usuario_id)
+
+
+class SesionLoginContinuo:
+    """Estado de una conexión: ROI, votación, mejor confianza por usuario y contadores"""
+
+    def __init__(self, identificar, control=None, ventana=5, minimo_votos=3, max_cuadros=300, duracion_max_s=60):
+        """
+        Args:
+            identificar: Función (img, roi) -> (resultado, roi) con resultado {'usuario',
+                'detalle', 'confianza'} si hubo coincidencia o {'mensaje'} si no
+            control: ControlCarga compartido por las conexiones del proceso
+            ventana: Cuadros que entran en la votación
+            minimo_votos: Coincidencias del mismo usuario dentro de la ventana para aceptarlo
+            max_cuadros: Cuadros recibidos antes de cerrar la conexión
+            duracion_max_s: Vida máxima de la conexión
+        """
+        self.identificar = identificar
+        self.control = control or ControlCarga()
+        self.votacion = VotacionRostros(ventana, minimo_votos)
+        self.max_cuadros = max_cuadros
+        self.limite = time.monotonic() + duracion_max_s
+        self.roi = None
+        self.recibidos = 0
+        self.procesados = 0
+        self.omitidos = 0
+        self.no_reconocidos = 0
+        self.reconocido = None
+        self._mejor = {}
+
+    @property
+    def terminada(self):
+        return (self.reconocido is not None or self.recibidos >= self.max_cuadros
+                or time.monotonic() >= self.limite)
+
+    def descartar(self, cantidad=1):
+        """Cuadros que llegaron mientras se procesaba otro y se reemplazaron por uno más nuevo"""
+        self.recibidos += cantidad
+        self.omitidos += cantidad
+
+    def procesar(self, datos):
+        """
+        Analizar un cuadro JPEG/PNG binario
+
+        Returns:
+            dict: Mensaje para el cliente: estado 'reconocido' (con 'usuario', 'detalle',
+                'confianza'), 'analizando', 'sin_coincidencia', 'omitido', 'invalido' o 'fin'
+        """
+        if self.terminada:
+            return self.respuesta('fin', mensaje='Tiempo de reconocimiento agotado')
+        self.recibidos += 1
+        if not self.control.intentar():
+            self.omitidos += 1
+            return self.respuesta('omitido')
+        try:
+            img = cv2.imdecode(np.frombuffer(datos, np.uint8), cv2.IMREAD_COLOR) if datos else None
+            if img is None:
+                return self.respuesta('invalido', mensaje='No se pudo procesar la imagen')
+            resultado, self.roi = self.identificar(img, self.roi)
+            self.procesados += 1
+        finally:
+            self.control.liberar()
+
+        if resultado.get('no_reconocido'):
+            self.no_reconocidos += 1
+        usuario = resultado.get('usuario')
+        usuario_id = str(usuario['id']) if usuario else None
+        if usuario is not None:
+            anterior = self._mejor.get(usuario_id)
+            if anterior is None or resultado['confianza'] > anterior['confianza']:
+                self._mejor[usuario_id] = resultado
+        ganador = self.votacion.agregar(usuario_id)
+        if ganador is not None:
+            self.reconocido = self._mejor[ganador]
+            return self.respuesta('reconocido', usuario=self.reconocido['usuario'],
+                                   detalle=self.reconocido['detalle'], confianza=self.reconocido['confianza'])
+        if usuario is not None:
+            return self.respuesta('analizando', votos=self.votacion.votos(usuario_id),
+                                   requeridos=self.votacion.minimo_votos)
+        return self.respuesta('sin_coincidencia', mensaje=resultado.get('mensaje'))
+
+    def respuesta(self, estado, **datos):
+        """Mensaje para el cliente con los contadores de la conexión"""
+        return {'estado': estado, 'recibidos': self.recibidos, 'procesados': self.procesados,
+                'omitidos': self.omitidos, **datos}
+
+
+class NoncesLocal:
+    """Nonces usados en memoria del proceso (sólo garantiza un uso con un único worker)"""
+
+    nombre = 'local'
+
+    def __init__(self):
+        self._usados = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, nonce, vigencia_s):
+        """True si el nonce no se había usado (y queda registrado), False si ya se usó"""
+        ahora = time.monotonic()
+        with self._lock:
+            for usado in [n for n, vence in self._usados.items() if vence <= ahora]:
+                del self._usados[usado]
+            if nonce in self._usados:
+                return False
+            self._usados[nonce] = ahora + vigencia_s
+            return True
+
+
+class NoncesMySQL:
+    """Nonces usados en una tabla con clave primaria: el INSERT sólo gana en un worker"""
+
+    nombre = 'mysql'
+
+    def __init__(self, db_manager, tabla='login_facial_nonces', purga_s=300):
+        self.db = db_manager
+        self.tabla = tabla
+        self.purga_s = purga_s
+        self._tabla_lista = False
+        self._ultima_purga = time.monotonic()
+
+    def registrar(self, nonce, vigencia_s):
+        if not self._tabla_lista:
+            self.db.execute_query(ESQUEMA_NONCES.format(tabla=self.tabla))
+            self._tabla_lista = True
+        if time.monotonic() - self._ultima_purga >= self.purga_s:
+            self._ultima_purga = time.monotonic()
+            self.db.execute_query(f"DELETE FROM {self.tabla} WHERE expira <= NOW() LIMIT 1000")
+        insertadas = self.db.execute_query(
+            f"INSERT IGNORE INTO {self.tabla} (nonce, expira) VALUES (%s, DATE_ADD(NOW(), INTERVAL %s SECOND))",
+            (nonce, int(vigencia_s) + 1),
+        )
+        return insertadas == 1
+
+
+class TokensLogin:
+    """Tokens firmados de un solo uso para canjear un reconocimiento por la sesión web"""
+
+    def __init__(self, vigencia_s=30, nonces=None):
+        """
+        Args:
+            vigencia_s: Vida del token
+            nonces: Registro de nonces usados (NoncesMySQL con varios workers; NoncesLocal por defecto)
+        """
+        self.vigencia_s = vigencia_s
+        self.nonces = nonces or NoncesLocal()
+
+    def emitir(self, secreto, usuario_id, detalle, confianza):
+        serializador = URLSafeTimedSerializer(secreto, salt=SAL_TOKEN)
+        return serializador.dumps({'u': str(usuario_id), 'd': detalle, 'c': round(float(confianza), 1),
+                                   'n': secrets.token_urlsafe(8)})
+
+    def canjear(self, secreto, token):
+        """Datos del token ({'u', 'd', 'c'}) o None si es inválido, venció o ya se usó"""
+        try:
+            datos = URLSafeTimedSerializer(secreto, salt=SAL_TOKEN).loads(token, max_age=self.vigencia_s)
+        except (BadSignature, SignatureExpired):
+            return None
+        try:
+            primer_uso = self.nonces.registrar(str(datos.get('n')), self.vigencia_s)
+        except Exception as e:
+            # Sin registro de nonces no se puede garantizar un solo uso: se rechaza
+            logger.warning("No se pudo registrar el uso del token de login facial: %s", e)
+            return None
+        return datos if primer_uso else None
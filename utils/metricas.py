@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de Métricas de la Aplicación Web (formato Prometheus)
+Sistema de Laboratorios - Centro Minero SENA
+Latencia por endpoint, códigos de estado, peticiones en curso, tamaño de cargas
+y gauges personalizados, expuestos en texto plano para Prometheus sin dependencias extra.
+
+Cada proceso lleva su propio registro. Sin `directorio`, /metrics devuelve sólo los
+valores del worker que atendió la petición. Con `directorio` (METRICS_MULTIPROC_DIR),
+cada worker vuelca sus series a un archivo cada `intervalo_s` segundos y /metrics
+devuelve las de todos los workers con la etiqueta `worker` (el PID); en Prometheus se
+agregan con `sum without (worker)`.
+"""
+
+import bisect
+import glob
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import threading
+import time
+
+from flask import Response, g, request
+
+logger = logging.getLogger(__name__)
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _etiquetas(nombres, valores):
+    if not nombres:
+        return ''
+    return '{' + ','.join(f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)) + '}'
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return repr(valor) if isinstance(valor, float) else str(valor)
+
+
+def _con_etiqueta(linea, nombre, valor):
+    """Añadir la etiqueta nombre="valor" a una línea de muestra"""
+    fin = min(i for i in (linea.find('{'), linea.find(' ')) if i >= 0)
+    if linea[fin] == '{':
+        return f'{linea[:fin + 1]}{nombre}="{_escapar(valor)}",{linea[fin + 1:]}'
+    return f'{linea[:fin]}{{{nombre}="{_escapar(valor)}"}}{linea[fin:]}'
+
+
+class Contador:
+    """Contador monótono con etiquetas"""
+    tipo = 'counter'
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *valores_etiquetas, cantidad=1):
+        with self._lock:
+            self._valores[valores_etiquetas] = self._valores.get(valores_etiquetas, 0) + cantidad
+
+    def exponer(self):
+        with self._lock:
+            items = list(self._valores.items())
+        return [f'{self.nombre}{_etiquetas(self.etiquetas, k)} {_numero(v)}' for k, v in items]
+
+
+class Gauge(Contador):
+    """Valor instantáneo (puede subir o bajar)"""
+    tipo = 'gauge'
+
+    def dec(self, *valores_etiquetas, cantidad=1):
+        self.inc(*valores_etiquetas, cantidad=-cantidad)
+
+    def set(self, valor, *valores_etiquetas):
+        with self._lock:
+            self._valores[valores_etiquetas] = valor
+
+
+class Histograma:
+    """Histograma acumulativo con buckets fijos"""
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_LATENCIA):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, tuple(etiquetas)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *valores_etiquetas):
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(valores_etiquetas)
+            if serie is None:
+                # [conteos por bucket (no acumulados) + desbordamiento, suma, total]
+                serie = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[valores_etiquetas] = serie
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exponer(self):
+        with self._lock:
+            items = [(k, list(s[0]), s[1], s[2]) for k, s in self._series.items()]
+        lineas = []
+        nombres_le = self.etiquetas + ('le',)
+        for k, conteos, suma, total in items:
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + (float('inf'),), conteos):
+                acumulado += conteo
+                lineas.append(f'{self.nombre}_bucket{_etiquetas(nombres_le, k + (_numero(limite),))} {acumulado}')
+            lineas.append(f'{self.nombre}_sum{_etiquetas(self.etiquetas, k)} {_numero(suma)}')
+            lineas.append(f'{self.nombre}_count{_etiquetas(self.etiquetas, k)} {total}')
+        return lineas
+
+
+class GaugeFuncion:
+    """Gauge calculado al exponer: la función devuelve un número o un dict {valor_etiqueta: número}"""
+    tipo = 'gauge'
+
+    def __init__(self, nombre, ayuda, funcion, etiqueta=None):
+        self.nombre, self.ayuda, self.funcion, self.etiqueta = nombre, ayuda, funcion, etiqueta
+
+    def exponer(self):
+        try:
+            valor = self.funcion()
+        except Exception as e:
+            logger.debug("Gauge %s no disponible: %s", self.nombre, e)
+            return []
+        if valor is None:
+            return []
+        if isinstance(valor, dict):
+            return [f'{self.nombre}{_etiquetas((self.etiqueta,), (k,))} {_numero(float(v))}'
+                    for k, v in valor.items() if v is not None]
+        return [f'{self.nombre} {_numero(float(valor))}']
+
+
+class RegistroMetricas:
+    """Registro de métricas con ganchos before/after_request para Flask"""
+
+    def __init__(self, prefijo='laboratorio', directorio=None, intervalo_s=5.0):
+        """
+        Args:
+            prefijo: Prefijo de los nombres de métrica
+            directorio: Carpeta compartida por los workers para combinar sus series (None = sólo este proceso)
+            intervalo_s: Cada cuánto vuelca cada worker sus series al directorio
+        """
+        self.prefijo = prefijo
+        self._metricas = []
+        self.inicio = time.time()
+        self.directorio = directorio
+        self.intervalo_s = intervalo_s
+        # Archivos de workers que no se actualizan en este tiempo (terminados o reciclados) se descartan
+        self.antiguedad_max_s = max(30.0, intervalo_s * 6)
+        self._pid_volcado = None
+        self._lock_volcado = threading.Lock()
+        self._lock_escritura = threading.Lock()
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+        self.latencia = self.registrar(Histograma(
+            f'{prefijo}_http_request_duration_seconds', 'Latencia de las peticiones HTTP',
+            ('endpoint', 'method')))
+        self.peticiones = self.registrar(Contador(
+            f'{prefijo}_http_requests_total', 'Peticiones HTTP por código de estado',
+            ('endpoint', 'method', 'status')))
+        self.en_curso = self.registrar(Gauge(
+            f'{prefijo}_http_requests_in_flight', 'Peticiones en curso'))
+        self.bytes_entrada = self.registrar(Histograma(
+            f'{prefijo}_http_request_size_bytes', 'Tamaño del cuerpo de la petición',
+            ('endpoint',), BUCKETS_BYTES))
+        self.bytes_salida = self.registrar(Histograma(
+            f'{prefijo}_http_response_size_bytes', 'Tamaño del cuerpo de la respuesta',
+            ('endpoint',), BUCKETS_BYTES))
+        self.registrar(GaugeFuncion(
+            f'{prefijo}_uptime_seconds', 'Segundos desde el arranque', lambda: time.time() - self.inicio))
+
+    def registrar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def gauge(self, nombre, ayuda, funcion, etiqueta=None):
+        """Registrar un gauge personalizado calculado en cada exposición"""
+        return self.registrar(GaugeFuncion(f'{self.prefijo}_{nombre}', ayuda, funcion, etiqueta))
+
+    def _bloques(self):
+        bloques = []
+        for metrica in self._metricas:
+            muestras = metrica.exponer()
+            if muestras:
+                bloques.append([metrica.nombre, metrica.ayuda, metrica.tipo, muestras])
+        return bloques
+
+    @staticmethod
+    def _formatear(bloques):
+        lineas = []
+        for nombre, ayuda, tipo, muestras in bloques:
+            lineas.append(f'# HELP {nombre} {ayuda}')
+            lineas.append(f'# TYPE {nombre} {tipo}')
+            lineas.extend(muestras)
+        return '\n'.join(lineas) + '\n'
+
+    def exponer(self):
+        """Texto en formato de exposición de Prometheus 0.0.4 (de todos los workers si hay directorio)"""
+        if not self.directorio:
+            return self._formatear(self._bloques())
+        self.volcar()
+        return self._formatear(self._combinar())
+
+    # ------------------------------------------------------------------
+    # Varios workers (directorio compartido)
+    # ------------------------------------------------------------------
+
+    def volcar(self):
+        """Escribir las series de este proceso, etiquetadas con su PID, en el directorio"""
+        pid = os.getpid()
+        # Lectura y escritura juntas: el hilo periódico no puede dejar en el archivo una
+        # copia anterior a la que acaba de volcar /metrics
+        with self._lock_escritura:
+            bloques = [[nombre, ayuda, tipo, [_con_etiqueta(m, 'worker', pid) for m in muestras]]
+                       for nombre, ayuda, tipo, muestras in self._bloques()]
+            ruta = os.path.join(self.directorio, f'metricas_{pid}.json')
+            temporal = f'{ruta}.{threading.get_ident()}.tmp'
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump({'pid': pid, 't': time.time(), 'bloques': bloques}, f)
+            os.replace(temporal, ruta)
+
+    def _combinar(self):
+        combinados = {}
+        limite = time.time() - self.antiguedad_max_s
+        for ruta in sorted(glob.glob(os.path.join(self.directorio, 'metricas_*.json'))):
+            try:
+                with open(ruta, encoding='utf-8') as f:
+                    datos = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if datos.get('t', 0) < limite:
+                try:
+                    os.remove(ruta)
+                except OSError:
+                    pass
+                continue
+            for nombre, ayuda, tipo, muestras in datos.get('bloques', []):
+                bloque = combinados.setdefault(nombre, [nombre, ayuda, tipo, []])
+                bloque[3].extend(muestras)
+        return list(combinados.values())
+
+    def _iniciar_volcado(self):
+        """Hilo de volcado periódico, uno por proceso (se crea en la primera petición tras el fork)"""
+        if self._pid_volcado == os.getpid():
+            return
+        with self._lock_volcado:
+            if self._pid_volcado == os.getpid():
+                return
+            self._pid_volcado = os.getpid()
+            threading.Thread(target=self._bucle_volcado, name='metricas-volcado', daemon=True).start()
+
+    def _bucle_volcado(self):
+        while True:
+            try:
+                self.volcar()
+            except Exception as e:
+                logger.debug("No se pudieron volcar las métricas: %s", e)
+            time.sleep(self.intervalo_s)
+
+    # ------------------------------------------------------------------
+    # Integración con Flask
+    # ------------------------------------------------------------------
+
+    def _antes(self):
+        if self.directorio:
+            self._iniciar_volcado()
+        g._metricas_inicio = time.perf_counter()
+        g._metricas_en_curso = True
+        self.en_curso.inc()
+
+    def _despues(self, respuesta):
+        inicio = g.pop('_metricas_inicio', None)
+        if inicio is None:
+            return respuesta
+        # Endpoint en lugar de la URL para no crear una serie por cada ID
+        endpoint = request.endpoint or 'sin_ruta'
+        self.latencia.observar(time.perf_counter() - inicio, endpoint, request.method)
+        self.peticiones.inc(endpoint, request.method, str(respuesta.status_code))
+        if request.content_length:
+            self.bytes_entrada.observar(request.content_length, endpoint)
+        if not respuesta.is_streamed and respuesta.content_length is not None:
+            self.bytes_salida.observar(respuesta.content_length, endpoint)
+        return respuesta
+
+    def _fin(self, _error=None):
+        # teardown_request se ejecuta también cuando la vista lanza una excepción
+        if g.pop('_metricas_en_curso', False):
+            self.en_curso.dec()
+
+    def init_app(self, app, ruta='/metrics', token=None, permitidas=('127.0.0.1', '::1')):
+        """
+        Instalar los ganchos y el endpoint de exposición
+
+        Args:
+            app: Aplicación Flask
+            ruta: URL del endpoint de métricas
+            token: Si se indica, se exige 'Authorization: Bearer <token>'
+            permitidas: Sin token, direcciones o redes (CIDR) que pueden consultar el endpoint
+                conectándose directamente (las peticiones reenviadas por un proxy se rechazan)
+        """
+        app.before_request(self._antes)
+        app.after_request(self._despues)
+        app.teardown_request(self._fin)
+        redes = [ipaddress.ip_network(r.strip(), strict=False) for r in permitidas if r and r.strip()]
+
+        def metricas():
+            if not _autorizado(token, redes):
+                return Response('No autorizado\n', status=401, mimetype='text/plain')
+            return Response(self.exponer(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+        app.add_url_rule(ruta, 'metricas', metricas)
+        return self
+
+
+def _autorizado(token, redes):
+    if token:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    # Detrás de un proxy remote_addr es el del proxy: no basta para identificar al cliente
+    if request.headers.get('X-Forwarded-For') or request.headers.get('Forwarded'):
+        return False
+    try:
+        direccion = ipaddress.ip_address(request.remote_addr or '')
+    except ValueError:
+        return False
+    return any(direccion in red for red in redes)
@@ -121,6 +121,7 @@ class OptimizacionRendimiento:
             ('cache_inventario_critico', '600', 'Caché de inventario crítico (10 min)'),
             ('cache_usuarios_activos', '1800', 'Caché de usuarios activos (30 min)'),
             ('cache_reportes_diarios', '3600', 'Caché de reportes diarios (1 hora)'),
+            ('cache_estadisticas_dashboard', '30', 'Caché de estadísticas del dashboard (30 s)'),
         ]
         for k, v, d in configuraciones_cache:
             self.cursor.execute(
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de Perfilado de Peticiones bajo Demanda
+Sistema de Laboratorios - Centro Minero SENA
+Perfila una petición concreta cuando un administrador lo pide (cabecera X-Perfilar o
+parámetro ?_perfilar=1), captura las consultas SQL que emitió y guarda el perfil en un
+buffer circular acotado en disco.
+
+Modos:
+    muestreo  (por defecto) Un hilo toma la pila del hilo de la petición cada N ms y
+              acumula pilas plegadas (.folded), formato de flamegraph.pl / speedscope
+    cprofile  Perfilador determinista de la biblioteca estándar (.prof, pstats), para
+              snakeviz o flameprof; más preciso en llamadas, con más sobrecarga
+"""
+
+import cProfile
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import g, request
+
+from utils.perfilador_consultas import huella_sql
+
+logger = logging.getLogger(__name__)
+
+MODOS = ('muestreo', 'cprofile')
+EXTENSIONES = {'folded': 'text/plain; charset=utf-8', 'prof': 'application/octet-stream'}
+# Clave en flask.g donde DatabaseManager añade las consultas de la petición perfilada
+CLAVE_CONSULTAS = '_perfil_consultas'
+
+_RE_ID = re.compile(r'^[0-9]{8}_[0-9]{6}_[0-9]{6}_[\w.-]+$')
+
+
+def _nombre_marco(codigo):
+    return f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})"
+
+
+class MuestreadorPilas:
+    """Toma muestras periódicas de la pila de un hilo y las acumula como pilas plegadas"""
+
+    def __init__(self, hilo_id, intervalo_s=0.005, max_profundidad=128):
+        self.hilo_id = hilo_id
+        self.intervalo_s = intervalo_s
+        self.max_profundidad = max_profundidad
+        self.pilas = Counter()
+        self.muestras = 0
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._ejecutar, name='perfilado-muestreo', daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._parar.set()
+        self._hilo.join()
+
+    def _ejecutar(self):
+        while not self._parar.wait(self.intervalo_s):
+            marco = sys._current_frames().get(self.hilo_id)
+            if marco is None:
+                continue
+            nombres = []
+            while marco is not None and len(nombres) < self.max_profundidad:
+                nombres.append(_nombre_marco(marco.f_code))
+                marco = marco.f_back
+            self.pilas[';'.join(reversed(nombres))] += 1
+            self.muestras += 1
+
+    def plegado(self):
+        """Texto en formato 'marco;marco;marco N' (una pila por línea)"""
+        return ''.join(f'{pila} {n}\n' for pila, n in self.pilas.most_common())
+
+
+class PerfiladorPeticiones:
+    """Perfilado opcional por petición con almacenamiento circular en disco"""
+
+    def __init__(self, directorio, max_perfiles=50, max_bytes=100 * 1048576, intervalo_ms=5,
+                 max_consultas=1000, autorizar=None):
+        """
+        Args:
+            directorio: Carpeta del buffer de perfiles (se crea si no existe)
+            max_perfiles: Perfiles conservados; se eliminan los más antiguos
+            max_bytes: Tamaño total máximo de la carpeta
+            intervalo_ms: Periodo de muestreo de la pila en modo 'muestreo'
+            max_consultas: Consultas SQL guardadas por perfil (el resto sólo se cuenta)
+            autorizar: Función sin argumentos que indica si la petición actual puede perfilarse
+        """
+        self.directorio = directorio
+        self.max_perfiles = max_perfiles
+        self.max_bytes = max_bytes
+        self.intervalo_s = intervalo_ms / 1000.0
+        self.max_consultas = max_consultas
+        self.autorizar = autorizar or (lambda: False)
+        self._lock = threading.Lock()
+
+    def init_app(self, app, cabecera='X-Perfilar', parametro='_perfilar'):
+        """
+        Instalar los ganchos de la aplicación
+
+        Args:
+            app: Aplicación Flask
+            cabecera: Cabecera que activa el perfilado (valor '1' o el modo)
+            parametro: Parámetro de la URL equivalente a la cabecera
+        """
+        self.cabecera = cabecera
+        self.parametro = parametro
+        app.before_request(self._antes)
+        app.after_request(self._despues)
+        app.teardown_request(self._fin)
+        return self
+
+    # ------------------------------------------------------------------
+    # Ganchos de la petición
+    # ------------------------------------------------------------------
+
+    def _solicitado(self):
+        valor = request.headers.get(self.cabecera) or request.args.get(self.parametro)
+        if not valor or valor.strip().lower() in ('0', 'false', 'no'):
+            return None
+        valor = valor.strip().lower()
+        return valor if valor in MODOS else 'muestreo'
+
+    def _antes(self):
+        modo = self._solicitado()
+        if modo is None:
+            return
+        try:
+            permitido = self.autorizar()
+        except Exception:
+            permitido = False
+        if not permitido:
+            logger.warning("Perfilado solicitado sin permisos en %s desde %s", request.path, request.remote_addr)
+            return
+
+        setattr(g, CLAVE_CONSULTAS, [])
+        estado = {'modo': modo, 'inicio': time.perf_counter(), 'fecha': datetime.now(), 'consultas_totales': 0}
+        if modo == 'cprofile':
+            estado['perfil'] = cProfile.Profile()
+            estado['perfil'].enable()
+        else:
+            estado['muestreador'] = MuestreadorPilas(threading.get_ident(), self.intervalo_s).iniciar()
+        g._perfil_estado = estado
+
+    def _despues(self, respuesta):
+        perfil_id = self._terminar(respuesta.status_code)
+        if perfil_id:
+            respuesta.headers['X-Perfil-Id'] = perfil_id
+        return respuesta
+
+    def _fin(self, error=None):
+        # La vista lanzó una excepción no manejada: se guarda igualmente
+        self._terminar(500, error)
+
+    def _terminar(self, estado_http, error=None):
+        estado = g.pop('_perfil_estado', None)
+        if estado is None:
+            return None
+        duracion_ms = (time.perf_counter() - estado['inicio']) * 1000
+        if 'perfil' in estado:
+            estado['perfil'].disable()
+        else:
+            estado['muestreador'].detener()
+        consultas = g.pop(CLAVE_CONSULTAS, [])
+        try:
+            return self._guardar(estado, consultas, duracion_ms, estado_http, error)
+        except OSError as e:
+            logger.warning("No se pudo guardar el perfil de %s: %s", request.path, e)
+            return None
+
+    # ------------------------------------------------------------------
+    # Almacenamiento
+    # ------------------------------------------------------------------
+
+    def _guardar(self, estado, consultas, duracion_ms, estado_http, error):
+        endpoint = re.sub(r'[^\w.-]', '_', request.endpoint or 'sin_ruta')
+        perfil_id = f"{estado['fecha']:%Y%m%d_%H%M%S_%f}_{endpoint}"
+        os.makedirs(self.directorio, exist_ok=True)
+        base = os.path.join(self.directorio, perfil_id)
+
+        if 'perfil' in estado:
+            archivo = 'prof'
+            estado['perfil'].dump_stats(base + '.prof')
+            muestras = None
+        else:
+            archivo = 'folded'
+            with open(base + '.folded', 'w', encoding='utf-8') as f:
+                f.write(estado['muestreador'].plegado())
+            muestras = estado['muestreador'].muestras
+
+        metadatos = {
+            'id': perfil_id,
+            'fecha': estado['fecha'].isoformat(timespec='seconds'),
+            'metodo': request.method,
+            'ruta': request.path,
+            'endpoint': request.endpoint,
+            'estado': estado_http,
+            'error': str(error) if error else None,
+            'modo': estado['modo'],
+            'archivo': archivo,
+            'duracion_ms': round(duracion_ms, 2),
+            'muestras': muestras,
+            'consultas_total': len(consultas),
+            'consultas_ms': round(sum(c['ms'] for c in consultas), 2),
+            'consultas': consultas[:self.max_consultas],
+        }
+        # El .json se escribe al final: un perfil sin él no aparece en el listado
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(metadatos, f, ensure_ascii=False, default=str)
+        self._podar()
+        logger.info("Perfil %s guardado (%s, %.1f ms, %d consultas)", perfil_id, estado['modo'],
+                    duracion_ms, len(consultas))
+        return perfil_id
+
+    def _archivos(self):
+        try:
+            nombres = os.listdir(self.directorio)
+        except FileNotFoundError:
+            return {}
+        grupos = {}
+        for nombre in nombres:
+            perfil_id, _, ext = nombre.rpartition('.')
+            if _RE_ID.match(perfil_id) and (ext == 'json' or ext in EXTENSIONES):
+                grupos.setdefault(perfil_id, []).append(os.path.join(self.directorio, nombre))
+        return grupos
+
+    def _podar(self):
+        """Eliminar los perfiles más antiguos que excedan el número o el tamaño máximo"""
+        with self._lock:
+            grupos = self._archivos()
+            tamanos = {}
+            for perfil_id, rutas in grupos.items():
+                tamanos[perfil_id] = sum(os.path.getsize(r) for r in rutas if os.path.exists(r))
+            ids = sorted(grupos)  # el id empieza por la fecha: orden cronológico
+            total = sum(tamanos.values())
+            while ids and (len(ids) > self.max_perfiles or total > self.max_bytes):
+                antiguo = ids.pop(0)
+                total -= tamanos[antiguo]
+                for ruta in grupos[antiguo]:
+                    try:
+                        os.remove(ruta)
+                    except FileNotFoundError:
+                        pass  # otro worker ya lo eliminó
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+
+    def listar(self, limite=50):
+        """Metadatos (sin la lista de consultas) de los perfiles guardados, más recientes primero"""
+        perfiles = []
+        for perfil_id in sorted(self._archivos(), reverse=True)[:limite]:
+            datos = self.obtener(perfil_id)
+            if datos:
+                datos.pop('consultas', None)
+                perfiles.append(datos)
+        return perfiles
+
+    def obtener(self, perfil_id):
+        """Metadatos completos de un perfil o None si no existe"""
+        if not _RE_ID.match(perfil_id or ''):
+            return None
+        try:
+            with open(os.path.join(self.directorio, perfil_id + '.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def ruta_archivo(self, perfil_id, extension):
+        """Ruta del archivo de perfil (.folded/.prof) o None si no existe o el id no es válido"""
+        if extension not in EXTENSIONES or not _RE_ID.match(perfil_id or ''):
+            return None
+        ruta = os.path.join(self.directorio, f'{perfil_id}.{extension}')
+        return ruta if os.path.isfile(ruta) else None
+
+    def eliminar_todos(self):
+        with self._lock:
+            for rutas in self._archivos().values():
+                for ruta in rutas:
+                    try:
+                        os.remove(ruta)
+                    except FileNotFoundError:
+                        pass
+
+
+def registrar_consulta(sql, duracion_ms, filas):
+    """Añadir una consulta al perfil de la petición actual (llamado por DatabaseManager)"""
+    consultas = g.get(CLAVE_CONSULTAS)
+    if consultas is None:
+        return
+    # Sólo la huella: los parámetros pueden contener contraseñas o datos personales
+    consultas.append({'sql': huella_sql(sql), 'ms': round(duracion_ms, 3), 'filas': filas})
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de Instrumentación de Consultas SQL
+Sistema de Laboratorios - Centro Minero SENA
+Registra por huella (SQL normalizado) la duración, filas devueltas y ruta que la originó,
+mantiene percentiles sobre una ventana móvil y guarda las consultas lentas con su EXPLAIN.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+_RE_COMENTARIOS = re.compile(r'/\*.*?\*/|--[^\n]*', re.S)
+_RE_CADENAS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_RE_NUMEROS = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_RE_MARCADORES = re.compile(r'%\(\w+\)s|%s')
+_RE_LISTAS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_RE_ESPACIOS = re.compile(r'\s+')
+
+
+def huella_sql(sql):
+    """
+    Normalizar una consulta para agrupar ejecuciones equivalentes
+
+    Sustituye literales y marcadores por '?', colapsa listas IN (...) y espacios.
+
+    Args:
+        sql: Texto SQL tal como se ejecutó
+
+    Returns:
+        str: Huella de la consulta
+    """
+    texto = _RE_COMENTARIOS.sub(' ', sql)
+    texto = _RE_CADENAS.sub('?', texto)
+    texto = _RE_MARCADORES.sub('?', texto)
+    texto = _RE_NUMEROS.sub('?', texto)
+    texto = _RE_LISTAS.sub('(?+)', texto)
+    return _RE_ESPACIOS.sub(' ', texto).strip()
+
+
+def percentil(valores_ordenados, p):
+    """Percentil por el método del rango más cercano sobre una lista ya ordenada"""
+    if not valores_ordenados:
+        return 0.0
+    indice = min(len(valores_ordenados) - 1, int(round(p / 100.0 * (len(valores_ordenados) - 1))))
+    return valores_ordenados[indice]
+
+
+class _EstadisticaHuella:
+    __slots__ = ('huella', 'ejecuciones', 'total_ms', 'max_ms', 'filas', 'ventana', 'rutas', 'ultima')
+
+    def __init__(self, huella, tamano_ventana):
+        self.huella = huella
+        self.ejecuciones = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.filas = 0
+        self.ventana = deque(maxlen=tamano_ventana)
+        self.rutas = Counter()
+        self.ultima = None
+
+
+class PerfiladorConsultas:
+    """Acumula métricas por huella de consulta y registra las consultas lentas"""
+
+    ORDENES = ('total_ms', 'p95_ms', 'p99_ms', 'max_ms', 'ejecuciones', 'filas')
+
+    def __init__(self, umbral_lento_ms=200, tamano_ventana=500, max_huellas=500,
+                 max_lentas=200, intervalo_explain_s=300, explicar=None):
+        """
+        Args:
+            umbral_lento_ms: Duración a partir de la cual la consulta se considera lenta
+            tamano_ventana: Ejecuciones recientes usadas para los percentiles de cada huella
+            max_huellas: Huellas distintas conservadas (se descartan las menos recientes)
+            max_lentas: Tamaño del registro de consultas lentas
+            intervalo_explain_s: Segundos mínimos entre dos EXPLAIN de la misma huella
+            explicar: Función (sql, params) -> lista de filas del EXPLAIN, o None
+        """
+        self.umbral_lento_ms = umbral_lento_ms
+        self.tamano_ventana = tamano_ventana
+        self.max_huellas = max_huellas
+        self.intervalo_explain_s = intervalo_explain_s
+        self.explicar = explicar
+        self._huellas = OrderedDict()
+        self._lentas = deque(maxlen=max_lentas)
+        self._ultimo_explain = {}
+        self._lock = threading.Lock()
+        self.inicio = datetime.now()
+
+    def registrar(self, sql, params, duracion_ms, filas, ruta=None):
+        """Registrar una ejecución; si supera el umbral se añade al registro de lentas"""
+        huella = huella_sql(sql)
+        with self._lock:
+            est = self._huellas.get(huella)
+            if est is None:
+                est = _EstadisticaHuella(huella, self.tamano_ventana)
+                self._huellas[huella] = est
+                if len(self._huellas) > self.max_huellas:
+                    self._huellas.popitem(last=False)
+            else:
+                self._huellas.move_to_end(huella)
+            est.ejecuciones += 1
+            est.total_ms += duracion_ms
+            est.max_ms = max(est.max_ms, duracion_ms)
+            est.filas += filas or 0
+            est.ventana.append(duracion_ms)
+            est.rutas[ruta or '-'] += 1
+            est.ultima = time.time()
+
+        if duracion_ms >= self.umbral_lento_ms:
+            self._registrar_lenta(huella, sql, params, duracion_ms, filas, ruta)
+
+    def _registrar_lenta(self, huella, sql, params, duracion_ms, filas, ruta):
+        plan = None
+        ahora = time.time()
+        if self.explicar and sql.lstrip().upper().startswith('SELECT'):
+            with self._lock:
+                ultimo = self._ultimo_explain.get(huella, 0)
+                toca = ahora - ultimo >= self.intervalo_explain_s
+                if toca:
+                    self._ultimo_explain[huella] = ahora
+            if toca:
+                try:
+                    plan = self.explicar(sql, params)
+                except Exception as e:
+                    plan = [{'error': str(e)}]
+
+        registro = {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'huella': huella,
+            'duracion_ms': round(duracion_ms, 2),
+            'filas': filas,
+            'ruta': ruta,
+            'plan': plan,
+        }
+        with self._lock:
+            self._lentas.append(registro)
+        logger.warning("Consulta lenta (%.1f ms, %s filas, ruta=%s): %s%s", duracion_ms, filas, ruta, huella,
+                       f"\nEXPLAIN: {plan}" if plan else '')
+
+    def resumen(self, orden='total_ms', limite=20):
+        """
+        Huellas ordenadas por el criterio indicado
+
+        Returns:
+            list: Diccionarios con ejecuciones, tiempos (media, p50, p95, p99, max), filas y rutas principales
+        """
+        if orden not in self.ORDENES:
+            orden = 'total_ms'
+        with self._lock:
+            copias = [(e.huella, e.ejecuciones, e.total_ms, e.max_ms, e.filas, sorted(e.ventana),
+                       e.rutas.most_common(3)) for e in self._huellas.values()]
+
+        filas = []
+        for huella, ejecuciones, total_ms, max_ms, total_filas, ventana, rutas in copias:
+            filas.append({
+                'huella': huella,
+                'ejecuciones': ejecuciones,
+                'total_ms': round(total_ms, 2),
+                'media_ms': round(total_ms / ejecuciones, 3) if ejecuciones else 0,
+                'p50_ms': round(percentil(ventana, 50), 3),
+                'p95_ms': round(percentil(ventana, 95), 3),
+                'p99_ms': round(percentil(ventana, 99), 3),
+                'max_ms': round(max_ms, 3),
+                'filas': total_filas,
+                'filas_por_ejecucion': round(total_filas / ejecuciones, 1) if ejecuciones else 0,
+                'rutas': [{'ruta': r, 'ejecuciones': n} for r, n in rutas],
+            })
+        filas.sort(key=lambda f: f[orden], reverse=True)
+        return filas[:limite]
+
+    def lentas(self, limite=50):
+        """Últimas consultas lentas registradas (más recientes primero)"""
+        with self._lock:
+            return list(self._lentas)[::-1][:limite]
+
+    def reiniciar(self):
+        with self._lock:
+            self._huellas.clear()
+            self._lentas.clear()
+            self._ultimo_explain.clear()
+            self.inicio = datetime.now()
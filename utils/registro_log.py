@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de Registro (logging) Estructurado
+Sistema de Laboratorios - Centro Minero SENA
+Líneas JSON con nivel, logger, ruta HTTP y campos extra; escritura en un hilo aparte
+mediante QueueHandler/QueueListener y muestreo para mensajes dentro de bucles calientes.
+
+Uso:
+    logger = logging.getLogger('web_app.facial')
+    logger.debug("Usuario %s: similitud %.4f", nombre, sim, extra={'muestra': 50})
+
+Variables de entorno:
+    LOG_LEVEL      Nivel raíz (INFO por defecto; DEBUG sólo si se pide explícitamente)
+    LOG_LEVELS     Niveles por módulo: "web_app.vision=DEBUG,modules.vision_ai_module=WARNING"
+    LOG_FORMAT     json (por defecto) o texto
+    LOG_FILE       Archivo adicional con rotación (p. ej. logs/sistema.log)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+
+try:
+    from flask import has_request_context, request
+except ImportError:  # Uso fuera de la aplicación web
+    has_request_context = None
+    request = None
+
+# Atributos estándar de LogRecord: el resto se considera campo extra estructurado
+_ATRIBUTOS_ESTANDAR = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_listener = None
+
+
+class FormateadorJSON(logging.Formatter):
+    """Una línea JSON por registro"""
+
+    def format(self, record):
+        datos = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensaje': record.getMessage(),
+            'modulo': record.module,
+            'linea': record.lineno,
+            'hilo': record.threadName,
+        }
+        for clave, valor in record.__dict__.items():
+            if clave not in _ATRIBUTOS_ESTANDAR and not clave.startswith('_'):
+                datos[clave] = valor
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            datos['excepcion'] = record.exc_text
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class FiltroMuestreo(logging.Filter):
+    """
+    Deja pasar 1 de cada N registros que lleven extra={'muestra': N}
+
+    El conteo es por (logger, plantilla del mensaje); el primero siempre se emite.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._conteos = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        n = getattr(record, 'muestra', None)
+        if not n or n <= 1:
+            return True
+        clave = (record.name, record.msg)
+        with self._lock:
+            conteo = self._conteos.get(clave, 0)
+            self._conteos[clave] = conteo + 1
+        return conteo % n == 0
+
+
+class FiltroContextoPeticion(logging.Filter):
+    """Añade método y ruta de la petición Flask (se ejecuta en el hilo que registra)"""
+
+    def filter(self, record):
+        if has_request_context is not None and has_request_context():
+            record.metodo = request.method
+            record.ruta = request.path
+        return True
+
+
+class QueueHandlerNoBloqueante(logging.handlers.QueueHandler):
+    """QueueHandler que descarta (y cuenta) registros si la cola está llena en lugar de bloquear"""
+
+    def __init__(self, cola):
+        super().__init__(cola)
+        self.descartados = 0
+
+    def prepare(self, record):
+        # Resolver el mensaje en el hilo que registra (los args pueden cambiar después);
+        # el formateo JSON y la escritura se hacen en el hilo del listener
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+def _parsear_niveles(texto):
+    niveles = {}
+    for parte in (texto or '').split(','):
+        if '=' in parte:
+            nombre, nivel = parte.split('=', 1)
+            niveles[nombre.strip()] = nivel.strip().upper()
+    return niveles
+
+
+def _detener_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(_detener_listener)
+
+
+def configurar_logging(nivel=None, formato=None, niveles_modulo=None, archivo=None, tamano_cola=10000, en_cola=True):
+    """
+    Configurar el logging raíz con cola no bloqueante
+
+    Args:
+        nivel: Nivel raíz (por defecto LOG_LEVEL o INFO)
+        formato: 'json' o 'texto' (por defecto LOG_FORMAT o json)
+        niveles_modulo: dict {logger: nivel} (se combina con LOG_LEVELS)
+        archivo: Ruta de archivo con rotación (por defecto LOG_FILE)
+        tamano_cola: Registros pendientes máximos antes de descartar
+        en_cola: False escribe directamente desde el hilo que registra, sin hilo listener
+            (proceso maestro de gunicorn antes del fork: un hilo no sobrevive al fork y
+            podría dejar tomado el lock de la cola o del stream en los workers)
+
+    Returns:
+        logging.Handler: Handler instalado en el logger raíz (el de la cola o el de stdout)
+    """
+    global _listener
+
+    nivel = (nivel or os.getenv('LOG_LEVEL', 'INFO')).upper()
+    formato = (formato or os.getenv('LOG_FORMAT', 'json')).lower()
+    archivo = archivo or os.getenv('LOG_FILE')
+
+    if formato == 'json':
+        formateador = FormateadorJSON()
+    else:
+        formateador = logging.Formatter('%(asctime)s %(levelname)-7s %(name)s: %(message)s')
+
+    destinos = [logging.StreamHandler(sys.stdout)]
+    if archivo:
+        os.makedirs(os.path.dirname(os.path.abspath(archivo)), exist_ok=True)
+        destinos.append(logging.handlers.RotatingFileHandler(
+            archivo, maxBytes=10 * 1024 * 1024, backupCount=5, encoding='utf-8'))
+    for destino in destinos:
+        destino.setFormatter(formateador)
+
+    # Reconfigurar (p. ej. varias llamadas a create_app o post_fork) detiene el listener anterior
+    _detener_listener()
+    if en_cola:
+        cola = queue.Queue(maxsize=tamano_cola)
+        _listener = logging.handlers.QueueListener(cola, *destinos, respect_handler_level=True)
+        _listener.start()
+        manejadores = [QueueHandlerNoBloqueante(cola)]
+    else:
+        manejadores = destinos
+    for manejador in manejadores:
+        manejador.addFilter(FiltroMuestreo())
+        manejador.addFilter(FiltroContextoPeticion())
+
+    raiz = logging.getLogger()
+    for h in list(raiz.handlers):
+        raiz.removeHandler(h)
+    for manejador in manejadores:
+        raiz.addHandler(manejador)
+    raiz.setLevel(nivel)
+
+    niveles = _parsear_niveles(os.getenv('LOG_LEVELS'))
+    niveles.update(niveles_modulo or {})
+    for nombre, nivel_modulo in niveles.items():
+        logging.getLogger(nombre).setLevel(nivel_modulo)
+
+    return manejadores[0]
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de Sesiones en el Servidor
+Sistema de Laboratorios - Centro Minero SENA
+Sustituye la sesión en cookie firmada de Flask por un identificador compacto (22 caracteres
++ firma) y guarda los datos en el servidor: en memoria del proceso ('local') o en la tabla
+sesiones_web de MySQL ('mysql').
+
+- Carga diferida: los datos sólo se leen del almacén si la petición toca `session`.
+- Escritura sólo si la sesión cambió o si hace falta extender su expiración (cada refresco_s).
+- Una sesión vaciada (logout) se borra del almacén junto con la cookie.
+- Al cambiar el usuario de la sesión (login) se emite un identificador nuevo y se borra el anterior.
+- Barrido periódico de sesiones expiradas desde las propias peticiones (cada barrido_s por proceso).
+
+Uso:
+    app.session_interface = InterfazSesionServidor(AlmacenSesionesMySQL(db_manager))
+"""
+
+import logging
+import secrets
+import threading
+import time
+from datetime import timedelta
+
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+logger = logging.getLogger(__name__)
+
+ESQUEMA_SESIONES = """
+CREATE TABLE IF NOT EXISTS {tabla} (
+    id CHAR(22) NOT NULL PRIMARY KEY,
+    datos MEDIUMTEXT NOT NULL,
+    expira DATETIME NOT NULL,
+    INDEX idx_sesiones_expira (expira)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin
+"""
+
+
+class AlmacenSesionesLocal:
+    """Sesiones en memoria del proceso (un solo worker o desarrollo)"""
+
+    nombre = 'local'
+
+    def __init__(self):
+        self._datos = {}
+        self._lock = threading.Lock()
+
+    def cargar(self, sid):
+        """(datos, segundos_restantes) o None si no existe o expiró"""
+        with self._lock:
+            entrada = self._datos.get(sid)
+        if entrada is None:
+            return None
+        restante = entrada[1] - time.time()
+        return (entrada[0], restante) if restante > 0 else None
+
+    def guardar(self, sid, datos, ttl_s):
+        with self._lock:
+            self._datos[sid] = (datos, time.time() + ttl_s)
+
+    def eliminar(self, sid):
+        with self._lock:
+            self._datos.pop(sid, None)
+
+    def purgar_expiradas(self):
+        ahora = time.time()
+        with self._lock:
+            vencidas = [sid for sid, (_, expira) in self._datos.items() if expira <= ahora]
+            for sid in vencidas:
+                del self._datos[sid]
+        return len(vencidas)
+
+    def __len__(self):
+        return len(self._datos)
+
+
+class AlmacenSesionesMySQL:
+    """Sesiones en la tabla sesiones_web, compartidas por todos los workers"""
+
+    nombre = 'mysql'
+
+    def __init__(self, db_manager, tabla='sesiones_web', purga_max=5000):
+        self.db = db_manager
+        self.tabla = tabla
+        self.purga_max = purga_max
+        self._tabla_lista = False
+
+    def _preparar(self):
+        if not self._tabla_lista:
+            self.db.execute_query(ESQUEMA_SESIONES.format(tabla=self.tabla))
+            self._tabla_lista = True
+
+    def cargar(self, sid):
+        self._preparar()
+        filas = self.db.execute_query(
+            f"SELECT datos, TIMESTAMPDIFF(SECOND, NOW(), expira) AS restante FROM {self.tabla} "
+            f"WHERE id = %s AND expira > NOW()",
+            (sid,),
+        )
+        return (filas[0]['datos'], float(filas[0]['restante'])) if filas else None
+
+    def guardar(self, sid, datos, ttl_s):
+        self._preparar()
+        self.db.execute_query(
+            f"""
+            INSERT INTO {self.tabla} (id, datos, expira) VALUES (%s, %s, DATE_ADD(NOW(), INTERVAL %s SECOND))
+            ON DUPLICATE KEY UPDATE datos = VALUES(datos), expira = VALUES(expira)
+            """,
+            (sid, datos, int(ttl_s)),
+        )
+
+    def eliminar(self, sid):
+        self._preparar()
+        self.db.execute_query(f"DELETE FROM {self.tabla} WHERE id = %s", (sid,))
+
+    def purgar_expiradas(self):
+        self._preparar()
+        # Por tandas para no bloquear la tabla con un DELETE enorme
+        return self.db.execute_query(f"DELETE FROM {self.tabla} WHERE expira <= NOW() LIMIT %s", (self.purga_max,))
+
+
+def crear_almacen_sesiones(tipo, db_manager=None):
+    """'local' o 'mysql' (None para 'cookie': se mantiene la sesión firmada de Flask)"""
+    tipo = (tipo or 'cookie').strip().lower()
+    if tipo == 'cookie':
+        return None
+    if tipo == 'local':
+        return AlmacenSesionesLocal()
+    if tipo == 'mysql':
+        return AlmacenSesionesMySQL(db_manager)
+    raise ValueError(f"SESSION_BACKEND desconocido: {tipo} (cookie, local o mysql)")
+
+
+def _con_carga(nombre):
+    original = getattr(CallbackDict, nombre)
+
+    def metodo(self, *args, **kwargs):
+        self._cargar()
+        return original(self, *args, **kwargs)
+    metodo.__name__ = nombre
+    return metodo
+
+
+class SesionServidor(CallbackDict, SessionMixin):
+    """Diccionario de sesión que lee el almacén en el primer acceso"""
+
+    def __init__(self, sid=None, cargador=None, trae_cookie=None):
+        def al_cambiar(sesion):
+            sesion.modified = True
+            sesion.accessed = True
+
+        super().__init__(None, al_cambiar)
+        self.sid = sid
+        # La petición trajo una cookie de sesión (válida o no): sólo entonces hay que borrarla
+        self.trae_cookie = sid is not None if trae_cookie is None else trae_cookie
+        self.restante = None
+        # Usuario con el que llegó la sesión: si cambia (login) se rota el identificador
+        self.usuario_inicial = None
+        self.modified = False
+        self.accessed = False
+        self._cargador = cargador
+        self.cargada = cargador is None
+
+    def _cargar(self):
+        if self.cargada:
+            return
+        self.cargada = True
+        self.accessed = True
+        try:
+            entrada = self._cargador()
+        except Exception as e:
+            # Sin almacén la petición sigue como anónima en lugar de fallar con 500
+            logger.warning("No se pudo leer la sesión: %s", e)
+            entrada = None
+        if entrada is None:
+            self.sid = None
+            return
+        datos, self.restante = entrada
+        try:
+            dict.update(self, session_json_serializer.loads(datos))
+        except Exception as e:
+            logger.warning("Sesión %s ilegible, se descarta: %s", self.sid[:6], e)
+            self.sid = None
+            return
+        self.usuario_inicial = dict.get(self, 'user_id')
+
+    __hash__ = None
+
+
+# Toda lectura o escritura del diccionario carga antes los datos del almacén
+for _nombre in ('__getitem__', '__contains__', '__iter__', '__len__', '__repr__', '__eq__', 'get', 'keys',
+                'items', 'values', 'copy', '__setitem__', '__delitem__', 'setdefault', 'pop', 'popitem',
+                'update', 'clear'):
+    setattr(SesionServidor, _nombre, _con_carga(_nombre))
+del _nombre
+
+
+class InterfazSesionServidor(SessionInterface):
+    """SessionInterface de Flask con los datos en un almacén del servidor"""
+
+    def __init__(self, almacen, duracion=timedelta(hours=12), refresco_s=300, barrido_s=600, salt='sesion-servidor'):
+        """
+        Args:
+            almacen: AlmacenSesionesLocal o AlmacenSesionesMySQL
+            duracion: Inactividad máxima de una sesión no permanente (las permanentes usan
+                PERMANENT_SESSION_LIFETIME)
+            refresco_s: Sin cambios, la expiración se extiende como mucho una vez cada refresco_s
+            barrido_s: Intervalo entre barridos de sesiones expiradas en cada proceso
+            salt: Sal de la firma del identificador
+        """
+        self.almacen = almacen
+        self.duracion = duracion
+        self.refresco_s = refresco_s
+        self.barrido_s = barrido_s
+        self.salt = salt
+        self._ultimo_barrido = time.monotonic()
+        self.stats = {'cargas': 0, 'escrituras': 0, 'eliminadas': 0, 'rotadas': 0, 'purgadas': 0}
+
+    def _firmante(self, app):
+        return Signer(app.secret_key, salt=self.salt) if app.secret_key else None
+
+    def _ttl(self, app, session):
+        vida = app.permanent_session_lifetime if session.permanent else self.duracion
+        return int(vida.total_seconds())
+
+    def open_session(self, app, request):
+        firmante = self._firmante(app)
+        if firmante is None:
+            return None
+        sid = None
+        valor = request.cookies.get(self.get_cookie_name(app))
+        if valor:
+            try:
+                sid = firmante.unsign(valor).decode('ascii')
+            except BadSignature:
+                sid = None
+        if sid is None:
+            return SesionServidor(trae_cookie=bool(valor))
+
+        def cargar():
+            self.stats['cargas'] += 1
+            return self.almacen.cargar(sid)
+        return SesionServidor(sid, cargar)
+
+    def save_session(self, app, session, response):
+        self._barrer()
+        if not session.cargada:
+            # La petición no tocó la sesión: ni lectura ni escritura
+            return
+        nombre = self.get_cookie_name(app)
+        dominio = self.get_cookie_domain(app)
+        ruta = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            # Vaciada (logout) o cookie que ya no sirve (vencida, ilegible, mal firmada); sin
+            # cookie en la petición no se envía nada
+            if session.modified or session.trae_cookie:
+                if session.sid is not None:
+                    self.almacen.eliminar(session.sid)
+                    self.stats['eliminadas'] += 1
+                response.delete_cookie(nombre, domain=dominio, path=ruta,
+                                       secure=self.get_cookie_secure(app), httponly=self.get_cookie_httponly(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+
+        nueva = session.sid is None
+        if not nueva and dict.get(session, 'user_id') != session.usuario_inicial:
+            # Login o cambio de usuario: identificador nuevo, para que uno obtenido (o fijado por
+            # un atacante) antes de autenticarse no sirva después
+            self.almacen.eliminar(session.sid)
+            self.stats['rotadas'] += 1
+            session.sid = None
+            nueva = True
+        ttl = self._ttl(app, session)
+        vencida_pronto = session.restante is not None and session.restante < ttl - self.refresco_s
+        if nueva:
+            session.sid = secrets.token_urlsafe(16)
+        if nueva or session.modified or vencida_pronto:
+            self.almacen.guardar(session.sid, session_json_serializer.dumps(dict(session)), ttl)
+            self.stats['escrituras'] += 1
+
+        if nueva or self.should_set_cookie(app, session):
+            response.set_cookie(
+                nombre,
+                self._firmante(app).sign(session.sid.encode('ascii')).decode('ascii'),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=dominio,
+                path=ruta,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+    def _barrer(self):
+        if time.monotonic() - self._ultimo_barrido < self.barrido_s:
+            return
+        self._ultimo_barrido = time.monotonic()
+        try:
+            self.stats['purgadas'] += int(self.almacen.purgar_expiradas() or 0)
+        except Exception as e:
+            logger.warning("No se pudieron purgar las sesiones expiradas: %s", e)
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+Punto de Entrada WSGI para Producción
+Sistema de Laboratorios - Centro Minero SENA
+
+Crea la aplicación con precarga de OpenCV/numpy, del generador de reportes y de los
+índices en memoria (plantillas ORB y rostros). Con un servidor pre-fork y
+preload_app (gunicorn.conf.py) esto ocurre una sola vez en el proceso maestro y los
+workers lo comparten por copy-on-write.
+
+Uso:
+    gunicorn -c gunicorn.conf.py wsgi:application            (Linux)
+    waitress-serve --port=5000 --threads=8 wsgi:application   (Windows)
+
+Variables de entorno (además de las de web_app.create_app):
+    APP_BLUEPRINTS   Grupos a montar en este pool (p. ej. "vision,facial"); por defecto todos
+    PRELOAD_VISION, PRELOAD_REPORTS, PRELOAD_INDEXES   1 por defecto en producción
+"""
+
+import os
+
+from web_app import create_app
+
+application = create_app({
+    'PRELOAD_VISION': os.getenv('PRELOAD_VISION', '1'),
+    'PRELOAD_REPORTS': os.getenv('PRELOAD_REPORTS', '1'),
+    'PRELOAD_INDEXES': os.getenv('PRELOAD_INDEXES', '1'),
+})
+app = application